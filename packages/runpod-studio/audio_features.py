@@ -0,0 +1,189 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+AUDIO FEATURES - Streaming Whisper Features, Cached by Audio Content
+═══════════════════════════════════════════════════════════════════════════════════
+
+MuseTalk conditions every frame on Whisper encoder features of the voice
+track. They depend only on the audio, not on fps or quality, so a draft
+preview followed by a cinema render of the same TTS clip extracts them once:
+
+    - the audio is decoded by ffmpeg to 16 kHz mono PCM and read in fixed
+      windows (30 s = one Whisper context), never fully in memory
+    - each window is featurized as soon as it is read; features are appended
+      to the cache entry on disk with per-chunk timings
+    - entries are keyed by sha256 of the audio file (+ extractor params) in a
+      size-bounded LRU DiskCache and opened as a read-only memmap on a hit
+
+Entry layout: `<key>/features.bin` (raw array) + `<key>/meta.json` (shape,
+dtype, chunk timings).
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import json
+import time
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Iterator
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from disk_cache import DiskCache, digest_key, file_digest
+
+FEATURE_VERSION = 1
+SAMPLE_RATE = 16000  # Whisper's input rate
+
+Featurizer = Callable[[np.ndarray], np.ndarray]  # float32 PCM window → (T, ...) features
+
+
+def ffmpeg_pcm_chunks(audio_path: Path, chunk_samples: int,
+                      sample_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """Decode any audio file to mono float32 PCM and yield it `chunk_samples` at a time."""
+    proc = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-i", str(audio_path),
+         "-f", "f32le", "-ac", "1", "-ar", str(sample_rate), "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    chunk_bytes = chunk_samples * 4
+    try:
+        while True:
+            data = proc.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)
+    finally:
+        proc.stdout.close()
+        stderr = proc.stderr.read().decode(errors="replace").strip()
+        proc.stderr.close()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg audio decode failed: {stderr}")
+
+
+@dataclass
+class FeatureResult:
+    key: str
+    features: np.ndarray
+    cache: str = "miss"          # "hit" | "miss" | "bypass"
+    elapsed_s: float = 0.0
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "cache": self.cache,
+            "ms": round(self.elapsed_s * 1000, 1),
+            "shape": list(self.features.shape),
+            "chunks": self.chunks,
+        }
+
+
+class AudioFeatureExtractor:
+    """
+    Usage:
+        extractor = AudioFeatureExtractor(DiskCache(WORKSPACE / "cache" / "audio", max_bytes=5 * 1024**3))
+        result = extractor.extract(voice_path, engine.featurize, params=engine.feature_params)
+        chunks = engine.audio_chunks(result.features, fps)
+        metadata["audio_features"] = result.to_dict()
+
+    `featurize(pcm)` maps one float32 window at SAMPLE_RATE to a (T, ...)
+    feature array; windows are concatenated along T. `params` holds
+    everything besides the audio that changes the result (model, version).
+    `pcm_source(path, chunk_samples)` defaults to ffmpeg decoding.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[DiskCache] = None,
+        chunk_s: float = 30.0,
+        dtype: Any = np.float16,
+        pcm_source: Callable[[Path, int], Iterator[np.ndarray]] = ffmpeg_pcm_chunks,
+    ):
+        self.cache = cache
+        self.chunk_s = chunk_s
+        self.dtype = np.dtype(dtype)
+        self.pcm_source = pcm_source
+
+    def key_for(self, audio_sha: str, params: Optional[Dict[str, Any]] = None) -> str:
+        params_digest = digest_key(FEATURE_VERSION, self.chunk_s, self.dtype.str,
+                                   json.dumps(params or {}, sort_keys=True))
+        return f"{audio_sha}-{params_digest[:16]}"
+
+    @staticmethod
+    def _open(directory: Path) -> np.memmap:
+        meta = json.loads((directory / "meta.json").read_text())
+        return np.memmap(directory / "features.bin", dtype=meta["dtype"], mode="r",
+                         shape=tuple(meta["shape"]))
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def extract(self, audio_path: Path, featurize: Featurizer,
+                params: Optional[Dict[str, Any]] = None) -> FeatureResult:
+        start = time.time()
+        key = self.key_for(file_digest(audio_path), params)
+
+        if self.cache is not None:
+            path = self.cache.get(key)
+            if path is not None:
+                try:
+                    meta = json.loads((path / "meta.json").read_text())
+                    result = FeatureResult(key, self._open(path), cache="hit", chunks=meta["chunks"])
+                    result.elapsed_s = time.time() - start
+                    return result
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"[AudioFeatures] Dropping unreadable entry {key}: {e}")
+                    self.cache.remove(key)
+
+        target = self.cache.reserve() if self.cache is not None else None
+        result = FeatureResult(key, np.empty(0, self.dtype), cache="miss" if target else "bypass")
+        parts: List[np.ndarray] = []
+        shape = None
+        out = None
+        try:
+            if target is not None:
+                target.mkdir(parents=True)
+                out = open(target / "features.bin", "wb")
+            chunk_samples = int(self.chunk_s * SAMPLE_RATE)
+            for index, pcm in enumerate(self.pcm_source(Path(audio_path), chunk_samples)):
+                t0 = time.perf_counter()
+                features = np.ascontiguousarray(featurize(pcm), dtype=self.dtype)
+                result.chunks.append({
+                    "index": index,
+                    "audio_s": round(len(pcm) / SAMPLE_RATE, 3),
+                    "frames": len(features),
+                    "ms": round((time.perf_counter() - t0) * 1000, 1),
+                })
+                if shape is None:
+                    shape = [0, *features.shape[1:]]
+                shape[0] += len(features)
+                if out is not None:
+                    out.write(features.tobytes())
+                else:
+                    parts.append(features)
+
+            if shape is None:
+                raise ValueError(f"No audio decoded from {audio_path}")
+            if target is None:
+                result.features = np.concatenate(parts)
+            else:
+                out.close()
+                (target / "meta.json").write_text(json.dumps({
+                    "shape": shape,
+                    "dtype": self.dtype.str,
+                    "chunks": result.chunks,
+                    "params": params or {},
+                    "created_at": time.time(),
+                }))
+                result.features = self._open(self.cache.commit(key, target))
+        except BaseException:
+            if out is not None:
+                out.close()
+                shutil.rmtree(target, ignore_errors=True)
+            raise
+
+        result.elapsed_s = time.time() - start
+        return result
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        return self.cache.stats() if self.cache is not None else None
@@ -0,0 +1,430 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+AUDIO MIXER - Block-Streaming Voice / Music / Ambience / SFX Mix in Process
+═══════════════════════════════════════════════════════════════════════════════════
+
+mix_audio used to build an ffmpeg amix graph: `aloop=loop=-1:size=2e+09`
+buffered the whole music and ambience loops, every job paid for another
+process, and any error silently fell back to the bare voice track.
+StreamingMixer does the same mix in one pass over fixed-size blocks:
+
+    voice ──────────────┬───────────────────────────────┐
+                        └─ envelope follower ─▶ gain ─┐ │
+    music (looped) × base_volume ────────────────── × ┴─┤
+    ambience (looped) × 0.08 ───────────────────────────┤─ Σ / active ─▶ PCM
+    sfx[i] at its start sample × volume ────────────────┘
+
+Every track is decoded once, as a stream (ffmpeg → f32le pipe, or the
+stdlib `wave` reader for PCM WAVs already at the mix rate). A looped bed
+keeps its decoded samples (int16, up to `loop_buffer_s`) to replay them. A
+bed longer than that is decoded again instead of being held in memory.
+
+The ducking matches ffmpeg's sidechaincompress as mix_audio configured it:
+RMS detection, threshold 0.02, ratio 10, soft knee 2.83, and attack/release
+from `ducking_config`. The envelope advances `hop` samples at a time
+(~2.7 ms at 48 kHz, far below the attack time) and the gain is
+interpolated back to every sample. The sum is normalized like amix: by the
+number of inputs, easing to the inputs still playing over 2 s as they end.
+The output is 16-bit PCM WAV, which the final muxer encodes to AAC once
+(the old path encoded AAC twice).
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import subprocess
+import time
+import wave
+from bisect import bisect_right
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 48000
+AMBIENCE_VOLUME = 0.08
+DROPOUT_TRANSITION_S = 2.0
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# DECODERS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class FfmpegPcmReader:
+    """Any ffmpeg-readable file as float32 (n, channels) blocks at `sample_rate`."""
+
+    def __init__(self, path: Path, sample_rate: int = SAMPLE_RATE, channels: int = 2):
+        self.channels = channels
+        self._proc = subprocess.Popen(
+            ["ffmpeg", "-v", "error", "-i", str(path), "-f", "f32le",
+             "-ac", str(channels), "-ar", str(sample_rate), "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+
+    def read(self, frames: int) -> np.ndarray:
+        data = self._proc.stdout.read(frames * self.channels * 4)
+        return np.frombuffer(data[:len(data) // (self.channels * 4) * self.channels * 4],
+                             dtype=np.float32).reshape(-1, self.channels)
+
+    def close(self) -> None:
+        self._proc.stdout.close()
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+
+
+class WavPcmReader:
+    """16-bit PCM WAV at the mix rate, read with the stdlib (mono is duplicated, extra channels dropped)."""
+
+    def __init__(self, path: Path, channels: int = 2):
+        self.channels = channels
+        self._wav = wave.open(str(path), "rb")
+        self._source_channels = self._wav.getnchannels()
+
+    @staticmethod
+    def supports(path: Path, sample_rate: int) -> bool:
+        if Path(path).suffix.lower() != ".wav":
+            return False
+        try:
+            with wave.open(str(path), "rb") as wav:
+                return wav.getsampwidth() == 2 and wav.getframerate() == sample_rate
+        except (wave.Error, EOFError, OSError):
+            return False
+
+    def read(self, frames: int) -> np.ndarray:
+        samples = np.frombuffer(self._wav.readframes(frames), dtype="<i2").reshape(-1, self._source_channels)
+        samples = samples.astype(np.float32) / 32768.0
+        if self._source_channels == self.channels:
+            return samples
+        if self._source_channels == 1:
+            return np.repeat(samples, self.channels, axis=1)
+        return samples[:, :self.channels]
+
+    def close(self) -> None:
+        self._wav.close()
+
+
+def open_pcm(path: Path, sample_rate: int = SAMPLE_RATE, channels: int = 2):
+    """Stream decoder for `path`: the stdlib WAV reader when it can, else an ffmpeg pipe."""
+    if WavPcmReader.supports(path, sample_rate):
+        return WavPcmReader(path, channels)
+    return FfmpegPcmReader(path, sample_rate, channels)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# TRACKS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class StreamTrack:
+    """
+    A track played once from `start` (samples of leading silence, as adelay).
+    `read(n)` always returns n samples; `ended` turns true once the source
+    is exhausted, and `filled` is how many of the last n were real samples.
+    """
+
+    def __init__(self, reader: Any, channels: int = 2, start: int = 0, volume: float = 1.0):
+        self.reader = reader
+        self.channels = channels
+        self.delay = max(0, start)
+        self.volume = volume
+        self.ended = False
+        self.filled = 0
+
+    def _source(self, frames: int) -> np.ndarray:
+        return self.reader.read(frames)
+
+    def read(self, frames: int) -> np.ndarray:
+        out = np.zeros((frames, self.channels), dtype=np.float32)
+        self.filled = 0
+        if self.ended:
+            return out
+        silent = min(self.delay, frames)
+        self.delay -= silent
+        filled = silent
+        while filled < frames:
+            block = self._source(frames - filled)
+            if len(block) == 0:
+                self.ended = True
+                self.reader.close()
+                break
+            out[filled:filled + len(block)] = block
+            filled += len(block)
+        self.filled = filled
+        if self.volume != 1.0:
+            out *= self.volume
+        return out
+
+    def close(self) -> None:
+        if not self.ended:
+            self.ended = True
+            self.reader.close()
+
+
+class LoopTrack(StreamTrack):
+    """
+    A bed looped until `limit` samples (atrim), then ended. The first pass is
+    streamed from `open_reader()` and kept as int16 while it fits in
+    `loop_buffer` samples; later passes replay that buffer, or reopen the
+    decoder when the bed was too long to keep.
+    """
+
+    def __init__(self, open_reader, limit: int, channels: int = 2, volume: float = 1.0,
+                 loop_buffer: int = 180 * SAMPLE_RATE):
+        super().__init__(open_reader(), channels, volume=volume)
+        self.open_reader = open_reader
+        self.remaining = limit
+        self.loop_buffer = loop_buffer
+        self.decodes = 1
+        self._kept: Optional[List[np.ndarray]] = []
+        self._kept_samples = 0
+        self._loop: Optional[List[np.ndarray]] = None
+        self._chunk = 0
+        self._position = 0
+        self._produced = False
+
+    def _source(self, frames: int) -> np.ndarray:
+        frames = min(frames, self.remaining)
+        if frames <= 0:
+            return np.zeros((0, self.channels), dtype=np.float32)
+        if self._loop is not None:
+            block = self._replay(frames)
+        else:
+            block = self.reader.read(frames)
+            if len(block) == 0:
+                block = self._rewind(frames)
+            elif self._kept is not None:
+                self._kept_samples += len(block)
+                if self._kept_samples <= self.loop_buffer:
+                    self._kept.append((np.clip(block, -1, 1) * 32767).astype(np.int16))
+                else:
+                    self._kept = None  # Too long to keep: the next pass is decoded again
+        self._produced = self._produced or len(block) > 0
+        self.remaining -= len(block)
+        return block
+
+    def _rewind(self, frames: int) -> np.ndarray:
+        if not self._produced:
+            return np.zeros((0, self.channels), dtype=np.float32)  # Empty source: nothing to loop
+        if self._kept is not None:
+            self._loop, self._kept = self._kept, None
+            self.reader.close()
+            return self._replay(frames)
+        self.reader.close()
+        self.reader = self.open_reader()
+        self.decodes += 1
+        return self.reader.read(frames)
+
+    def _replay(self, frames: int) -> np.ndarray:
+        chunk = self._loop[self._chunk]
+        if self._position >= len(chunk):
+            self._chunk = (self._chunk + 1) % len(self._loop)
+            self._position = 0
+            chunk = self._loop[self._chunk]
+        block = chunk[self._position:self._position + frames]
+        self._position += len(block)
+        return block.astype(np.float32) / 32767.0
+
+    def close(self) -> None:
+        if self._loop is None:
+            super().close()
+        self.ended = True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# SIDECHAIN DUCKING
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class SidechainDucker:
+    """
+    Envelope follower + downward compressor gain, ffmpeg sidechaincompress
+    semantics (detection=rms, link=average, makeup 1), fed the voice block by
+    block; state carries across blocks.
+
+    ffmpeg updates the envelope every sample, with the attack coefficient
+    when the sample's power is above it and the release one otherwise. Here
+    each hop of `hop` samples is advanced in one step: the hop's powers are
+    sorted, split at the envelope into attack and release samples, and the
+    envelope moves toward their weighted mean in closed form. That is exact
+    for hop=1 and in steady state, and keeps the Python loop at one
+    iteration per hop.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, attack_ms: float = 50, release_ms: float = 300,
+                 threshold: float = 0.02, ratio: float = 10.0, knee: float = 2.82843, hop: int = 128):
+        self.hop = max(1, hop)
+        self.attack = min(1.0, 4000.0 / (max(attack_ms, 0.01) * sample_rate))
+        self.release = min(1.0, 4000.0 / (max(release_ms, 0.01) * sample_rate))
+
+        self.ratio = ratio
+        self.thres = np.log(threshold)
+        self.knee_on = knee > 1.0
+        self.adj_knee_start = (threshold / np.sqrt(knee)) ** 2
+        self.knee_start = np.log(threshold / np.sqrt(knee))
+        self.knee_stop = np.log(threshold * np.sqrt(knee))
+        self.compressed_knee_stop = (self.knee_stop - self.thres) / ratio + self.thres
+
+        self.slope = 0.0
+        self.last_gain = 1.0
+        self._carry = np.zeros(0, dtype=np.float32)
+
+    def _gain(self, lin_slope: np.ndarray) -> np.ndarray:
+        gain = np.ones_like(lin_slope)
+        active = lin_slope > self.adj_knee_start
+        if not active.any():
+            return gain
+        slope = 0.5 * np.log(lin_slope[active])  # RMS: the envelope is a power
+        out = (slope - self.thres) / self.ratio + self.thres
+        if self.knee_on:
+            in_knee = slope < self.knee_stop
+            if in_knee.any():
+                x0, x1 = self.knee_start, self.knee_stop
+                width = x1 - x0
+                t = (slope[in_knee] - x0) / width
+                p0, p1, m0, m1 = x0, self.compressed_knee_stop, width, width / self.ratio
+                out[in_knee] = ((2 * p0 + m0 - 2 * p1 + m1) * t ** 3
+                                + (-3 * p0 - 2 * m0 + 3 * p1 - m1) * t ** 2 + m0 * t + p0)
+        gain[active] = np.exp(out - slope)
+        return gain
+
+    def _envelope(self, power: np.ndarray) -> np.ndarray:
+        hop = self.hop
+        ordered = np.sort(power.reshape(-1, hop), axis=1)
+        prefix = np.zeros((len(ordered), hop + 1))
+        np.cumsum(ordered, axis=1, out=prefix[:, 1:])
+
+        envelope = np.empty(len(ordered))
+        slope, attack, release = self.slope, self.attack, self.release
+        for i, (row, sums) in enumerate(zip(ordered.tolist(), prefix.tolist())):
+            below = bisect_right(row, slope)  # Samples at or under the envelope release it
+            rate = attack * (hop - below) + release * below
+            if rate > 0:
+                target = (attack * (sums[hop] - sums[below]) + release * sums[below]) / rate
+                slope = target + (slope - target) * (1.0 - rate / hop) ** hop
+            envelope[i] = slope
+        self.slope = slope
+        return envelope
+
+    def process(self, sidechain: np.ndarray) -> np.ndarray:
+        """Per-sample gain (n,) for the ducked track, from the voice block (n, channels)."""
+        power = np.concatenate([self._carry, np.einsum("ij,ij->i", sidechain, sidechain) / sidechain.shape[1]])
+        hops = len(power) // self.hop
+        self._carry = power[hops * self.hop:]
+
+        # Gains at hop ends, interpolated per sample; samples after the last full hop hold its gain
+        gains = np.concatenate([[self.last_gain], self._gain(self._envelope(power[:hops * self.hop]))])
+        ends = np.arange(hops + 1) * self.hop - (len(power) - len(sidechain)) - 1
+        self.last_gain = float(gains[-1])
+        return np.interp(np.arange(len(sidechain)), ends, gains).astype(np.float32)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# MIXER
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class StreamingMixer:
+    """
+    Usage:
+        mixer = StreamingMixer(sample_rate=48000)
+        stats = mixer.mix(voice, tmp / "mixed.wav", music=music, ambience=ambience,
+                          sfx=[(sfx_path, 2.5, 0.5)], duration=total_duration, ducking=ducking_config)
+
+    The output is as long as the voice (amix duration=first). Beds are
+    trimmed to `duration`. `open_reader(path)` can be swapped for decoders
+    of synthetic tracks (see `python benchmark.py --mixer`).
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, channels: int = 2, block_s: float = 1.0,
+                 loop_buffer_s: float = 180.0, hop: int = 128, open_reader=None):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block = max(self.channels, int(block_s * sample_rate))
+        self.loop_buffer = int(loop_buffer_s * sample_rate)
+        self.hop = hop
+        self.open_reader = open_reader or (lambda path: open_pcm(path, sample_rate, channels))
+
+    def mix(self, voice: Path, output: Path, music: Optional[Path] = None, ambience: Optional[Path] = None,
+            sfx: Sequence[Tuple[Path, float, float]] = (), duration: float = 0.0,
+            ducking: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        ducking = ducking or {}
+        start = time.perf_counter()
+        limit = int(duration * self.sample_rate) if duration > 0 else 2 ** 62
+
+        voice_track = StreamTrack(self.open_reader(voice), self.channels)
+        tracks: List[StreamTrack] = [voice_track]
+        music_track = None
+        if music:
+            music_track = LoopTrack(lambda: self.open_reader(music), limit, self.channels,
+                                    volume=ducking.get("base_volume", 0.15), loop_buffer=self.loop_buffer)
+            tracks.append(music_track)
+        if ambience:
+            tracks.append(LoopTrack(lambda: self.open_reader(ambience), limit, self.channels,
+                                    volume=AMBIENCE_VOLUME, loop_buffer=self.loop_buffer))
+        for path, start_time, volume in sfx:
+            tracks.append(StreamTrack(self.open_reader(path), self.channels,
+                                      start=int(round(start_time * self.sample_rate)), volume=volume))
+
+        ducker = SidechainDucker(self.sample_rate, ducking.get("attack_ms", 50), ducking.get("release_ms", 300),
+                                 hop=self.hop) if music_track else None
+
+        inputs = len(tracks)
+        norm = float(inputs)  # amix scale_norm: starts at the input count, eases to the active count
+        norm_rate = 1.0 / (inputs * DROPOUT_TRANSITION_S * self.sample_rate)
+        frames = 0
+        peak = 0.0
+        clipped = 0
+
+        try:
+            with wave.open(str(output), "wb") as out:
+                out.setnchannels(self.channels)
+                out.setsampwidth(2)
+                out.setframerate(self.sample_rate)
+
+                while True:
+                    live = [track for track in tracks if not track.ended]
+                    mixed = voice_track.read(self.block)
+                    n = voice_track.filled if voice_track.ended else self.block  # Output ends with the voice
+                    if n == 0:
+                        break
+                    mixed = mixed[:n]
+
+                    # The voice (still alone in `mixed`) keys the music's gain
+                    duck = ducker.process(mixed)[:, None] if ducker is not None and not music_track.ended else None
+                    for track in live[1:]:
+                        block = track.read(self.block)[:n]
+                        if track is music_track:
+                            block *= duck
+                        mixed += block
+
+                    target = float(len(live))
+                    if norm > target:
+                        ramp = norm - target * norm_rate * np.arange(1, n + 1)
+                        norm = max(target, norm - target * norm_rate * n)
+                        mixed /= np.maximum(ramp, target)[:, None].astype(np.float32)
+                    else:
+                        norm = target
+                        mixed /= np.float32(norm)
+
+                    peak = max(peak, float(np.max(np.abs(mixed))) if n else 0.0)
+                    clipped += int(np.count_nonzero(np.abs(mixed) > 1.0))
+                    out.writeframes((np.clip(mixed, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+                    frames += n
+                    if voice_track.ended:
+                        break
+        finally:
+            for track in tracks:
+                track.close()
+        if frames == 0:
+            raise RuntimeError(f"voice track {voice} decoded to no samples")
+
+        elapsed = time.perf_counter() - start
+        return {
+            "engine": "native",
+            "sample_rate": self.sample_rate,
+            "inputs": inputs,
+            "duration_s": round(frames / self.sample_rate, 3),
+            "music_decodes": music_track.decodes if music_track else 0,
+            "peak": round(peak, 4),
+            "clipped_samples": clipped,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "realtime_x": round(frames / self.sample_rate / elapsed, 1) if elapsed > 0 else None,
+        }
+
@@ -0,0 +1,161 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+AVATAR CACHE - MuseTalk Preparation Stored Once per Persona Image
+═══════════════════════════════════════════════════════════════════════════════════
+
+MuseTalk's per-image preparation (face landmarks + crop box, VAE latents of the
+256×256 face crop, face-parsing blend mask) does not depend on the audio, yet
+it used to run on every job. Personas reuse a handful of images across
+thousands of jobs, so the result is stored on the workspace volume keyed by
+the image's content hash:
+
+    <cache>/<sha[:2]>/<sha>-<params>/
+        frames.npy       (N, H, W, 3) uint8   BGR source frames
+        bboxes.npy       (N, 4)       int32   face crop x1, y1, x2, y2
+        landmarks.npy    (N, 68, 2)   float32 face landmarks (NaN if unavailable)
+        latents.npy      (N, C, h, w) float16 VAE latents fed to the UNet
+        mask_boxes.npy   (N, 4)       int32   blend region x1, y1, x2, y2
+        mask_0000.npy    (h', w')     uint8   feathered blend mask per frame
+        meta.json
+
+Arrays are plain .npy files opened with `mmap_mode="r"`, so a hit costs a few
+page faults rather than a decode, and concurrent workers share the page cache.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Tuple
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from disk_cache import DiskCache, digest_key, file_digest
+
+PREP_VERSION = 1  # Bump when the layout or the preparation itself changes
+
+_ARRAYS = ("frames", "bboxes", "landmarks", "latents", "mask_boxes")
+
+
+@dataclass
+class AvatarPrep:
+    """Everything MuseTalk needs from the source image, independent of the audio."""
+    frames: np.ndarray
+    bboxes: np.ndarray
+    landmarks: np.ndarray
+    latents: np.ndarray
+    masks: List[np.ndarray]
+    mask_boxes: np.ndarray
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.bboxes)
+
+    def cycle_index(self, i: int) -> int:
+        """Frame used for output frame `i`: MuseTalk plays the frames forward then backward."""
+        n = len(self)
+        i %= 2 * n
+        return i if i < n else 2 * n - 1 - i
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        for i, mask in enumerate(self.masks):
+            np.save(directory / f"mask_{i:04d}.npy", np.ascontiguousarray(mask))
+        (directory / "meta.json").write_text(json.dumps(self.meta))
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "AvatarPrep":
+        mode = "r" if mmap else None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mode) for name in _ARRAYS}
+        masks = [np.load(p, mmap_mode=mode) for p in sorted(directory.glob("mask_[0-9]*.npy"))]
+        meta = json.loads((directory / "meta.json").read_text())
+        return cls(masks=masks, meta=meta, **arrays)
+
+
+@dataclass
+class AvatarLookup:
+    key: str
+    cache: str = "miss"          # "hit" | "miss" | "bypass"
+    elapsed_s: float = 0.0
+    frames: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "cache": self.cache,
+            "ms": round(self.elapsed_s * 1000, 1),
+            "frames": self.frames,
+        }
+
+
+class AvatarCache:
+    """
+    Usage:
+        avatars = AvatarCache(DiskCache(WORKSPACE / "cache" / "avatars", max_bytes=10 * 1024**3))
+        prep, lookup = avatars.prepare(image_path, engine.prepare_avatar,
+                                       params={"model": engine.version, "bbox_shift": 0})
+        metadata["avatar"] = lookup.to_dict()
+
+    `preparer(image_path)` computes an AvatarPrep on a miss. `params` holds
+    everything besides the image that changes the result (model version,
+    bbox shift); it is folded into the key. `cache=None` always prepares.
+    """
+
+    def __init__(self, cache: Optional[DiskCache] = None):
+        self.cache = cache
+
+    @staticmethod
+    def key_for(image_sha: str, params: Optional[Dict[str, Any]] = None) -> str:
+        params_digest = digest_key(PREP_VERSION, json.dumps(params or {}, sort_keys=True))
+        return f"{image_sha}-{params_digest[:16]}"
+
+    def lookup(self, image_path: Path, params: Optional[Dict[str, Any]] = None) -> Tuple[str, Optional[AvatarPrep]]:
+        """(key, prep or None) without preparing anything."""
+        key = self.key_for(file_digest(image_path), params)
+        if self.cache is None:
+            return key, None
+        path = self.cache.get(key)
+        if path is None:
+            return key, None
+        try:
+            return key, AvatarPrep.load(path)
+        except (OSError, ValueError) as e:
+            print(f"[AvatarCache] Dropping unreadable entry {key}: {e}")
+            self.cache.remove(key)
+            return key, None
+
+    def prepare(
+        self,
+        image_path: Path,
+        preparer: Callable[[Path], AvatarPrep],
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[AvatarPrep, AvatarLookup]:
+        start = time.time()
+        key, prep = self.lookup(image_path, params)
+        lookup = AvatarLookup(key, cache="hit" if prep is not None else "miss")
+
+        if prep is None:
+            prep = preparer(Path(image_path))
+            prep.meta.update({
+                "version": PREP_VERSION,
+                "params": params or {},
+                "created_at": time.time(),
+                "prepare_s": round(time.time() - start, 3),
+            })
+            if self.cache is None:
+                lookup.cache = "bypass"
+            else:
+                tmp = self.cache.reserve()
+                prep.save(tmp)
+                prep = AvatarPrep.load(self.cache.commit(key, tmp))
+
+        lookup.elapsed_s = time.time() - start
+        lookup.frames = len(prep)
+        return prep, lookup
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        return self.cache.stats() if self.cache is not None else None
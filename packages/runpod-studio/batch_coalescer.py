@@ -0,0 +1,209 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+BATCH COALESCER - Micro-Batching Concurrent Requests onto One Forward Pass
+═══════════════════════════════════════════════════════════════════════════════════
+
+The realtime preset runs MuseTalk in batches of 16 frames, but every job
+brings only its own frames: short clips and the tail of every clip run
+partly empty batches, and two realtime jobs in flight run their forward
+passes back to back. MicroBatcher sits in front of the model:
+
+    job A ─ run([16 frames]) ─┐
+    job B ─ run([ 9 frames]) ─┼─▶ one batch of ≤ max_batch ─▶ model ─▶ scatter
+    job C ─ run([16 frames]) ─┘       (flushed when full or max_wait_ms after
+                                       the oldest waiting request arrived)
+
+Callers block in `run` until their own outputs are back. Requests larger
+than the room left in a batch are split across batches, in order.
+
+Reported: added latency per request part (time queued before its batch
+started; p50 / p99), batch fill rate (batch size / max_batch) and why each
+batch was flushed (full or timeout).
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, List, Callable, Deque
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0-100) of unsorted samples; 0.0 when empty."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+class _Request:
+    __slots__ = ("items", "results", "next", "done", "ready_at", "error", "event")
+
+    def __init__(self, items: List[Any]):
+        self.items = items
+        self.results: List[Any] = [None] * len(items)
+        self.next = 0          # First item not yet handed to a batch
+        self.done = 0          # Items with results
+        self.ready_at = time.perf_counter()
+        self.error: Optional[BaseException] = None
+        self.event = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Usage:
+        batcher = MicroBatcher(lambda items: model(items), max_batch=32, max_wait_ms=15)
+        outputs = batcher.run(frames)          # from any number of threads
+        metadata["coalescer"] = batcher.stats()
+
+    `run_batch(items)` gets up to `max_batch` items (from one or more
+    callers) and must return one output per item, in order. It runs on the
+    batcher's own thread, one batch at a time. `max_wait_ms=0` flushes as
+    soon as the scheduler sees a request (no coalescing window).
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]], max_batch: int = 32,
+                 max_wait_ms: float = 15.0, name: str = "batcher", history: int = 10000):
+        self.run_batch = run_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000
+        self.name = name
+
+        self._pending: Deque[_Request] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.batches = 0
+        self.items = 0
+        self.requests = 0
+        self.flushes = {"full": 0, "timeout": 0}
+        self._latency: Deque[float] = deque(maxlen=history)
+        self._fill: Deque[float] = deque(maxlen=history)
+        self._batch_s = 0.0
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def run(self, items: List[Any]) -> List[Any]:
+        """Queue `items` for the next batches and block until their outputs are back."""
+        if not items:
+            return []
+        request = _Request(list(items))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            self._ensure_thread()
+            self._pending.append(request)
+            self.requests += 1
+            self._cond.notify()
+        request.event.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _queued(self) -> int:
+        return sum(len(r.items) - r.next for r in self._pending)
+
+    def _take(self) -> List[tuple]:
+        """Pop up to max_batch items FIFO: [(request, start, end)] (caller holds the lock)."""
+        parts, room = [], self.max_batch
+        while self._pending and room:
+            request = self._pending[0]
+            end = min(len(request.items), request.next + room)
+            parts.append((request, request.next, end))
+            room -= end - request.next
+            request.next = end
+            if request.next == len(request.items):
+                self._pending.popleft()
+        return parts
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+
+                # Window opens with the oldest waiting request
+                deadline = self._pending[0].ready_at + self.max_wait_s
+                while self._queued() < self.max_batch and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                reason = "full" if self._queued() >= self.max_batch else "timeout"
+                parts = self._take()
+
+            started = time.perf_counter()
+            batch = [item for request, start, end in parts for item in request.items[start:end]]
+            try:
+                outputs = list(self.run_batch(batch))
+                if len(outputs) != len(batch):
+                    raise RuntimeError(f"{self.name}: run_batch returned {len(outputs)} outputs "
+                                       f"for {len(batch)} items")
+                error = None
+            except BaseException as e:
+                outputs, error = None, e
+            finished = time.perf_counter()
+
+            with self._cond:
+                self.batches += 1
+                self.items += len(batch)
+                self.flushes[reason] += 1
+                self._fill.append(len(batch) / self.max_batch)
+                self._batch_s += finished - started
+
+                offset = 0
+                for request, start, end in parts:
+                    self._latency.append(started - request.ready_at)
+                    request.ready_at = finished  # A split request's next part waits from here
+                    if error is not None:
+                        request.error = error
+                        request.event.set()
+                        continue
+                    request.results[start:end] = outputs[offset:offset + end - start]
+                    offset += end - start
+                    request.done += end - start
+                    if request.done == len(request.items):
+                        request.event.set()
+
+                # Parts of a failed request still queued would never complete
+                if error is not None:
+                    failed = {id(request) for request, _, _ in parts}
+                    self._pending = deque(r for r in self._pending if id(r) not in failed)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            latency = list(self._latency)
+            fill = list(self._fill)
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait_s * 1000, 1),
+                "requests": self.requests,
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "fill_rate": round(sum(fill) / len(fill), 3) if fill else 0.0,
+                "flushes": dict(self.flushes),
+                "added_latency_ms": {
+                    "p50": round(percentile(latency, 50) * 1000, 2),
+                    "p99": round(percentile(latency, 99) * 1000, 2),
+                    "max": round(max(latency) * 1000, 2) if latency else 0.0,
+                },
+                "batch_ms": round(self._batch_s / self.batches * 1000, 2) if self.batches else 0.0,
+            }
@@ -0,0 +1,1161 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+STUDIO BENCHMARKS - CPU-runnable micro-benchmarks with synthetic inputs
+═══════════════════════════════════════════════════════════════════════════════════
+
+Each benchmark swaps the GPU models for CPU stand-ins so the surrounding
+planning / batching / stitching code can be measured anywhere.
+
+Usage:
+    python benchmark.py --upscale
+    python benchmark.py --download
+    python benchmark.py --upload
+    python benchmark.py --segments
+    python benchmark.py --executor
+    python benchmark.py --coalesce
+    python benchmark.py --hls
+    python benchmark.py --idle
+    python benchmark.py --persona
+    python benchmark.py --filtergraph
+    python benchmark.py --captions
+    python benchmark.py --mixer
+    python benchmark.py --delta
+    python benchmark.py --ring
+    python benchmark.py --all
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import importlib.util
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+def synthetic_frames(count: int, width: int, height: int, seed: int = 0) -> list:
+    """Smooth gradient + noise frames (compress like real video, unlike pure noise)."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = ((x + y) % 256).astype(np.uint8)
+    frames = []
+    for i in range(count):
+        frame = np.stack([base, np.roll(base, i, axis=1), base[::-1]], axis=-1)
+        noise = rng.integers(0, 8, size=frame.shape, dtype=np.uint8)
+        frames.append(frame + noise)
+    return frames
+
+
+def report(title: str, rows: list) -> None:
+    print("\n" + "=" * 60)
+    print(title)
+    print("=" * 60)
+    if not rows:
+        return
+    keys = list(rows[0].keys())
+    print("  ".join(f"{k:>14}" for k in keys))
+    for row in rows:
+        print("  ".join(f"{str(row[k]):>14}" for k in keys))
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# UPSCALER
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def bench_upscale(frames: int = 8, width: int = 512, height: int = 512, scale: int = 4) -> list:
+    """Tile planner + stitcher across memory budgets with the nearest-neighbour model."""
+    from upscaler import TiledUpscaler, InterpolationUpscaleModel
+
+    source = synthetic_frames(frames, width, height)
+    rows = []
+    for budget_mb in (64, 256, 1024, 8192):
+        engine = TiledUpscaler(lambda s: InterpolationUpscaleModel(s),
+                               memory_budget_bytes=budget_mb * 1024 * 1024)
+        start = time.perf_counter()
+        engine.upscale_frames(source, scale)
+        elapsed = time.perf_counter() - start
+
+        plan = engine.plan(width, height, scale)
+        rows.append({
+            "budget_mb": budget_mb,
+            "tile": plan.tile or "full",
+            "batch": plan.batch_size,
+            "passes": engine.stats.forward_passes,
+            "stitch_s": round(engine.stats.stitch_s, 3),
+            "fps": round(frames / elapsed, 1),
+        })
+
+    report(f"UPSCALE {width}x{height} @{scale}x, {frames} frames (CPU nearest)", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# MODEL DOWNLOADER
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class LocalFileServer:
+    """
+    Threaded HTTP stand-in for HuggingFace / GitHub releases / input CDNs with
+    Range and ETag (If-None-Match → 304) support.
+
+    `bandwidth` throttles each response (bytes/s) so worker-pool speedups show
+    up locally; paths in `truncate_once` drop the connection halfway through
+    their first response to exercise resume.
+    """
+
+    def __init__(self, root: Path, bandwidth: float = 0, truncate_once: tuple = ()):
+        import http.server
+
+        server = self
+        self.root = Path(root)
+        self.bandwidth = bandwidth
+        self.truncate_once = set(truncate_once)
+        self.requests = 0
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                path = server.root / self.path.lstrip("/")
+                if not path.is_file():
+                    self.send_error(404)
+                    return
+                data = path.read_bytes()
+                etag = f'"{len(data):x}-{int(path.stat().st_mtime_ns):x}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                start, status = 0, 200
+                if self.headers.get("Range"):
+                    start = int(self.headers["Range"].split("=")[1].split("-")[0])
+                    if start >= len(data):
+                        self.send_error(416)
+                        return
+                    status = 206
+                body = data[start:]
+
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                self.end_headers()
+
+                if self.path in server.truncate_once:
+                    server.truncate_once.discard(self.path)
+                    body = body[:len(body) // 2]
+                step = 256 * 1024
+                for i in range(0, len(body), step):
+                    self.wfile.write(body[i:i + step])
+                    if server.bandwidth:
+                        time.sleep(step / server.bandwidth)
+
+        self._httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def bench_download(files: int = 8, size_mb: int = 4, bandwidth_mb: float = 16) -> list:
+    """Worker-pool scaling, resume and checksum verification against LocalFileServer."""
+    import hashlib
+    from download_models import FileTask, ParallelDownloader, build_report
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        (tmp / "srv").mkdir()
+        digests = {}
+        for i in range(files):
+            data = rng.integers(0, 256, size_mb * 1024 * 1024, dtype=np.uint8).tobytes()
+            (tmp / "srv" / f"w{i}.pth").write_bytes(data)
+            digests[f"w{i}.pth"] = hashlib.sha256(data).hexdigest()
+
+        def tasks(server, dest):
+            return [FileTask(f"bench/m{i % 2}", f"{server.url}/{name}", dest / name, digest)
+                    for i, (name, digest) in enumerate(digests.items())]
+
+        rows = []
+        with LocalFileServer(tmp / "srv", bandwidth=bandwidth_mb * 1024 * 1024,
+                             truncate_once=("/w0.pth",)) as server:
+            for workers in (1, 4, 8):
+                dest = tmp / f"dl{workers}"
+                downloader = ParallelDownloader(workers=workers, headers={},
+                                                lock_path=dest / "lock.json")
+                start = time.perf_counter()
+                results = downloader.run(tasks(server, dest), progress=False)
+                total = build_report(results, time.perf_counter() - start)["total"]
+                rows.append({
+                    "workers": workers,
+                    "files": total["files"],
+                    "failed": total["failed"],
+                    "mb": round(total["downloaded_bytes"] / 1e6, 1),
+                    "mb_per_s": total["mb_per_s"],
+                    "resumed": sum(1 for r in results if r.resumed_from),
+                })
+
+            # Resume from a half-written partial, then a pinned checksum that cannot match
+            dest = tmp / "resume"
+            dest.mkdir()
+            (dest / "w1.pth.part").write_bytes((tmp / "srv" / "w1.pth").read_bytes()[:1024 * 1024])
+            bad = tasks(server, dest)[:2]
+            bad[0].sha256 = "0" * 64
+            results = ParallelDownloader(workers=2, retries=1, headers={},
+                                         lock_path=dest / "lock.json").run(bad, progress=False)
+            by_name = {r.task.path.name: r for r in results}
+            rows.append({
+                "workers": "resume+pin",
+                "files": len(results),
+                "failed": sum(1 for r in results if r.error),
+                "mb": round(sum(r.bytes_downloaded for r in results) / 1e6, 1),
+                "mb_per_s": "-",
+                "resumed": int(by_name["w1.pth"].resumed_from > 0),
+            })
+
+    report(f"DOWNLOAD {files} x {size_mb} MB at {bandwidth_mb} MB/s per connection (local server)", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# UPLOADER
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class LocalS3:
+    """
+    In-process S3 stand-in (put_object + multipart API) with a per-request
+    bandwidth cap, so part parallelism and streaming overlap are measurable.
+    Point `R2_ENDPOINT` at MinIO to run the real client against the same code.
+    """
+
+    def __init__(self, bandwidth: float = 0, latency_s: float = 0.02):
+        self.bandwidth = bandwidth
+        self.latency_s = latency_s
+        self.objects = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _transfer(self, size: int) -> None:
+        time.sleep(self.latency_s + (size / self.bandwidth if self.bandwidth else 0))
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._transfer(len(Body))
+        self.objects[Key] = bytes(Body)
+        return {"ETag": str(hash(self.objects[Key]))}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        with self._lock:
+            upload_id = f"u{len(self._uploads)}"
+            self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._transfer(len(Body))
+        self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f"{UploadId}-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self._uploads.pop(UploadId)
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        if numbers != sorted(parts):
+            raise ValueError(f"Parts out of order or missing: {numbers}")
+        self.objects[Key] = b"".join(parts[n] for n in numbers)
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._uploads.pop(UploadId, None)
+        return {}
+
+
+def bench_upload(size_mb: int = 96, bandwidth_mb: float = 64, write_mb_s: float = 48) -> list:
+    """Single PUT vs parallel multipart, and post-encode vs streaming upload of a growing file."""
+    from uploader import MultipartUploader
+
+    data = np.random.default_rng(0).integers(0, 256, size_mb * 1024 * 1024, dtype=np.uint8).tobytes()
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "final.mp4"
+        path.write_bytes(data)
+
+        for part_mb, concurrency in ((size_mb, 1), (8, 1), (8, 4), (8, 8)):
+            s3 = LocalS3(bandwidth=bandwidth_mb * 1024 * 1024)
+            uploader = MultipartUploader(s3, "bench", part_size=part_mb * 1024 * 1024, concurrency=concurrency)
+            stats = uploader.upload_file(path, "final.mp4")
+            uploader.shutdown()
+            assert s3.objects["final.mp4"] == data
+            rows.append({"mode": "put" if stats.parts == 1 else "multipart", "part_mb": part_mb,
+                         "workers": concurrency, "parts": stats.parts, "mb_per_s": round(stats.mb_per_s, 1),
+                         "after_write_s": round(stats.elapsed_s, 2)})
+
+        # Writer appends at `write_mb_s` (an encoder); upload after close vs while writing
+        def write_slowly(target: Path):
+            step = 1024 * 1024
+            with open(target, "wb") as f:
+                for i in range(0, len(data), step):
+                    f.write(data[i:i + step])
+                    f.flush()
+                    time.sleep(step / (write_mb_s * 1024 * 1024))
+
+        for streamed in (False, True):
+            s3 = LocalS3(bandwidth=bandwidth_mb * 1024 * 1024)
+            uploader = MultipartUploader(s3, "bench", part_size=8 * 1024 * 1024, concurrency=8)
+            target = Path(tmp) / f"growing_{int(streamed)}.mp4"
+            upload = uploader.stream(target, "growing.mp4", poll_s=0.05) if streamed else None
+            write_slowly(target)
+            stats = upload.finish() if streamed else uploader.upload_file(target, "growing.mp4")
+            uploader.shutdown()
+            assert s3.objects["growing.mp4"] == data
+            rows.append({"mode": "streamed" if streamed else "after-close", "part_mb": 8, "workers": 8,
+                         "parts": stats.parts, "mb_per_s": round(stats.mb_per_s, 1),
+                         "after_write_s": round(stats.tail_s if streamed else stats.elapsed_s, 2)})
+
+    report(f"UPLOAD {size_mb} MB at {bandwidth_mb} MB/s per request, writer {write_mb_s} MB/s (LocalS3)", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# SEGMENTED LIP-SYNC
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def synthetic_voice(duration_s: float, sample_rate: int = 16000, seed: int = 0) -> np.ndarray:
+    """Noise "speech" with 0.4-1.2 s pauses every 4-12 s."""
+    rng = np.random.default_rng(seed)
+    pcm = (rng.standard_normal(int(duration_s * sample_rate)) * 0.2).astype(np.float32)
+    t = rng.uniform(4, 12)
+    while t < duration_s:
+        pause = rng.uniform(0.4, 1.2)
+        pcm[int(t * sample_rate):int((t + pause) * sample_rate)] = 0
+        t += pause + rng.uniform(4, 12)
+    return pcm
+
+
+def bench_segments(duration_s: float = 600, fps: int = 25, frame_ms: float = 0.4) -> list:
+    """Silence-split parallel lip-sync with a stub backend (`frame_ms` per frame) across worker counts."""
+    from segment_renderer import SegmentRenderer
+    from frame_pipeline import MemoryFrameSink
+
+    pcm = synthetic_voice(duration_s)
+    frame = np.zeros((64, 64, 3), np.uint8)
+    rendered = {}
+
+    def pcm_source(path, chunk):
+        for i in range(0, len(pcm), chunk):
+            yield pcm[i:i + chunk]
+
+    def cut_audio(src, start_s, length_s, dest):
+        rendered[dest.stem] = int(round(length_s * fps))
+        return dest
+
+    def backend(segment, audio, out):
+        time.sleep(rendered[audio.stem] * frame_ms / 1000)  # Stands in for UNet + VAE time
+        out.write_text(str(rendered[audio.stem]))
+
+    def read_frames(path):
+        return [frame] * int(path.read_text())
+
+    rows = []
+    baseline = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in (1, 2, 4, 8):
+            sink = MemoryFrameSink()
+            renderer = SegmentRenderer(backend, workers=workers, pcm_source=pcm_source,
+                                       cut_audio=cut_audio, read_frames=read_frames)
+            stats = renderer.render(Path(tmp) / "voice.wav", Path(tmp) / f"w{workers}", fps, sink)
+            assert len(sink.frames) == int(round(duration_s * fps))
+            baseline = baseline or stats["elapsed_s"]
+            rows.append({"workers": workers, "segments": len(stats["segments"]), "frames": stats["frames"],
+                         "wall_s": stats["elapsed_s"], "speedup": round(baseline / stats["elapsed_s"], 2),
+                         "plan_ms": round(stats["plan_s"] * 1000, 1)})
+
+    report(f"SEGMENTED LIP-SYNC {duration_s:.0f}s voice at {fps} fps, stub {frame_ms} ms/frame", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# JOB EXECUTOR
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def bench_executor(jobs: int = 12) -> list:
+    """Fake GPU → CPU → upload jobs through the resource-class executor at increasing job concurrency."""
+    from job_executor import JobExecutor, ResourcePool, FakeJobSource, simulated_handler
+
+    source = FakeJobSource(count=jobs)
+    rows = []
+    baseline = None
+    for max_jobs in (1, 2, 3, 4):
+        resources = ResourcePool({"gpu": 1, "cpu": 2, "upload": 2})
+        executor = JobExecutor(simulated_handler(resources), max_jobs=max_jobs, resources=resources)
+        start = time.perf_counter()
+        results = executor.run(source)
+        wall = time.perf_counter() - start
+        stats = executor.stats()["resources"]
+        executor.shutdown()
+
+        baseline = baseline or wall
+        latency = sorted(r["elapsed_s"] for r in results)
+        rows.append({"max_jobs": max_jobs, "wall_s": round(wall, 2), "speedup": round(baseline / wall, 2),
+                     "p50_job_s": round(latency[len(latency) // 2], 2),
+                     "gpu_util": stats["gpu"]["utilization"], "cpu_util": stats["cpu"]["utilization"],
+                     "upload_util": stats["upload"]["utilization"],
+                     "gpu_wait_s": stats["gpu"]["wait_s"]})
+
+    phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in source.phases)
+    report(f"JOB EXECUTOR {jobs} fake jobs ({phases}), slots gpu=1 cpu=2 upload=2", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# REALTIME COALESCER
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def bench_coalesce(loads: tuple = (2, 8), frames: int = 75, group: int = 16,
+                   fixed_ms: float = 6.0, per_frame_ms: float = 0.4) -> list:
+    """
+    Concurrent realtime clips through MicroBatcher with a fake model costing
+    `fixed_ms` per forward pass + `per_frame_ms` per frame, across windows.
+    """
+    from batch_coalescer import MicroBatcher
+
+    def fake_model(items):
+        time.sleep((fixed_ms + per_frame_ms * len(items)) / 1000)
+        return [item + 1 for item in items]
+
+    rows = []
+    for jobs, (max_batch, max_wait_ms) in ((j, w) for j in loads
+                                           for w in ((group, 0), (32, 5), (32, 10), (32, 20), (64, 20))):
+        batcher = MicroBatcher(fake_model, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        latencies = []
+
+        def clip(j):
+            start = time.perf_counter()
+            for s in range(0, frames, group):
+                items = list(range(j * frames + s, j * frames + min(frames, s + group)))
+                assert batcher.run(items) == [item + 1 for item in items]
+            latencies.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=clip, args=(j,)) for j in range(jobs)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+        stats = batcher.stats()
+        batcher.close()
+
+        rows.append({"clips": jobs, "max_batch": max_batch, "wait_ms": max_wait_ms, "batches": stats["batches"],
+                     "fill_rate": stats["fill_rate"], "fps": round(jobs * frames / wall),
+                     "p50_added_ms": stats["added_latency_ms"]["p50"],
+                     "p99_added_ms": stats["added_latency_ms"]["p99"],
+                     "clip_ms": round(sorted(latencies)[len(latencies) // 2] * 1000)})
+
+    report(f"REALTIME COALESCER concurrent clips × {frames} frames in groups of {group}, "
+           f"fake model {fixed_ms} ms + {per_frame_ms} ms/frame", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# HLS STREAMING
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def bench_hls(segment_lengths: tuple = (1, 2, 4, 6), duration_s: float = 12, fps: int = 25,
+              render_fps: float = 50, encode_fps: float = 400, publish_ms: float = 30) -> list:
+    """
+    Time to first playable output: HlsSegmenter over a synthetic frame source
+    rendering at `render_fps`, stub encoders at `encode_fps` and a publish
+    costing `publish_ms`, against writing one file and uploading it at the end.
+    """
+    import shutil
+    from hls_segmenter import HlsSegmenter, StubSegmentEncoder, SyntheticFrameSource
+
+    count = int(duration_s * fps)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        published = tmp / "published"
+        published.mkdir()
+
+        def publish(path, name):
+            time.sleep(publish_ms / 1000)
+            shutil.copyfile(path, published / name)
+            return f"file://{published / name}"
+
+        # Baseline: the whole clip, then one encode + one upload
+        start = time.perf_counter()
+        encoder = StubSegmentEncoder(tmp / "output.mp4", encode_fps=encode_fps)
+        encoder.open(256, 256, fps)
+        for frame in SyntheticFrameSource(count, fps=fps, render_fps=render_fps):
+            encoder.write(frame)
+        encoder.close()
+        publish(tmp / "output.mp4", "output.mp4")
+        whole_ms = round((time.perf_counter() - start) * 1000)
+        rows = [{"mode": "whole file", "segment_s": "-", "segments": 1,
+                 "first_ms": whole_ms, "total_ms": whole_ms}]
+
+        for segment_s in segment_lengths:
+            workdir = tmp / f"seg{segment_s}"
+            segmenter = HlsSegmenter(workdir, publish,
+                                     lambda path, start_s, duration: StubSegmentEncoder(path, encode_fps),
+                                     segment_s=segment_s)
+            start = time.perf_counter()
+            segmenter.start()
+            segmenter.open(256, 256, fps)
+            segmenter.write_batch(SyntheticFrameSource(count, fps=fps, render_fps=render_fps))
+            stats = segmenter.close()
+            total_ms = round((time.perf_counter() - start) * 1000)
+            playlist = (published / "index.m3u8").read_text()
+            assert playlist.count("#EXTINF") == stats["segments"] and "#EXT-X-ENDLIST" in playlist
+            assert sum(s["frames"] for s in stats["detail"]) == count
+            rows.append({"mode": "hls", "segment_s": segment_s, "segments": stats["segments"],
+                         "first_ms": round(stats["ttfs_ms"]), "total_ms": total_ms})
+
+    report(f"HLS STREAMING {duration_s:.0f}s clip @ {fps} fps, rendered at {render_fps} fps, "
+           f"encode {encode_fps} fps, publish {publish_ms} ms", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# IDLE LOOPS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def bench_idle(size: int = 256, duration_s: float = 5, fps: int = 30,
+               takes: tuple = ("neutral", "neutral", "happy", "happy", "thinking", "intense")) -> list:
+    """
+    Persona build of idle takes with a stub encoder: every take warped on a
+    cold loop cache (repeated emotions already hit), then the same build warm.
+    """
+    from disk_cache import DiskCache
+    from idle_motion import IdleMotionEngine, create_warp_backend
+
+    class NullEncoder:
+        def __init__(self, path):
+            self.path = path
+        def open(self, width, height, fps):
+            self.file = open(self.path, "wb")
+        def write(self, frame):
+            self.file.write(frame[::64, ::64].tobytes())
+        def close(self):
+            self.file.close()
+        def abort(self):
+            self.file.close()
+
+    frames = int(duration_s * fps)
+    rows = []
+
+    backend = "opencv" if importlib.util.find_spec("cv2") else "numpy"
+
+    image = synthetic_frames(1, size, size)[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        image_path = tmp / "persona.png"
+        image_path.write_bytes(image.tobytes())  # Content only feeds the cache key
+        engine = IdleMotionEngine(DiskCache(tmp / "cache"), NullEncoder, backend=create_warp_backend(backend), fps=fps)
+        eye_box = (size // 4, size * 3 // 8, size * 3 // 4, size // 2)
+
+        for label in ("cold", "warm"):
+            start = time.perf_counter()
+            lookups = [engine.render(image_path, tmp / f"take_{i}.mp4", duration_s, expression,
+                                     image=image, eye_box=eye_box)
+                       for i, expression in enumerate(takes)]
+            rows.append({"build": label, "backend": backend, "takes": len(takes),
+                         "rendered": sum(lookup.cache == "miss" for lookup in lookups),
+                         "ms": round((time.perf_counter() - start) * 1000, 1)})
+
+    report(f"IDLE LOOPS {len(takes)} takes × {frames} frames at {size}x{size}", rows)
+    return rows
+
+
+def bench_persona(takes: int = 12, workers: tuple = (1, 2, 4), size: int = 192, duration_s: float = 2,
+                  upload_ms: float = 150) -> list:
+    """
+    Persona build pipeline: `takes` idle takes rendered (uncached) by a pool
+    of `workers`, each upload (`upload_ms`, background) started as soon as its
+    take is rendered, against one take at a time.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from idle_motion import IdleMotionEngine, create_warp_backend, render_takes
+
+    class NullEncoder:
+        def __init__(self, path):
+            self.path = path
+        def open(self, width, height, fps):
+            self.file = open(self.path, "wb")
+        def write(self, frame):
+            self.file.write(frame[::64, ::64].tobytes())
+        def close(self):
+            self.file.close()
+        def abort(self):
+            self.file.close()
+
+    backend = "opencv" if importlib.util.find_spec("cv2") else "numpy"
+
+    image = synthetic_frames(1, size, size)[0]
+    emotions = ("neutral", "happy", "sad", "thinking", "listening", "excited")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        image_path = tmp / "persona.png"
+        image_path.write_bytes(image.tobytes())
+        engine = IdleMotionEngine(None, NullEncoder, backend=create_warp_backend(backend))
+        uploads = ThreadPoolExecutor(4)
+
+        def upload(path):
+            time.sleep(upload_ms / 1000)
+            return path
+
+        def render(i, spec=None, timings=None):
+            engine.render(image_path, tmp / f"take_{i}.mp4", duration_s, emotions[i % len(emotions)],
+                          image=image, eye_box=(0, 0, 1, 1))
+            return uploads.submit(upload, tmp / f"take_{i}.mp4")
+
+        def finish(i, spec, upload, timings):
+            return {"path": upload.result()}
+
+        for n in (0,) + tuple(workers):
+            start = time.perf_counter()
+            if n == 0:
+                for i in range(takes):  # Previous behaviour: render, upload, next take
+                    render(i).result()
+            else:
+                render_takes([{}] * takes, render, finish, workers=n)  # The handler's take pipeline
+            wall = time.perf_counter() - start
+            rows.append({"mode": "serial" if n == 0 else "pipelined", "workers": max(1, n), "takes": takes,
+                         "wall_ms": round(wall * 1000), "per_take_ms": round(wall * 1000 / takes, 1)})
+        uploads.shutdown()
+
+    for row in rows:
+        row["speedup"] = round(rows[0]["wall_ms"] / row["wall_ms"], 2)
+    report(f"PERSONA BUILD {takes} takes × {int(duration_s * 30)} frames at {size}x{size} ({backend} warp), "
+           f"upload {upload_ms:.0f} ms, {os.cpu_count()} cores", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# POST GRAPH
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def bench_filtergraph(duration_s: float = 10, width: int = 540, height: int = 960, captions: int = 8) -> list:
+    """
+    video_render post-processing on lavfi test inputs: one ffmpeg process per
+    step (mix, captions, grade, grain, final encode, thumbnail) against the
+    same steps compiled into one PostGraph run. Needs ffmpeg on PATH; without
+    it only the compiled graph is printed.
+    """
+    import shutil
+    import subprocess
+    from filtergraph import PostGraph, audio_mix_filters, drawtext_filters, grade_filter, grain_filter
+
+    style = {"font_size": 40}
+    caption_list = [{"text": f"Caption {i}: it's here", "start": i * duration_s / captions,
+                     "end": (i + 1) * duration_s / captions} for i in range(captions)]
+    encode = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23"]
+
+    def graph_for(tmp: Path) -> PostGraph:
+        return (PostGraph(tmp / "lipsync.mp4")
+                .mix(tmp / "voice.wav", music=tmp / "music.wav", duration=duration_s,
+                     ducking={"base_volume": 0.15})
+                .captions(caption_list, style)
+                .grade("cinematic")
+                .grain(0.02)
+                .thumbnail(tmp / "thumb_graph.jpg"))
+
+    if not shutil.which("ffmpeg"):
+        graph = graph_for(Path("work"))
+        print(f"\nffmpeg not found; compiled graph ({len(graph.filter_complex())} chars, "
+              f"stages {' → '.join(graph.stages)}):\n  {graph.filter_complex()[:400]}…")
+        rows = [{"mode": "chain", "processes": 6, "ms": "n/a"}, {"mode": "one-pass", "processes": 1, "ms": "n/a"}]
+        report("POST GRAPH (ffmpeg missing, not timed)", rows)
+        return rows
+
+    def run(cmd: list) -> None:
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *cmd[2:]], check=True)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        run(["ffmpeg", "-y", "-f", "lavfi", "-i", f"testsrc2=s={width}x{height}:r=30:d={duration_s}",
+             *encode, "-pix_fmt", "yuv420p", str(tmp / "lipsync.mp4")])
+        run(["ffmpeg", "-y", "-f", "lavfi", "-i", f"sine=frequency=220:duration={duration_s}", str(tmp / "voice.wav")])
+        run(["ffmpeg", "-y", "-f", "lavfi", "-i", "sine=frequency=440:duration=3", str(tmp / "music.wav")])
+
+        start = time.perf_counter()
+        mix = ";".join(audio_mix_filters("0:a", "1:a", duration=duration_s, out="out"))
+        run(["ffmpeg", "-y", "-i", str(tmp / "voice.wav"), "-i", str(tmp / "music.wav"),
+             "-filter_complex", mix, "-map", "[out]", "-c:a", "aac", str(tmp / "mixed.aac")])
+        run(["ffmpeg", "-y", "-i", str(tmp / "lipsync.mp4"), "-vf", ",".join(drawtext_filters(caption_list, style)),
+             *encode, str(tmp / "captioned.mp4")])
+        run(["ffmpeg", "-y", "-i", str(tmp / "captioned.mp4"), "-vf", grade_filter("cinematic"),
+             *encode, str(tmp / "graded.mp4")])
+        run(["ffmpeg", "-y", "-i", str(tmp / "graded.mp4"), "-vf", grain_filter(0.02),
+             *encode, str(tmp / "grain.mp4")])
+        run(["ffmpeg", "-y", "-i", str(tmp / "grain.mp4"), "-i", str(tmp / "mixed.aac"), *encode,
+             "-c:a", "aac", "-map", "0:v", "-map", "1:a", "-shortest", str(tmp / "final_chain.mp4")])
+        run(["ffmpeg", "-y", "-i", str(tmp / "final_chain.mp4"), "-vframes", "1", "-q:v", "2",
+             str(tmp / "thumb_chain.jpg")])
+        rows.append({"mode": "chain", "processes": 6, "ms": round((time.perf_counter() - start) * 1000)})
+
+        graph = graph_for(tmp)
+        start = time.perf_counter()
+        run(graph.command(tmp / "final_graph.mp4", video_args=encode, audio_args=["-c:a", "aac"]))
+        rows.append({"mode": "one-pass", "processes": 1, "ms": round((time.perf_counter() - start) * 1000)})
+
+    for row in rows:
+        row["speedup"] = round(rows[0]["ms"] / row["ms"], 2)
+    report(f"POST GRAPH {duration_s:.0f}s at {width}x{height}, {captions} captions, grade + grain + ducked music",
+           rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# CAPTIONS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def bench_captions(counts: tuple = (10, 100, 1000, 5000), word_s: float = 0.4, fps: int = 25,
+                   width: int = 540, height: int = 960, sample_frames: int = 500) -> list:
+    """
+    Word-level captions (`word_s` each) swept over caption count: size of the
+    drawtext chain vs. the compiled .ass file, and the frame pipeline's
+    per-frame overlay cost with the old per-frame scan + per-caption
+    rasterization against the timeline + glyph cache. With ffmpeg on PATH,
+    burning a 20 s clip is also timed for drawtext vs. ass.
+    """
+    import shutil
+    import subprocess
+    from caption_engine import CaptionTimeline, GlyphCache, ass_filter, blend_patch, build_ass
+    from filtergraph import drawtext_filters
+
+    words = ["so", "today", "we", "are", "going", "to", "talk", "about", "the", "new", "studio", "pipeline"]
+    style = {"font_size": 40}
+    frame = synthetic_frames(1, width, height)[0]
+    ffmpeg = shutil.which("ffmpeg")
+    rows = []
+
+    def scan(captions, t):  # Previous CaptionOverlayStage lookup
+        for i, caption in enumerate(captions):
+            if caption["start"] <= t <= caption["end"]:
+                return i
+            if caption["start"] > t:
+                break
+        return None
+
+    for count in counts:
+        captions = [{"text": words[i % len(words)], "start": round(i * word_s, 3),
+                     "end": round((i + 1) * word_s - 0.01, 3)} for i in range(count)]
+        total_frames = int(count * word_s * fps)
+        sample = np.linspace(0, total_frames - 1, min(sample_frames, total_frames)).astype(int)
+
+        start = time.perf_counter()
+        ass = build_ass(captions, style, width, height)
+        ass_ms = (time.perf_counter() - start) * 1000
+
+        # Previous overlay: linear scan per frame, one rasterization per caption index
+        old_glyphs, patches = GlyphCache(max_entries=count + 1), {}
+        start = time.perf_counter()
+        for index in sample:
+            active = scan(captions, index / fps)
+            if active is not None:
+                if active not in patches:
+                    patches[active] = old_glyphs._render(captions[active]["text"], style)
+                blend_patch(frame, patches[active], 0, int(height * 0.75))
+        scan_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+        glyphs = GlyphCache()
+        start = time.perf_counter()
+        timeline = CaptionTimeline(captions, fps)
+        for index in sample:
+            active = timeline.active(index)
+            if active is not None:
+                blend_patch(frame, glyphs.patch(captions[active]["text"], style), 0, int(height * 0.75))
+        timeline_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+        row = {
+            "captions": count,
+            "drawtext_kb": round(len(",".join(drawtext_filters(captions, style))) / 1024, 1),
+            "ass_kb": round(len(ass) / 1024, 1),
+            "ass_ms": round(ass_ms, 1),
+            "scan_us/frame": round(scan_us),
+            "overlay_us/frame": round(timeline_us),
+            "rasterized": f"{len(patches)}→{glyphs.misses}",
+        }
+
+        if ffmpeg and count <= 1000:
+            with tempfile.TemporaryDirectory() as tmp:
+                ass_path = Path(tmp) / "captions.ass"
+                ass_path.write_text(ass)
+                script = Path(tmp) / "filters.txt"  # A 1000-caption chain exceeds one argv string's limit
+                for label, video_filter in (("drawtext_s", ",".join(drawtext_filters(captions, style))),
+                                            ("libass_s", ass_filter(ass_path))):
+                    script.write_text(video_filter)
+                    start = time.perf_counter()
+                    result = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi",
+                                             "-i", f"testsrc2=s={width}x{height}:r={fps}:d=20",
+                                             "-filter_script:v", str(script), "-f", "null", "-"],
+                                            capture_output=True)
+                    row[label] = round(time.perf_counter() - start, 2) if result.returncode == 0 else "failed"
+        rows.append(row)
+
+    report(f"CAPTIONS word-level ({word_s}s each) at {width}x{height}, {fps} fps"
+           + ("" if ffmpeg else " (ffmpeg missing, burn not timed)"), rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# AUDIO MIXER
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def write_wav(path: Path, samples: np.ndarray, sample_rate: int = 48000) -> Path:
+    import wave
+    samples = samples if samples.ndim == 2 else samples[:, None]
+    with wave.open(str(path), "wb") as out:
+        out.setnchannels(samples.shape[1])
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        out.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+    return path
+
+
+def read_wav(path: Path) -> np.ndarray:
+    import wave
+    with wave.open(str(path), "rb") as wav:
+        data = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2")
+        return data.reshape(-1, wav.getnchannels()).astype(np.float32) / 32768.0
+
+
+def _mixer_variant(queue, variant: str, tmp: Path, tracks: list, effects: list, duration_s: float,
+                   ducking: dict, sample_rate: int) -> None:
+    from audio_mixer import StreamingMixer
+    from job_metrics import PeakRssMonitor
+
+    voice, music, ambience = tracks
+    with PeakRssMonitor() as rss:
+        start = time.perf_counter()
+        if variant == "whole arrays":
+            # Everything decoded and looped to full length first, then mixed (no ducking)
+            length = int(duration_s * sample_rate)
+            mixed = np.repeat(read_wav(voice), 2, axis=1)
+            mixed += np.resize(read_wav(music), (length, 2)) * ducking["base_volume"]
+            mixed += np.repeat(np.resize(read_wav(ambience), (length, 1)), 2, axis=1) * 0.08
+            for path, start_time, volume in effects:
+                effect = read_wav(path)
+                offset = int(start_time * sample_rate)
+                mixed[offset:offset + len(effect)] += effect[:length - offset] * volume
+            mixed /= 3 + len(effects)
+            decodes = 1
+        else:
+            stats = StreamingMixer(sample_rate, loop_buffer_s=300 if variant == "kept" else 30).mix(
+                voice, tmp / "native.wav", music=music, ambience=ambience, sfx=effects,
+                duration=duration_s, ducking=ducking)
+            decodes = stats["music_decodes"]
+        elapsed = time.perf_counter() - start
+    queue.put({"mixer": "arrays, no duck" if variant == "whole arrays" else f"native {variant}",
+               "ms": round(elapsed * 1000), "realtime_x": round(duration_s / elapsed, 1),
+               "music_decodes": decodes,
+               "peak_mb": round((rss.peak_bytes - rss.start_bytes) / 1024 ** 2, 1)})
+
+
+def bench_mixer(duration_s: float = 600, music_s: float = 180, ambience_s: float = 60, sfx: int = 20,
+                sample_rate: int = 48000) -> list:
+    """
+    10-minute mix (voice, looped music ducked under it, looped ambience, SFX)
+    in process: the streaming mixer with the music bed kept for looping and
+    with it re-decoded, against mixing whole decoded arrays at once (without
+    ducking). Peak RSS is measured above the baseline of a fresh process.
+    With ffmpeg on PATH the old amix graph is timed too and compared with the
+    native output.
+    """
+    import multiprocessing
+    import shutil
+    import subprocess
+    from filtergraph import audio_mix_filters
+
+    ducking = {"base_volume": 0.15, "attack_ms": 50, "release_ms": 300}
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        t = np.arange(int(duration_s * sample_rate)) / sample_rate
+        # Speech-like voice: 2 s phrases with 1 s pauses, so the music ducks and recovers
+        voice = write_wav(tmp / "voice.wav", (0.3 * np.sin(2 * np.pi * 220 * t) * (t % 3 < 2)).astype(np.float32))
+        music = write_wav(tmp / "music.wav", np.stack([0.4 * np.sin(2 * np.pi * 330 * t[:int(music_s * sample_rate)])] * 2, 1))
+        ambience = write_wav(tmp / "ambience.wav", 0.2 * np.sin(2 * np.pi * 110 * t[:int(ambience_s * sample_rate)]))
+        hit = write_wav(tmp / "hit.wav", 0.5 * np.sin(2 * np.pi * 880 * t[:sample_rate // 2]))
+        del t
+        effects = [(hit, i * duration_s / sfx + 0.25, 0.5) for i in range(sfx)]
+
+        # Each variant in a fresh interpreter: freed arenas of the previous one would hide its peak
+        context = multiprocessing.get_context("spawn")
+        for variant in ("kept", "re-decoded", "whole arrays"):
+            queue = context.Queue()
+            process = context.Process(target=_mixer_variant, args=(
+                queue, variant, tmp, [voice, music, ambience], effects, duration_s, ducking, sample_rate))
+            process.start()
+            rows.append(queue.get())
+            process.join()
+
+        if shutil.which("ffmpeg"):
+            paths = [voice, music, ambience] + [path for path, _, _ in effects]
+            graph = ";".join(audio_mix_filters("0:a", "1:a", "2:a",
+                                               [(f"{i + 3}:a", start_time, volume)
+                                                for i, (_, start_time, volume) in enumerate(effects)],
+                                               duration_s, ducking, out="out"))
+            start = time.perf_counter()
+            subprocess.run(["ffmpeg", "-y", "-v", "error", *[arg for path in paths for arg in ("-i", str(path))],
+                            "-filter_complex", graph, "-map", "[out]", "-ar", str(sample_rate), "-ac", "2",
+                            str(tmp / "ffmpeg.wav")], check=True)
+            elapsed = time.perf_counter() - start
+            native, reference = read_wav(tmp / "native.wav"), read_wav(tmp / "ffmpeg.wav")
+            n = min(len(native), len(reference))
+            rows.append({"mixer": "ffmpeg amix", "ms": round(elapsed * 1000), "realtime_x": round(duration_s / elapsed, 1),
+                         "music_decodes": 1, "peak_mb": "n/a"})
+            print(f"\nnative vs ffmpeg: RMS diff {np.sqrt(np.mean((native[:n] - reference[:n]) ** 2)):.5f} "
+                  f"(signal RMS {np.sqrt(np.mean(reference[:n] ** 2)):.5f})")
+
+    report(f"AUDIO MIXER {duration_s / 60:.0f} min: voice, {music_s:.0f}s music looped + ducked, "
+           f"{ambience_s:.0f}s ambience looped, {sfx} SFX", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# STATIC REGION REUSE
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def talking_head_frames(count: int, width: int, height: int, head_motion: float = 0.0, seed: int = 0) -> list:
+    """A still portrait whose "mouth" opens and closes, ±2 levels of codec-like noise, optional head sway."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    portrait = np.stack([x * 255 // width, y * 255 // height, (x // 8 + y // 8) % 2 * 60 + 90], -1).astype(np.uint8)
+    cy, cx = int(height * 0.55), width // 2
+    frames = []
+    for i in range(count):
+        frame = np.roll(portrait, int(head_motion * np.sin(i / 5)), axis=1)
+        opening = int(height * (0.012 + 0.01 * np.sin(i / 3)))
+        frame[cy - opening:cy + opening, cx - width // 12:cx + width // 12] = (40, 20, 120)
+        noise = rng.integers(-2, 3, size=frame.shape, dtype=np.int16)
+        frames.append(np.clip(frame + noise, 0, 255).astype(np.uint8))
+    return frames
+
+
+class _CostlyUpsampler:
+    """RealESRGANer stand-in: nearest-neighbour upscale, plus modelled GPU time per megapixel."""
+
+    def __init__(self, ms_per_mpix: float):
+        self.ms_per_mpix = ms_per_mpix
+        self.pixels = 0
+
+    def enhance(self, frame: np.ndarray, outscale: int = 2):
+        self.pixels += frame.shape[0] * frame.shape[1]
+        time.sleep(frame.shape[0] * frame.shape[1] / 1e6 * self.ms_per_mpix / 1000)
+        return np.repeat(np.repeat(frame, outscale, axis=0), outscale, axis=1), None
+
+
+def bench_delta(frames: int = 120, width: int = 720, height: int = 1280, ms_per_mpix: float = 150) -> list:
+    """
+    2× upscale of a talking head, whole frames vs. delta-region mode, with
+    the model cost modelled as `ms_per_mpix` of sleep per input megapixel.
+    The change detection and compositing run for real. Error is measured
+    against the whole-frame output. With head motion the change
+    covers most of the frame, so frames go through whole.
+    """
+    from frame_pipeline import ArrayFrameSource, DeltaRegionStage, FramePipeline, MemoryFrameSink, UpscaleStage
+
+    rows = []
+    for clip, sway in (("talking head", 0.0), ("head motion", width * 0.05)):
+        source = talking_head_frames(frames, width, height, head_motion=sway)
+        outputs = {}
+        for mode in ("full frame", "delta region"):
+            model = _CostlyUpsampler(ms_per_mpix)
+            stage = UpscaleStage(model, scale=2)
+            if mode == "delta region":
+                stage = DeltaRegionStage(stage)
+            sink = MemoryFrameSink()
+            stats = FramePipeline([stage]).run(ArrayFrameSource(source, width, height, 25, frames), sink)
+            outputs[mode] = sink.frames
+
+            region = stage.report()["delta_region"] if mode == "delta region" else None
+            row = {
+                "clip": clip,
+                "mode": mode,
+                "fps": round(stats.fps, 1),
+                "model_mpix": round(model.pixels / 1e6, 1),
+                "pixel_frac": region["pixel_fraction"] if region else 1.0,
+                "static": region["static_frames"] if region else 0,
+                "full": region["full_frames"] if region else frames,
+                "region_ms": round(region["region_s"] * 1000 / frames, 1) if region else 0,
+                "psnr_db": "ref",
+            }
+            if region:
+                error = np.mean([np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+                                 for a, b in zip(outputs["full frame"], outputs["delta region"])])
+                row["psnr_db"] = round(10 * np.log10(255 ** 2 / error), 1) if error > 0 else "inf"
+            rows.append(row)
+
+    report(f"DELTA REGION {frames} frames {width}x{height} → 2x, model {ms_per_mpix:.0f} ms/Mpix "
+           f"(region_ms = detect + composite per frame)", rows)
+    return rows
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# FRAME WORKERS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class _DigestSink:
+    """Discards frames, keeping a cheap per-frame digest so variants can be compared."""
+
+    def __init__(self):
+        self.digests = []
+
+    def open(self, width: int, height: int, fps: float) -> None:
+        pass
+
+    def write(self, frame: np.ndarray, release=None) -> None:
+        self.digests.append(hash(frame[::16, ::16].tobytes()))
+        if release is not None:
+            release()
+
+    def close(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        pass
+
+
+_PICKLED_STAGES = []
+
+
+def _pickled_frame(item):
+    index, frame = item
+    for stage in _PICKLED_STAGES:
+        frame = stage.process(frame, index)
+    return frame
+
+
+def _set_pickled_stages(stages) -> None:
+    _PICKLED_STAGES[:] = stages
+
+
+def bench_frame_ring(frames: int = 240, width: int = 720, height: int = 1280, worker_counts: tuple = (2, 4)) -> list:
+    """
+    The CPU tail of the frame pipeline (colour grade + film grain) over
+    synthetic frames: in process, through multiprocessing.Pool.imap (every
+    frame pickled to a worker and back), and through the shared-memory
+    frame ring at several worker counts (plus one per core). Throughput only
+    grows with real cores; on a single-core box the pool rows show the
+    coordination overhead instead.
+    """
+    import multiprocessing
+    from frame_pipeline import ArrayFrameSource, ColorGradeStage, FilmGrainStage, FramePipeline
+
+    palette = synthetic_frames(8, width, height)
+
+    def source():
+        return ArrayFrameSource((palette[i % len(palette)] for i in range(frames)), width, height, 30, frames)
+
+    def stages():
+        return [ColorGradeStage("cinematic"), FilmGrainStage(0.02, seed=7)]
+
+    cores = os.cpu_count() or 1
+    rows = []
+
+    sink = _DigestSink()
+    stats = FramePipeline(stages()).run(source(), sink)
+    reference = sink.digests
+    baseline = stats.fps
+    rows.append({"mode": "in process", "workers": 1, "fps": round(stats.fps, 1), "speedup": 1.0,
+                 "max_reorder": 0, "wait_in_ms": 0, "wait_out_ms": 0, "identical": True})
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+    for workers in sorted(set(worker_counts) | {cores}):
+        if workers < 2:
+            continue
+        start = time.perf_counter()
+        with context.Pool(workers, initializer=_set_pickled_stages, initargs=(stages(),)) as pool:
+            digests = [hash(frame[::16, ::16].tobytes())
+                       for frame in pool.imap(_pickled_frame, enumerate(source()), chunksize=2)]
+        fps = frames / (time.perf_counter() - start)
+        rows.append({"mode": "pickled imap", "workers": workers, "fps": round(fps, 1),
+                     "speedup": round(fps / baseline, 2), "max_reorder": "n/a", "wait_in_ms": "n/a",
+                     "wait_out_ms": "n/a", "identical": digests == reference})
+
+        sink = _DigestSink()
+        stats = FramePipeline(stages(), workers=workers).run(source(), sink)
+        rows.append({"mode": "frame ring", "workers": workers, "fps": round(stats.fps, 1),
+                     "speedup": round(stats.fps / baseline, 2), "max_reorder": stats.pool["max_reorder"],
+                     "wait_in_ms": round(stats.pool["waited_free_in_s"] * 1000),
+                     "wait_out_ms": round(stats.pool["waited_free_out_s"] * 1000),
+                     "identical": sink.digests == reference})
+
+    report(f"FRAME WORKERS {frames} frames {width}x{height}, grade + grain, {cores} CPU core(s) "
+           f"(wait_* = feeder blocked on a full ring)", rows)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PersonaForge Studio CPU benchmarks")
+    parser.add_argument("--all", action="store_true", help="Run every benchmark")
+    parser.add_argument("--upscale", action="store_true", help="Tiled upscaler planner/stitcher")
+    parser.add_argument("--download", action="store_true", help="Parallel resumable model downloader")
+    parser.add_argument("--upload", action="store_true", help="Multipart / streaming R2 uploader")
+    parser.add_argument("--segments", action="store_true", help="Silence-split parallel lip-sync renderer")
+    parser.add_argument("--executor", action="store_true", help="Concurrent jobs pipelined by resource class")
+    parser.add_argument("--coalesce", action="store_true", help="Micro-batching of concurrent realtime requests")
+    parser.add_argument("--hls", action="store_true", help="Time to first segment of streamed output")
+    parser.add_argument("--idle", action="store_true", help="Vectorized idle loops and the loop cache")
+    parser.add_argument("--persona", action="store_true", help="Parallel persona takes with overlapped uploads")
+    parser.add_argument("--filtergraph", action="store_true", help="One-pass post graph vs. one process per step")
+    parser.add_argument("--captions", action="store_true", help="Caption cost swept over caption count")
+    parser.add_argument("--mixer", action="store_true", help="Streaming in-process audio mixer on a 10-minute mix")
+    parser.add_argument("--delta", action="store_true", help="Static-region reuse vs. whole-frame upscaling")
+    parser.add_argument("--ring", action="store_true", help="Shared-memory frame workers vs. pickled frames")
+
+    args = parser.parse_args()
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        return
+
+    if args.all or args.upscale:
+        bench_upscale()
+    if args.all or args.download:
+        bench_download()
+    if args.all or args.upload:
+        bench_upload()
+    if args.all or args.segments:
+        bench_segments()
+    if args.all or args.executor:
+        bench_executor()
+    if args.all or args.coalesce:
+        bench_coalesce()
+    if args.all or args.hls:
+        bench_hls()
+    if args.all or args.idle:
+        bench_idle()
+    if args.all or args.persona:
+        bench_persona()
+    if args.all or args.filtergraph:
+        bench_filtergraph()
+    if args.all or args.captions:
+        bench_captions()
+    if args.all or args.mixer:
+        bench_mixer()
+    if args.all or args.delta:
+        bench_delta()
+    if args.all or args.ring:
+        bench_frame_ring()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+BOOTSTRAP MANIFEST - Packages, Repos and Weights, Checked in Milliseconds
+═══════════════════════════════════════════════════════════════════════════════════
+
+Single declaration of everything the handler needs on disk:
+
+    MODELS      - weight sources (HuggingFace repos or direct URLs), shared with
+                  download_models.py
+    COMPONENTS  - per model: Python packages, git repos and MODELS entries
+
+Provisioning (pip / git clone / weight download) happens at build or volume
+setup time via `python download_models.py --bootstrap`. At runtime the handler
+only calls `check()` / `require()`, which stat files and look up import specs
+without importing anything, and raise `BootstrapError` instead of installing.
+
+Downloaded weights are recorded in MODELS_DIR/manifest.lock.json (sha256 +
+size). The readiness check compares sizes against the lock; `--deep` re-hashes.
+
+Usage:
+    python bootstrap.py                 # readiness report with timings
+    python bootstrap.py --deep          # also verify sha256 of every weight
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import importlib.util
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+
+# Paths
+WORKSPACE = Path(os.getenv("WORKSPACE", "/workspace"))
+MODELS_DIR = WORKSPACE / "models"
+MUSETALK_DIR = WORKSPACE / "MuseTalk"
+LIVEPORTRAIT_DIR = WORKSPACE / "LivePortrait"
+WAV2LIP_DIR = WORKSPACE / "Wav2Lip"
+LOCK_PATH = MODELS_DIR / "manifest.lock.json"
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# MANIFEST
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+# Weight sources. Entries use either `repo_id` (+ optional `files`, None = whole
+# snapshot) or `urls` ({filename: url}). `sha256` ({filename: hex}) pins a file;
+# unpinned files are pinned in the lockfile on first download.
+MODELS = {
+    "lipsync": {
+        "latentsync": {
+            "repo_id": "ByteDance/LatentSync",
+            "local_dir": MODELS_DIR / "video" / "latentsync",
+            "files": None,  # Download entire repo
+        },
+        "musetalk": {
+            "repo_id": "TMElyralab/MuseTalk",
+            "local_dir": MUSETALK_DIR / "models",
+            "files": None,
+        },
+        "wav2lip": {
+            "repo_id": "numz/wav2lip_studio",
+            "local_dir": MODELS_DIR / "video" / "wav2lip",
+            "files": ["wav2lip_gan.pth", "wav2lip.pth"],
+        },
+        "liveportrait": {
+            "repo_id": "KwaiVGI/LivePortrait",
+            "local_dir": LIVEPORTRAIT_DIR / "pretrained_weights",
+            "files": None,
+        },
+    },
+    "upscalers": {
+        "realesrgan": {
+            "local_dir": MODELS_DIR / "upscalers" / "realesrgan",
+            "urls": {
+                "RealESRGAN_x2plus.pth":
+                    "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.1/RealESRGAN_x2plus.pth",
+                "RealESRGAN_x4plus.pth":
+                    "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.1.0/RealESRGAN_x4plus.pth",
+                "RealESRGAN_x4plus_anime_6B.pth":
+                    "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.2.4/RealESRGAN_x4plus_anime_6B.pth",
+            },
+        },
+        "gfpgan": {
+            "local_dir": MODELS_DIR / "gfpgan",
+            "urls": {
+                "GFPGANv1.4.pth":
+                    "https://github.com/TencentARC/GFPGAN/releases/download/v1.3.4/GFPGANv1.4.pth",
+            },
+        },
+    },
+    "diffusion": {
+        # Add your image generation models here
+        "sdxl": {
+            "repo_id": "stabilityai/stable-diffusion-xl-base-1.0",
+            "local_dir": MODELS_DIR / "diffusion" / "sdxl",
+            "files": None,  # Download entire repo
+        },
+    },
+    "face": {
+        "face_detection": {
+            "repo_id": "ybelkada/face-parse-bisent",
+            "local_dir": MODELS_DIR / "face" / "detection",
+            "files": None,
+        },
+    },
+}
+
+
+@dataclass
+class Package:
+    pip: str
+    module: str
+
+
+@dataclass
+class Repo:
+    url: str
+    path: Path
+    marker: str = "README.md"  # A file that only exists after a complete clone
+
+
+@dataclass
+class Component:
+    packages: List[Package] = field(default_factory=list)
+    repos: List[Repo] = field(default_factory=list)
+    weights: List[str] = field(default_factory=list)  # "category/name" keys into MODELS
+
+
+COMPONENTS = {
+    "musetalk": Component(
+        packages=[
+            Package("torch", "torch"), Package("torchvision", "torchvision"),
+            Package("torchaudio", "torchaudio"), Package("diffusers", "diffusers"),
+            Package("transformers", "transformers"), Package("accelerate", "accelerate"),
+            Package("opencv-python", "cv2"), Package("mediapipe", "mediapipe"),
+            Package("librosa", "librosa"), Package("omegaconf", "omegaconf"),
+            Package("av", "av"), Package("pydub", "pydub"),
+        ],
+        repos=[Repo("https://github.com/TMElyralab/MuseTalk.git", MUSETALK_DIR)],
+        weights=["lipsync/musetalk"],
+    ),
+    "gfpgan": Component(
+        packages=[Package("gfpgan", "gfpgan"), Package("basicsr", "basicsr"),
+                  Package("facexlib", "facexlib")],
+        weights=["upscalers/gfpgan"],
+    ),
+    "realesrgan": Component(
+        packages=[Package("realesrgan", "realesrgan"), Package("basicsr", "basicsr")],
+        weights=["upscalers/realesrgan"],
+    ),
+    "liveportrait": Component(
+        packages=[
+            Package("onnxruntime-gpu", "onnxruntime"), Package("insightface", "insightface"),
+            Package("imageio", "imageio"), Package("imageio-ffmpeg", "imageio_ffmpeg"),
+        ],
+        repos=[Repo("https://github.com/KwaiVGI/LivePortrait.git", LIVEPORTRAIT_DIR)],
+        weights=["lipsync/liveportrait"],
+    ),
+    "wav2lip": Component(
+        packages=[Package("face-alignment", "face_alignment"), Package("batch-face", "batch_face")],
+        repos=[Repo("https://github.com/Rudrabha/Wav2Lip.git", WAV2LIP_DIR)],
+        weights=["lipsync/wav2lip"],
+    ),
+}
+
+
+class BootstrapError(RuntimeError):
+    """A required package, repo or weight file is missing at runtime."""
+
+
+def model_config(key: str) -> Dict[str, Any]:
+    category, name = key.split("/", 1)
+    return MODELS[category][name]
+
+
+def model_files(config: Dict[str, Any]) -> Optional[List[str]]:
+    """Explicit file list for a MODELS entry (None = whole snapshot)."""
+    if config.get("urls"):
+        return list(config["urls"])
+    return config.get("files")
+
+
+def weight_path(key: str, filename: str) -> Path:
+    """Resolve a weight file declared in MODELS, e.g. weight_path("upscalers/gfpgan", "GFPGANv1.4.pth")."""
+    return model_config(key)["local_dir"] / filename
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# LOCKFILE
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def sha256_file(path: Path, chunk_size: int = 4 * 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_lock(path: Optional[Path] = None) -> Dict[str, Dict[str, Any]]:
+    """{path relative to WORKSPACE: {"sha256": ..., "bytes": ...}} (default: LOCK_PATH)"""
+    try:
+        with open(path or LOCK_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_lock(lock: Dict[str, Dict[str, Any]], path: Optional[Path] = None) -> None:
+    path = path or LOCK_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(lock, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def lock_key(path: Path) -> str:
+    try:
+        return str(path.relative_to(WORKSPACE))
+    except ValueError:
+        return str(path)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# READINESS CHECK
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class Readiness:
+    component: str
+    missing: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return not self.missing
+
+
+def check_component(name: str, lock: Optional[Dict[str, Dict[str, Any]]] = None,
+                    deep: bool = False) -> Readiness:
+    """
+    Presence-only check: import specs, repo markers and weight files (size
+    matched against the lockfile). `deep` re-hashes weights against the
+    manifest pin or lock - seconds per GB, so not for the startup path.
+    """
+    start = time.perf_counter()
+    component = COMPONENTS[name]
+    lock = load_lock() if lock is None else lock
+    missing = []
+
+    for package in component.packages:
+        if importlib.util.find_spec(package.module) is None:
+            missing.append(f"package {package.pip}")
+
+    for repo in component.repos:
+        if not (repo.path / repo.marker).exists():
+            missing.append(f"repo {repo.path}")
+
+    for key in component.weights:
+        config = model_config(key)
+        local_dir = config["local_dir"]
+        files = model_files(config)
+        if files is None:
+            if not local_dir.is_dir() or not any(local_dir.iterdir()):
+                missing.append(f"weights {local_dir}")
+            continue
+
+        for filename in files:
+            path = local_dir / filename
+            if not path.is_file():
+                missing.append(f"weights {path}")
+                continue
+            record = lock.get(lock_key(path))
+            if record and record.get("bytes") != path.stat().st_size:
+                missing.append(f"weights {path} (size differs from lock)")
+            elif deep:
+                expected = config.get("sha256", {}).get(filename) or (record or {}).get("sha256")
+                if expected and sha256_file(path) != expected:
+                    missing.append(f"weights {path} (sha256 mismatch)")
+
+    return Readiness(name, missing, (time.perf_counter() - start) * 1000)
+
+
+def check(names: Optional[List[str]] = None, deep: bool = False) -> Dict[str, Readiness]:
+    lock = load_lock()
+    return {name: check_component(name, lock, deep) for name in (names or COMPONENTS)}
+
+
+def require(name: str) -> None:
+    """Raise BootstrapError (never install) if a component is not provisioned."""
+    readiness = check_component(name)
+    if not readiness.ready:
+        raise BootstrapError(
+            f"{name} is not provisioned (missing: {'; '.join(readiness.missing)}). "
+            f"Run `python download_models.py --bootstrap` at build/volume setup time."
+        )
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# PROVISIONING (build / volume setup time only)
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def provision(names: Optional[List[str]] = None, install_packages: bool = True) -> None:
+    """
+    pip install missing packages and clone missing repos for `names`. Weights
+    are fetched by download_models.py. Never called from the handler.
+    """
+    import subprocess
+
+    for name in names or COMPONENTS:
+        component = COMPONENTS[name]
+
+        missing = [p.pip for p in component.packages if importlib.util.find_spec(p.module) is None]
+        if install_packages and missing:
+            print(f"[Bootstrap] {name}: pip install {' '.join(missing)}")
+            subprocess.run([sys.executable, "-m", "pip", "install", "-q", *missing], check=True)
+
+        for repo in component.repos:
+            if (repo.path / repo.marker).exists():
+                continue
+            print(f"[Bootstrap] {name}: cloning {repo.url}")
+            subprocess.run(["git", "clone", "--depth", "1", repo.url, str(repo.path)], check=True)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# COLD-START TIMING
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class ColdStartTimer:
+    """
+    Named phase timings from process start to first ready state.
+
+    Usage:
+        timer = ColdStartTimer()
+        with timer.phase("readiness"):
+            check()
+        timer.ready()
+        timer.report()
+    """
+
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def mark(self, name: str) -> None:
+        """Record elapsed time since the origin (e.g. "imports" at module load)."""
+        self.phases[name] = time.perf_counter() - self.origin
+
+    def ready(self) -> None:
+        """Freeze the total: the worker is accepting jobs."""
+        self.ready_at = time.perf_counter()
+
+    def report(self) -> Dict[str, Any]:
+        end = self.ready_at if self.ready_at is not None else time.perf_counter()
+        return {
+            "phases_ms": {name: round(s * 1000, 2) for name, s in self.phases.items()},
+            "total_ms": round((end - self.origin) * 1000, 2),
+        }
+
+
+def print_readiness(results: Dict[str, Readiness]) -> None:
+    for name, readiness in results.items():
+        status = "✅" if readiness.ready else "❌"
+        print(f"  {status} {name:<14} {readiness.elapsed_ms:7.2f} ms")
+        for item in readiness.missing:
+            print(f"       missing {item}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PersonaForge Studio readiness check")
+    parser.add_argument("components", nargs="*", help=f"Subset of {', '.join(COMPONENTS)}")
+    parser.add_argument("--deep", action="store_true", help="Also verify sha256 of weights")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = check(args.components or None, deep=args.deep)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print_readiness(results)
+    print(f"\nChecked {len(results)} components in {elapsed_ms:.2f} ms")
+    sys.exit(0 if all(r.ready for r in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+CAPTION ENGINE - Captions Compiled Once, Constant Cost per Frame
+═══════════════════════════════════════════════════════════════════════════════════
+
+`burn_captions` used to chain one drawtext filter per caption. ffmpeg checks
+every drawtext's `enable=between(...)` on every frame, so the cost per frame
+grew with the caption count, and word-level captions for a long video made
+the command line itself unmanageable. Captions are now compiled once, in one
+of three forms:
+
+    ass        build_ass() → one .ass file, burned by a single `ass` filter.
+               libass only lays out the events on screen and caches glyphs.
+    overlay    CaptionTimeline + GlyphCache → frame index → pre-rasterized
+               RGBA patch in O(1), for the in-process frame pipeline.
+               Patches are cached by text + style, so repeated words
+               (and repeated jobs) are rasterized once.
+    soft       soft_subtitle_command() → the .ass muxed as a subtitle track
+               with stream copy, so the video is not re-encoded at all.
+
+The placement matches the drawtext filters: horizontally centered, with the
+top of the text at `position_y` × height, `font_size` / `color` /
+`stroke_color` / `stroke_width` from `caption_style`. Everything except the
+rasterizer is plain string / numpy code and runs without ffmpeg
+(see `python benchmark.py --captions`).
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+ASS_FONT = "DejaVu Sans"
+PATCH_FONT = "DejaVuSans-Bold.ttf"
+
+NAMED_COLORS = {
+    "white": (255, 255, 255),
+    "black": (0, 0, 0),
+    "red": (255, 0, 0),
+    "green": (0, 128, 0),
+    "blue": (0, 0, 255),
+    "yellow": (255, 255, 0),
+    "cyan": (0, 255, 255),
+    "magenta": (255, 0, 255),
+    "orange": (255, 165, 0),
+    "gray": (128, 128, 128),
+    "grey": (128, 128, 128),
+}
+
+
+def parse_color(color: str, default: Tuple[int, int, int] = (255, 255, 255)) -> Tuple[int, int, int]:
+    """ffmpeg-style color ("white", "#ffcc00", "0xFFCC00") → (r, g, b)."""
+    value = str(color).strip().lower()
+    if value in NAMED_COLORS:
+        return NAMED_COLORS[value]
+    hex_value = value[1:] if value.startswith("#") else value[2:] if value.startswith("0x") else value
+    if len(hex_value) >= 6:
+        try:
+            return tuple(int(hex_value[i:i + 2], 16) for i in (0, 2, 4))
+        except ValueError:
+            pass
+    return default
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# ASS / SOFT SUBTITLES
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def ass_color(color: str, default: Tuple[int, int, int] = (255, 255, 255)) -> str:
+    r, g, b = parse_color(color, default)
+    return f"&H00{b:02X}{g:02X}{r:02X}"
+
+
+def ass_time(seconds: float) -> str:
+    centis = max(0, int(round(seconds * 100)))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    secs, centis = divmod(centis, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centis:02d}"
+
+
+def escape_ass(text: str) -> str:
+    """Literal text for a Dialogue line (no override blocks, explicit line breaks)."""
+    return (str(text).replace("\\", "\\\u200b").replace("{", "\\{").replace("}", "\\}")
+            .replace("\r\n", "\\N").replace("\n", "\\N"))
+
+
+def build_ass(captions: Sequence[Dict[str, Any]], style: Dict[str, Any], width: int, height: int) -> str:
+    """
+    One ASS script for all captions. PlayRes is the video size, so font size,
+    stroke and position are in video pixels like the drawtext filters.
+    """
+    font_size = int(style.get("font_size", 48))
+    stroke_width = style.get("stroke_width", 2)
+    margin_v = int(height * style.get("position_y", 0.75))
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 2",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
+        "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        # Alignment 8 = top center: MarginV is the top of the text, like drawtext's y=h*position_y
+        f"Style: Caption,{ASS_FONT},{font_size},{ass_color(style.get('color', 'white'))},&H000000FF,"
+        f"{ass_color(style.get('stroke_color', 'black'), (0, 0, 0))},&H00000000,"
+        f"-1,0,0,0,100,100,0,0,1,{stroke_width},0,8,0,0,{margin_v},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for caption in sorted(captions, key=lambda c: c["start"]):
+        lines.append(f"Dialogue: 0,{ass_time(caption['start'])},{ass_time(caption['end'])},"
+                     f"Caption,,0,0,0,,{escape_ass(caption['text'])}")
+    return "\n".join(lines) + "\n"
+
+
+def write_ass(captions: Sequence[Dict[str, Any]], style: Dict[str, Any], width: int, height: int,
+              path: Path) -> Path:
+    Path(path).write_text(build_ass(captions, style, width, height), encoding="utf-8")
+    return Path(path)
+
+
+def ass_filter(path: Path) -> str:
+    """The single video filter that burns a compiled .ass file."""
+    escaped = str(path).replace("\\", "/").replace("'", "'\\''").replace(":", "\\:")
+    return f"ass=filename='{escaped}'"
+
+
+def soft_subtitle_command(video: Path, subtitles: Path, output: Path, language: str = "eng") -> List[str]:
+    """ffmpeg argv muxing `subtitles` as a selectable track; audio and video are stream-copied."""
+    codec = "mov_text" if Path(output).suffix.lower() in (".mp4", ".m4v", ".mov") else "ass"
+    return [
+        "ffmpeg", "-y",
+        "-i", str(video),
+        "-i", str(subtitles),
+        "-map", "0:v", "-map", "0:a?", "-map", "1:0",
+        "-c:v", "copy", "-c:a", "copy", "-c:s", codec,
+        "-metadata:s:s:0", f"language={language}",
+        str(output),
+    ]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# PRE-RASTERIZED OVERLAY
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class CaptionTimeline:
+    """
+    Frame index → active caption in O(1).
+
+    Built once per frame rate: each caption's frame range is filled into an
+    index table, later captions first, so where captions overlap the
+    earliest-starting one wins (as the per-frame scan did). Frames past the
+    last caption are simply inactive.
+    """
+
+    def __init__(self, captions: Sequence[Dict[str, Any]], fps: float):
+        self.captions = sorted(captions, key=lambda c: c["start"])
+        self.fps = fps or 30.0
+        end = max((c["end"] for c in self.captions), default=0.0)
+        frames = int(np.floor(end * self.fps)) + 2
+        times = np.arange(frames) / self.fps
+        self.table = np.full(frames, -1, dtype=np.int32)
+        for i in range(len(self.captions) - 1, -1, -1):
+            caption = self.captions[i]
+            first = np.searchsorted(times, caption["start"], side="left")
+            last = np.searchsorted(times, caption["end"], side="right")
+            self.table[first:last] = i
+
+    def active(self, index: int) -> Optional[int]:
+        if 0 <= index < len(self.table) and self.table[index] >= 0:
+            return int(self.table[index])
+        return None
+
+
+class GlyphCache:
+    """
+    Rasterized caption patches, keyed by text + style and LRU-bounded by
+    both entry count and total bytes.
+
+    Usage:
+        glyphs = GlyphCache(max_entries=2048, max_bytes=64 * 1024**2)
+        premultiplied, inverse_alpha = glyphs.patch("Hello", caption_style)
+
+    A patch is stored premultiplied (BGR × alpha, float32) with its inverse
+    alpha, so blending it is one multiply-add per pixel. That is 16 bytes
+    per pixel: a long line at a large font size is several MB, so the byte
+    cap is what bounds memory. Shared between jobs: word-level captions
+    repeat the same words constantly.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 ** 2):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._patches: "OrderedDict[Tuple, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str, style: Dict[str, Any]) -> Tuple:
+        return (text, int(style.get("font_size", 48)), int(style.get("stroke_width", 2)),
+                str(style.get("color", "white")), str(style.get("stroke_color", "black")))
+
+    def patch(self, text: str, style: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        key = self._key(text, style)
+        with self._lock:
+            if key in self._patches:
+                self._patches.move_to_end(key)
+                self.hits += 1
+                return self._patches[key]
+        patch = self._render(text, style)
+        with self._lock:
+            self.misses += 1
+            if key not in self._patches:
+                self._patches[key] = patch
+                self.bytes += self._size(patch)
+            # The newest patch always stays, even on its own over max_bytes
+            while len(self._patches) > 1 and (len(self._patches) > self.max_entries
+                                              or (self.max_bytes and self.bytes > self.max_bytes)):
+                _, evicted = self._patches.popitem(last=False)
+                self.bytes -= self._size(evicted)
+                self.evictions += 1
+        return patch
+
+    @staticmethod
+    def _size(patch: Tuple[np.ndarray, np.ndarray]) -> int:
+        return sum(array.nbytes for array in patch)
+
+    def _render(self, text: str, style: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        from PIL import Image, ImageDraw, ImageFont
+
+        font_size = int(style.get("font_size", 48))
+        try:
+            font = ImageFont.truetype(PATCH_FONT, font_size)
+        except OSError:
+            font = ImageFont.load_default()
+
+        stroke_width = int(style.get("stroke_width", 2))
+        probe = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+        left, top, right, bottom = probe.textbbox((0, 0), text, font=font, stroke_width=stroke_width)
+        patch = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(patch).text(
+            (-left, -top), text, font=font,
+            fill=parse_color(style.get("color", "white")),
+            stroke_width=stroke_width,
+            stroke_fill=parse_color(style.get("stroke_color", "black"), (0, 0, 0)),
+        )
+
+        rgba = np.asarray(patch)
+        alpha = rgba[..., 3:].astype(np.float32) / 255.0
+        premultiplied = rgba[..., 2::-1].astype(np.float32) * alpha + 0.5
+        return premultiplied, 1.0 - alpha
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._patches), "mb": round(self.bytes / 1024 ** 2, 1),
+                    "max_mb": round(self.max_bytes / 1024 ** 2, 1), "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+def blend_patch(frame: np.ndarray, patch: Tuple[np.ndarray, np.ndarray], x: int, y: int) -> np.ndarray:
+    """Alpha-blend a GlyphCache patch with its top-left corner at (x, y), clipped to the frame."""
+    premultiplied, inverse_alpha = patch
+    height, width = frame.shape[:2]
+    h = min(premultiplied.shape[0], height - y)
+    w = min(premultiplied.shape[1], width - x)
+    if w <= 0 or h <= 0:
+        return frame
+
+    frame = frame.copy()
+    region = frame[y:y + h, x:x + w].astype(np.float32)
+    frame[y:y + h, x:x + w] = (premultiplied[:h, :w] + region * inverse_alpha[:h, :w]).astype(np.uint8)
+    return frame
@@ -0,0 +1,231 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+CHECKPOINTS - Resumable Multi-Stage Jobs on the Workspace Volume
+═══════════════════════════════════════════════════════════════════════════════════
+
+Intermediate artifacts used to live in a TemporaryDirectory, so a preempted
+pod or a failed late stage (captions, grain, upload) threw away the MuseTalk +
+GFPGAN + Real-ESRGAN work. Stage outputs are now kept per job:
+
+    <root>/<job_id>/<stage>-<key[:16]>/
+        <filename>          the stage's output file
+        meta.json           stage stats, key, timings (written last = complete)
+
+A stage's key hashes the job's input files (by content), its own params and
+the keys of the stages it depends on, so a retry with the same inputs finds
+the finished stages and one with different inputs does not. Stages are
+resolved lazily from the end: asking for the final output returns it if it
+is checkpointed, otherwise runs the stage, which asks for its upstream
+outputs in turn - so a retry resumes from the last finished stage.
+
+Job directories older than `ttl_hours` are pruned, and the oldest jobs go
+first when the store exceeds `max_bytes`.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable
+
+from disk_cache import digest_key, file_digest, path_size
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class StageCheckpoint:
+    """One stage of a job: `path()` returns its output, from the store or by running it."""
+
+    def __init__(self, job: "JobCheckpoints", name: str, produce: Callable[[Path], Any],
+                 filename: str, key: str):
+        self.job = job
+        self.name = name
+        self.produce = produce
+        self.filename = filename
+        self.key = key
+        self.stats: Any = None
+        self.resumed = False
+        self.elapsed_s = 0.0
+        self._path: Optional[Path] = None
+
+    @property
+    def directory(self) -> Path:
+        return self.job.directory / f"{self.name}-{self.key[:16]}"
+
+    def done(self) -> bool:
+        return (self.directory / "meta.json").exists()
+
+    def path(self) -> Path:
+        if self._path is not None:
+            return self._path
+
+        start = time.time()
+        if self.done():
+            meta = json.loads((self.directory / "meta.json").read_text())
+            self.stats, self.resumed = meta.get("stats"), True
+            print(f"[Checkpoint] {self.job.job_id}/{self.name}: resumed")
+        else:
+            tmp = self.job.store.reserve()
+            try:
+                self.stats = self.produce(tmp / self.filename)
+            except BaseException:
+                self.job.store.remove(tmp)
+                raise
+            (tmp / "meta.json").write_text(json.dumps({
+                "stage": self.name,
+                "key": self.key,
+                "stats": self.stats,
+                "elapsed_s": round(time.time() - start, 3),
+                "created_at": time.time(),
+            }, default=str))
+            self.job.store.commit(tmp, self.directory)
+
+        self.elapsed_s = time.time() - start
+        self._path = self.directory / self.filename
+        return self._path
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.name,
+            "status": "skipped" if self._path is None else ("resumed" if self.resumed else "ran"),
+            "ms": round(self.elapsed_s * 1000, 1),
+        }
+
+
+class JobCheckpoints:
+    """
+    Usage:
+        ckpt = checkpoints.job(job_id, inputs={"image": image_path, "audio": audio_path},
+                               params={"quality": quality})
+        lipsync = ckpt.stage("lipsync", lambda out: run_lipsync(image_path, audio_path, out, ...))
+        render = ckpt.stage("render", lambda out: run_frame_pipeline(lipsync.path(), out, ...),
+                            after=[lipsync])
+        final = render.path()              # runs only what is not checkpointed yet
+        metadata["checkpoints"] = ckpt.report()
+
+    `produce(out)` writes the stage's output to `out` and may return
+    JSON-able stats, which are stored and handed back on resume.
+    """
+
+    def __init__(self, store: "CheckpointStore", job_id: str, digest: str):
+        self.store = store
+        self.job_id = job_id
+        self.digest = digest
+        self.directory = store.root / _UNSAFE.sub("_", job_id)[:128]
+        self.stages: List[StageCheckpoint] = []
+
+    def stage(self, name: str, produce: Callable[[Path], Any], filename: str = "output.mp4",
+              params: Optional[Dict[str, Any]] = None,
+              after: Optional[List[StageCheckpoint]] = None) -> StageCheckpoint:
+        key = digest_key(self.digest, name, json.dumps(params or {}, sort_keys=True, default=str),
+                         *(upstream.key for upstream in after or []))
+        checkpoint = StageCheckpoint(self, name, produce, filename, key)
+        self.stages.append(checkpoint)
+        return checkpoint
+
+    def discard(self) -> None:
+        """Drop this job's checkpoints (e.g. once its outputs are delivered)."""
+        self.store.remove(self.directory)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "job_dir": str(self.directory),
+            "stages": [stage.to_dict() for stage in self.stages],
+            "resumed": [stage.name for stage in self.stages if stage.resumed],
+        }
+
+
+class CheckpointStore:
+    """
+    Usage:
+        checkpoints = CheckpointStore(WORKSPACE / "jobs", max_bytes=50 * 1024**3, ttl_hours=24)
+        ckpt = checkpoints.job(job_id, inputs={...}, params={...})
+
+    `max_bytes=0` / `ttl_hours=0` disable the size cap / age limit.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 0, ttl_hours: float = 24):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.ttl_hours = ttl_hours
+        self._tmp = self.root / ".tmp"
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def job(self, job_id: str, inputs: Optional[Dict[str, Path]] = None,
+            params: Optional[Dict[str, Any]] = None) -> JobCheckpoints:
+        """Checkpoints of `job_id`; `inputs` files are hashed by content into every stage key."""
+        if time.time() - self._last_prune > 60:
+            self.prune()
+        digest = digest_key(
+            json.dumps({name: file_digest(path) for name, path in sorted((inputs or {}).items())
+                        if path is not None and Path(path).exists()}, sort_keys=True),
+            json.dumps(params or {}, sort_keys=True, default=str),
+        )
+        return JobCheckpoints(self, job_id, digest)
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def reserve(self) -> Path:
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        return Path(tempfile.mkdtemp(dir=self._tmp))
+
+    def commit(self, tmp: Path, directory: Path) -> None:
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            tmp.rename(directory)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # Same stage finished elsewhere first
+        os.utime(directory.parent)  # Job recency for pruning
+
+    def remove(self, directory: Path) -> None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _jobs(self) -> List[Path]:
+        if not self.root.exists():
+            return []
+        return [p for p in self.root.iterdir() if p.is_dir() and p != self._tmp]
+
+    def prune(self) -> int:
+        """Apply the age limit and size cap; returns job directories removed."""
+        removed = 0
+        with self._lock:
+            now = self._last_prune = time.time()
+            jobs = []
+            for job in self._jobs():
+                try:
+                    jobs.append((job.stat().st_mtime, path_size(job), job))
+                except FileNotFoundError:
+                    pass
+
+            jobs.sort()
+            total = sum(size for _, size, _ in jobs)
+            for mtime, size, job in jobs:
+                expired = self.ttl_hours and now - mtime > self.ttl_hours * 3600
+                over = self.max_bytes and total > self.max_bytes
+                if not (expired or over):
+                    continue
+                self.remove(job)
+                total -= size
+                removed += 1
+
+            cutoff = now - 6 * 3600
+            for tmp in self._tmp.iterdir() if self._tmp.exists() else []:
+                if tmp.stat().st_mtime < cutoff:
+                    shutil.rmtree(tmp, ignore_errors=True)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        jobs = self._jobs()
+        return {
+            "jobs": len(jobs),
+            "size_mb": round(sum(path_size(j) for j in jobs) / 1024 ** 2, 1),
+            "max_mb": round(self.max_bytes / 1024 ** 2, 1),
+            "ttl_hours": self.ttl_hours,
+        }
@@ -0,0 +1,248 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+DISK CACHE - Size-Bounded LRU Store on the Workspace Volume
+═══════════════════════════════════════════════════════════════════════════════════
+
+Shared by the input fetcher and the precompute caches. Entries are files or
+directories under `root/<key[:2]>/<key>`, written to `root/tmp` first and
+renamed into place, so readers never observe a half-written entry and
+several workers can share one volume.
+
+Recency is the entry's mtime (touched on every hit); when the total size goes
+over `max_bytes`, the least-recently-used entries are deleted until it fits.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+_KEY = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def digest_key(*parts: Any) -> str:
+    """sha256 hex of the parts (str / bytes / anything with a stable repr)."""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            h.update(part)
+        else:
+            h.update(str(part).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_digest(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """sha256 hex of a file's content, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def path_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+
+def copy_blob(src: Path, dest: Path) -> None:
+    """
+    Copy a file into or out of a cache (reflinked where the filesystem can).
+
+    Never a hard link: a job that rewrites its copy in place (`ffmpeg -y` on a
+    retry) would otherwise rewrite the cache entry every later job reads.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        dest.unlink()
+    try:
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        if remaining:
+            raise OSError(f"copy_file_range stopped {remaining} bytes short")
+    except (AttributeError, OSError):
+        shutil.copyfile(src, dest)
+
+
+class DiskCache:
+    """
+    Usage:
+        cache = DiskCache(WORKSPACE / "cache" / "inputs", max_bytes=20 * 1024**3)
+        path = cache.get(key)                       # None on miss
+        if path is None:
+            tmp = cache.reserve()                   # write a file or a directory here
+            ...
+            path = cache.commit(key, tmp)
+
+    `max_bytes=0` disables eviction.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 0, name: str = "cache"):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.name = name
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_written = 0
+
+        self._tmp = self.root / "tmp"
+        self._size: Optional[int] = None
+        self._lock = threading.RLock()
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def path_for(self, key: str) -> Path:
+        if not _KEY.match(key):
+            raise ValueError(f"Invalid cache key: {key!r}")
+        return self.root / key[:2] / key
+
+    def contains(self, key: str) -> bool:
+        return self.path_for(key).exists()
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the entry (marked most-recently-used), or None."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def note_miss(self) -> None:
+        """Count a miss for a lookup resolved outside `get` (e.g. through a reference record)."""
+        with self._lock:
+            self.misses += 1
+
+    def reserve(self, suffix: str = "") -> Path:
+        """Fresh temporary path inside the cache (same filesystem, so commit is a rename)."""
+        self._tmp.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=self._tmp, suffix=suffix)
+        os.close(fd)
+        os.unlink(name)
+        return Path(name)
+
+    def commit(self, key: str, tmp: Path) -> Path:
+        """Move a file or directory written at `tmp` into place under `key`, then evict."""
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = path_size(tmp)
+        if path.is_file():
+            size -= path.stat().st_size  # Overwriting a file entry
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            # Another worker committed the same directory first; keep theirs
+            shutil.rmtree(tmp, ignore_errors=True)
+            return path
+
+        with self._lock:
+            self.bytes_written += size
+            if self._size is not None:
+                self._size += size
+        self._evict(keep=key)
+        return path
+
+    def put_file(self, key: str, src: Path) -> Path:
+        tmp = self.reserve(Path(src).suffix)
+        shutil.copyfile(src, tmp)
+        return self.commit(key, tmp)
+
+    def put_bytes(self, key: str, data: bytes) -> Path:
+        tmp = self.reserve()
+        tmp.write_bytes(data)
+        return self.commit(key, tmp)
+
+    def remove(self, key: str) -> None:
+        path = self.path_for(key)
+        self._delete(path)
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for shard in self.root.iterdir() if self.root.exists() else []:
+            if not shard.is_dir() or shard == self._tmp or len(shard.name) != 2:
+                continue
+            for path in shard.iterdir():
+                try:
+                    entries.append((path.stat().st_mtime, path_size(path), path))
+                except FileNotFoundError:
+                    pass
+        return entries
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            return self._size
+
+    def _delete(self, path: Path) -> int:
+        try:
+            size = path_size(path)
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        except FileNotFoundError:
+            return 0
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+        return size
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        if not self.max_bytes or self.size_bytes() <= self.max_bytes:
+            return
+        with self._lock:
+            # Rescan: other workers on the same volume may have added or removed entries
+            entries = sorted(self._entries())
+            self._size = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if self._size <= self.max_bytes:
+                    break
+                if path.name == keep:
+                    continue
+                self._delete(path)
+                self.evictions += 1
+
+    def prune_tmp(self, max_age_s: float = 3600) -> None:
+        """Remove temporaries abandoned by crashed writers."""
+        cutoff = time.time() - max_age_s
+        for path in self._tmp.glob("*") if self._tmp.exists() else []:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    shutil.rmtree(path) if path.is_dir() else path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "size_mb": round(self.size_bytes() / 1024 ** 2, 1),
+                "max_mb": round(self.max_bytes / 1024 ** 2, 1),
+            }
@@ -6,130 +6,387 @@ MODEL DOWNLOADER - Pre-download models to Network Volume
 Run this ONCE after attaching your network volume to download all models.
 This ensures fast startup (no cold start delays).
 
+Every MODELS entry is expanded into per-file HTTP downloads (HuggingFace
+snapshots are listed through the Hub API) and fetched by a bounded worker pool
+shared across models and files. Partial files (`*.part`) are resumed with
+Range requests, every file is SHA-256 verified against the manifest pin or
+the lockfile before it is moved into place, and a JSON report of bytes and
+time per model is printed (or written with `--report`). A failed file makes
+the run exit non-zero instead of leaving truncated weights behind.
+
+`HF_ENDPOINT` points the HuggingFace URLs at a mirror or a local stand-in.
+
 Usage:
     python download_models.py --all
     python download_models.py --lipsync
     python download_models.py --upscalers
     python download_models.py --diffusion
+    python download_models.py --bootstrap          # packages + repos + weights for the handler
+    python download_models.py --all --workers 16 --report report.json
+    python download_models.py --verify --deep
 
 ═══════════════════════════════════════════════════════════════════════════════════
 """
 
 import os
 import sys
+import json
+import time
+import hashlib
 import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
 from pathlib import Path
-from huggingface_hub import hf_hub_download, snapshot_download
-from tqdm import tqdm
-
-# Paths
-WORKSPACE = Path(os.getenv("WORKSPACE", "/workspace"))
-MODELS_DIR = WORKSPACE / "models"
-
-# Model configurations
-MODELS = {
-    "lipsync": {
-        "latentsync": {
-            "repo_id": "ByteDance/LatentSync",
-            "local_dir": MODELS_DIR / "video" / "latentsync",
-            "files": None,  # Download entire repo
-        },
-        "musetalk": {
-            "repo_id": "TMElyralab/MuseTalk",
-            "local_dir": MODELS_DIR / "video" / "musetalk",
-            "files": None,
-        },
-        "wav2lip": {
-            "repo_id": "numz/wav2lip_studio",
-            "local_dir": MODELS_DIR / "video" / "wav2lip",
-            "files": ["wav2lip_gan.pth", "wav2lip.pth"],
-        },
-    },
-    "upscalers": {
-        "realesrgan": {
-            "repo_id": "sberbank-ai/Real-ESRGAN",
-            "local_dir": MODELS_DIR / "upscalers" / "realesrgan",
-            "files": ["RealESRGAN_x4plus.pth", "RealESRGAN_x4plus_anime_6B.pth"],
-        },
-        "gfpgan": {
-            "repo_id": "TencentARC/GFPGAN",
-            "local_dir": MODELS_DIR / "upscalers" / "gfpgan",
-            "files": ["GFPGANv1.4.pth"],
-        },
-    },
-    "diffusion": {
-        # Add your image generation models here
-        "sdxl": {
-            "repo_id": "stabilityai/stable-diffusion-xl-base-1.0",
-            "local_dir": MODELS_DIR / "diffusion" / "sdxl",
-            "files": None,  # Download entire repo
-        },
-    },
-    "face": {
-        "face_detection": {
-            "repo_id": "ybelkada/face-parse-bisent",
-            "local_dir": MODELS_DIR / "face" / "detection",
-            "files": None,
-        },
-    },
-}
+from typing import Optional, Dict, Any, List
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from bootstrap import (
+    MODELS, MODELS_DIR, COMPONENTS, LOCK_PATH,
+    check, print_readiness, provision, model_config, model_files,
+    sha256_file, load_lock, save_lock, lock_key,
+)
+
+HF_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co").rstrip("/")
+HF_TOKEN = os.getenv("HF_TOKEN", "")
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# TASKS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class FileTask:
+    model: str              # "category/name"
+    url: str
+    path: Path
+    sha256: Optional[str] = None
+
+
+@dataclass
+class FileResult:
+    task: FileTask
+    bytes_total: int = 0
+    bytes_downloaded: int = 0
+    resumed_from: int = 0
+    skipped: bool = False
+    started: float = 0.0
+    finished: float = 0.0
+    error: Optional[str] = None
 
-def download_model(category: str, name: str, config: dict):
-    """Download a single model."""
-    print(f"\n{'='*60}")
-    print(f"Downloading: {category}/{name}")
-    print(f"From: {config['repo_id']}")
-    print(f"To: {config['local_dir']}")
-    print(f"{'='*60}")
 
+def hf_headers() -> Dict[str, str]:
+    return {"Authorization": f"Bearer {HF_TOKEN}"} if HF_TOKEN else {}
+
+
+def hf_file_url(repo_id: str, filename: str, endpoint: str = None) -> str:
+    return f"{endpoint or HF_ENDPOINT}/{repo_id}/resolve/main/{urllib.parse.quote(filename)}"
+
+
+def hf_list_files(repo_id: str, endpoint: str = None, timeout: float = 30) -> List[str]:
+    """Filenames in a HuggingFace repo snapshot (Hub API `siblings`)."""
+    request = urllib.request.Request(f"{endpoint or HF_ENDPOINT}/api/models/{repo_id}",
+                                     headers=hf_headers())
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        info = json.load(response)
+    return [s["rfilename"] for s in info.get("siblings", [])]
+
+
+def expand_model(key: str, config: dict, endpoint: str = None) -> List[FileTask]:
+    """Turn one MODELS entry into per-file download tasks."""
     local_dir = config["local_dir"]
-    local_dir.mkdir(parents=True, exist_ok=True)
+    pins = config.get("sha256", {})
 
-    try:
-        if config.get("files"):
-            # Download specific files
-            for filename in tqdm(config["files"], desc="Files"):
-                hf_hub_download(
-                    repo_id=config["repo_id"],
-                    filename=filename,
-                    local_dir=str(local_dir),
-                    local_dir_use_symlinks=False,
-                )
-        else:
-            # Download entire repo
-            snapshot_download(
-                repo_id=config["repo_id"],
-                local_dir=str(local_dir),
-                local_dir_use_symlinks=False,
-            )
-        print(f"✅ {name} downloaded successfully")
-    except Exception as e:
-        print(f"❌ Failed to download {name}: {e}")
+    if config.get("urls"):
+        items = list(config["urls"].items())
+    else:
+        files = config.get("files") or hf_list_files(config["repo_id"], endpoint)
+        items = [(f, hf_file_url(config["repo_id"], f, endpoint)) for f in files]
 
+    return [FileTask(key, url, local_dir / filename, pins.get(filename)) for filename, url in items]
 
-def download_category(category: str):
-    """Download all models in a category."""
-    if category not in MODELS:
-        print(f"Unknown category: {category}")
-        return
 
-    for name, config in MODELS[category].items():
-        download_model(category, name, config)
+# ═══════════════════════════════════════════════════════════════════════════════════
+# PARALLEL DOWNLOADER
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class ChecksumError(Exception):
+    pass
+
+
+class ParallelDownloader:
+    """
+    Bounded thread pool over file tasks from any number of models.
+
+    Usage:
+        downloader = ParallelDownloader(workers=8)
+        results = downloader.run(tasks)
+        report = build_report(results)
 
+    A file is only moved into place once its size matches the server's and its
+    SHA-256 matches the expected digest (manifest pin, else the lockfile entry
+    from an earlier download). New digests are recorded in the lockfile.
+    """
+
+    def __init__(
+        self,
+        workers: int = DOWNLOAD_WORKERS,
+        retries: int = 3,
+        timeout: float = 60,
+        chunk_size: int = CHUNK_SIZE,
+        headers: Optional[Dict[str, str]] = None,
+        lock_path: Path = LOCK_PATH,
+    ):
+        self.workers = max(1, workers)
+        self.retries = retries
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.headers = headers if headers is not None else hf_headers()
+        self.lock_path = lock_path
+
+        self._lock = load_lock(lock_path)
+        self._lock_guard = threading.Lock()
+
+    def run(self, tasks: List[FileTask], progress: bool = True) -> List[FileResult]:
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download") as pool:
+            futures = [pool.submit(self.fetch, task) for task in tasks]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if progress:
+                    print_result(result)
+        return results
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def expected_sha256(self, task: FileTask) -> Optional[str]:
+        if task.sha256:
+            return task.sha256
+        with self._lock_guard:
+            return self._lock.get(lock_key(task.path), {}).get("sha256")
+
+    def _record(self, task: FileTask, digest: str, size: int) -> None:
+        with self._lock_guard:
+            self._lock[lock_key(task.path)] = {"sha256": digest, "bytes": size}
+            save_lock(self._lock, self.lock_path)
+
+    def fetch(self, task: FileTask) -> FileResult:
+        result = FileResult(task, started=time.time())
+        expected = self.expected_sha256(task)
+
+        try:
+            if task.path.is_file():
+                size = task.path.stat().st_size
+                recorded = self._lock.get(lock_key(task.path), {})
+                if recorded.get("bytes") == size and (not task.sha256 or recorded.get("sha256") == task.sha256):
+                    result.skipped = True
+                    result.bytes_total = size
+                    return result
+                # Unverified leftover (e.g. truncated by an older downloader): resume it as a partial
+                os.replace(task.path, self._part_path(task))
+
+            for attempt in range(self.retries + 1):
+                try:
+                    digest, size = self._download(task, result)
+                    if expected and digest != expected:
+                        self._part_path(task).unlink()
+                        raise ChecksumError(f"sha256 {digest[:12]}… != expected {expected[:12]}…")
+                    os.replace(self._part_path(task), task.path)
+                    self._record(task, digest, size)
+                    result.bytes_total = size
+                    return result
+                except (urllib.error.URLError, OSError, ChecksumError) as e:
+                    if isinstance(e, urllib.error.HTTPError) and 400 <= e.code < 500 and e.code not in (408, 429):
+                        raise
+                    if attempt == self.retries:
+                        raise
+                    time.sleep(min(2 ** attempt, 30))
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        finally:
+            result.finished = time.time()
+        return result
+
+    @staticmethod
+    def _part_path(task: FileTask) -> Path:
+        return task.path.with_name(task.path.name + ".part")
+
+    def _download(self, task: FileTask, result: FileResult):
+        """Fetch into `<file>.part`, resuming from its current size. Returns (sha256, size)."""
+        part = self._part_path(task)
+        part.parent.mkdir(parents=True, exist_ok=True)
+        offset = part.stat().st_size if part.exists() else 0
+
+        headers = dict(self.headers)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        request = urllib.request.Request(task.url, headers=headers)
+
+        digest = hashlib.sha256()
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code != 416 or not offset:
+                raise
+            # Range not satisfiable: the partial already holds the whole file
+            return sha256_file(part), offset
+
+        with response:
+            if offset and response.status == 206:
+                result.resumed_from = offset
+                with open(part, "rb") as f:
+                    for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                        digest.update(chunk)
+                mode = "ab"
+            else:
+                offset = 0  # Server ignored the range: start over
+                mode = "wb"
+
+            length = response.headers.get("Content-Length")
+            expected_size = offset + int(length) if length is not None else None
+
+            with open(part, mode) as f:
+                for chunk in iter(lambda: response.read(self.chunk_size), b""):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    result.bytes_downloaded += len(chunk)
+
+        size = part.stat().st_size
+        if expected_size is not None and size != expected_size:
+            raise OSError(f"truncated download: {size} of {expected_size} bytes")
+        return digest.hexdigest(), size
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# REPORT
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def print_result(result: FileResult) -> None:
+    name = result.task.path.name
+    if result.error:
+        print(f"  ❌ {result.task.model}/{name}: {result.error}")
+    elif result.skipped:
+        print(f"  ✅ {result.task.model}/{name} (verified, skipped)")
+    else:
+        elapsed = max(result.finished - result.started, 1e-6)
+        resumed = f", resumed at {result.resumed_from / 1e6:.1f} MB" if result.resumed_from else ""
+        print(f"  ✅ {result.task.model}/{name} {result.bytes_downloaded / 1e6:.1f} MB "
+              f"in {elapsed:.1f}s ({result.bytes_downloaded / 1e6 / elapsed:.1f} MB/s{resumed})")
+
+
+def build_report(results: List[FileResult], wall_s: float = 0.0) -> Dict[str, Any]:
+    """Per-model bytes / time / failures, plus totals."""
+    models: Dict[str, Dict[str, Any]] = {}
+    for r in results:
+        entry = models.setdefault(r.task.model, {
+            "files": 0, "skipped": 0, "bytes": 0, "downloaded_bytes": 0,
+            "started": r.started, "finished": r.finished, "failed": [],
+        })
+        entry["files"] += 1
+        entry["skipped"] += int(r.skipped)
+        entry["bytes"] += r.bytes_total
+        entry["downloaded_bytes"] += r.bytes_downloaded
+        entry["started"] = min(entry["started"], r.started)
+        entry["finished"] = max(entry["finished"], r.finished)
+        if r.error:
+            entry["failed"].append({"file": r.task.path.name, "error": r.error})
+
+    for entry in models.values():
+        elapsed = entry.pop("finished") - entry.pop("started")
+        entry["elapsed_s"] = round(elapsed, 3)
+        entry["mb_per_s"] = round(entry["downloaded_bytes"] / 1e6 / elapsed, 2) if elapsed > 0 else 0.0
+
+    downloaded = sum(r.bytes_downloaded for r in results)
+    return {
+        "models": models,
+        "total": {
+            "files": len(results),
+            "failed": sum(1 for r in results if r.error),
+            "bytes": sum(r.bytes_total for r in results),
+            "downloaded_bytes": downloaded,
+            "elapsed_s": round(wall_s, 3),
+            "mb_per_s": round(downloaded / 1e6 / wall_s, 2) if wall_s > 0 else 0.0,
+        },
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# ENTRY POINTS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class VolumeLock:
+    """
+    Exclusive lock on the models directory so two pods sharing a network
+    volume don't download into the same `.part` files.
+    """
+
+    def __init__(self, path: Path = MODELS_DIR / ".download.lock"):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        import fcntl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "w")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f"Waiting for another downloader holding {self.path}...")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
 
-def download_all():
-    """Download all models."""
-    for category in MODELS:
-        download_category(category)
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+def download_models(keys: List[str], workers: int = DOWNLOAD_WORKERS,
+                    report_path: Optional[Path] = None) -> Dict[str, Any]:
+    """Download MODELS entries ("category/name") through one shared worker pool."""
+    print(f"\n{'='*60}")
+    print(f"Downloading {len(keys)} models with {workers} workers")
+    print(f"{'='*60}")
+
+    start = time.time()
+    tasks, failures = [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(expand_model, key, model_config(key)): key for key in keys}
+        for future in as_completed(futures):
+            try:
+                tasks.extend(future.result())
+            except Exception as e:
+                failures.append(FileResult(FileTask(futures[future], "", Path("listing")),
+                                           started=start, finished=time.time(),
+                                           error=f"listing failed: {e}"))
+    for failure in failures:
+        print_result(failure)
+
+    with VolumeLock():
+        results = ParallelDownloader(workers=workers).run(tasks) + failures
+    report = build_report(results, time.time() - start)
+
+    if report_path:
+        Path(report_path).write_text(json.dumps(report, indent=2))
+    print(json.dumps(report["total"]))
+    return report
+
+
+def category_keys(category: str) -> List[str]:
+    if category not in MODELS:
+        print(f"Unknown category: {category}")
+        return []
+    return [f"{category}/{name}" for name in MODELS[category]]
 
 
 def download_external_models():
     """
     Download models from external sources (not on HuggingFace).
     """
-    import urllib.request
-
     # face_alignment models
     print("\n" + "="*60)
     print("Downloading face_alignment models...")
@@ -149,23 +406,58 @@ def download_external_models():
         print(f"⚠️ face_alignment will download on first use: {e}")
 
 
-def verify_models():
-    """Verify all models are present."""
+def bootstrap_keys(names=None) -> List[str]:
+    """
+    Provision packages and repos for handler components and return the MODELS
+    entries they need, so the runtime readiness check passes without installing.
+    """
+    names = names or list(COMPONENTS)
+    print("\n" + "="*60)
+    print(f"BOOTSTRAP: {', '.join(names)}")
+    print("="*60)
+
+    provision(names)
+    return [key for name in names for key in COMPONENTS[name].weights]
+
+
+def verify_models(deep: bool = False):
+    """Verify all models are present (and handler components are provisioned)."""
     print("\n" + "="*60)
     print("VERIFYING MODELS")
     print("="*60)
 
     all_good = True
+    lock = load_lock()
 
     for category, models in MODELS.items():
         print(f"\n{category.upper()}:")
         for name, config in models.items():
             local_dir = config["local_dir"]
-            if local_dir.exists() and any(local_dir.iterdir()):
-                print(f"  ✅ {name}")
+            problems = []
+            if not local_dir.exists() or not any(local_dir.iterdir()):
+                problems.append("MISSING")
             else:
-                print(f"  ❌ {name} - MISSING")
+                problems += [f"{p.name} partial" for p in local_dir.rglob("*.part")]
+                for filename in model_files(config) or []:
+                    path = local_dir / filename
+                    record = lock.get(lock_key(path))
+                    if not path.is_file():
+                        problems.append(f"{filename} missing")
+                    elif not record or record["bytes"] != path.stat().st_size:
+                        problems.append(f"{filename} unverified")
+                    elif deep and sha256_file(path) != record["sha256"]:
+                        problems.append(f"{filename} sha256 mismatch")
+
+            if problems:
+                print(f"  ❌ {name} - {', '.join(problems)}")
                 all_good = False
+            else:
+                print(f"  ✅ {name}")
+
+    print("\nCOMPONENTS:")
+    results = check(deep=deep)
+    print_readiness(results)
+    all_good = all_good and all(r.ready for r in results.values())
 
     return all_good
 
@@ -179,6 +471,11 @@ def main():
     parser.add_argument("--face", action="store_true", help="Download face models")
     parser.add_argument("--external", action="store_true", help="Download external models")
     parser.add_argument("--verify", action="store_true", help="Verify models are present")
+    parser.add_argument("--deep", action="store_true", help="With --verify, re-hash weights against the lockfile")
+    parser.add_argument("--bootstrap", nargs="*", metavar="COMPONENT",
+                        help="Provision packages, repos and weights for handler components (default: all)")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS, help="Concurrent file downloads")
+    parser.add_argument("--report", type=Path, help="Write the JSON bytes/time report here")
 
     args = parser.parse_args()
 
@@ -188,29 +485,31 @@ def main():
         return
 
     if args.verify:
-        success = verify_models()
+        success = verify_models(deep=args.deep)
         sys.exit(0 if success else 1)
 
+    keys = []
+    if args.bootstrap is not None:
+        keys += bootstrap_keys(args.bootstrap)
     if args.all:
-        download_all()
-        download_external_models()
+        keys += [key for category in MODELS for key in category_keys(category)]
     else:
-        if args.lipsync:
-            download_category("lipsync")
-        if args.upscalers:
-            download_category("upscalers")
-        if args.diffusion:
-            download_category("diffusion")
-        if args.face:
-            download_category("face")
-        if args.external:
-            download_external_models()
+        for category in ("lipsync", "upscalers", "diffusion", "face"):
+            if getattr(args, category):
+                keys += category_keys(category)
+
+    report = download_models(list(dict.fromkeys(keys)), args.workers, args.report) if keys else None
+    if args.all or args.external:
+        download_external_models()
 
     print("\n" + "="*60)
     print("DOWNLOAD COMPLETE")
     print("="*60)
     verify_models()
 
+    if report and report["total"]["failed"]:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
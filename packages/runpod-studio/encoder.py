@@ -0,0 +1,280 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+ENCODER SINK - Raw Frames → One Long-Lived ffmpeg Process
+═══════════════════════════════════════════════════════════════════════════════════
+
+Replaces the cv2.VideoWriter('mp4v') → shutil.move(.temp.mp4) → ffmpeg
+re-encode dance. Frames are streamed as rawvideo over stdin to a single
+ffmpeg process whose codec, CRF, preset and audio mux are fixed up front,
+so every output is encoded exactly once.
+
+A writer thread drains a bounded queue into ffmpeg's stdin. When the encoder
+falls behind, `write` blocks on the full queue; the time spent blocked and the
+queue depth are reported as back-pressure. A frame written with a `release`
+callback is handed back (called from the writer thread) once ffmpeg has it,
+so a producer can reuse the buffer (frame_ring's shared-memory slots).
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, List, Sequence, Union
+from dataclasses import dataclass
+
+import numpy as np
+
+_SENTINEL = None
+
+# Append-only MP4 (no moov rewrite on close), so the file can be uploaded while it is written
+FRAGMENTED_MP4_ARGS = ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+
+
+@dataclass
+class EncoderStats:
+    frames: int = 0
+    bytes_written: int = 0
+    blocked_s: float = 0.0
+    max_pending: int = 0
+    elapsed_s: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "bytes_written": self.bytes_written,
+            "blocked_s": round(self.blocked_s, 3),
+            "max_pending": self.max_pending,
+            "elapsed_s": round(self.elapsed_s, 3),
+        }
+
+
+class FfmpegEncoderSink:
+    """
+    Streams numpy frames (H×W×3 uint8, BGR by default) into ffmpeg.
+
+    Usage:
+        sink = FfmpegEncoderSink.from_preset(QUALITY_PRESETS["high"], out, audio_path=voice)
+        sink.open(width, height, fps)
+        sink.write_batch(frames)
+        sink.close()
+
+    Frames are queued by reference, so callers must not mutate an array after
+    handing it to `write` until its `release` callback (if any) has run.
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        audio_path: Optional[Path] = None,
+        codec: str = "libx264",
+        crf: int = 23,
+        preset: str = "medium",
+        video_bitrate: Optional[str] = None,
+        audio_bitrate: str = "192k",
+        audio_offset_s: float = 0.0,
+        audio_codec: str = "aac",
+        audio_ts_offset_s: float = 0.0,
+        pix_fmt: str = "yuv420p",
+        input_pix_fmt: str = "bgr24",
+        max_pending: int = 8,
+        extra_args: Optional[List[str]] = None,
+    ):
+        self.output_path = Path(output_path)
+        self.audio_path = audio_path
+        self.codec = codec
+        self.crf = crf
+        self.preset = preset
+        self.video_bitrate = video_bitrate
+        self.audio_bitrate = audio_bitrate
+        self.audio_offset_s = audio_offset_s
+        self.audio_codec = audio_codec
+        self.audio_ts_offset_s = audio_ts_offset_s
+        self.pix_fmt = pix_fmt
+        self.input_pix_fmt = input_pix_fmt
+        self.max_pending = max(1, max_pending)
+        self.extra_args = extra_args or []
+
+        self.stats = EncoderStats()
+        self._proc: Optional[subprocess.Popen] = None
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stderr = None
+        self._error: Optional[BaseException] = None
+        self._shape = (0, 0)
+        self._started = 0.0
+
+    @classmethod
+    def from_preset(cls, preset: Dict[str, Any], output_path: Path,
+                    audio_path: Optional[Path] = None, **overrides) -> "FfmpegEncoderSink":
+        """Build a sink from a QUALITY_PRESETS entry (crf, preset, video/audio bitrate)."""
+        settings = {
+            "crf": preset.get("crf", 23),
+            "preset": preset.get("preset", "medium"),
+            "video_bitrate": preset.get("video_bitrate"),
+            "audio_bitrate": preset.get("audio_bitrate", "192k"),
+        }
+        settings.update(overrides)
+        return cls(output_path, audio_path=audio_path, **settings)
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def command(self, width: int, height: int, fps: float) -> List[str]:
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo",
+            "-pix_fmt", self.input_pix_fmt,
+            "-s", f"{width}x{height}",
+            "-r", str(fps),
+            "-i", "-",
+        ]
+        if self.audio_path:
+            if self.audio_offset_s:
+                cmd += ["-ss", f"{self.audio_offset_s:.3f}"]  # Audio for a later slice of the video
+            if self.audio_ts_offset_s:
+                cmd += ["-itsoffset", f"{self.audio_ts_offset_s:.6f}"]  # Pre-cut audio not on a frame boundary
+            cmd += ["-i", str(self.audio_path)]
+        cmd += [
+            "-map", "0:v",
+            "-c:v", self.codec,
+            "-crf", str(self.crf),
+            "-preset", self.preset,
+            "-pix_fmt", self.pix_fmt,
+        ]
+        if self.video_bitrate:
+            cmd += ["-b:v", self.video_bitrate]
+        if self.audio_path and self.audio_codec == "copy":
+            cmd += ["-map", "1:a?", "-c:a", "copy"]  # Already encoded and cut to length
+        elif self.audio_path:
+            cmd += ["-map", "1:a?", "-c:a", self.audio_codec, "-b:a", self.audio_bitrate, "-shortest"]
+        cmd += self.extra_args
+        cmd.append(str(self.output_path))
+        return cmd
+
+    def open(self, width: int, height: int, fps: float) -> None:
+        self._shape = (height, width)
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(
+            self.command(width, height, fps),
+            stdin=subprocess.PIPE,
+            stderr=self._stderr,
+        )
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._thread = threading.Thread(target=self._drain, name="ffmpeg-encoder", daemon=True)
+        self._thread.start()
+        self._started = time.time()
+
+    def _drain(self) -> None:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _SENTINEL:
+                    break
+                data, release = item
+                self._proc.stdin.write(data)
+                if release is not None:
+                    release()
+        except BaseException as e:
+            self._error = e
+            # Keep consuming (and releasing) so producers never deadlock on a dead encoder
+            while True:
+                item = self._queue.get()
+                if item is _SENTINEL:
+                    break
+                if item[1] is not None:
+                    item[1]()
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    @property
+    def pending(self) -> int:
+        """Frames (or batches) queued but not yet handed to ffmpeg."""
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def backpressure(self) -> float:
+        """Queue fill ratio, 0.0 (idle encoder) to 1.0 (producer will block)."""
+        return self.pending / self.max_pending
+
+    def _put(self, item: Any) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"ffmpeg encoder failed: {self._error}; {self._read_stderr()}")
+        t0 = time.perf_counter()
+        self._queue.put(item)
+        self.stats.blocked_s += time.perf_counter() - t0
+        self.stats.max_pending = max(self.stats.max_pending, self._queue.qsize())
+
+    def _check(self, frame: np.ndarray) -> np.ndarray:
+        if frame.shape[:2] != self._shape or frame.dtype != np.uint8:
+            raise ValueError(
+                f"Frame {frame.shape}/{frame.dtype} does not match encoder {self._shape}/uint8"
+            )
+        return np.ascontiguousarray(frame)
+
+    def write(self, frame: np.ndarray, release: Optional[Callable[[], None]] = None) -> float:
+        """
+        Queue one frame. `release` is called once ffmpeg has consumed it.
+        Returns the current back-pressure ratio.
+        """
+        frame = self._check(frame)
+        self._put((frame.data, release))
+        self.stats.frames += 1
+        self.stats.bytes_written += frame.nbytes
+        return self.backpressure
+
+    def write_batch(self, frames: Union[np.ndarray, Sequence[np.ndarray]]) -> float:
+        """Queue an (N, H, W, 3) array or a list of frames as one stdin write."""
+        if not isinstance(frames, np.ndarray):
+            if len(frames) == 0:
+                return self.backpressure
+            frames = np.stack([self._check(f) for f in frames])
+        elif frames.ndim == 3:
+            return self.write(frames)
+        elif (len(frames) and frames.shape[1:3] != self._shape) or frames.dtype != np.uint8:
+            raise ValueError(f"Batch {frames.shape}/{frames.dtype} does not match encoder {self._shape}/uint8")
+
+        batch = np.ascontiguousarray(frames)
+        self._put((batch.data, None))
+        self.stats.frames += len(batch)
+        self.stats.bytes_written += batch.nbytes
+        return self.backpressure
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def _read_stderr(self) -> str:
+        if self._stderr is None:
+            return ""
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors="replace").strip()
+
+    def close(self) -> EncoderStats:
+        """Flush the queue, finish the encode and raise if ffmpeg failed."""
+        self._queue.put(_SENTINEL)
+        self._thread.join()
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self._proc.wait()
+        stderr = self._read_stderr()
+        self._stderr.close()
+        self.stats.elapsed_s = time.time() - self._started
+
+        if self._error is not None or returncode != 0:
+            raise RuntimeError(f"ffmpeg encode failed ({returncode}): {stderr or self._error}")
+        return self.stats
+
+    def abort(self) -> None:
+        """Kill the encoder without waiting for queued frames."""
+        if self._proc and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        if self._thread and self._thread.is_alive():
+            self._queue.put(_SENTINEL)
+            self._thread.join(timeout=5)
+        if self._stderr:
+            self._stderr.close()
+            self._stderr = None
@@ -0,0 +1,254 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+FILTERGRAPH - video_render Post-Processing Compiled into One ffmpeg Run
+═══════════════════════════════════════════════════════════════════════════════════
+
+The multi-pass post chain ran one ffmpeg process per step, each decoding and
+re-encoding the whole video:
+
+    mix_audio → burn_captions → apply_color_grading → add_film_grain
+        → final encode → thumbnail
+
+PostGraph takes the same steps, in the order the job asks for them, and
+compiles them into a single `-filter_complex`:
+
+    [1:a]volume,asplit ─┬──────────────────────────────┐
+    [2:a]aloop,atrim,volume ─ sidechaincompress ─┐     ├─ amix ─▶ [aout]
+    [3:a]… ambience / [4:a]… adelay SFX ─────────┴─────┘
+    [0:v]drawtext…,eq…,noise…,scale,pad,fps,split ─┬─▶ [vout]  → final.mp4
+                                                  └─▶ trim ─▶ [thumb] → thumbnail.jpg
+
+so the video is decoded once and encoded once, and the thumbnail is a second
+output of the same run. Everything here builds strings and argv lists (no
+subprocess, no file access), so graphs can be checked as plain strings. The
+per-step helpers in handler.py use the same builders.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+from caption_engine import ass_filter
+
+COLOR_GRADES = {
+    "cinematic": "eq=contrast=1.1:saturation=1.15:brightness=0.02,curves=preset=lighter",
+    "warm": "eq=saturation=1.2:brightness=0.03,colorbalance=rs=0.1:gs=0.05:bs=-0.05",
+    "cool": "eq=saturation=1.1,colorbalance=rs=-0.05:gs=0:bs=0.1",
+    "vibrant": "eq=contrast=1.15:saturation=1.3:brightness=0.02",
+}
+
+LOOP_FOREVER = "aloop=loop=-1:size=2e+09"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# FILTER BUILDERS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def grade_filter(style: str = "cinematic") -> str:
+    return COLOR_GRADES.get(style, COLOR_GRADES["cinematic"])
+
+
+def grain_filter(intensity: float = 0.02) -> str:
+    return f"noise=alls={int(intensity * 100)}:allf=t"
+
+
+def escape_drawtext(text: str) -> str:
+    """Quote-safe drawtext text (the value sits inside single quotes)."""
+    return text.replace("'", "'\\''").replace(":", "\\:")
+
+
+def drawtext_filters(captions: Sequence[Dict[str, Any]], style: Dict[str, Any]) -> List[str]:
+    """One drawtext per caption, enabled between its start and end."""
+    font_size = style.get("font_size", 48)
+    font_color = style.get("color", "white")
+    stroke_color = style.get("stroke_color", "black")
+    stroke_width = style.get("stroke_width", 2)
+    position_y = style.get("position_y", 0.75)
+
+    return [
+        f"drawtext=text='{escape_drawtext(caption['text'])}':"
+        f"fontsize={font_size}:"
+        f"fontcolor={font_color}:"
+        f"borderw={stroke_width}:"
+        f"bordercolor={stroke_color}:"
+        f"x=(w-tw)/2:"
+        f"y=h*{position_y}:"
+        f"enable='between(t,{caption['start']},{caption['end']})'"
+        for caption in captions
+    ]
+
+
+def scale_filter(width: int, height: int, fps: Optional[float] = None) -> str:
+    """Fit inside width×height keeping the aspect ratio, pad the rest, optionally resample fps."""
+    chain = (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+             f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1")
+    if fps:
+        chain += f",fps={fps}"
+    return chain
+
+
+def audio_mix_filters(
+    voice: str,
+    music: Optional[str] = None,
+    ambience: Optional[str] = None,
+    sfx: Sequence[Tuple[str, float, float]] = (),
+    duration: float = 0.0,
+    ducking: Optional[Dict[str, Any]] = None,
+    out: str = "aout",
+) -> List[str]:
+    """
+    Filter chains mixing input pads (e.g. "1:a") into `[out]`: music looped,
+    trimmed to `duration` and ducked under the voice; ambience looped at a
+    low level; `sfx` as (pad, start_time_s, volume). The voice feeds both the
+    mix and the ducking sidechain, so it is split when there is music.
+    """
+    ducking = ducking or {}
+    beds = int(bool(music)) + int(bool(ambience)) + len(sfx)
+    if not beds:
+        return [f"[{voice}]volume=1.0[{out}]"]
+
+    parts = [f"[{voice}]volume=1.0,asplit=2[voice][voice_key]" if music else f"[{voice}]volume=1.0[voice]"]
+    mix = ["[voice]"]
+
+    if music:
+        parts.append(f"[{music}]{LOOP_FOREVER},atrim=0:{duration},"
+                     f"volume={ducking.get('base_volume', 0.15)}[music_raw]")
+        parts.append(f"[music_raw][voice_key]sidechaincompress=threshold=0.02:ratio=10:"
+                     f"attack={ducking.get('attack_ms', 50)}:"
+                     f"release={ducking.get('release_ms', 300)}[music]")
+        mix.append("[music]")
+
+    if ambience:
+        parts.append(f"[{ambience}]{LOOP_FOREVER},atrim=0:{duration},volume=0.08[ambience]")
+        mix.append("[ambience]")
+
+    for i, (pad, start_time, volume) in enumerate(sfx):
+        delay_ms = int(start_time * 1000)
+        parts.append(f"[{pad}]adelay={delay_ms}|{delay_ms},volume={volume}[sfx{i}]")
+        mix.append(f"[sfx{i}]")
+
+    parts.append(f"{''.join(mix)}amix=inputs={len(mix)}:duration=first[{out}]")
+    return parts
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# ONE-PASS GRAPH
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class PostGraph:
+    """
+    Usage:
+        graph = (PostGraph(lipsync_video)
+                 .mix(voice, music=music, sfx=[(sfx_path, 1.5, 0.5)], duration=12.0, ducking=ducking)
+                 .captions(captions, caption_style)
+                 .grade("cinematic")
+                 .grain(0.02)
+                 .scale(1080, 1920, 30)
+                 .thumbnail(tmp / "thumbnail.jpg"))
+        graph.filter_complex()          # the compiled graph, e.g. for tests / logs
+        subprocess.run(graph.command(final_mp4, video_args=[...], audio_args=[...]), check=True)
+
+    Video steps apply in call order. Without `mix` or `audio` the source
+    video's own audio (if any) is passed through the audio encoder.
+    """
+
+    def __init__(self, video: Path):
+        self.inputs: List[str] = [str(video)]
+        self.video_filters: List[str] = []
+        self.audio_parts: List[str] = []
+        self.audio_input: Optional[str] = None
+        self.stages: List[str] = []
+        self.thumbnail_path: Optional[str] = None
+        self.thumbnail_at_s = 0.0
+
+    def _input(self, path: Path) -> str:
+        self.inputs.append(str(path))
+        return f"{len(self.inputs) - 1}:a"
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def mix(self, voice: Path, music: Optional[Path] = None, ambience: Optional[Path] = None,
+            sfx: Sequence[Tuple[Path, float, float]] = (), duration: float = 0.0,
+            ducking: Optional[Dict[str, Any]] = None) -> "PostGraph":
+        """Voice + ducked music + ambience + SFX ((path, start_time_s, volume)) as the output audio."""
+        voice_pad = self._input(voice)
+        music_pad = self._input(music) if music else None
+        ambience_pad = self._input(ambience) if ambience else None
+        sfx_pads = [(self._input(path), start, volume) for path, start, volume in sfx]
+        self.audio_parts = audio_mix_filters(voice_pad, music_pad, ambience_pad, sfx_pads, duration, ducking)
+        self.audio_input = None
+        self.stages.append("mix")
+        return self
+
+    def audio(self, path: Path) -> "PostGraph":
+        """Use an already mixed track (e.g. audio_mixer's PCM) as the output audio."""
+        self.audio_input = self._input(path)
+        self.audio_parts = []
+        return self
+
+    def captions(self, captions: Sequence[Dict[str, Any]], style: Dict[str, Any]) -> "PostGraph":
+        if captions:
+            self.video_filters.extend(drawtext_filters(captions, style))
+            self.stages.append("captions")
+        return self
+
+    def subtitles(self, ass_path: Path) -> "PostGraph":
+        """Captions from a compiled .ass file (caption_engine.write_ass): one filter for any count."""
+        self.video_filters.append(ass_filter(ass_path))
+        self.stages.append("captions")
+        return self
+
+    def grade(self, style: str = "cinematic") -> "PostGraph":
+        self.video_filters.append(grade_filter(style))
+        self.stages.append("grade")
+        return self
+
+    def grain(self, intensity: float) -> "PostGraph":
+        if intensity > 0:
+            self.video_filters.append(grain_filter(intensity))
+            self.stages.append("grain")
+        return self
+
+    def scale(self, width: int, height: int, fps: Optional[float] = None) -> "PostGraph":
+        self.video_filters.append(scale_filter(width, height, fps))
+        self.stages.append("scale")
+        return self
+
+    def thumbnail(self, path: Path, at_s: float = 0.0) -> "PostGraph":
+        """Also write the frame at `at_s` (after every video step) as a JPEG."""
+        self.thumbnail_path = str(path)
+        self.thumbnail_at_s = at_s
+        self.stages.append("thumbnail")
+        return self
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def filter_complex(self) -> str:
+        chain = ",".join(self.video_filters) or "null"
+        if self.thumbnail_path:
+            video = [f"[0:v]{chain},split=2[vout][thumb_src]"]
+            seek = f"trim=start={self.thumbnail_at_s},setpts=PTS-STARTPTS," if self.thumbnail_at_s else ""
+            video.append(f"[thumb_src]{seek}trim=end_frame=1[thumb]")
+        else:
+            video = [f"[0:v]{chain}[vout]"]
+        return ";".join(video + self.audio_parts)
+
+    def command(self, output: Path, video_args: Sequence[str] = ("-c:v", "libx264"),
+                audio_args: Sequence[str] = ("-c:a", "aac")) -> List[str]:
+        """Full ffmpeg argv: one decode, the final video (+ thumbnail) as outputs."""
+        cmd = ["ffmpeg", "-y"]
+        for path in self.inputs:
+            cmd += ["-i", path]
+        cmd += ["-filter_complex", self.filter_complex(), "-map", "[vout]"]
+        if self.audio_parts:
+            cmd += ["-map", "[aout]"]
+        else:
+            cmd += ["-map", self.audio_input or "0:a?"]
+        cmd += [*video_args, *audio_args, "-shortest", str(output)]
+        if self.thumbnail_path:
+            cmd += ["-map", "[thumb]", "-frames:v", "1", "-q:v", "2", self.thumbnail_path]
+        return cmd
+
+    def describe(self) -> Dict[str, Any]:
+        return {"stages": list(self.stages), "inputs": len(self.inputs), "filters": len(self.video_filters)}
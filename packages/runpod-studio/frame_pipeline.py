@@ -0,0 +1,869 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+FRAME PIPELINE - Single-Pass Decode → Stages → Encode
+═══════════════════════════════════════════════════════════════════════════════════
+
+Decodes the MuseTalk output once, pushes every frame through a chain of
+pluggable stages and encodes once:
+
+    decode ─▶ face enhance ─▶ upscale ─▶ captions ─▶ grade LUT ─▶ grain ─▶ encode
+
+The old chain ran each step as its own file round trip (mp4v intermediates,
+one ffmpeg process per step). Here frames stay in memory as BGR uint8 numpy
+arrays between stages, so there is exactly one decode and one encode.
+
+Stages are plain objects with a `process(frame, index)` method. Anything that
+needs a GPU model takes the model as a constructor argument, so the whole
+graph runs on CPU with stub stages.
+
+With `workers` > 1 the trailing CPU stages that only depend on (frame, index)
+(captions, grade, grain) run in worker processes over shared-memory frame
+slots (frame_ring.FramePool), while the model stages stay in this process.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from caption_engine import CaptionTimeline, GlyphCache, blend_patch
+from encoder import FfmpegEncoderSink
+from frame_ring import FramePool
+from static_region import ChangeDetector, DeltaRegionStats, box_area, composite, edge_feather, face_box, union_box
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# STAGES
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class FrameStage:
+    """
+    Base class for a per-frame stage.
+
+    `setup` is called once with the incoming frame size and returns the
+    outgoing frame size, so the pipeline knows the encoder resolution before
+    the first frame is decoded.
+
+    Stages that benefit from batching set `batch_size` and override
+    `process_batch`; the pipeline then feeds every stage chunks of that size.
+
+    Stages whose output depends only on (frame, index) set `parallel_safe`:
+    the pipeline may then run them out of order in worker processes.
+    """
+
+    name = "stage"
+    batch_size = 1
+    parallel_safe = False
+
+    def setup(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        return width, height
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def process_batch(self, frames: List[np.ndarray], start_index: int) -> List[np.ndarray]:
+        return [self.process(frame, start_index + i) for i, frame in enumerate(frames)]
+
+    def report(self) -> Optional[Dict[str, Any]]:
+        """Stage-specific stats for the job metadata, if any."""
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+class FaceEnhanceStage(FrameStage):
+    """GFPGAN face restoration. `enhancer` is a GFPGANer (or a stub with the same API)."""
+
+    name = "face_enhance"
+
+    def __init__(self, enhancer: Any, scale: int = 2):
+        self.enhancer = enhancer
+        self.scale = scale
+
+    def setup(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        return width * self.scale, height * self.scale
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        _, _, enhanced = self.enhancer.enhance(
+            frame,
+            has_aligned=False,
+            only_center_face=True,
+            paste_back=True
+        )
+        return enhanced
+
+
+class BatchedFaceEnhanceStage(FrameStage):
+    """
+    GFPGAN with detection reused across frames and batched restores.
+
+    `engine` is a face_batch.BatchedFaceEnhancer (real GFPGAN adapters or fakes).
+    """
+
+    name = "face_enhance"
+
+    def __init__(self, engine: Any):
+        self.engine = engine
+        self.batch_size = engine.batch_size
+
+    def setup(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        self.engine.reset()
+        return width * self.engine.upscale, height * self.engine.upscale
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        return self.engine.enhance_batch([frame])[0]
+
+    def process_batch(self, frames: List[np.ndarray], start_index: int) -> List[np.ndarray]:
+        return self.engine.enhance_batch(frames)
+
+
+class UpscaleStage(FrameStage):
+    """
+    Real-ESRGAN upscaling with optional temporal smoothing.
+
+    `upsampler` is either a RealESRGANer (one frame per call; it takes BGR
+    input like cv2.imread, so frames pass straight through) or an
+    upscaler.TiledUpscaler, which plans tiles/batches from a memory budget
+    and upscales whole chunks of frames at once.
+    """
+
+    name = "upscale"
+
+    def __init__(self, upsampler: Any, scale: int = 2, temporal_smoothing: bool = False,
+                 alpha: float = 0.85):
+        self.upsampler = upsampler
+        self.scale = scale
+        self.temporal_smoothing = temporal_smoothing
+        self.alpha = alpha
+        self.batched = hasattr(upsampler, "upscale_frames")
+        self.batch_size = upsampler.batch_size if self.batched else 1
+        self._prev: Optional[np.ndarray] = None
+
+    def setup(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        self._prev = None
+        return width * self.scale, height * self.scale
+
+    def _smooth(self, upscaled: np.ndarray) -> np.ndarray:
+        # Temporal smoothing (reduces flickering for cinema quality)
+        if self.temporal_smoothing:
+            if self._prev is not None:
+                blended = (upscaled.astype(np.float32) * self.alpha
+                           + self._prev.astype(np.float32) * (1 - self.alpha))
+                upscaled = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+            self._prev = upscaled
+        return upscaled
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        if self.batched:
+            return self.process_batch([frame], index)[0]
+        upscaled, _ = self.upsampler.enhance(frame, outscale=self.scale)
+        return self._smooth(upscaled)
+
+    def process_batch(self, frames: List[np.ndarray], start_index: int) -> List[np.ndarray]:
+        if not self.batched:
+            return super().process_batch(frames, start_index)
+        return [self._smooth(f) for f in self.upsampler.upscale_frames(frames, self.scale)]
+
+
+class DeltaRegionStage(FrameStage):
+    """
+    Runs an enhance / upscale stage only on the region that moves
+    (static_region.py). The rest of each frame comes from a cached
+    background: the stage's output for the reference frame.
+
+    Usage:
+        stage = DeltaRegionStage(UpscaleStage(engine, scale=2), threshold=10, margin=32)
+        FramePipeline([stage]).run(source, sink)
+        stage.report()["pixel_fraction"]      # share of input pixels the model saw
+
+    `face_detector` (a face_batch.FaceDetector) makes every ROI contain the
+    whole aligned face. Use it for GFPGAN, whose crops must hold a
+    detectable face. If no face is found on the reference, frames go through
+    whole. The inner stage is set up again at the ROI size whenever the ROI
+    changes. That resets its track / smoothing state, so the ROI only grows
+    until the next reseed.
+    """
+
+    def __init__(self, inner: FrameStage, threshold: float = 10.0, margin: int = 32, feather: int = 8,
+                 max_fraction: float = 0.5, face_detector: Any = None, face_size: int = 512):
+        self.inner = inner
+        self.name = inner.name
+        self.batch_size = inner.batch_size
+        self.detector = ChangeDetector(threshold=threshold, margin=margin)
+        self.feather = feather
+        self.max_fraction = max_fraction
+        self.face_detector = face_detector
+        self.face_size = face_size
+        self.stats = DeltaRegionStats()
+        self.width = self.height = self.scale = 0
+        self.fps = 30.0
+        self._background: Optional[np.ndarray] = None
+        self._anchor = None
+        self._roi = None
+        self._inner_box = None
+        self._mask: Optional[np.ndarray] = None
+        self._background_roi: Optional[np.ndarray] = None
+
+    def setup(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        out_w, out_h = self.inner.setup(width, height, fps)
+        self.width, self.height, self.fps = width, height, fps
+        self.scale = max(1, out_w // max(1, width))
+        self.stats = DeltaRegionStats()
+        self._background = None
+        self._roi = None
+        self._inner_box = None
+        return out_w, out_h
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def _configure_inner(self, box) -> None:
+        """Set the inner stage up for `box` (None = the full frame)."""
+        if box == self._inner_box:
+            return
+        if box is None:
+            self.inner.setup(self.width, self.height, self.fps)
+        else:
+            self.inner.setup(box[2] - box[0], box[3] - box[1], self.fps)
+        self._inner_box = box
+
+    def _seed(self, frame: np.ndarray, output: np.ndarray) -> None:
+        self.detector.reset(frame)
+        self._background = output
+        self._roi = None
+        self._anchor = None
+        if self.face_detector is not None:
+            affine = self.face_detector(frame)
+            if affine is not None:
+                self._anchor = face_box(affine, self.face_size, self.width, self.height)
+        self.stats.seeds += 1
+
+    def _full(self, frames: List[np.ndarray], start_index: int) -> List[np.ndarray]:
+        self._configure_inner(None)
+        outputs = self.inner.process_batch(frames, start_index)
+        t0 = time.perf_counter()
+        self._seed(frames[-1], outputs[-1])
+        self.stats.region_s += time.perf_counter() - t0
+        frame_pixels = self.width * self.height
+        self.stats.add("full", len(frames), frame_pixels, frame_pixels)
+        return outputs
+
+    def _set_roi(self, roi) -> None:
+        self._roi = roi
+        self.stats.roi = roi
+        self.stats.roi_changes += 1
+        out_box = tuple(v * self.scale for v in roi)
+        x0, y0, x1, y1 = out_box
+        self._mask = edge_feather(roi, self.width, self.height, self.feather, self.scale)
+        self._background_roi = self._background[y0:y1, x0:x1].astype(np.float32)
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        return self.process_batch([frame], index)[0]
+
+    def process_batch(self, frames: List[np.ndarray], start_index: int) -> List[np.ndarray]:
+        if self._background is None:
+            return self._full(frames, start_index)
+
+        t0 = time.perf_counter()
+        frame_pixels = self.width * self.height
+        box = self.detector.changed_box(frames)
+        if box is None:
+            self.stats.region_s += time.perf_counter() - t0
+            self.stats.add("static", len(frames), 0, frame_pixels)
+            return [self._background] * len(frames)
+
+        if self.face_detector is not None:
+            if self._anchor is None:
+                self.stats.region_s += time.perf_counter() - t0
+                return self._full(frames, start_index)
+            box = union_box(box, self._anchor)
+        roi = union_box(self._roi, box)
+        if box_area(roi) > self.max_fraction * frame_pixels:
+            self.stats.region_s += time.perf_counter() - t0
+            return self._full(frames, start_index)
+        if roi != self._roi:
+            self._set_roi(roi)
+        self.stats.region_s += time.perf_counter() - t0
+
+        x0, y0, x1, y1 = roi
+        self._configure_inner(roi)
+        patches = self.inner.process_batch([np.ascontiguousarray(f[y0:y1, x0:x1]) for f in frames], start_index)
+
+        t0 = time.perf_counter()
+        out_box = tuple(v * self.scale for v in roi)
+        outputs = [composite(self._background, patch, out_box, self._mask, self._background_roi)
+                   for patch in patches]
+        self.stats.region_s += time.perf_counter() - t0
+        self.stats.add("roi", len(frames), box_area(roi), frame_pixels)
+        return outputs
+
+    def report(self) -> Optional[Dict[str, Any]]:
+        return {"delta_region": self.stats.to_dict()}
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+# Grade parameters mirror the ffmpeg filter chains in filtergraph.COLOR_GRADES:
+# eq (contrast / brightness / saturation), curves=preset=lighter, colorbalance (shadows).
+GRADE_STYLES: Dict[str, Dict[str, Any]] = {
+    "cinematic": {"contrast": 1.1, "saturation": 1.15, "brightness": 0.02, "curve": "lighter"},
+    "warm": {"saturation": 1.2, "brightness": 0.03, "balance": (0.1, 0.05, -0.05)},
+    "cool": {"saturation": 1.1, "balance": (-0.05, 0.0, 0.1)},
+    "vibrant": {"contrast": 1.15, "saturation": 1.3, "brightness": 0.02},
+}
+
+# ffmpeg curves presets as (x, y) control points in 0-1
+_CURVE_PRESETS = {
+    "lighter": ([0.0, 0.4, 1.0], [0.0, 0.5, 1.0]),
+    "darker": ([0.0, 0.5, 1.0], [0.0, 0.4, 1.0]),
+}
+
+# BT.601 limited range, swscale's default for untagged yuv420p: RGB → (Y, Cb, Cr)
+_RGB_TO_YUV = np.array([[0.256788, 0.504129, 0.097906],
+                        [-0.148223, -0.290993, 0.439216],
+                        [0.439216, -0.367788, -0.071427]], dtype=np.float64)
+_YUV_OFFSET = np.array([16.0, 128.0, 128.0])
+_YUV_TO_RGB = np.linalg.inv(_RGB_TO_YUV)
+
+
+def eq_lut(contrast: float = 1.0, brightness: float = 0.0) -> np.ndarray:
+    """
+    One plane of ffmpeg `eq` (process_c, gamma 1) as a 256-entry table.
+    Luma uses the contrast / brightness options. Each chroma plane uses
+    contrast = saturation with brightness 0, the way eq sets them up.
+    """
+    if contrast == 1.0 and brightness == 0.0:
+        return np.arange(256, dtype=np.uint8)
+    c = int(contrast * 256 * 16)
+    b = (int(100.0 * brightness + 100.0) * 511) // 200 - 128 - c // 32
+    pel = ((np.arange(256, dtype=np.int64) * c) >> 12) + b
+    return np.clip(pel, 0, 255).astype(np.uint8)
+
+
+def curve_lut(xs: List[float], ys: List[float]) -> np.ndarray:
+    """ffmpeg `curves` natural cubic spline through (xs, ys), sampled like vf_curves at 8 bits."""
+    n = len(xs)
+    h = np.diff(xs)
+    matrix = np.zeros((n, n))
+    rhs = np.zeros(n)
+    matrix[0, 0] = matrix[-1, -1] = 1.0
+    for i in range(1, n - 1):
+        matrix[i, i - 1:i + 2] = h[i - 1], 2 * (h[i - 1] + h[i]), h[i]
+        rhs[i] = 6 * ((ys[i + 1] - ys[i]) / h[i] - (ys[i] - ys[i - 1]) / h[i - 1])
+    r = np.linalg.solve(matrix, rhs)
+
+    lut = np.arange(256, dtype=np.int64)
+    for i in range(n - 1):
+        a = ys[i]
+        b = (ys[i + 1] - ys[i]) / h[i] - h[i] * r[i] / 2 - h[i] * (r[i + 1] - r[i]) / 6
+        c = r[i] / 2
+        d = (r[i + 1] - r[i]) / (6 * h[i])
+        x_start, x_end = int(xs[i] * 255), int(xs[i + 1] * 255)
+        xx = (np.arange(x_start, x_end + 1) - x_start) / 255.0
+        lut[x_start:x_end + 1] = np.trunc((a + b * xx + c * xx ** 2 + d * xx ** 3) * 255)
+    return np.clip(lut, 0, 255).astype(np.uint8)
+
+
+def balance_lut(shadows: Tuple[float, float, float]) -> np.ndarray:
+    """
+    ffmpeg `colorbalance` shadow shifts (one per channel, preserve lightness
+    off) as flat tables indexed [channel, (max + min) * 256 + value], where
+    max + min is the pixel's lightness, which weights the shift as in
+    vf_colorbalance.
+    """
+    lightness = (np.arange(511, dtype=np.float32) / 255.0)[:, None]
+    weight = np.clip((0.333 - lightness) * 4.0 + 0.5, 0.0, 1.0) * 0.7
+    values = (np.arange(256, dtype=np.float32) / 255.0)[None, :]
+    tables = [np.rint(np.clip(values + weight * np.float32(shift), 0.0, 1.0) * 255.0) for shift in shadows]
+    return np.stack(tables).astype(np.uint8).reshape(3, -1)
+
+
+def build_grade_lut(style: str = "cinematic") -> Dict[str, Any]:
+    """
+    Tables for one grade style, in ffmpeg's filter order: `eq` per YCbCr
+    plane ("luma", "chroma"), `curves` per RGB channel ("curve", None when
+    the style has no curve) and the colorbalance shadow shifts ("balance",
+    BGR order, None when unused).
+    """
+    params = GRADE_STYLES.get(style, GRADE_STYLES["cinematic"])
+
+    curve = params.get("curve")
+    r, g, b = params.get("balance", (0.0, 0.0, 0.0))
+    return {
+        "luma": eq_lut(params.get("contrast", 1.0), params.get("brightness", 0.0)),
+        "chroma": eq_lut(params.get("saturation", 1.0)),
+        "curve": curve_lut(*_CURVE_PRESETS[curve]) if curve in _CURVE_PRESETS else None,
+        "balance": balance_lut((b, g, r)) if (r, g, b) != (0.0, 0.0, 0.0) else None,
+    }
+
+
+class ColorGradeStage(FrameStage):
+    """
+    Colour grading with ffmpeg's `eq` → `curves` → `colorbalance` order and
+    arithmetic: BGR → BT.601 YCbCr, eq tables on Y and on Cb/Cr, back to
+    8-bit BGR, the curve table per channel, then the lightness-weighted
+    shadow shift of colorbalance. Chroma stays at full resolution, so edges
+    differ slightly from ffmpeg's 4:2:0 path.
+    """
+
+    name = "color_grade"
+    parallel_safe = True
+    # Bumped when the grade's output changes (stage cache key)
+    version = 2
+
+    def __init__(self, style: str = "cinematic"):
+        self.style = style
+        self.tables = build_grade_lut(style)
+        luma, chroma = self.tables["luma"], self.tables["chroma"]
+        self._to_yuv = _RGB_TO_YUV[:, ::-1].astype(np.float32)      # BGR input
+        self._to_bgr = _YUV_TO_RGB[::-1].astype(np.float32)         # BGR output
+        self._eq = [luma, chroma, chroma]
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        yuv = frame.astype(np.float32) @ self._to_yuv.T
+        yuv += _YUV_OFFSET.astype(np.float32) + 0.5
+        planes = np.clip(yuv, 0, 255).astype(np.uint8)
+        for c in range(3):
+            planes[..., c] = self._eq[c][planes[..., c]]
+
+        bgr = (planes.astype(np.float32) - _YUV_OFFSET.astype(np.float32)) @ self._to_bgr.T
+        graded = np.clip(bgr + 0.5, 0, 255).astype(np.uint8)
+
+        if self.tables["curve"] is not None:
+            graded = self.tables["curve"][graded]
+
+        balance = self.tables["balance"]
+        if balance is None:
+            return graded
+
+        b, g, r = graded[..., 0], graded[..., 1], graded[..., 2]
+        offset = np.maximum(np.maximum(b, g), r).astype(np.int32)
+        offset += np.minimum(np.minimum(b, g), r)
+        offset <<= 8
+        out = np.empty_like(graded)
+        for c in range(3):
+            out[..., c] = np.take(balance[c], offset + graded[..., c])
+        return out
+
+
+class FilmGrainStage(FrameStage):
+    """
+    Temporal film grain, equivalent to ffmpeg `noise=alls=N:allf=t`.
+
+    `intensity` uses the preset scale (0.02 → alls=2), i.e. uniform noise of
+    ±intensity*100 levels, regenerated every frame. The noise is drawn from
+    (seed, frame index), so frames can be grained in any order or process.
+    """
+
+    name = "film_grain"
+    parallel_safe = True
+
+    def __init__(self, intensity: float = 0.02, seed: Optional[int] = None):
+        self.amplitude = max(1, int(intensity * 100))
+        self.seed = np.random.SeedSequence(seed).entropy
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        rng = np.random.default_rng([self.seed, index])
+        noise = rng.integers(-self.amplitude, self.amplitude + 1,
+                             size=frame.shape[:2], dtype=np.int16)
+        out = frame.astype(np.int16) + noise[..., None]
+        return np.clip(out, 0, 255).astype(np.uint8)
+
+
+class CaptionOverlayStage(FrameStage):
+    """
+    Burns captions into frames.
+
+    Each caption text is rasterized once into an RGBA patch (caption_engine.
+    GlyphCache, shareable between jobs) and the active caption is looked up
+    per frame in a precomputed timeline, so per-frame cost is one table read
+    and a single small blend however many captions there are.
+    """
+
+    name = "captions"
+    parallel_safe = True
+
+    def __init__(self, captions: List[Dict[str, Any]], caption_style: Optional[Dict[str, Any]] = None,
+                 glyphs: Optional[GlyphCache] = None):
+        self.captions = sorted(captions, key=lambda c: c["start"])
+        self.style = caption_style or {}
+        self.glyphs = glyphs or GlyphCache()
+        self.fps = 30.0
+        self.width = 0
+        self.height = 0
+        self._timeline: Optional[CaptionTimeline] = None
+
+    def setup(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        self.fps = fps or 30.0
+        self.width = width
+        self.height = height
+        self._timeline = CaptionTimeline(self.captions, self.fps)
+        return width, height
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        if self._timeline is None:
+            self.setup(frame.shape[1], frame.shape[0], self.fps)
+        active = self._timeline.active(index)
+        if active is None:
+            return frame
+
+        patch = self.glyphs.patch(self.captions[active]["text"], self.style)
+        x = max(0, (self.width - patch[0].shape[1]) // 2)
+        y = int(self.height * self.style.get("position_y", 0.75))
+        return blend_patch(frame, patch, x, y)
+
+
+class TeeStage(FrameStage):
+    """
+    Passes frames through unchanged and copies them into a second sink, e.g.
+    to store an intermediate result (stage_cache) without a second pass.
+
+    The sink is opened in `setup`; closing or aborting it is left to the
+    owner, which knows whether the run succeeded. Later stages must not
+    modify frames in place (none of the stages here do).
+    """
+
+    name = "tee"
+
+    def __init__(self, sink: Any):
+        self.sink = sink
+
+    def setup(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        self.sink.open(width, height, fps)
+        return width, height
+
+    def process(self, frame: np.ndarray, index: int) -> np.ndarray:
+        self.sink.write(frame)
+        return frame
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# SOURCES & SINKS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class VideoFrameSource:
+    """Decodes a video file once with OpenCV and yields BGR frames."""
+
+    def __init__(self, path: Path):
+        import cv2
+
+        self.path = path
+        self._cap = cv2.VideoCapture(str(path))
+        if not self._cap.isOpened():
+            raise IOError(f"Cannot open video: {path}")
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.frame_count = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        try:
+            while True:
+                ret, frame = self._cap.read()
+                if not ret:
+                    break
+                yield frame
+        finally:
+            self._cap.release()
+
+    def read_into(self, out: np.ndarray) -> bool:
+        """Decode the next frame into `out` (e.g. a shared-memory slot); False at the end."""
+        ret, _ = self._cap.read(out)
+        if not ret:
+            self._cap.release()
+        return ret
+
+
+class ArrayFrameSource:
+    """In-memory frame source (synthetic frames, tests, benchmarks)."""
+
+    def __init__(self, frames: Iterable[np.ndarray], width: int, height: int, fps: float = 30.0,
+                 frame_count: int = 0):
+        self._frames = frames
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frame_count = frame_count
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return iter(self._frames)
+
+
+class MemoryFrameSink:
+    """Collects output frames in a list instead of encoding them."""
+
+    def __init__(self):
+        self.frames: List[np.ndarray] = []
+        self.size: Tuple[int, int] = (0, 0)
+        self.fps = 0.0
+        self.closed = False
+
+    def open(self, width: int, height: int, fps: float) -> None:
+        self.size = (width, height)
+        self.fps = fps
+
+    def write(self, frame: np.ndarray, release=None) -> None:
+        if release is not None:
+            frame = frame.copy()
+            release()
+        self.frames.append(frame)
+
+    def close(self) -> None:
+        self.closed = True
+
+    def abort(self) -> None:
+        self.closed = True
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# PIPELINE
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class PipelineStats:
+    frames: int = 0
+    elapsed_s: float = 0.0
+    output_size: Tuple[int, int] = (0, 0)
+    stage_seconds: Dict[str, float] = field(default_factory=dict)
+    stage_reports: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    pool: Dict[str, Any] = field(default_factory=dict)
+    encoder: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "fps": round(self.fps, 2),
+            "output_size": list(self.output_size),
+            "stage_seconds": {k: round(v, 3) for k, v in self.stage_seconds.items()},
+            "stage_reports": self.stage_reports,
+            "pool": self.pool,
+            "encoder": self.encoder,
+        }
+
+
+class FramePipeline:
+    """
+    Runs a source through an ordered list of stages into a sink.
+
+    With `workers` > 1 the trailing run of `parallel_safe` stages goes to a
+    frame_ring.FramePool of that many processes. The leading stages
+    (models, stateful stages) run here, on the pool's feeder thread.
+    """
+
+    def __init__(self, stages: List[FrameStage], workers: int = 0):
+        self.stages = stages
+        self.workers = workers
+        self.sizes: List[Tuple[int, int]] = []
+
+    @property
+    def stage_names(self) -> List[str]:
+        return [stage.name for stage in self.stages]
+
+    def configure(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        """Propagate the frame size through every stage; returns the output size."""
+        self.sizes = [(width, height)]
+        for stage in self.stages:
+            width, height = stage.setup(width, height, fps)
+            self.sizes.append((width, height))
+        return width, height
+
+    def split(self) -> Tuple[List[FrameStage], List[FrameStage]]:
+        """(in-process head, tail for the worker pool); the tail is empty without workers."""
+        tail = len(self.stages)
+        if self.workers > 1:
+            while tail > 0 and self.stages[tail - 1].parallel_safe:
+                tail -= 1
+        return self.stages[:tail], self.stages[tail:]
+
+    def _run_stages(self, stages: List[FrameStage], frames: List[np.ndarray], start_index: int,
+                    stats: PipelineStats) -> List[np.ndarray]:
+        for stage in stages:
+            t0 = time.perf_counter()
+            frames = stage.process_batch(frames, start_index)
+            stats.stage_seconds[stage.name] += time.perf_counter() - t0
+        return frames
+
+    def _run_batch(self, frames: List[np.ndarray], stats: PipelineStats, sink: Any, total: int) -> None:
+        frames = self._run_stages(self.stages, frames, stats.frames, stats)
+
+        for frame in frames:
+            sink.write(frame)
+            stats.frames += 1
+
+            if stats.frames % 30 == 0:
+                progress = (stats.frames / total) * 100 if total > 0 else 0
+                print(f"[FramePipeline] {stats.frames}/{total} frames ({progress:.1f}%)")
+
+    def _head_frames(self, source: Any, head: List[FrameStage], chunk: int,
+                     stats: PipelineStats) -> Iterator[np.ndarray]:
+        """Frames after the in-process stages, generated on the pool's feeder thread."""
+        fed = 0
+        batch: List[np.ndarray] = []
+        for frame in source:
+            batch.append(frame)
+            if len(batch) >= chunk:
+                yield from self._run_stages(head, batch, fed, stats)
+                fed += len(batch)
+                batch = []
+                if fed % 30 < chunk:
+                    progress = (fed / source.frame_count) * 100 if source.frame_count > 0 else 0
+                    print(f"[FramePipeline] {fed}/{source.frame_count} frames ({progress:.1f}%)")
+        if batch:
+            yield from self._run_stages(head, batch, fed, stats)
+
+    def _run_pooled(self, source: Any, sink: Any, head: List[FrameStage], tail: List[FrameStage],
+                    size: Tuple[int, int], out_size: Tuple[int, int], stats: PipelineStats) -> None:
+        chunk = max([stage.batch_size for stage in head] + [1])
+        frames = self._head_frames(source, head, chunk, stats) if head else source
+        with FramePool(tail, out_shape=(out_size[1], out_size[0], 3), in_shape=(size[1], size[0], 3),
+                       workers=self.workers, fps=source.fps) as pool:
+            try:
+                stats.pool = pool.run(frames, sink)
+            except BaseException:
+                sink.abort()
+                raise
+            # Close while the pool is alive: the encoder reads the last frames from its slots
+            sink.close()
+        stats.frames = stats.pool["frames"]
+        for name, seconds in stats.pool["stage_seconds"].items():
+            stats.stage_seconds[name] += seconds
+
+    def run(self, source: Any, sink: Any) -> PipelineStats:
+        stats = PipelineStats(stage_seconds={stage.name: 0.0 for stage in self.stages})
+        start = time.time()
+
+        out_w, out_h = self.configure(source.width, source.height, source.fps)
+        head, tail = self.split()
+        stats.output_size = (out_w, out_h)
+        sink.open(out_w, out_h, source.fps)
+
+        # Batched stages (e.g. GFPGAN restore) set the chunk size for the whole chain
+        chunk = max([stage.batch_size for stage in self.stages] + [1])
+
+        try:
+            if tail:
+                self._run_pooled(source, sink, head, tail, self.sizes[len(head)], (out_w, out_h), stats)
+            else:
+                try:
+                    batch: List[np.ndarray] = []
+                    for frame in source:
+                        batch.append(frame)
+                        if len(batch) >= chunk:
+                            self._run_batch(batch, stats, sink, source.frame_count)
+                            batch = []
+                    if batch:
+                        self._run_batch(batch, stats, sink, source.frame_count)
+                except BaseException:
+                    sink.abort()
+                    raise
+                sink.close()
+        finally:
+            for stage in self.stages:
+                stage.close()
+
+        for stage in self.stages:
+            report = stage.report()
+            if report:
+                stats.stage_reports[stage.name] = report
+        stats.elapsed_s = time.time() - start
+        return stats
+
+
+def build_stages(
+    preset: Dict[str, Any],
+    face_enhancer: Any = None,
+    upscaler: Any = None,
+    captions: Optional[List[Dict[str, Any]]] = None,
+    caption_style: Optional[Dict[str, Any]] = None,
+    face_enhance: Optional[bool] = None,
+    glyphs: Optional[GlyphCache] = None,
+    grade_style: str = "cinematic",
+    grain_seed: Optional[int] = None,
+    delta_region: Optional[Dict[str, Any]] = None,
+    face_detector: Any = None,
+) -> List[FrameStage]:
+    """
+    Build the stage chain from a QUALITY_PRESETS entry.
+
+    Uses the same toggles as the file-based chain: `face_enhance`, `upscale`
+    / `upscale_factor` / `temporal_smoothing`, `color_grading` and
+    `film_grain`. `face_enhancer` and `upscaler` are the loaded models (or
+    stubs); a toggle whose model is missing is skipped. A face enhancer with
+    `enhance_batch` (face_batch.BatchedFaceEnhancer) gets the batched stage.
+    `glyphs` is the caption patch cache to share between jobs.
+
+    With `delta_region` (DeltaRegionStage options, {} for the defaults) the
+    enhance and upscale stages only process the moving region. Face
+    enhancement needs a face box for its crops: `face_detector`, or the
+    batched engine's own detector. Without one it keeps running on whole
+    frames.
+    """
+    stages: List[FrameStage] = []
+
+    if face_enhance is None:
+        face_enhance = preset.get("face_enhance", True)
+    if face_enhance and face_enhancer is not None:
+        if hasattr(face_enhancer, "enhance_batch"):
+            stage = BatchedFaceEnhanceStage(face_enhancer)
+        else:
+            stage = FaceEnhanceStage(face_enhancer)
+        detector = face_detector or getattr(face_enhancer, "detector", None)
+        if delta_region is not None and detector is not None:
+            stage = DeltaRegionStage(stage, face_detector=detector,
+                                     face_size=getattr(face_enhancer, "face_size", 512), **delta_region)
+        stages.append(stage)
+
+    if preset.get("upscale", False) and upscaler is not None:
+        stage = UpscaleStage(
+            upscaler,
+            scale=preset.get("upscale_factor", 2),
+            temporal_smoothing=preset.get("temporal_smoothing", False),
+        )
+        stages.append(DeltaRegionStage(stage, **delta_region) if delta_region is not None else stage)
+
+    if captions:
+        stages.append(CaptionOverlayStage(captions, caption_style, glyphs))
+
+    if preset.get("color_grading", False):
+        stages.append(ColorGradeStage(grade_style))
+
+    if preset.get("film_grain", 0) > 0:
+        stages.append(FilmGrainStage(preset["film_grain"], seed=grain_seed))
+
+    return stages
+
+
+def render_video(
+    input_video: Path,
+    output_video: Path,
+    stages: List[FrameStage],
+    preset: Dict[str, Any],
+    audio_path: Optional[Path] = None,
+    encoder_args: Optional[List[str]] = None,
+    workers: int = 0,
+) -> PipelineStats:
+    """
+    Decode `input_video` once, run `stages`, encode once to `output_video` with
+    preset settings. `encoder_args` are appended to the ffmpeg output options.
+    `workers` > 1 runs the trailing CPU stages in that many processes.
+    """
+    pipeline = FramePipeline(stages, workers=workers)
+    print(f"[FramePipeline] Stages: {' → '.join(pipeline.stage_names) or '(passthrough)'}")
+
+    source = VideoFrameSource(input_video)
+    sink = FfmpegEncoderSink.from_preset(preset, output_video, audio_path=audio_path,
+                                         extra_args=encoder_args)
+    stats = pipeline.run(source, sink)
+    stats.encoder = sink.stats.to_dict()
+
+    print(f"[FramePipeline] {stats.frames} frames in {stats.elapsed_s:.2f}s ({stats.fps:.1f} fps)")
+    return stats
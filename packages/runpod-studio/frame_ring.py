@@ -0,0 +1,345 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+FRAME RING - Shared-Memory Frame Slots and Process-Pool Frame Workers
+═══════════════════════════════════════════════════════════════════════════════════
+
+Per-frame CPU work (idle warps, caption blends, grade LUTs, grain) ran on
+one Python thread. Threads do not help much, because most of that NumPy code
+holds the GIL. Worker processes do help, but pickling every frame through a
+multiprocessing queue costs about as much as the work itself.
+
+FramePool moves frames through two rings of preallocated shared-memory slots.
+Only slot indices travel on the queues:
+
+    feeder thread ──(seq, in, out)──▶ tasks ──▶ worker 1..N ──(seq, out)──▶ results
+      │  decode into in-slot                 │  stages in-slot → out-slot       │
+      ▲                                      ▼                                  ▼
+      └──────────── free_in ◀────────────────┘         collector: reorder by seq
+      └──────────── free_out ◀── encoder thread, once ffmpeg took the frame ◀──┘
+
+The feeder claims an out-slot together with each in-slot. Every frame in
+flight therefore owns the slot its result goes to. The number of frames in
+flight is bounded by the ring size: a slow encoder holds out-slots and a
+slow worker holds in-slots, and either stalls the feeder (back-pressure).
+A frame that finishes early never blocks one that finishes late, so ordered
+reassembly cannot deadlock.
+
+Stages run in the workers with the FrameStage protocol (`setup`,
+`process(frame, index)`). `process` is called frame by frame in whatever
+order the workers pick frames up, so a stage must depend only on its
+input and index. Carried state such as temporal smoothing or a face track
+stays in the parent process. Workers are forked by default, so stages and
+their models are inherited without pickling. With `start_method="spawn"`
+they must pickle.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import time
+import queue
+import inspect
+import threading
+import traceback
+import multiprocessing
+from functools import partial
+from multiprocessing import shared_memory
+from typing import Optional, Dict, Any, List, Iterable, Sequence, Tuple
+
+import numpy as np
+
+
+class FrameRing:
+    """
+    `slots` preallocated frames of one shape in a single shared-memory block.
+
+    Usage:
+        ring = FrameRing(16, (1080, 1920, 3))          # owner: creates the block
+        view = FrameRing.attach(ring.spec)             # in a worker: maps the same block
+        view.frames[3][...] = frame                    # slot 3, no copy through a pipe
+        view.close(); ring.close()                     # the owner also unlinks it
+    """
+
+    def __init__(self, slots: int, shape: Sequence[int], dtype: Any = np.uint8, name: Optional[str] = None):
+        self.slots = slots
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=max(1, slots * self.frame_bytes))
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    @property
+    def spec(self) -> Tuple[str, int, Tuple[int, ...], str]:
+        """Picklable description for `attach`."""
+        return self._shm.name, self.slots, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec: Tuple[str, int, Tuple[int, ...], str]) -> "FrameRing":
+        name, slots, shape, dtype = spec
+        return cls(slots, shape, dtype, name=name)
+
+    def close(self) -> None:
+        self.frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # A view is still exported (e.g. an aborted encoder queue); unmapped at exit
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# WORKERS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def _frame_worker(stages: List[Any], in_spec, out_spec, size: Tuple[int, int], fps: float,
+                  tasks, results, free_in) -> None:
+    """Worker process loop: (seq, in_slot, out_slot) tasks until a None sentinel."""
+    in_ring = FrameRing.attach(in_spec) if in_spec is not None else None
+    out_ring = FrameRing.attach(out_spec)
+    try:
+        width, height = size
+        for stage in stages:
+            width, height = stage.setup(width, height, fps)
+
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, in_slot, out_slot = task
+            seconds = []
+            try:
+                frame = in_ring.frames[in_slot] if in_ring is not None else None
+                for stage in stages:
+                    t0 = time.perf_counter()
+                    frame = stage.process(frame, seq)
+                    seconds.append(time.perf_counter() - t0)
+                out_ring.frames[out_slot] = frame
+            except BaseException:
+                results.put((seq, out_slot, None, traceback.format_exc()))
+                break
+            finally:
+                if in_ring is not None:
+                    free_in.put(in_slot)
+            results.put((seq, out_slot, seconds, None))
+    finally:
+        for stage in stages:
+            stage.close()
+        if in_ring is not None:
+            in_ring.close()
+        out_ring.close()
+
+
+class FramePool:
+    """
+    Runs frame stages in worker processes over shared-memory rings.
+
+    Usage:
+        with FramePool([ColorGradeStage("warm"), FilmGrainStage(0.02)], out_shape=(h, w, 3),
+                       in_shape=(h, w, 3), workers=4, fps=fps) as pool:
+            stats = pool.run(VideoFrameSource(path), sink)     # frames reach sink in order
+
+        with FramePool([renderer], out_shape=(h, w, 3), workers=4) as pool:
+            pool.run(None, sink, count=150)                    # generated frames: process(None, index)
+
+    `sink.write(frame, release=callback)` gets a view of the out-slot, and the
+    slot is reused once `release` is called. FfmpegEncoderSink calls it after
+    the frame went into ffmpeg's stdin, so the frame is never copied on the
+    way out. A sink without `release` gets a copy. With `slots` (default
+    2 × workers + 2) there are enough frames in flight to keep every worker
+    busy while the encoder drains.
+    """
+
+    def __init__(self, stages: List[Any], out_shape: Sequence[int], in_shape: Optional[Sequence[int]] = None,
+                 workers: int = 2, slots: Optional[int] = None, fps: float = 30.0,
+                 start_method: Optional[str] = None):
+        self.stages = stages
+        self.out_shape = tuple(out_shape)
+        self.in_shape = tuple(in_shape) if in_shape is not None else None
+        self.workers = max(1, workers)
+        self.slots = max(2, slots or 2 * self.workers + 2)
+        self.fps = fps
+        if start_method is None:
+            start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        self.start_method = start_method
+
+        self.in_ring: Optional[FrameRing] = None
+        self.out_ring: Optional[FrameRing] = None
+        self._processes: List[Any] = []
+        self._stop = threading.Event()
+        self._fed: Optional[int] = None
+        self._feed_error: Optional[BaseException] = None
+        self._waits = {"free_in": 0.0, "free_out": 0.0}
+
+    def __enter__(self) -> "FramePool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        ctx = multiprocessing.get_context(self.start_method)
+        self.in_ring = FrameRing(self.slots, self.in_shape) if self.in_shape is not None else None
+        self.out_ring = FrameRing(self.slots, self.out_shape)
+
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._free_in = ctx.Queue()
+        self._free_out: "queue.Queue[int]" = queue.Queue()
+        for slot in range(self.slots):
+            self._free_in.put(slot)
+            self._free_out.put(slot)
+
+        size = (self.in_shape or self.out_shape)[1::-1]
+        in_spec = self.in_ring.spec if self.in_ring is not None else None
+        for i in range(self.workers):
+            process = ctx.Process(
+                target=_frame_worker, name=f"frame-worker-{i}", daemon=True,
+                args=(self.stages, in_spec, self.out_ring.spec, size, self.fps,
+                      self._tasks, self._results, self._free_in),
+            )
+            process.start()
+            self._processes.append(process)
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def _take(self, slots, name: str) -> Optional[int]:
+        """Next free slot, or None once the pool is stopping. Time spent waiting is back-pressure."""
+        t0 = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    return slots.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return None
+        finally:
+            self._waits[name] += time.perf_counter() - t0
+
+    def _feed(self, source: Optional[Iterable[np.ndarray]], count: Optional[int]) -> None:
+        seq = 0
+        read_into = getattr(source, "read_into", None)
+        frames = iter(source) if source is not None and read_into is None else None
+        try:
+            while count is None or seq < count:
+                out_slot = self._take(self._free_out, "free_out")
+                if out_slot is None:
+                    break
+                in_slot = None
+                if self.in_ring is not None:
+                    in_slot = self._take(self._free_in, "free_in")
+                    if in_slot is None:
+                        break
+                    if read_into is not None:
+                        # Decode straight into the slot
+                        if not read_into(self.in_ring.frames[in_slot]):
+                            break
+                    else:
+                        frame = next(frames, None)
+                        if frame is None:
+                            break
+                        self.in_ring.frames[in_slot] = frame
+                self._tasks.put((seq, in_slot, out_slot))
+                seq += 1
+        except BaseException as e:
+            self._feed_error = e
+        finally:
+            self._fed = seq
+
+    def _check_workers(self) -> None:
+        dead = [p for p in self._processes if p.exitcode is not None]
+        if dead:
+            raise RuntimeError(f"Frame worker {dead[0].name} exited with code {dead[0].exitcode}")
+
+    def run(self, source: Optional[Iterable[np.ndarray]], sink: Any, count: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Feed `source` (frames, or an object with `read_into(array) -> bool`;
+        None with `count` for generated frames) through the workers and write
+        the results to `sink` in source order. Returns throughput stats.
+        """
+        start = time.perf_counter()
+        self._fed, self._feed_error = None, None
+        stage_seconds = [0.0] * len(self.stages)
+        releases = "release" in inspect.signature(sink.write).parameters
+
+        feeder = threading.Thread(target=self._feed, args=(source, count), name="frame-feeder", daemon=True)
+        feeder.start()
+
+        pending: Dict[int, int] = {}
+        written = 0
+        max_reorder = 0
+        try:
+            while self._fed is None or written < self._fed:
+                try:
+                    seq, out_slot, seconds, error = self._results.get(timeout=0.5)
+                except queue.Empty:
+                    self._check_workers()
+                    continue
+                if error is not None:
+                    raise RuntimeError(f"Frame worker failed on frame {seq}:\n{error}")
+
+                pending[seq] = out_slot
+                max_reorder = max(max_reorder, len(pending))
+                for i, s in enumerate(seconds):
+                    stage_seconds[i] += s
+
+                # Ordered reassembly: emit the run of consecutive frames that is complete
+                while written in pending:
+                    out_slot = pending.pop(written)
+                    release = partial(self._free_out.put, out_slot)
+                    if releases:
+                        sink.write(self.out_ring.frames[out_slot], release=release)
+                    else:
+                        sink.write(self.out_ring.frames[out_slot].copy())
+                        release()
+                    written += 1
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            feeder.join()
+
+        if self._feed_error is not None:
+            raise self._feed_error
+
+        elapsed = time.perf_counter() - start
+        return {
+            "frames": written,
+            "workers": self.workers,
+            "slots": self.slots,
+            "elapsed_s": round(elapsed, 3),
+            "fps": round(written / elapsed, 2) if elapsed > 0 else 0.0,
+            "max_reorder": max_reorder,
+            "waited_free_in_s": round(self._waits["free_in"], 3),      # workers were the bottleneck
+            "waited_free_out_s": round(self._waits["free_out"], 3),    # the encoder was the bottleneck
+            "stage_seconds": {getattr(stage, "name", type(stage).__name__): round(s, 3)
+                              for stage, s in zip(self.stages, stage_seconds)},
+        }
+
+    def close(self) -> None:
+        """Stop the workers and free the rings (after the sink is closed or aborted)."""
+        self._stop.set()
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._processes = []
+
+        for q in (getattr(self, "_tasks", None), getattr(self, "_results", None), getattr(self, "_free_in", None)):
+            if q is not None:
+                q.cancel_join_thread()
+                q.close()
+        for ring in (self.in_ring, self.out_ring):
+            if ring is not None:
+                ring.close()
+        self.in_ring = self.out_ring = None
@@ -15,11 +15,12 @@ Deploy with: runpodctl deploy --gpu L40S --volume 200GB
 ═══════════════════════════════════════════════════════════════════════════════════
 """
 
+import time
+_PROCESS_START = time.perf_counter()
+
 import runpod
 import os
 import json
-import time
-import base64
 import subprocess
 import tempfile
 import shutil
@@ -28,8 +29,36 @@ from pathlib import Path
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 from enum import Enum
-import asyncio
-import urllib.request
+from contextlib import nullcontext
+
+from bootstrap import BootstrapError, ColdStartTimer, check, print_readiness, require, weight_path
+from audio_mixer import StreamingMixer
+from caption_engine import GlyphCache, ass_filter, soft_subtitle_command, write_ass
+from encoder import FfmpegEncoderSink, FRAGMENTED_MP4_ARGS
+from hls_segmenter import HlsSegmenter, ffmpeg_segment_encoder
+from face_batch import BatchedFaceEnhancer, GFPGANBatchRestorer, gfpgan_face_detector
+from filtergraph import PostGraph, audio_mix_filters, drawtext_filters, grade_filter, grain_filter, scale_filter
+from frame_pipeline import (BatchedFaceEnhanceStage, ColorGradeStage, DeltaRegionStage, FaceEnhanceStage, TeeStage,
+                            UpscaleStage, VideoFrameSource, build_stages, render_video)
+from model_registry import ModelRegistry, release_cuda_cache
+from upscaler import TiledUpscaler, RealESRGANTorchModel
+from batch_coalescer import MicroBatcher
+from checkpoints import CheckpointStore
+from disk_cache import DiskCache
+from avatar_cache import AvatarCache
+from audio_features import AudioFeatureExtractor
+from idle_motion import IdleMotionEngine, create_warp_backend, eye_box_from_landmarks, render_takes
+from input_fetcher import InputFetcher
+from job_executor import JobExecutor, ResourcePool
+from job_metrics import PeakRssMonitor
+from musetalk_engine import MuseTalkEngine
+from segment_renderer import SegmentRenderer
+from stage_cache import StageMemo, differs
+from storage import create_storage
+from uploader import get_s3_client
+
+cold_start = ColdStartTimer(origin=_PROCESS_START)
+cold_start.mark("imports")
 
 # ═══════════════════════════════════════════════════════════════════════════════════
 # CONFIGURATION
@@ -38,6 +67,8 @@ import urllib.request
 WORKSPACE = Path(os.getenv("WORKSPACE", "/workspace"))
 MODELS_DIR = WORKSPACE / "models"
 MUSETALK_DIR = WORKSPACE / "MuseTalk"
+LIVEPORTRAIT_DIR = WORKSPACE / "LivePortrait"
+WAV2LIP_DIR = WORKSPACE / "Wav2Lip"
 OUTPUTS_DIR = WORKSPACE / "outputs"
 
 # Cloudflare R2 storage
@@ -47,6 +78,133 @@ R2_SECRET_KEY = os.getenv("R2_SECRET_KEY", "")
 R2_BUCKET = os.getenv("R2_BUCKET", "personaforge-studio")
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL", f"https://{R2_BUCKET}.r2.dev")
 
+# Multipart uploads: part size, parallel parts, and streaming the final mp4
+# (as fragmented MP4) while the encoder is still writing it
+R2_PART_SIZE_MB = int(os.getenv("R2_PART_SIZE_MB", "16"))
+R2_UPLOAD_CONCURRENCY = int(os.getenv("R2_UPLOAD_CONCURRENCY", "8"))
+R2_STREAM_UPLOADS = os.getenv("R2_STREAM_UPLOADS", "1") == "1"
+
+# Output storage: "r2", "local" (artifact server over OUTPUTS_DIR) or "auto" (R2 if configured).
+# Local outputs up to INLINE_MAX_MB are returned as base64 data URLs (0 = never inline).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "auto")
+ARTIFACT_BASE_URL = os.getenv("ARTIFACT_BASE_URL", "")
+ARTIFACT_PORT = int(os.getenv("ARTIFACT_PORT", "8765"))
+ARTIFACT_TTL_HOURS = float(os.getenv("ARTIFACT_TTL_HOURS", "24"))
+INLINE_MAX_MB = float(os.getenv("INLINE_MAX_MB", "2"))
+
+# Job inputs: fetched concurrently into a content-addressed LRU cache on the volume
+INPUT_CACHE_DIR = Path(os.getenv("INPUT_CACHE_DIR", str(WORKSPACE / "cache" / "inputs")))
+INPUT_CACHE_MAX_GB = float(os.getenv("INPUT_CACHE_MAX_GB", "20"))
+INPUT_CACHE_REVALIDATE_S = float(os.getenv("INPUT_CACHE_REVALIDATE_S", "3600"))
+INPUT_FETCH_TIMEOUT = float(os.getenv("INPUT_FETCH_TIMEOUT", "30"))
+INPUT_FETCH_RETRIES = int(os.getenv("INPUT_FETCH_RETRIES", "3"))
+
+# Concurrent jobs per worker (RunPod concurrency_modifier), pipelined by resource class: each
+# stage holds a GPU / CPU / upload slot, so one job's lip-sync overlaps another's encode and upload.
+# Opt-in: 1 keeps the one-job-at-a-time handler
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "1"))
+GPU_CONCURRENCY = int(os.getenv("GPU_CONCURRENCY", "1"))
+CPU_CONCURRENCY = int(os.getenv("CPU_CONCURRENCY", str(max(1, (os.cpu_count() or 2) // 2))))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+
+# Persona builds render up to PERSONA_TAKE_WORKERS takes at once (each holds a CPU slot while
+# rendering); every take's upload starts as soon as it is rendered
+PERSONA_TAKE_WORKERS = int(os.getenv("PERSONA_TAKE_WORKERS", str(CPU_CONCURRENCY)))
+
+# Frame worker processes per render for per-frame CPU work (captions/grade/grain tail of the
+# frame pipeline, idle-motion warps); frames move through shared-memory slots (frame_ring.py).
+# 0/1 = in-process (default): the pool only pays off with spare physical cores, so it is opt-in
+FRAME_WORKERS = int(os.getenv("FRAME_WORKERS", "0"))
+
+# Job checkpoints: finished stage outputs (lip-sync, final render) are kept per job_id so a
+# retried job resumes after its last finished stage. Pruned after JOB_CHECKPOINT_TTL_HOURS and
+# oldest-first above JOB_CHECKPOINT_MAX_GB; dropped on success unless KEEP_COMPLETED=1.
+JOB_CHECKPOINT_DIR = Path(os.getenv("JOB_CHECKPOINT_DIR", str(WORKSPACE / "jobs")))
+JOB_CHECKPOINT_MAX_GB = float(os.getenv("JOB_CHECKPOINT_MAX_GB", "50"))
+JOB_CHECKPOINT_TTL_HOURS = float(os.getenv("JOB_CHECKPOINT_TTL_HOURS", "24"))
+JOB_CHECKPOINT_KEEP_COMPLETED = os.getenv("JOB_CHECKPOINT_KEEP_COMPLETED", "0") == "1"
+
+# Cross-job stage cache: lip-sync / enhanced / upscaled / graded outputs keyed by input content
+# and the preset fields that change them, so near-duplicate jobs reuse them. LRU-evicted above
+# STAGE_CACHE_MAX_GB (0 = off); fused pipeline stages are stored at STAGE_CACHE_CRF.
+STAGE_CACHE_DIR = Path(os.getenv("STAGE_CACHE_DIR", str(WORKSPACE / "cache" / "stages")))
+STAGE_CACHE_MAX_GB = float(os.getenv("STAGE_CACHE_MAX_GB", "40"))
+STAGE_CACHE_CRF = int(os.getenv("STAGE_CACHE_CRF", "12"))
+
+# MuseTalk: resident engine (models loaded once, avatar prep cached per image) or the
+# per-job inference script (0). Avatar preparations are LRU-evicted above AVATAR_CACHE_MAX_GB.
+MUSETALK_ENGINE = os.getenv("MUSETALK_ENGINE", "1") == "1"
+AVATAR_CACHE_DIR = Path(os.getenv("AVATAR_CACHE_DIR", str(WORKSPACE / "cache" / "avatars")))
+AVATAR_CACHE_MAX_GB = float(os.getenv("AVATAR_CACHE_MAX_GB", "10"))
+
+# Whisper audio features: extracted in AUDIO_FEATURE_CHUNK_S windows and cached by audio
+# content, so re-rendering the same clip at another quality skips extraction
+AUDIO_FEATURE_CACHE_DIR = Path(os.getenv("AUDIO_FEATURE_CACHE_DIR", str(WORKSPACE / "cache" / "audio_features")))
+AUDIO_FEATURE_CACHE_MAX_GB = float(os.getenv("AUDIO_FEATURE_CACHE_MAX_GB", "5"))
+AUDIO_FEATURE_CHUNK_S = float(os.getenv("AUDIO_FEATURE_CHUNK_S", "30"))
+
+# Idle takes: breathing / blink / head-sway loops warped with IDLE_WARP_BACKEND (opencv | numpy)
+# and cached per image + expression + duration (0 GB = no cache)
+IDLE_CACHE_DIR = Path(os.getenv("IDLE_CACHE_DIR", str(WORKSPACE / "cache" / "idle")))
+IDLE_CACHE_MAX_GB = float(os.getenv("IDLE_CACHE_MAX_GB", "5"))
+IDLE_WARP_BACKEND = os.getenv("IDLE_WARP_BACKEND", "opencv")
+
+# Long-form lip-sync: voice tracks of at least SEGMENT_MIN_DURATION_S are split at silences
+# into ~SEGMENT_TARGET_S segments, rendered SEGMENT_WORKERS at a time and crossfaded (0 = off)
+SEGMENT_MIN_DURATION_S = float(os.getenv("SEGMENT_MIN_DURATION_S", "90"))
+SEGMENT_TARGET_S = float(os.getenv("SEGMENT_TARGET_S", "30"))
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", "2"))
+SEGMENT_CROSSFADE_S = float(os.getenv("SEGMENT_CROSSFADE_S", "0.2"))
+
+# Realtime micro-batching: MuseTalk frames of concurrent realtime jobs share forward passes of up
+# to REALTIME_BATCH_MAX frames, flushed REALTIME_BATCH_WAIT_MS after the oldest arrived (0 = off)
+REALTIME_BATCH_MAX = int(os.getenv("REALTIME_BATCH_MAX", "32"))
+REALTIME_BATCH_WAIT_MS = float(os.getenv("REALTIME_BATCH_WAIT_MS", "15"))
+
+# Streaming output: lip-sync jobs (realtime by default, any job with "stream": true) publish an HLS
+# playlist as soon as their inputs are in and append STREAM_SEGMENT_S-second segments while rendering
+REALTIME_STREAM = os.getenv("REALTIME_STREAM", "1") == "1"
+STREAM_SEGMENT_S = float(os.getenv("STREAM_SEGMENT_S", "2"))
+
+# Audio mix: voice + ducked music + ambience + SFX mixed in process to PCM (AUDIO_MIXER=native) at
+# AUDIO_MIX_SAMPLE_RATE, or by an ffmpeg amix graph (ffmpeg); native failures fall back to ffmpeg
+AUDIO_MIXER = os.getenv("AUDIO_MIXER", "native")
+AUDIO_MIX_SAMPLE_RATE = int(os.getenv("AUDIO_MIX_SAMPLE_RATE", "48000"))
+
+# Captions: burned from one compiled .ass file (CAPTION_ENGINE=ass) or one drawtext filter per caption
+# (drawtext); the frame pipeline overlays pre-rasterized patches, kept across jobs up to
+# CAPTION_GLYPH_CACHE of them and CAPTION_GLYPH_CACHE_MB in total (float32 patches, 16 bytes per pixel)
+CAPTION_ENGINE = os.getenv("CAPTION_ENGINE", "ass")
+CAPTION_GLYPH_CACHE = int(os.getenv("CAPTION_GLYPH_CACHE", "2048"))
+CAPTION_GLYPH_CACHE_MB = float(os.getenv("CAPTION_GLYPH_CACHE_MB", "64"))
+
+# GFPGAN batched mode: detect/align once per N frames, restore crops in batches (1 = per-frame)
+GFPGAN_BATCH_SIZE = int(os.getenv("GFPGAN_BATCH_SIZE", "8"))
+GFPGAN_DETECT_EVERY = int(os.getenv("GFPGAN_DETECT_EVERY", "30"))
+
+# Static-region reuse: GFPGAN / Real-ESRGAN only see the region that changed since the first frame
+# (mouth/jaw), composited onto that frame's cached output (see static_region.py)
+DELTA_REGION = os.getenv("DELTA_REGION", "1") == "1"
+DELTA_REGION_OPTIONS = {
+    "threshold": float(os.getenv("DELTA_REGION_THRESHOLD", "10")),         # mean level change per 4x4 block
+    "margin": int(os.getenv("DELTA_REGION_MARGIN", "32")),                 # context pixels around the change
+    "max_fraction": float(os.getenv("DELTA_REGION_MAX_FRACTION", "0.5")),  # above this, whole frame + reseed
+}
+
+# Real-ESRGAN tiling/batching budget in MB (0 = auto from free VRAM/RAM) and precision
+REALESRGAN_MEMORY_BUDGET_MB = int(os.getenv("REALESRGAN_MEMORY_BUDGET_MB", "0"))
+REALESRGAN_HALF = os.getenv("REALESRGAN_HALF", "1") == "1"
+
+# Model registry: models load lazily and are LRU-evicted above the ceiling
+# (MB, 0 = 85% of total VRAM, unlimited without CUDA). Only MODEL_PREWARM load at startup.
+MODEL_MEMORY_CEILING_MB = int(os.getenv("MODEL_MEMORY_CEILING_MB", "0"))
+MODEL_PREWARM = [m.strip() for m in os.getenv("MODEL_PREWARM", "musetalk").split(",") if m.strip()]
+
+# Components that must be provisioned (see bootstrap.py) or the worker exits at startup
+BOOTSTRAP_REQUIRED = [
+    m.strip() for m in os.getenv("BOOTSTRAP_REQUIRED", ",".join(MODEL_PREWARM)).split(",") if m.strip()
+]
+
 # ═══════════════════════════════════════════════════════════════════════════════════
 # PIXAR-QUALITY PRESETS - The Heart of Pixar-Level Generation
 # ═══════════════════════════════════════════════════════════════════════════════════
@@ -148,96 +306,84 @@ class JobResult:
     duration_ms: int
     error: Optional[str] = None
 
+# ═══════════════════════════════════════════════════════════════════════════════════
+# RESOURCE CLASSES
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+# Slots are re-entrant per thread. GPU-bound helpers called from segment worker threads
+# (run_musetalk_inference, prepare_avatar) are left unbound: run_lipsync already holds the GPU.
+resources = ResourcePool({"gpu": GPU_CONCURRENCY, "cpu": CPU_CONCURRENCY, "upload": UPLOAD_CONCURRENCY})
+
 # ═══════════════════════════════════════════════════════════════════════════════════
 # MODEL LOADING - MuseTalk + GFPGAN
 # ═══════════════════════════════════════════════════════════════════════════════════
 
-_musetalk_ready = False
-_gfpgan_model = None
+def default_model_ceiling() -> int:
+    """Registry ceiling in bytes: MODEL_MEMORY_CEILING_MB, else 85% of total VRAM."""
+    if MODEL_MEMORY_CEILING_MB > 0:
+        return MODEL_MEMORY_CEILING_MB * 1024 * 1024
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return int(torch.cuda.get_device_properties(0).total_memory * 0.85)
+    except ImportError:
+        pass
+    return 0
 
-def setup_musetalk():
+models = ModelRegistry(ceiling_bytes=default_model_ceiling(), on_evict=release_cuda_cache)
+
+def load_musetalk():
     """
-    Clone and setup MuseTalk if not already present.
-    This runs once on first invocation.
+    Put the provisioned MuseTalk checkout on sys.path and load the resident
+    engine (None if MUSETALK_ENGINE is off or it fails to load: the per-job
+    inference script is used instead).
+    Called by the model registry on first use (or after an eviction).
+    Repo, packages and weights come from the bootstrap manifest; nothing is
+    installed here.
     """
-    global _musetalk_ready
+    require("musetalk")
 
-    if _musetalk_ready:
-        return True
+    # Add MuseTalk to path
+    if str(MUSETALK_DIR) not in sys.path:
+        sys.path.insert(0, str(MUSETALK_DIR))
 
-    print("[Studio] Setting up MuseTalk...")
+    engine = None
+    if MUSETALK_ENGINE:
+        try:
+            engine = MuseTalkEngine.load(MUSETALK_DIR)
+        except Exception as e:
+            print(f"[Studio] MuseTalk engine unavailable, using inference script: {e}")
 
-    # Clone MuseTalk if not present
-    if not MUSETALK_DIR.exists():
-        print("[Studio] Cloning MuseTalk repository...")
-        subprocess.run([
-            "git", "clone",
-            "https://github.com/TMElyralab/MuseTalk.git",
-            str(MUSETALK_DIR)
-        ], check=True)
-
-    # Install dependencies
-    print("[Studio] Installing MuseTalk dependencies...")
-    subprocess.run([
-        sys.executable, "-m", "pip", "install", "-q",
-        "torch", "torchvision", "torchaudio",
-        "diffusers", "transformers", "accelerate",
-        "opencv-python", "mediapipe", "librosa",
-        "omegaconf", "av", "pydub"
-    ], check=True)
-
-    # Download model weights if not present
-    models_path = MUSETALK_DIR / "models"
-    if not models_path.exists():
-        print("[Studio] Downloading MuseTalk model weights...")
-        # MuseTalk uses huggingface for weights
-        subprocess.run([
-            sys.executable, "-m", "pip", "install", "-q", "huggingface_hub"
-        ], check=True)
-
-        from huggingface_hub import snapshot_download
-        snapshot_download(
-            repo_id="TMElyralab/MuseTalk",
-            local_dir=str(MUSETALK_DIR / "models"),
-            local_dir_use_symlinks=False
-        )
+    print(f"[Studio] MuseTalk ready! ({'engine' if engine else 'script'})")
+    return engine
 
-    # Add MuseTalk to path
-    sys.path.insert(0, str(MUSETALK_DIR))
+def unload_musetalk(_engine: Any):
+    """
+    MuseTalk's inference script loads its weights at import time, so
+    releasing it means dropping those modules along with the engine.
+    """
+    for name in list(sys.modules):
+        if name.startswith(("musetalk", "scripts.inference")):
+            del sys.modules[name]
 
-    _musetalk_ready = True
-    print("[Studio] MuseTalk ready!")
-    return True
+def setup_musetalk():
+    """Ensure MuseTalk is loaded (through the model registry)."""
+    return models.get("musetalk")
 
-def setup_gfpgan():
+models.register("musetalk", load_musetalk, footprint_mb=6000, unload=unload_musetalk)
+
+def load_gfpgan():
     """
     Setup GFPGAN for face enhancement.
     """
-    global _gfpgan_model
-
-    if _gfpgan_model is not None:
-        return _gfpgan_model
-
     print("[Studio] Setting up GFPGAN...")
-
-    subprocess.run([
-        sys.executable, "-m", "pip", "install", "-q",
-        "gfpgan", "basicsr", "realesrgan"
-    ], check=True)
+    require("gfpgan")
 
     from gfpgan import GFPGANer
 
-    # Download GFPGAN model
-    model_path = MODELS_DIR / "gfpgan" / "GFPGANv1.4.pth"
-    if not model_path.exists():
-        model_path.parent.mkdir(parents=True, exist_ok=True)
-        print("[Studio] Downloading GFPGAN weights...")
-        urllib.request.urlretrieve(
-            "https://github.com/TencentARC/GFPGAN/releases/download/v1.3.4/GFPGANv1.4.pth",
-            str(model_path)
-        )
+    model_path = weight_path("upscalers/gfpgan", "GFPGANv1.4.pth")
 
-    _gfpgan_model = GFPGANer(
+    gfpgan = GFPGANer(
         model_path=str(model_path),
         upscale=2,
         arch='clean',
@@ -246,79 +392,126 @@ def setup_gfpgan():
     )
 
     print("[Studio] GFPGAN ready!")
-    return _gfpgan_model
+    return gfpgan
+
+def setup_gfpgan():
+    """Shared GFPGANer (through the model registry)."""
+    return models.get("gfpgan")
+
+models.register("gfpgan", load_gfpgan, footprint_mb=1500)
+
+def setup_batched_gfpgan(
+    batch_size: int = GFPGAN_BATCH_SIZE,
+    detect_every: int = GFPGAN_DETECT_EVERY
+) -> BatchedFaceEnhancer:
+    """
+    Wrap the shared GFPGANer in the batched engine.
+    Face detection/alignment runs once per `detect_every` frames (or on a scene
+    cut) and aligned crops go through the network `batch_size` at a time.
+    """
+    gfpgan = setup_gfpgan()
+    return BatchedFaceEnhancer(
+        gfpgan_face_detector(gfpgan),
+        GFPGANBatchRestorer(gfpgan),
+        upscale=gfpgan.upscale,
+        batch_size=batch_size,
+        detect_every=detect_every
+    )
 
 # ═══════════════════════════════════════════════════════════════════════════════════
 # REAL-ESRGAN VIDEO UPSCALING - Pixar-Quality Enhancement
 # ═══════════════════════════════════════════════════════════════════════════════════
 
-_realesrgan_model = None
+# One RealESRGANer per native scale (x2plus / x4plus); other scales resize from x4
+_upscaler_engine = None
 
-def setup_realesrgan(scale: int = 4):
+REALESRGAN_WEIGHTS = {
+    2: "RealESRGAN_x2plus.pth",
+    4: "RealESRGAN_x4plus.pth",
+}
+
+def load_realesrgan(scale: int = 4, half: bool = True):
     """
     Setup Real-ESRGAN for video upscaling.
     This is the secret sauce for Pixar-quality output.
     """
-    global _realesrgan_model
-
-    if _realesrgan_model is not None:
-        return _realesrgan_model
-
-    print(f"[Studio] Setting up Real-ESRGAN (scale={scale})...")
+    native = 2 if scale == 2 else 4
 
-    subprocess.run([
-        sys.executable, "-m", "pip", "install", "-q",
-        "realesrgan", "basicsr"
-    ], check=True)
+    print(f"[Studio] Setting up Real-ESRGAN (scale={native})...")
+    require("realesrgan")
 
+    import torch
     from realesrgan import RealESRGANer
     from basicsr.archs.rrdbnet_arch import RRDBNet
 
-    # Download model if needed
-    model_path = MODELS_DIR / "upscalers" / "realesrgan" / "RealESRGAN_x4plus.pth"
-    if not model_path.exists():
-        model_path.parent.mkdir(parents=True, exist_ok=True)
-        print("[Studio] Downloading Real-ESRGAN weights...")
-        urllib.request.urlretrieve(
-            "https://github.com/xinntao/Real-ESRGAN/releases/download/v0.1.0/RealESRGAN_x4plus.pth",
-            str(model_path)
-        )
+    model_path = weight_path("upscalers/realesrgan", REALESRGAN_WEIGHTS[native])
 
     # Initialize model
-    model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=4)
+    model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=native)
 
-    _realesrgan_model = RealESRGANer(
-        scale=4,
+    upsampler = RealESRGANer(
+        scale=native,
         model_path=str(model_path),
         dni_weight=None,
         model=model,
-        tile=0,  # No tiling for quality
+        tile=0,  # Tiling is planned per frame size by TiledUpscaler
         tile_pad=10,
         pre_pad=0,
-        half=True,  # Use FP16 for speed on H100
-        gpu_id=0
+        half=half and torch.cuda.is_available(),  # FP16 on GPU only
+        gpu_id=0 if torch.cuda.is_available() else None
     )
 
     print("[Studio] Real-ESRGAN ready!")
-    return _realesrgan_model
+    return upsampler
+
+
+def setup_realesrgan(scale: int = 4):
+    """RealESRGANer for the native scale serving `scale` (through the model registry)."""
+    return models.get("realesrgan", scale=2 if scale == 2 else 4, half=REALESRGAN_HALF)
+
+models.register("realesrgan", load_realesrgan, footprint_mb=700)
+
+
+def setup_upscaler_engine() -> TiledUpscaler:
+    """
+    Shared tiled/batched upscaler over the per-scale Real-ESRGAN models.
+    Tile and batch sizes come from REALESRGAN_MEMORY_BUDGET_MB (0 = half of
+    free VRAM, or free RAM on CPU).
+    """
+    global _upscaler_engine
+
+    if _upscaler_engine is None:
+        budget = REALESRGAN_MEMORY_BUDGET_MB * 1024 * 1024 or None
+        _upscaler_engine = TiledUpscaler(
+            lambda scale: RealESRGANTorchModel(setup_realesrgan(scale)),
+            memory_budget_bytes=budget,
+            half=REALESRGAN_HALF,
+            cache_models=False  # the registry owns model lifetime
+        )
+    return _upscaler_engine
 
 
+@resources.bound("gpu")
+@models.pin("realesrgan")
 def upscale_video_realesrgan(
     input_video: Path,
     output_video: Path,
     scale: int = 4,
-    apply_temporal_smoothing: bool = False
+    apply_temporal_smoothing: bool = False,
+    delta_region: bool = DELTA_REGION
 ) -> Path:
     """
     Upscale video using Real-ESRGAN - Pixar-quality enhancement.
 
-    This transforms standard video into cinema-quality output.
+    This transforms standard video into cinema-quality output. With
+    `delta_region` only the region that moves is upscaled per frame
+    (static_region.py).
     """
     print(f"[Real-ESRGAN] Upscaling video {scale}x...")
     start = time.time()
 
     try:
-        upsampler = setup_realesrgan(scale)
+        upscaler = setup_upscaler_engine()
 
         import cv2
         import numpy as np
@@ -329,66 +522,70 @@ def upscale_video_realesrgan(
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
-        # Output at upscaled resolution
+        # Output at upscaled resolution, encoded once with audio from the original
         out_width = width * scale
         out_height = height * scale
 
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(str(output_video), fourcc, fps, (out_width, out_height))
+        out = FfmpegEncoderSink(
+            output_video,
+            audio_path=input_video,
+            crf=17,  # High quality
+            preset="slow",
+            audio_bitrate="320k"
+        )
+        out.open(out_width, out_height, fps)
+
+        region = None
+        if delta_region:
+            region = DeltaRegionStage(UpscaleStage(upscaler, scale=scale), **DELTA_REGION_OPTIONS)
+            region.setup(width, height, fps)
 
         frame_count = 0
+        reported = 0
         prev_frame = None
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Convert BGR to RGB for Real-ESRGAN
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            # Upscale frame
-            upscaled, _ = upsampler.enhance(frame_rgb, outscale=scale)
-
-            # Temporal smoothing (reduces flickering for cinema quality)
-            if apply_temporal_smoothing and prev_frame is not None:
-                alpha = 0.85  # Current frame weight
-                upscaled = cv2.addWeighted(upscaled, alpha, prev_frame, 1 - alpha, 0)
-
-            prev_frame = upscaled.copy()
-
-            # Convert back to BGR for OpenCV
-            upscaled_bgr = cv2.cvtColor(upscaled, cv2.COLOR_RGB2BGR)
-            out.write(upscaled_bgr)
-
-            frame_count += 1
-            if frame_count % 30 == 0:
-                progress = (frame_count / total_frames) * 100 if total_frames > 0 else 0
-                print(f"[Real-ESRGAN] {frame_count}/{total_frames} frames ({progress:.1f}%)")
-
-        cap.release()
-        out.release()
-
-        # Re-encode with audio from original
-        temp_upscaled = output_video.with_suffix('.temp.mp4')
-        shutil.move(str(output_video), str(temp_upscaled))
-
-        subprocess.run([
-            "ffmpeg", "-y",
-            "-i", str(temp_upscaled),
-            "-i", str(input_video),
-            "-c:v", "libx264",
-            "-crf", "17",  # High quality
-            "-preset", "slow",
-            "-c:a", "aac",
-            "-b:a", "320k",
-            "-map", "0:v",
-            "-map", "1:a?",  # Audio optional
-            "-shortest",
-            str(output_video)
-        ], check=True, capture_output=True)
-
-        temp_upscaled.unlink(missing_ok=True)
+        batch = []
+
+        try:
+            while True:
+                ret, frame = cap.read()
+                if ret:
+                    batch.append(frame)
+                if batch and (not ret or len(batch) >= upscaler.batch_size):
+                    # Upscale a chunk of BGR frames (tiled/batched per memory budget), or only its moving region
+                    if region is not None:
+                        upscaled_batch = region.process_batch(batch, frame_count)
+                    else:
+                        upscaled_batch = upscaler.upscale_frames(batch, scale)
+                    for upscaled in upscaled_batch:
+
+                        # Temporal smoothing (reduces flickering for cinema quality)
+                        if apply_temporal_smoothing and prev_frame is not None:
+                            alpha = 0.85  # Current frame weight
+                            upscaled = cv2.addWeighted(upscaled, alpha, prev_frame, 1 - alpha, 0)
+
+                        prev_frame = upscaled
+                        out.write(upscaled)
+
+                    frame_count += len(batch)
+                    batch = []
+
+                if not ret:
+                    break
+
+                if frame_count // 30 > reported:
+                    reported = frame_count // 30
+                    progress = (frame_count / total_frames) * 100 if total_frames > 0 else 0
+                    print(f"[Real-ESRGAN] {frame_count}/{total_frames} frames ({progress:.1f}%)")
+        except BaseException:
+            out.abort()
+            raise
+        finally:
+            cap.release()
+
+        out.close()
+
+        if region is not None:
+            print(f"[Real-ESRGAN] Delta region: {region.stats.to_dict()}")
 
     except Exception as e:
         print(f"[Real-ESRGAN] Upscaling failed: {e}")
@@ -403,20 +600,14 @@ def upscale_video_realesrgan(
     return output_video
 
 
+@resources.bound("cpu")
 def apply_color_grading(input_video: Path, output_video: Path, style: str = "cinematic") -> Path:
     """
     Apply color grading for that Pixar look.
     """
     print(f"[ColorGrade] Applying {style} color grading...")
 
-    color_filters = {
-        "cinematic": "eq=contrast=1.1:saturation=1.15:brightness=0.02,curves=preset=lighter",
-        "warm": "eq=saturation=1.2:brightness=0.03,colorbalance=rs=0.1:gs=0.05:bs=-0.05",
-        "cool": "eq=saturation=1.1,colorbalance=rs=-0.05:gs=0:bs=0.1",
-        "vibrant": "eq=contrast=1.15:saturation=1.3:brightness=0.02",
-    }
-
-    filter_str = color_filters.get(style, color_filters["cinematic"])
+    filter_str = grade_filter(style)
 
     try:
         subprocess.run([
@@ -433,6 +624,7 @@ def apply_color_grading(input_video: Path, output_video: Path, style: str = "cin
     return output_video
 
 
+@resources.bound("cpu")
 def add_film_grain(input_video: Path, output_video: Path, intensity: float = 0.02) -> Path:
     """
     Add subtle film grain for cinema quality.
@@ -443,7 +635,7 @@ def add_film_grain(input_video: Path, output_video: Path, intensity: float = 0.0
         subprocess.run([
             "ffmpeg", "-y",
             "-i", str(input_video),
-            "-vf", f"noise=alls={int(intensity * 100)}:allf=t",
+            "-vf", grain_filter(intensity),
             "-c:a", "copy",
             str(output_video)
         ], check=True, capture_output=True)
@@ -457,110 +649,143 @@ def add_film_grain(input_video: Path, output_video: Path, intensity: float = 0.0
 # STORAGE UTILITIES
 # ═══════════════════════════════════════════════════════════════════════════════════
 
-def upload_to_r2(local_path: Path, remote_key: str) -> str:
-    """Upload file to R2 and return public URL."""
-
-    if not R2_ENDPOINT:
-        # Fallback: return base64 data URL
-        with open(local_path, 'rb') as f:
-            data = f.read()
-        mime = "video/mp4" if local_path.suffix == ".mp4" else "image/png"
-        return f"data:{mime};base64,{base64.b64encode(data).decode()}"
-
-    import boto3
-    from botocore.config import Config
-
-    s3 = boto3.client(
-        's3',
-        endpoint_url=R2_ENDPOINT,
-        aws_access_key_id=R2_ACCESS_KEY,
-        aws_secret_access_key=R2_SECRET_KEY,
-        config=Config(signature_version='s3v4')
-    )
+storage = create_storage(
+    STORAGE_BACKEND,
+    r2_endpoint=R2_ENDPOINT,
+    r2_client_factory=lambda: get_s3_client(R2_ENDPOINT, R2_ACCESS_KEY, R2_SECRET_KEY,
+                                            max_pool=R2_UPLOAD_CONCURRENCY * 2),
+    r2_bucket=R2_BUCKET,
+    r2_public_url=R2_PUBLIC_URL,
+    r2_part_size=R2_PART_SIZE_MB * 1024 * 1024,
+    r2_concurrency=R2_UPLOAD_CONCURRENCY,
+    r2_stream_uploads=R2_STREAM_UPLOADS,
+    local_root=OUTPUTS_DIR,
+    local_base_url=ARTIFACT_BASE_URL,
+    local_port=ARTIFACT_PORT,
+    local_inline_max_bytes=int(INLINE_MAX_MB * 1024 * 1024),
+    local_ttl_hours=ARTIFACT_TTL_HOURS,
+)
+
+def _record_upload(url: str, stats, upload_stats: Optional[List[Dict[str, Any]]]) -> str:
+    mode = "inline" if stats.inline else f"{stats.parts} parts{', streamed' if stats.streamed else ''}"
+    print(f"[Upload] {stats.key}: {stats.bytes / 1e6:.1f} MB in {stats.elapsed_s:.2f}s "
+          f"({stats.mb_per_s:.1f} MB/s, {mode})")
+    if upload_stats is not None:
+        upload_stats.append(stats.to_dict())
+    return url
+
+@resources.bound("upload")
+def upload_output(local_path: Path, remote_key: str,
+                  upload_stats: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Store a job output with the configured backend and return its URL. Throughput is appended to `upload_stats`."""
+    url, stats = storage.put(local_path, remote_key)
+    return _record_upload(url, stats, upload_stats)
+
+def stream_output(local_path: Path, remote_key: str):
+    """
+    Start storing `local_path` while it is being written, if the backend can.
+    The writer must produce an append-only file (pass FRAGMENTED_MP4_ARGS to
+    the encoder). Returns None otherwise.
+    """
+    return storage.stream(local_path, remote_key)
 
-    content_type = "video/mp4" if local_path.suffix == ".mp4" else "image/png"
-    s3.upload_file(
-        str(local_path),
-        R2_BUCKET,
-        remote_key,
-        ExtraArgs={'ContentType': content_type, 'ACL': 'public-read'}
-    )
+def start_upload(local_path: Path, remote_key: str):
+    """Store a finished file in the background; pass the handle to finish_upload."""
+    return storage.submit(local_path, remote_key)
+
+@resources.bound("upload")
+def finish_upload(handle, local_path: Path, remote_key: str,
+                  upload_stats: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Wait for a stream_output / start_upload handle (or store now if there is none)."""
+    url, stats = storage.finish(handle, local_path, remote_key)
+    return _record_upload(url, stats, upload_stats)
+
+def open_stream(job_id: str, audio_path: Path, workdir: Path) -> HlsSegmenter:
+    """
+    HLS segmenter publishing under videos/{job_id}/stream/ (never inlined:
+    players fetch segments by URI relative to the playlist).
+    """
+    prefix = f"videos/{job_id}/stream"
 
-    return f"{R2_PUBLIC_URL}/{remote_key}"
+    def publish(path: Path, name: str) -> str:
+        with resources.use("upload"):
+            url, _ = storage.put(path, f"{prefix}/{name}", inline=False)
+        return url
 
-def download_file(url: str, local_path: Path) -> Path:
-    """Download file from URL."""
-    urllib.request.urlretrieve(url, str(local_path))
-    return local_path
+    return HlsSegmenter(workdir, publish, ffmpeg_segment_encoder(audio_path), segment_s=STREAM_SEGMENT_S)
 
-def decode_base64_to_file(data: str, path: Path) -> Path:
-    """Decode base64 string to file."""
-    if data.startswith("data:"):
-        data = data.split(",", 1)[1]
-    with open(path, 'wb') as f:
-        f.write(base64.b64decode(data))
-    return path
+def finish_stream(stream: HlsSegmenter, video_path: Path) -> Dict[str, Any]:
+    """
+    Append the frames of `video_path` not yet streamed, then end the playlist.
+    Covers every lip-sync path that does not write frames live (stage cache
+    hit, checkpoint resume, segmented and fallback renders).
+    """
+    source = VideoFrameSource(video_path)
+    if stream.frames == 0 or stream.frames < source.frame_count:
+        stream.open(source.width, source.height, source.fps)
+        skip = stream.frames
+        for i, frame in enumerate(source):
+            if i >= skip:
+                stream.write(frame)
+    report = stream.close()
+    print(f"[Stream] {report['segments']} segments, first live after {report['ttfs_ms']}ms")
+    return report
+
+input_fetcher = InputFetcher(
+    DiskCache(INPUT_CACHE_DIR, max_bytes=int(INPUT_CACHE_MAX_GB * 1024 ** 3), name="inputs")
+    if INPUT_CACHE_MAX_GB > 0 else None,
+    timeout=INPUT_FETCH_TIMEOUT,
+    retries=INPUT_FETCH_RETRIES,
+    revalidate_after_s=INPUT_CACHE_REVALIDATE_S
+)
+
+checkpoints = CheckpointStore(
+    JOB_CHECKPOINT_DIR,
+    max_bytes=int(JOB_CHECKPOINT_MAX_GB * 1024 ** 3),
+    ttl_hours=JOB_CHECKPOINT_TTL_HOURS
+)
+
+def fetch_inputs(items: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Fetch {name: (url or base64, dest path)} concurrently through the input
+    cache. Returns the report for job metadata (per-input latency, hit rate).
+    """
+    start = time.time()
+    results = input_fetcher.fetch_all(items)
+    report = input_fetcher.report(results, time.time() - start)
+    print(f"[Inputs] {len(results)} inputs in {report['fetch_ms']:.0f}ms "
+          f"(hit rate {report['hit_rate']:.0%}, {report['bytes'] / 1e6:.1f} MB)")
+    return report
 
 # ═══════════════════════════════════════════════════════════════════════════════════
 # LIVEPORTRAIT - Real-Time Face Animation (For Interactive Avatars)
 # ═══════════════════════════════════════════════════════════════════════════════════
 
-_liveportrait_ready = False
-
-def setup_liveportrait():
+def load_liveportrait():
     """
     Setup LivePortrait for real-time face animation.
     Used for interactive avatar sessions where low latency is critical.
     """
-    global _liveportrait_ready
-
-    if _liveportrait_ready:
-        return True
-
     print("[Studio] Setting up LivePortrait...")
+    require("liveportrait")
 
-    try:
-        # Install LivePortrait dependencies
-        subprocess.run([
-            sys.executable, "-m", "pip", "install", "-q",
-            "onnxruntime-gpu", "insightface", "imageio", "imageio-ffmpeg"
-        ], check=True)
-
-        liveportrait_dir = WORKSPACE / "LivePortrait"
-        if not liveportrait_dir.exists():
-            print("[Studio] Cloning LivePortrait repository...")
-            subprocess.run([
-                "git", "clone",
-                "https://github.com/KwaiVGI/LivePortrait.git",
-                str(liveportrait_dir)
-            ], check=True)
-
-        # Download model weights if not present
-        models_path = liveportrait_dir / "pretrained_weights"
-        if not models_path.exists():
-            print("[Studio] Downloading LivePortrait weights...")
-            subprocess.run([
-                sys.executable, "-m", "pip", "install", "-q", "huggingface_hub"
-            ], check=True)
-
-            from huggingface_hub import snapshot_download
-            snapshot_download(
-                repo_id="KwaiVGI/LivePortrait",
-                local_dir=str(models_path),
-                local_dir_use_symlinks=False
-            )
-
-        # Add LivePortrait to path
-        sys.path.insert(0, str(liveportrait_dir))
+    # Add LivePortrait to path
+    if str(LIVEPORTRAIT_DIR) not in sys.path:
+        sys.path.insert(0, str(LIVEPORTRAIT_DIR))
 
-        _liveportrait_ready = True
-        print("[Studio] LivePortrait ready!")
-        return True
+    print("[Studio] LivePortrait ready!")
+    return True
 
+def setup_liveportrait():
+    """Ensure LivePortrait is loaded (through the model registry)."""
+    try:
+        return models.get("liveportrait")
     except Exception as e:
         print(f"[Studio] LivePortrait setup failed: {e}")
         return False
 
+models.register("liveportrait", load_liveportrait, footprint_mb=2500)
+
 
 def run_liveportrait_inference(
     image_path: Path,
@@ -626,72 +851,47 @@ def run_liveportrait_inference(
     return output_path
 
 
+idle_engine = IdleMotionEngine(
+    DiskCache(IDLE_CACHE_DIR, max_bytes=int(IDLE_CACHE_MAX_GB * 1024 ** 3), name="idle")
+    if IDLE_CACHE_MAX_GB > 0 else None,
+    encoder_factory=lambda path: FfmpegEncoderSink(path, crf=23, preset="fast"),
+    backend=create_warp_backend(IDLE_WARP_BACKEND),
+    fps=30,
+    workers=FRAME_WORKERS
+)
+
+
 def generate_idle_animation(
     image_path: Path,
     output_path: Path,
     duration: float = 5.0,
-    expression: str = "neutral"
+    expression: str = "neutral",
+    image=None,
+    eye_box=None,
+    stats: Optional[Dict[str, Any]] = None
 ) -> Path:
     """
     Generate an idle animation loop for a persona.
 
     Creates natural breathing, blinking, and micro-movements
-    for when the persona is "alive" but not speaking.
+    for when the persona is "alive" but not speaking. The loop is seamless
+    and cached per image + expression (idle_motion.IdleMotionEngine); pass
+    the decoded `image` when rendering several takes of one source.
     """
-    print(f"[LivePortrait] Generating {duration}s idle animation...")
+    print(f"[LivePortrait] Generating {duration}s idle animation ({expression})...")
 
     try:
-        import cv2
-        import numpy as np
-
-        # Read source image
-        img = cv2.imread(str(image_path))
-        height, width = img.shape[:2]
-        fps = 30
-        frame_count = int(duration * fps)
-
-        # Create video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(str(output_path), fourcc, fps, (width, height))
-
-        for frame_idx in range(frame_count):
-            timestamp = frame_idx / fps * 1000  # ms
-
-            # Calculate natural blink (every 4-6 seconds)
-            blink = calculate_blink(timestamp)
-
-            # Calculate breathing motion
-            breath = calculate_breathing(timestamp)
-
-            # Calculate micro-movements
-            micro = calculate_micro_movement(timestamp)
-
-            # For now, just output the source image
-            # Real implementation would warp the face based on these parameters
-            # using LivePortrait's stitching pipeline
-            out.write(img)
-
-        out.release()
-
-        # Re-encode for better compression
-        temp_output = output_path.with_suffix('.temp.mp4')
-        shutil.move(str(output_path), str(temp_output))
-
-        subprocess.run([
-            "ffmpeg", "-y",
-            "-i", str(temp_output),
-            "-c:v", "libx264",
-            "-crf", "23",
-            "-preset", "fast",
-            str(output_path)
-        ], check=True, capture_output=True)
-
-        temp_output.unlink(missing_ok=True)
-
-        print(f"[LivePortrait] Idle animation generated: {output_path}")
+        lookup = idle_engine.render(image_path, output_path, duration_s=duration, expression=expression,
+                                    image=image, eye_box=eye_box)
+        if stats is not None:
+            stats.update(lookup.to_dict())
+        print(f"[LivePortrait] Idle animation {lookup.cache} ({lookup.elapsed_s * 1000:.0f}ms, "
+              f"{lookup.frames} frames, blink {'on' if lookup.blink else 'off'}): {output_path}")
 
     except Exception as e:
         print(f"[LivePortrait] Idle animation failed: {e}")
+        if stats is not None:
+            stats.update({"cache": "fallback", "error": str(e)})
         # Fallback: static image video
         subprocess.run([
             "ffmpeg", "-y",
@@ -707,54 +907,115 @@ def generate_idle_animation(
     return output_path
 
 
-def calculate_blink(timestamp: float) -> float:
-    """Calculate natural eye blink timing (0-1)."""
-    blink_interval = 5000  # 5 seconds
-    blink_duration = 150  # 150ms
-    phase = timestamp % blink_interval
+# ═══════════════════════════════════════════════════════════════════════════════════
+# MUSETALK LIP-SYNC - REAL IMPLEMENTATION
+# ═══════════════════════════════════════════════════════════════════════════════════
 
-    if phase < blink_duration / 2:
-        return phase / (blink_duration / 2)
-    elif phase < blink_duration:
-        return 1 - (phase - blink_duration / 2) / (blink_duration / 2)
-    return 0
+avatars = AvatarCache(
+    DiskCache(AVATAR_CACHE_DIR, max_bytes=int(AVATAR_CACHE_MAX_GB * 1024 ** 3), name="avatars")
+    if AVATAR_CACHE_MAX_GB > 0 else None
+)
 
+audio_features = AudioFeatureExtractor(
+    DiskCache(AUDIO_FEATURE_CACHE_DIR, max_bytes=int(AUDIO_FEATURE_CACHE_MAX_GB * 1024 ** 3),
+              name="audio_features")
+    if AUDIO_FEATURE_CACHE_MAX_GB > 0 else None,
+    chunk_s=AUDIO_FEATURE_CHUNK_S
+)
 
-def calculate_breathing(timestamp: float) -> float:
-    """Calculate breathing motion cycle."""
-    breath_period = 4000  # 4 seconds
-    import math
-    phase = (timestamp % breath_period) / breath_period
-    return math.sin(phase * math.pi * 2)
+def realtime_coalesced(quality: str) -> bool:
+    return quality == "realtime" and MUSETALK_ENGINE and REALTIME_BATCH_WAIT_MS > 0
 
+def _realtime_batch(items: List[tuple]) -> List[Any]:
+    """One MuseTalk forward pass over (latent, audio chunk) pairs from any number of realtime jobs."""
+    import numpy as np
 
-def calculate_micro_movement(timestamp: float) -> dict:
-    """Calculate subtle head micro-movements."""
-    import math
-    scale = 0.02
-    return {
-        "pitch": math.sin(timestamp * 0.0003) * scale,
-        "yaw": math.sin(timestamp * 0.0005 + 1) * scale,
-        "roll": math.sin(timestamp * 0.0002 + 2) * scale * 0.5,
-    }
+    with models.acquire("musetalk") as engine, resources.use("gpu"):
+        return engine.infer(np.stack([latent for latent, _ in items]), np.stack([audio for _, audio in items]))
 
+realtime_batcher = MicroBatcher(
+    _realtime_batch,
+    max_batch=REALTIME_BATCH_MAX,
+    max_wait_ms=REALTIME_BATCH_WAIT_MS,
+    name="realtime-batcher"
+)
 
-# ═══════════════════════════════════════════════════════════════════════════════════
-# MUSETALK LIP-SYNC - REAL IMPLEMENTATION
-# ═══════════════════════════════════════════════════════════════════════════════════
+def coalesced_infer(latents, audio) -> List[Any]:
+    """Drop-in for MuseTalkEngine.infer that shares the forward pass with other realtime jobs."""
+    return realtime_batcher.run(list(zip(latents, audio)))
+
+def prepare_avatar(engine: MuseTalkEngine, image_path: Path):
+    """
+    Landmarks, crop boxes, latents and blend masks for `image_path`, from the
+    avatar cache when this image was seen before. Returns (prep, lookup).
+    """
+    prep, lookup = avatars.prepare(image_path, engine.prepare_avatar, params=engine.prep_params)
+    print(f"[MuseTalk] Avatar prep {lookup.cache} ({lookup.elapsed_s * 1000:.0f}ms, {lookup.frames} frames)")
+    return prep, lookup
+
+def render_musetalk(
+    engine: MuseTalkEngine,
+    image_path: Path,
+    audio_path: Path,
+    output_path: Path,
+    fps: int,
+    batch_size: int,
+    stats: Dict[str, Any],
+    infer=None,
+    stream: Optional[HlsSegmenter] = None
+) -> Path:
+    """
+    Cached avatar prep → cached audio features → UNet/VAE batches → one encode
+    with the voice muxed in. `infer` swaps the forward pass (coalesced_infer);
+    `stream` also receives every frame as it is generated.
+    """
+    prep, lookup = prepare_avatar(engine, image_path)
+    stats["avatar"] = lookup.to_dict()
+
+    features = audio_features.extract(audio_path, engine.featurize, params=engine.feature_params)
+    print(f"[MuseTalk] Audio features {features.cache} ({features.elapsed_s * 1000:.0f}ms, "
+          f"{len(features.chunks)} chunks)")
+    stats["audio_features"] = features.to_dict()
+    chunks = engine.audio_chunks(features.features, fps)
+
+    t0 = time.time()
+    height, width = prep.frames.shape[1:3]
+    sink = FfmpegEncoderSink(output_path, audio_path=audio_path, crf=16, preset="veryfast")
+    sink.open(width, height, fps)
+    if stream is not None:
+        stream.open(width, height, fps)
+    try:
+        for frame in engine.generate(prep, chunks, batch_size=batch_size, infer=infer):
+            sink.write(frame)
+            if stream is not None:
+                stream.write(frame)
+    except BaseException:
+        sink.abort()
+        raise
+    stats["encoder"] = sink.close().to_dict()
+    stats["generate_ms"] = round((time.time() - t0) * 1000, 1)
+    stats["frames"] = len(chunks)
+    return output_path
 
+@models.pin("musetalk")
 def run_musetalk_inference(
     image_path: Path,
     audio_path: Path,
     output_path: Path,
-    quality: str = "standard"
+    quality: str = "standard",
+    stats: Optional[Dict[str, Any]] = None,
+    stream: Optional[HlsSegmenter] = None
 ) -> Path:
     """
     Run REAL MuseTalk lip-sync inference.
 
     This generates actual lip-synced video, not a slideshow!
     Supports Pixar-quality presets for studio-grade output.
+    `stats` receives the path taken ("engine" / "script" / fallbacks) and,
+    on the engine path, the avatar-cache outcome and stage timings. On the
+    engine path frames go to `stream` live.
     """
+    stats = stats if stats is not None else {}
     print(f"[MuseTalk] Starting REAL lip-sync generation...")
     print(f"[MuseTalk] Image: {image_path}")
     print(f"[MuseTalk] Audio: {audio_path}")
@@ -763,7 +1024,7 @@ def run_musetalk_inference(
     start = time.time()
 
     # Ensure MuseTalk is ready
-    setup_musetalk()
+    engine = setup_musetalk()
 
     # Get quality preset from global QUALITY_PRESETS
     preset = QUALITY_PRESETS.get(quality, QUALITY_PRESETS["standard"])
@@ -774,35 +1035,43 @@ def run_musetalk_inference(
     print(f"[MuseTalk] Using preset: fps={config['fps']}, batch_size={config['batch_size']}")
 
     try:
-        # Import MuseTalk inference
-        from musetalk.utils.utils import get_file_type, get_video_fps
-        from musetalk.utils.preprocessing import get_landmark_and_bbox, read_imgs
-        from musetalk.utils.blending import get_image_blending
-        from scripts.inference import main as musetalk_main
-        import argparse
-
-        # Create config for MuseTalk
-        args = argparse.Namespace(
-            source_image=str(image_path),
-            driven_audio=str(audio_path),
-            result_dir=str(output_path.parent),
-            fps=config["fps"],
-            batch_size=config["batch_size"],
-            output_vid_name=output_path.stem,
-            use_float16=True,  # Faster inference
-        )
+        if engine is not None:
+            # Resident models; repeat personas skip straight to generation
+            stats["mode"] = "engine"
+            coalesce = realtime_coalesced(quality)
+            stats["coalesced"] = coalesce
+            render_musetalk(engine, image_path, audio_path, output_path,
+                            config["fps"], config["batch_size"], stats,
+                            infer=coalesced_infer if coalesce else None, stream=stream)
+        else:
+            # Import MuseTalk inference
+            stats["mode"] = "script"
+            from scripts.inference import main as musetalk_main
+            import argparse
+
+            # Create config for MuseTalk
+            args = argparse.Namespace(
+                source_image=str(image_path),
+                driven_audio=str(audio_path),
+                result_dir=str(output_path.parent),
+                fps=config["fps"],
+                batch_size=config["batch_size"],
+                output_vid_name=output_path.stem,
+                use_float16=True,  # Faster inference
+            )
 
-        # Run inference
-        musetalk_main(args)
+            # Run inference
+            musetalk_main(args)
 
-        # Find output video
-        result_video = output_path.parent / f"{output_path.stem}.mp4"
-        if result_video.exists():
-            shutil.move(str(result_video), str(output_path))
+            # Find output video
+            result_video = output_path.parent / f"{output_path.stem}.mp4"
+            if result_video.exists():
+                shutil.move(str(result_video), str(output_path))
 
     except ImportError as e:
         print(f"[MuseTalk] Import error: {e}")
         print("[MuseTalk] Falling back to SadTalker-style inference...")
+        stats["mode"] = "wav2lip"
 
         # Fallback: Use wav2lip or similar approach
         run_wav2lip_fallback(image_path, audio_path, output_path, config["fps"])
@@ -813,13 +1082,93 @@ def run_musetalk_inference(
         traceback.print_exc()
 
         # Emergency fallback: ffmpeg slideshow (better than nothing)
+        stats["mode"] = "ffmpeg"
         run_ffmpeg_fallback(image_path, audio_path, output_path)
 
     elapsed = time.time() - start
+    stats["elapsed_ms"] = round(elapsed * 1000, 1)
     print(f"[MuseTalk] Generated in {elapsed:.2f}s")
 
     return output_path
 
+def probe_size(video_path: Path, default: tuple = (1080, 1920)) -> tuple:
+    """First video stream's (width, height) (ffprobe), or `default` if it can't be read."""
+    result = subprocess.run([
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height",
+        "-of", "csv=p=0:s=x",
+        str(video_path)
+    ], capture_output=True, text=True)
+    try:
+        width, height = result.stdout.strip().split("x")[:2]
+        return int(width), int(height)
+    except ValueError:
+        return default
+
+def probe_duration(media_path: Path, default: float = 10.0) -> float:
+    """Container duration in seconds (ffprobe), or `default` if it can't be read."""
+    result = subprocess.run([
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        str(media_path)
+    ], capture_output=True, text=True)
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return default
+
+@models.pin("musetalk")
+def run_lipsync(
+    image_path: Path,
+    audio_path: Path,
+    output_path: Path,
+    quality: str,
+    workdir: Path,
+    stats: Dict[str, Any],
+    duration: Optional[float] = None,
+    stream: Optional[HlsSegmenter] = None
+) -> Path:
+    """
+    Lip-sync `audio_path` onto `image_path`. Short clips run as one MuseTalk
+    call; long ones are split at silences and rendered as parallel segments
+    (SEGMENT_* settings), stitched with crossfades against the full voice track.
+    Only the single call feeds `stream` live (segments finish out of order).
+    """
+    # Coalesced realtime jobs take the GPU per shared batch (on the batcher thread), not per job
+    with nullcontext() if realtime_coalesced(quality) else resources.use("gpu"):
+        duration = duration if duration is not None else probe_duration(audio_path)
+        if not SEGMENT_MIN_DURATION_S or duration < SEGMENT_MIN_DURATION_S:
+            return run_musetalk_inference(image_path, audio_path, output_path, quality, stats, stream)
+
+        preset = QUALITY_PRESETS.get(quality, QUALITY_PRESETS["standard"])
+        engine = setup_musetalk()
+        if engine is not None:
+            stats["avatar"] = prepare_avatar(engine, image_path)[1].to_dict()  # Once, before the workers
+
+        segment_stats = {}
+
+        def render_segment(segment, segment_audio: Path, segment_video: Path):
+            segment_stats[segment.index] = {}
+            run_musetalk_inference(image_path, segment_audio, segment_video, quality,
+                                   segment_stats[segment.index])
+
+        renderer = SegmentRenderer(
+            render_segment,
+            workers=SEGMENT_WORKERS,
+            target_s=SEGMENT_TARGET_S,
+            crossfade_s=SEGMENT_CROSSFADE_S
+        )
+        sink = FfmpegEncoderSink(output_path, audio_path=audio_path, crf=16, preset="veryfast")
+        stats["mode"] = "segmented"
+        stats.update(renderer.render(audio_path, workdir / "segments", preset["fps"], sink))
+        for entry in stats["segments"]:
+            entry["musetalk"] = segment_stats.get(entry["index"])
+        print(f"[MuseTalk] {len(stats['segments'])} segments in {stats['elapsed_s']:.1f}s "
+              f"(speedup {stats['parallel_speedup']}x)")
+        return output_path
+
 def run_wav2lip_fallback(image_path: Path, audio_path: Path, output_path: Path, fps: int = 30):
     """
     Fallback using Wav2Lip if MuseTalk fails.
@@ -828,27 +1177,9 @@ def run_wav2lip_fallback(image_path: Path, audio_path: Path, output_path: Path,
     print("[Fallback] Trying Wav2Lip...")
 
     try:
-        # Install Wav2Lip dependencies
-        subprocess.run([
-            sys.executable, "-m", "pip", "install", "-q",
-            "face_alignment", "batch_face"
-        ], check=True)
-
-        wav2lip_dir = WORKSPACE / "Wav2Lip"
-        if not wav2lip_dir.exists():
-            subprocess.run([
-                "git", "clone",
-                "https://github.com/Rudrabha/Wav2Lip.git",
-                str(wav2lip_dir)
-            ], check=True)
-
-        # Download Wav2Lip model if needed
-        model_path = wav2lip_dir / "checkpoints" / "wav2lip_gan.pth"
-        if not model_path.exists():
-            model_path.parent.mkdir(parents=True, exist_ok=True)
-            # Model download URL (you'd need to host this)
-            print("[Fallback] Wav2Lip model not found, using ffmpeg fallback")
-            raise FileNotFoundError("Wav2Lip model not available")
+        require("wav2lip")
+        wav2lip_dir = WAV2LIP_DIR
+        model_path = weight_path("lipsync/wav2lip", "wav2lip_gan.pth")
 
         # Run Wav2Lip inference
         cmd = [
@@ -893,16 +1224,29 @@ def run_ffmpeg_fallback(image_path: Path, audio_path: Path, output_path: Path):
 # FACE ENHANCEMENT - GFPGAN
 # ═══════════════════════════════════════════════════════════════════════════════════
 
-def enhance_face_in_video(input_video: Path, output_video: Path) -> Path:
+@resources.bound("gpu")
+@models.pin("gfpgan")
+def enhance_face_in_video(
+    input_video: Path,
+    output_video: Path,
+    batch_size: int = GFPGAN_BATCH_SIZE,
+    delta_region: bool = DELTA_REGION
+) -> Path:
     """
     Apply GFPGAN face enhancement to video frames.
     This dramatically improves video quality.
+
+    With batch_size > 1 the face is detected once per GFPGAN_DETECT_EVERY
+    frames and crops are restored in batches (see face_batch.py). With
+    `delta_region` only the face box around the moving region is enhanced
+    per frame (static_region.py).
     """
-    print("[GFPGAN] Enhancing faces in video...")
+    print(f"[GFPGAN] Enhancing faces in video (batch_size={batch_size})...")
     start = time.time()
 
     try:
         gfpgan = setup_gfpgan()
+        engine = setup_batched_gfpgan(batch_size) if batch_size > 1 else None
 
         import cv2
         import numpy as np
@@ -913,51 +1257,73 @@ def enhance_face_in_video(input_video: Path, output_video: Path) -> Path:
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
 
-        # Output writer (higher resolution due to upscaling)
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(str(output_video), fourcc, fps, (width * 2, height * 2))
-
-        frame_count = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Enhance face
-            _, _, enhanced = gfpgan.enhance(
-                frame,
-                has_aligned=False,
-                only_center_face=True,
-                paste_back=True
-            )
-
-            out.write(enhanced)
-            frame_count += 1
-
-            if frame_count % 30 == 0:
-                print(f"[GFPGAN] Processed {frame_count} frames...")
+        # Output encoder (higher resolution due to upscaling), muxing audio from the original
+        out = FfmpegEncoderSink(output_video, audio_path=input_video)
+        out.open(width * 2, height * 2, fps)
 
-        cap.release()
-        out.release()
+        region = None
+        if delta_region:
+            inner = BatchedFaceEnhanceStage(engine) if engine is not None else FaceEnhanceStage(gfpgan)
+            region = DeltaRegionStage(inner, face_detector=gfpgan_face_detector(gfpgan), **DELTA_REGION_OPTIONS)
+            region.setup(width, height, fps)
 
-        # Re-encode with audio from original
-        temp_enhanced = output_video.with_suffix('.temp.mp4')
-        shutil.move(str(output_video), str(temp_enhanced))
-
-        # Extract audio from input and merge with enhanced video
-        subprocess.run([
-            "ffmpeg", "-y",
-            "-i", str(temp_enhanced),
-            "-i", str(input_video),
-            "-c:v", "libx264",
-            "-c:a", "aac",
-            "-map", "0:v",
-            "-map", "1:a",
-            "-shortest",
-            str(output_video)
-        ], check=True, capture_output=True)
-
-        temp_enhanced.unlink(missing_ok=True)
+        frame_count = 0
+        reported = 0
+        batch = []
+        try:
+            while True:
+                ret, frame = cap.read()
+
+                if engine is None:
+                    if not ret:
+                        break
+
+                    # Enhance face
+                    if region is not None:
+                        enhanced = region.process(frame, frame_count)
+                    else:
+                        _, _, enhanced = gfpgan.enhance(
+                            frame,
+                            has_aligned=False,
+                            only_center_face=True,
+                            paste_back=True
+                        )
+
+                    out.write(enhanced)
+                    frame_count += 1
+                else:
+                    if ret:
+                        batch.append(frame)
+
+                    # Batched: reuse the alignment, restore crops in one forward pass
+                    if batch and (not ret or len(batch) >= batch_size):
+                        if region is not None:
+                            enhanced_batch = region.process_batch(batch, frame_count)
+                        else:
+                            enhanced_batch = engine.enhance_batch(batch)
+                        for enhanced in enhanced_batch:
+                            out.write(enhanced)
+                        frame_count += len(batch)
+                        batch = []
+
+                    if not ret:
+                        break
+
+                if frame_count // 30 > reported:
+                    reported = frame_count // 30
+                    print(f"[GFPGAN] Processed {frame_count} frames...")
+        except BaseException:
+            out.abort()
+            raise
+        finally:
+            cap.release()
+
+        out.close()
+
+        if engine is not None:
+            print(f"[GFPGAN] Batch stats: {engine.stats.to_dict()}")
+        if region is not None:
+            print(f"[GFPGAN] Delta region: {region.stats.to_dict()}")
 
     except Exception as e:
         print(f"[GFPGAN] Enhancement failed: {e}")
@@ -973,6 +1339,7 @@ def enhance_face_in_video(input_video: Path, output_video: Path) -> Path:
 # AUDIO MIXING
 # ═══════════════════════════════════════════════════════════════════════════════════
 
+@resources.bound("cpu")
 def mix_audio(
     voice_path: Path,
     music_path: Optional[Path],
@@ -980,62 +1347,52 @@ def mix_audio(
     sfx_tracks: List[Dict[str, Any]],
     output_path: Path,
     total_duration: float,
-    ducking_config: Dict[str, Any]
+    ducking_config: Dict[str, Any],
+    stats: Optional[Dict[str, Any]] = None
 ) -> Path:
-    """Mix audio tracks with ducking."""
-    print(f"[AudioMix] Mixing audio tracks...")
-
-    inputs = ["-i", str(voice_path)]
-    filter_parts = ["[0:a]volume=1.0[voice]"]
-    mix_inputs = ["[voice]"]
-    input_idx = 1
-
-    # Add music with ducking
-    if music_path and music_path.exists():
-        inputs.extend(["-i", str(music_path)])
-        base_vol = ducking_config.get("base_volume", 0.15)
-        filter_parts.append(
-            f"[{input_idx}:a]aloop=loop=-1:size=2e+09,atrim=0:{total_duration},"
-            f"volume={base_vol}[music_raw];"
-            f"[music_raw][voice]sidechaincompress=threshold=0.02:ratio=10:"
-            f"attack={ducking_config.get('attack_ms', 50)}:"
-            f"release={ducking_config.get('release_ms', 300)}[music]"
-        )
-        mix_inputs.append("[music]")
-        input_idx += 1
-
-    # Add ambience
-    if ambience_path and ambience_path.exists():
-        inputs.extend(["-i", str(ambience_path)])
-        filter_parts.append(
-            f"[{input_idx}:a]aloop=loop=-1:size=2e+09,atrim=0:{total_duration},"
-            f"volume=0.08[ambience]"
-        )
-        mix_inputs.append("[ambience]")
-        input_idx += 1
-
-    # Add SFX
-    for i, sfx in enumerate(sfx_tracks):
-        if "path" in sfx and Path(sfx["path"]).exists():
-            inputs.extend(["-i", sfx["path"]])
-            delay_ms = int(sfx.get("start_time", 0) * 1000)
-            volume = sfx.get("volume", 0.5)
-            filter_parts.append(
-                f"[{input_idx}:a]adelay={delay_ms}|{delay_ms},volume={volume}[sfx{i}]"
-            )
-            mix_inputs.append(f"[sfx{i}]")
-            input_idx += 1
+    """
+    Mix audio tracks with ducking. Returns the mixed file: a PCM WAV next to
+    `output_path` from the native mixer, else `output_path` itself.
+    """
+    stats = stats if stats is not None else {}
+
+    music = music_path if music_path and music_path.exists() else None
+    ambience = ambience_path if ambience_path and ambience_path.exists() else None
+    sfx = [(Path(track["path"]), track.get("start_time", 0), track.get("volume", 0.5))
+           for track in sfx_tracks if "path" in track and Path(track["path"]).exists()]
+
+    if AUDIO_MIXER == "native":
+        print(f"[AudioMix] Mixing audio tracks in process...")
+        try:
+            pcm_path = output_path.with_suffix(".wav")
+            stats.update(StreamingMixer(sample_rate=AUDIO_MIX_SAMPLE_RATE).mix(
+                voice_path, pcm_path, music=music, ambience=ambience, sfx=sfx,
+                duration=total_duration, ducking=ducking_config
+            ))
+            print(f"[AudioMix] {stats['duration_s']}s mixed in {stats['elapsed_ms']}ms")
+            return pcm_path
+        except Exception as e:
+            print(f"[AudioMix] Native mixer failed, using ffmpeg: {e}")
+            stats["native_error"] = str(e)
+
+    print(f"[AudioMix] Mixing audio tracks with ffmpeg...")
+    start = time.time()
+    paths = [voice_path]
 
-    # Final mix
-    filter_parts.append(
-        f"{''.join(mix_inputs)}amix=inputs={len(mix_inputs)}:duration=first[out]"
-    )
+    def pad(path: Path) -> str:
+        paths.append(path)
+        return f"{len(paths) - 1}:a"
 
-    filter_complex = ";".join(filter_parts)
+    # Music is ducked under the voice (sidechain); ambience looped low; SFX delayed to their start
+    filter_complex = ";".join(audio_mix_filters(
+        "0:a", pad(music) if music else None, pad(ambience) if ambience else None,
+        [(pad(path), start_time, volume) for path, start_time, volume in sfx],
+        total_duration, ducking_config, out="out"
+    ))
 
     cmd = [
         "ffmpeg", "-y",
-        *inputs,
+        *[arg for path in paths for arg in ("-i", str(path))],
         "-filter_complex", filter_complex,
         "-map", "[out]",
         "-c:a", "aac",
@@ -1044,8 +1401,10 @@ def mix_audio(
     ]
 
     result = subprocess.run(cmd, capture_output=True)
+    stats.update(engine="ffmpeg", elapsed_ms=round((time.time() - start) * 1000, 1))
     if result.returncode != 0:
         print(f"[AudioMix] Warning: {result.stderr.decode()}")
+        stats["engine"] = "voice_only"
         shutil.copy(voice_path, output_path)
 
     return output_path
@@ -1054,69 +1413,279 @@ def mix_audio(
 # CAPTION BURNING
 # ═══════════════════════════════════════════════════════════════════════════════════
 
+caption_glyphs = GlyphCache(CAPTION_GLYPH_CACHE, max_bytes=int(CAPTION_GLYPH_CACHE_MB * 1024 ** 2))
+
+@resources.bound("cpu")
 def burn_captions(
     video_path: Path,
     captions: List[Dict[str, Any]],
     caption_style: Dict[str, Any],
-    output_path: Path
+    output_path: Path,
+    engine: Optional[str] = None
 ) -> Path:
-    """Burn captions into video."""
+    """Burn captions into video (compiled .ass, falling back to drawtext filters)."""
 
     if not captions:
         shutil.copy(video_path, output_path)
         return output_path
 
-    print(f"[Captions] Burning {len(captions)} captions...")
-
-    font_size = caption_style.get("font_size", 48)
-    font_color = caption_style.get("color", "white")
-    stroke_color = caption_style.get("stroke_color", "black")
-    stroke_width = caption_style.get("stroke_width", 2)
-    position_y = caption_style.get("position_y", 0.75)
-
-    drawtext_filters = []
-    for caption in captions:
-        text = caption["text"].replace("'", "'\\''").replace(":", "\\:")
-        start_time = caption["start"]
-        end_time = caption["end"]
-
-        filter_str = (
-            f"drawtext=text='{text}':"
-            f"fontsize={font_size}:"
-            f"fontcolor={font_color}:"
-            f"borderw={stroke_width}:"
-            f"bordercolor={stroke_color}:"
-            f"x=(w-tw)/2:"
-            f"y=h*{position_y}:"
-            f"enable='between(t,{start_time},{end_time})'"
-        )
-        drawtext_filters.append(filter_str)
+    engine = engine or CAPTION_ENGINE
+    print(f"[Captions] Burning {len(captions)} captions ({engine})...")
 
-    filter_complex = ",".join(drawtext_filters)
+    filters = []
+    if engine == "ass":
+        width, height = probe_size(video_path)
+        ass_path = write_ass(captions, caption_style, width, height, output_path.with_suffix(".ass"))
+        filters.append(ass_filter(ass_path))
+    filters.append(",".join(drawtext_filters(captions, caption_style)))
 
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", str(video_path),
-        "-vf", filter_complex,
-        "-c:a", "copy",
-        str(output_path)
-    ]
+    for video_filter in filters:
+        cmd = [
+            "ffmpeg", "-y",
+            "-i", str(video_path),
+            "-vf", video_filter,
+            "-c:a", "copy",
+            str(output_path)
+        ]
+        result = subprocess.run(cmd, capture_output=True)
+        if result.returncode == 0:
+            return output_path
+        print(f"[Captions] {video_filter.split('=')[0]} failed: {result.stderr.decode()[-300:]}")
+
+    shutil.copy(video_path, output_path)
+    return output_path
+
+@resources.bound("cpu")
+def add_soft_subtitles(
+    video_path: Path,
+    captions: List[Dict[str, Any]],
+    caption_style: Dict[str, Any],
+    output_path: Path
+) -> Path:
+    """Mux captions as a subtitle track (stream copy, no re-encode). Returns the .ass file."""
+    width, height = probe_size(video_path)
+    ass_path = write_ass(captions, caption_style, width, height, output_path.with_suffix(".ass"))
+    print(f"[Captions] Muxing {len(captions)} captions as a subtitle track")
+    subprocess.run(soft_subtitle_command(video_path, ass_path, output_path), check=True, capture_output=True)
+    return ass_path
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# ONE-PASS POST GRAPH
+# ═══════════════════════════════════════════════════════════════════════════════════
 
+@resources.bound("cpu")
+def run_post_graph(graph: PostGraph, output_path: Path, preset: Dict[str, Any],
+                   encoder_args: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Run a compiled PostGraph (mix, captions, grade, grain, scale, thumbnail)
+    as one ffmpeg process encoding with the preset's settings.
+    """
+    start = time.time()
+    cmd = graph.command(
+        output_path,
+        video_args=["-c:v", "libx264", "-preset", preset["preset"], "-crf", str(preset["crf"]),
+                    "-b:v", preset["video_bitrate"], *(encoder_args or [])],
+        audio_args=["-c:a", "aac", "-b:a", preset["audio_bitrate"]],
+    )
+    print(f"[PostGraph] {' → '.join(graph.stages)} in one pass")
     result = subprocess.run(cmd, capture_output=True)
     if result.returncode != 0:
-        shutil.copy(video_path, output_path)
+        raise RuntimeError(f"ffmpeg post graph failed: {result.stderr.decode()[-2000:]}")
+    return {**graph.describe(), "processes": 1, "elapsed_ms": round((time.time() - start) * 1000, 1)}
 
-    return output_path
+# ═══════════════════════════════════════════════════════════════════════════════════
+# CROSS-JOB STAGE CACHE
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+stage_memo = StageMemo(
+    DiskCache(STAGE_CACHE_DIR, max_bytes=int(STAGE_CACHE_MAX_GB * 1024 ** 3), name="stages")
+    if STAGE_CACHE_MAX_GB > 0 else None
+)
+
+def stage_memo_params(preset: Dict[str, Any], grade_style: str = "cinematic") -> Dict[str, Dict[str, Any]]:
+    """
+    Key params of each memoized stage: only what changes its output. batch_size
+    and the final-encode fields (crf, preset, bitrates) are left out on purpose.
+    """
+    return {
+        "lipsync": {
+            "fps": preset["fps"],
+            "engine": MuseTalkEngine.version if MUSETALK_ENGINE else "script",
+            "segments": [SEGMENT_MIN_DURATION_S, SEGMENT_TARGET_S, SEGMENT_CROSSFADE_S],
+        },
+        "enhanced": {
+            "model": "GFPGANv1.4",
+            "detect_every": GFPGAN_DETECT_EVERY if GFPGAN_BATCH_SIZE > 1 else 1,
+            "delta_region": DELTA_REGION_OPTIONS if DELTA_REGION else None,
+        },
+        "upscaled": {
+            "factor": preset.get("upscale_factor", 2),
+            "temporal_smoothing": preset.get("temporal_smoothing", False),
+            "delta_region": DELTA_REGION_OPTIONS if DELTA_REGION else None,
+        },
+        "graded": {"style": grade_style, "version": ColorGradeStage.version},
+    }
+
+def lipsync_cacheable(stats: Dict[str, Any]) -> bool:
+    """Only real MuseTalk output is shared across jobs, never a wav2lip / slideshow fallback."""
+    if stats.get("mode") == "segmented":
+        return all(lipsync_cacheable(entry.get("musetalk") or {}) for entry in stats.get("segments", []))
+    return stats.get("mode") in ("engine", "script")
+
+def memoized_lipsync(
+    key: str,
+    output_path: Path,
+    render,
+    memo_report: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Lip-sync through the stage cache; `render(out, stats)` writes `out`. Returns the MuseTalk stats."""
+    musetalk_stats = {}
+
+    def produce(out: Path) -> Dict[str, Any]:
+        render(out, musetalk_stats)
+        return musetalk_stats
+
+    lookup = stage_memo.run("lipsync", key, output_path, produce, keep=lipsync_cacheable)
+    memo_report.append(lookup.to_dict())
+    return lookup.stats if lookup.cache == "hit" else musetalk_stats
+
+def memoized_step(
+    stage: str,
+    upstream_key: str,
+    params: Dict[str, Any],
+    input_video: Path,
+    output_video: Path,
+    step,
+    memo_report: List[Dict[str, Any]]
+) -> str:
+    """
+    One file-based chain step (`step(input_video, output_video)`) through the
+    stage cache. A step that fell back to copying its input is not stored.
+    Returns the step's key for the next one to chain on.
+    """
+    key = stage_memo.key(stage, upstream_key, params=params)
+
+    def produce(out: Path) -> None:
+        step(input_video, out)
+
+    lookup = stage_memo.run(stage, key, output_video, produce,
+                            keep=lambda _: differs(input_video, output_video))
+    memo_report.append(lookup.to_dict())
+    return key
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# SINGLE-PASS FRAME PIPELINE
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@resources.bound("gpu")
+@models.pin("gfpgan")
+@models.pin("realesrgan")
+def run_frame_pipeline(
+    input_video: Path,
+    output_video: Path,
+    preset: Dict[str, Any],
+    audio_path: Optional[Path] = None,
+    face_enhance: Optional[bool] = None,
+    captions: Optional[List[Dict[str, Any]]] = None,
+    caption_style: Optional[Dict[str, Any]] = None,
+    encoder_args: Optional[List[str]] = None,
+    upstream_key: Optional[str] = None,
+    memo_report: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Run enhance/upscale/captions/grade/grain as one decode and one encode.
+
+    Models that fail to load are skipped, matching the per-stage fallbacks
+    of the multi-pass chain. Returns the pipeline stats for job metadata.
+
+    With `upstream_key` (the lip-sync stage key) the leading enhance/upscale/
+    grade stages are looked up in the stage cache: a hit decodes from the
+    cached frames instead, a miss tees them into a new entry.
+
+    With DELTA_REGION the enhance/upscale stages only process the moving
+    region; the share of pixels they processed is in `stage_reports`.
+
+    With FRAME_WORKERS > 1 the trailing CPU stages (captions/grade/grain)
+    run in worker processes; their queueing stats are under "pool".
+    """
+    if face_enhance is None:
+        face_enhance = preset.get("face_enhance", True)
+
+    face_enhancer, face_detector = None, None
+    if face_enhance:
+        try:
+            face_enhancer = setup_batched_gfpgan() if GFPGAN_BATCH_SIZE > 1 else setup_gfpgan()
+            face_detector = gfpgan_face_detector(setup_gfpgan())
+        except Exception as e:
+            print(f"[FramePipeline] GFPGAN unavailable, skipping face enhancement: {e}")
+
+    upscaler = None
+    if preset.get("upscale", False):
+        try:
+            upscaler = setup_upscaler_engine()
+        except Exception as e:
+            print(f"[FramePipeline] Real-ESRGAN unavailable, skipping upscaling: {e}")
+
+    stages = build_stages(
+        preset,
+        face_enhancer=face_enhancer,
+        upscaler=upscaler,
+        captions=captions,
+        caption_style=caption_style,
+        face_enhance=face_enhance,
+        glyphs=caption_glyphs,
+        delta_region=DELTA_REGION_OPTIONS if DELTA_REGION else None,
+        face_detector=face_detector
+    )
+
+    tee, store = None, None
+    if upstream_key is not None and stage_memo.enabled:
+        plan = stage_memo.plan_pipeline(input_video, stages, upstream_key, stage_memo_params(preset))
+        input_video, stages, store = plan.input_path, plan.stages, plan.store
+        if memo_report is not None:
+            memo_report.extend(lookup.to_dict() for lookup in plan.lookups)
+        if store is not None:
+            memoized = {stage.name for stage in stages[:store[2]]}
+            entry = stage_memo.reserve()
+            tee = TeeStage(FfmpegEncoderSink(entry / "frames.mp4", crf=STAGE_CACHE_CRF, preset="veryfast"))
+            stages.insert(store[2], tee)
+
+    try:
+        stats = render_video(input_video, output_video, stages, preset,
+                             audio_path=audio_path, encoder_args=encoder_args, workers=FRAME_WORKERS)
+    except BaseException:
+        if tee is not None:
+            tee.sink.abort()
+            stage_memo.discard(entry)
+        raise
+
+    if tee is not None:
+        try:
+            tee.sink.close()
+            # What a later hit saves: the memoized stages ahead of the tee
+            produced_s = sum(stats.stage_seconds.get(name, 0.0) for name in memoized)
+            lookup = stage_memo.commit(store[0], store[1], entry, "frames.mp4", produced_s,
+                                       stats={"frames": stats.frames})
+            if memo_report is not None:
+                memo_report.append(lookup.to_dict())
+        except Exception as e:
+            stage_memo.discard(entry)
+            print(f"[StageCache] Not storing {store[0]}: {e}")
+    return stats.to_dict()
 
 # ═══════════════════════════════════════════════════════════════════════════════════
 # JOB HANDLERS
 # ═══════════════════════════════════════════════════════════════════════════════════
 
-def handle_lipsync_only(job_input: Dict[str, Any]) -> JobResult:
+def handle_lipsync_only(job_input: Dict[str, Any], progress=None) -> JobResult:
     """
     Handle lip-sync only job - the most common operation.
     Input: image + audio -> Output: talking video
 
+    Streaming jobs (realtime by default) publish an HLS playlist of the
+    lip-sync render right after the inputs arrive and report it through
+    `progress({"playlist": url})`; the finished video follows as usual.
+
     Supports Pixar-quality output with:
     - Real-ESRGAN upscaling (2x or 4x)
     - GFPGAN face enhancement
@@ -1146,81 +1715,151 @@ def handle_lipsync_only(job_input: Dict[str, Any]) -> JobResult:
         # Download/decode inputs
         image_path = tmpdir / "input.png"
         audio_path = tmpdir / "input.mp3"
-        lipsync_output = tmpdir / "lipsync.mp4"
         enhanced_output = tmpdir / "enhanced.mp4"
         upscaled_output = tmpdir / "upscaled.mp4"
         graded_output = tmpdir / "graded.mp4"
         final_output = tmpdir / "output.mp4"
 
-        if image_data.startswith("http"):
-            download_file(image_data, image_path)
-        else:
-            decode_base64_to_file(image_data, image_path)
+        inputs_report = fetch_inputs({
+            "image": (image_data, image_path),
+            "audio": (audio_data, audio_path),
+        })
 
-        if audio_data.startswith("http"):
-            download_file(audio_data, audio_path)
-        else:
-            decode_base64_to_file(audio_data, audio_path)
+        # Stage outputs are checkpointed under JOB_CHECKPOINT_DIR; a retry resumes after the last finished one
+        ckpt = checkpoints.job(job_id, inputs={"image": image_path, "audio": audio_path},
+                               params={"quality": quality, "face_enhance": face_enhance})
+        remote_key = f"videos/{job_id}/output.mp4"
+        video_upload = None
+
+        # Near-duplicate jobs (same image + audio) share stage outputs through the stage cache
+        memo_params = stage_memo_params(preset)
+        lipsync_key = stage_memo.key("lipsync", image_path, audio_path, params=memo_params["lipsync"])
+        memo_report = []
+
+        # Playable while rendering: playlist URL goes out before the first frame
+        stream = None
+        if job_input.get("stream", quality == "realtime" and REALTIME_STREAM):
+            stream = open_stream(job_id, audio_path, tmpdir / "stream")
+            playlist_url = stream.start()
+            print(f"[LipSync] Streaming to {playlist_url}")
+            if progress is not None:
+                progress({"playlist": playlist_url, "segment_s": STREAM_SEGMENT_S})
 
         # Step 1: Run REAL lip-sync
-        print(f"[LipSync] Step 1/5: MuseTalk lip-sync")
-        run_musetalk_inference(image_path, audio_path, lipsync_output, quality)
-        current_output = lipsync_output
-
-        # Step 2: Apply face enhancement (GFPGAN)
-        if face_enhance:
-            print(f"[LipSync] Step 2/5: GFPGAN face enhancement")
-            enhance_face_in_video(current_output, enhanced_output)
-            current_output = enhanced_output
-        else:
-            print(f"[LipSync] Step 2/5: Skipping face enhancement")
-
-        # Step 3: Apply Real-ESRGAN upscaling (Pixar/Cinema only)
-        if preset.get("upscale", False):
-            print(f"[LipSync] Step 3/5: Real-ESRGAN {preset['upscale_factor']}x upscaling")
-            upscale_video_realesrgan(
-                current_output,
-                upscaled_output,
-                scale=preset["upscale_factor"],
-                apply_temporal_smoothing=preset.get("temporal_smoothing", False)
+        def lipsync_stage(lipsync_output: Path) -> Dict[str, Any]:
+            print(f"[LipSync] Step 1/5: MuseTalk lip-sync")
+            return memoized_lipsync(
+                lipsync_key, lipsync_output,
+                lambda out, stats: run_lipsync(image_path, audio_path, out, quality, tmpdir, stats,
+                                               stream=stream),
+                memo_report
             )
-            current_output = upscaled_output
-        else:
-            print(f"[LipSync] Step 3/5: Skipping upscaling")
-
-        # Step 4: Apply color grading (Pixar/Cinema only)
-        if preset.get("color_grading", False):
-            print(f"[LipSync] Step 4/5: Cinematic color grading")
-            apply_color_grading(current_output, graded_output, style="cinematic")
-            current_output = graded_output
-        else:
-            print(f"[LipSync] Step 4/5: Skipping color grading")
-
-        # Step 5: Add film grain (Cinema only)
-        if preset.get("film_grain", 0) > 0:
-            print(f"[LipSync] Step 5/5: Adding film grain")
-            add_film_grain(current_output, final_output, intensity=preset["film_grain"])
-        else:
-            print(f"[LipSync] Step 5/5: No film grain")
-            shutil.copy(current_output, final_output)
 
-        # Final encode with preset quality settings
-        final_encoded = tmpdir / "final_encoded.mp4"
-        subprocess.run([
-            "ffmpeg", "-y",
-            "-i", str(final_output),
-            "-c:v", "libx264",
-            "-crf", str(preset["crf"]),
-            "-preset", preset["preset"],
-            "-b:v", preset["video_bitrate"],
-            "-c:a", "aac",
-            "-b:a", preset["audio_bitrate"],
-            str(final_encoded)
-        ], check=True, capture_output=True)
-
-        # Upload result
-        remote_key = f"videos/{job_id}/output.mp4"
-        video_url = upload_to_r2(final_encoded, remote_key)
+        try:
+            lipsync = ckpt.stage("lipsync", lipsync_stage, filename="lipsync.mp4")
+            stream_report = finish_stream(stream, lipsync.path()) if stream is not None else None
+        except BaseException:
+            if stream is not None:
+                stream.abort()
+            raise
+
+        # Steps 2-5: one decode → enhance/upscale/grade/grain → one encode
+        def render_stage(final_encoded: Path) -> Optional[Dict[str, Any]]:
+            nonlocal video_upload
+            lipsync_output = lipsync.path()
+            current_output = lipsync_output
+            pipeline_stats = None
+            if job_input.get("frame_pipeline", True):
+                try:
+                    print(f"[LipSync] Steps 2-5/5: Single-pass frame pipeline")
+                    video_upload = stream_output(final_encoded, remote_key)
+                    pipeline_stats = run_frame_pipeline(
+                        lipsync_output, final_encoded, preset,
+                        audio_path=audio_path,
+                        face_enhance=face_enhance,
+                        encoder_args=FRAGMENTED_MP4_ARGS if video_upload else None,
+                        upstream_key=lipsync_key,
+                        memo_report=memo_report
+                    )
+                except Exception as e:
+                    if video_upload:
+                        video_upload.abort()
+                        video_upload = None
+                    print(f"[LipSync] Frame pipeline failed, using multi-pass chain: {e}")
+
+            if pipeline_stats is None:
+                step_key = lipsync_key
+
+                # Step 2: Apply face enhancement (GFPGAN)
+                if face_enhance:
+                    print(f"[LipSync] Step 2/5: GFPGAN face enhancement")
+                    step_key = memoized_step("enhanced", step_key, memo_params["enhanced"],
+                                             current_output, enhanced_output, enhance_face_in_video,
+                                             memo_report)
+                    current_output = enhanced_output
+                else:
+                    print(f"[LipSync] Step 2/5: Skipping face enhancement")
+
+                # Step 3: Apply Real-ESRGAN upscaling (Pixar/Cinema only)
+                if preset.get("upscale", False):
+                    print(f"[LipSync] Step 3/5: Real-ESRGAN {preset['upscale_factor']}x upscaling")
+                    step_key = memoized_step(
+                        "upscaled", step_key, memo_params["upscaled"], current_output, upscaled_output,
+                        lambda src, dst: upscale_video_realesrgan(
+                            src, dst,
+                            scale=preset["upscale_factor"],
+                            apply_temporal_smoothing=preset.get("temporal_smoothing", False)
+                        ),
+                        memo_report
+                    )
+                    current_output = upscaled_output
+                else:
+                    print(f"[LipSync] Step 3/5: Skipping upscaling")
+
+                # Step 4: Apply color grading (Pixar/Cinema only)
+                if preset.get("color_grading", False):
+                    print(f"[LipSync] Step 4/5: Cinematic color grading")
+                    memoized_step("graded", step_key, memo_params["graded"], current_output, graded_output,
+                                  lambda src, dst: apply_color_grading(src, dst, style="cinematic"),
+                                  memo_report)
+                    current_output = graded_output
+                else:
+                    print(f"[LipSync] Step 4/5: Skipping color grading")
+
+                # Step 5: Add film grain (Cinema only)
+                if preset.get("film_grain", 0) > 0:
+                    print(f"[LipSync] Step 5/5: Adding film grain")
+                    add_film_grain(current_output, final_output, intensity=preset["film_grain"])
+                else:
+                    print(f"[LipSync] Step 5/5: No film grain")
+                    shutil.copy(current_output, final_output)
+
+                # Final encode with preset quality settings
+                with resources.use("cpu"):
+                    subprocess.run([
+                        "ffmpeg", "-y",
+                        "-i", str(final_output),
+                        "-c:v", "libx264",
+                        "-crf", str(preset["crf"]),
+                        "-preset", preset["preset"],
+                        "-b:v", preset["video_bitrate"],
+                        "-c:a", "aac",
+                        "-b:a", preset["audio_bitrate"],
+                        str(final_encoded)
+                    ], check=True, capture_output=True)
+            return pipeline_stats
+
+        render = ckpt.stage("render", render_stage, params={"frame_pipeline": job_input.get("frame_pipeline", True)},
+                            after=[lipsync])
+        final_encoded = render.path()
+        pipeline_stats, musetalk_stats = render.stats, lipsync.stats
+
+        # Upload result (already streaming if the frame pipeline wrote it)
+        upload_stats = []
+        video_url = finish_upload(video_upload, final_encoded, remote_key, upload_stats)
+        checkpoint_report = ckpt.report()
+        if not JOB_CHECKPOINT_KEEP_COMPLETED:
+            ckpt.discard()
 
         duration_ms = int((time.time() - start) * 1000)
 
@@ -1228,9 +1867,13 @@ def handle_lipsync_only(job_input: Dict[str, Any]) -> JobResult:
         print(f"[LipSync] Completed in {duration_ms}ms")
         print(f"[LipSync] Output: {video_url}")
 
+        output_urls = {"video": video_url}
+        if stream_report is not None:
+            output_urls["playlist"] = stream_report["playlist"]
+
         return JobResult(
             success=True,
-            output_urls={"video": video_url},
+            output_urls=output_urls,
             metadata={
                 "quality": quality,
                 "preset": preset,
@@ -1238,6 +1881,13 @@ def handle_lipsync_only(job_input: Dict[str, Any]) -> JobResult:
                 "upscaled": preset.get("upscale", False),
                 "upscale_factor": preset.get("upscale_factor", 1),
                 "color_graded": preset.get("color_grading", False),
+                "musetalk": musetalk_stats,
+                "frame_pipeline": pipeline_stats,
+                "uploads": upload_stats,
+                "inputs": inputs_report,
+                "checkpoints": checkpoint_report,
+                "stage_cache": memo_report,
+                "stream": stream_report,
                 "job_id": job_id,
                 "processing_ms": duration_ms
             },
@@ -1278,152 +1928,286 @@ def handle_video_render(job_input: Dict[str, Any]) -> JobResult:
         image_path = tmpdir / "image.png"
         voice_path = tmpdir / "voice.mp3"
 
-        if image_data.startswith("http"):
-            download_file(image_data, image_path)
-        else:
-            decode_base64_to_file(image_data, image_path)
-
-        if audio_data.startswith("http"):
-            download_file(audio_data, voice_path)
-        else:
-            decode_base64_to_file(audio_data, voice_path)
+        inputs = {
+            "image": (image_data, image_path),
+            "voice": (audio_data, voice_path),
+        }
 
         # Optional: music and ambience
         music_path = None
         if job_input.get("music_url"):
             music_path = tmpdir / "music.mp3"
-            download_file(job_input["music_url"], music_path)
+            inputs["music"] = (job_input["music_url"], music_path)
 
         ambience_path = None
         if job_input.get("ambience_url"):
             ambience_path = tmpdir / "ambience.mp3"
-            download_file(job_input["ambience_url"], ambience_path)
+            inputs["ambience"] = (job_input["ambience_url"], ambience_path)
 
         # SFX tracks
         sfx_tracks = []
         for i, sfx in enumerate(job_input.get("sfx_tracks", [])):
             sfx_path = tmpdir / f"sfx_{i}.mp3"
-            download_file(sfx["url"], sfx_path)
+            inputs[f"sfx_{i}"] = (sfx["url"], sfx_path)
             sfx_tracks.append({
                 "path": str(sfx_path),
                 "start_time": sfx.get("start_time", 0),
                 "volume": sfx.get("volume", 0.5)
             })
 
-        # Step 1: Generate lip-synced video
-        print(f"[VideoRender] Step 1/7: MuseTalk lip-sync")
-        lipsync_output = tmpdir / "lipsync.mp4"
-        run_musetalk_inference(image_path, voice_path, lipsync_output, quality)
-        current_video = lipsync_output
-
-        # Step 2: Face enhancement (GFPGAN)
-        print(f"[VideoRender] Step 2/7: GFPGAN face enhancement")
-        enhanced_output = tmpdir / "enhanced.mp4"
-        if preset.get("face_enhance", True):
-            enhance_face_in_video(current_video, enhanced_output)
-            current_video = enhanced_output
-        else:
-            print(f"[VideoRender] Skipping face enhancement")
-
-        # Step 3: Real-ESRGAN upscaling (Pixar/Cinema only)
-        upscaled_output = tmpdir / "upscaled.mp4"
-        if preset.get("upscale", False):
-            print(f"[VideoRender] Step 3/7: Real-ESRGAN {preset['upscale_factor']}x upscaling")
-            upscale_video_realesrgan(
-                current_video,
-                upscaled_output,
-                scale=preset["upscale_factor"],
-                apply_temporal_smoothing=preset.get("temporal_smoothing", False)
-            )
-            current_video = upscaled_output
-        else:
-            print(f"[VideoRender] Step 3/7: Skipping upscaling")
-
-        # Step 4: Mix audio
-        print(f"[VideoRender] Step 4/7: Audio mixing with ducking")
-        mixed_audio = tmpdir / "mixed.aac"
+        # All inputs at once, through the input cache
+        inputs_report = fetch_inputs(inputs)
 
         # Get voice duration
-        result = subprocess.run([
-            "ffprobe", "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(voice_path)
-        ], capture_output=True, text=True)
-        total_duration = float(result.stdout.strip() or 10)
+        total_duration = probe_duration(voice_path)
 
+        captions = job_input.get("captions", [])
+        caption_style = job_input.get("caption_style", {})
+        format_spec = job_input.get("format", {"width": 1080, "height": 1920, "fps": 30})
         ducking_config = job_input.get("ducking_config", {
             "base_volume": 0.15,
             "attack_ms": 50,
             "release_ms": 300
         })
+        # "soft": captions become a subtitle track of the final mp4 instead of being burned in
+        soft_captions = bool(captions) and job_input.get("caption_mode", "burn") == "soft"
+        burned_captions = [] if soft_captions else captions
+        # An explicit `format` is applied by whichever path does the final encode (same scale_filter)
+        format_args = (["-vf", scale_filter(format_spec["width"], format_spec["height"], format_spec.get("fps"))]
+                       if "format" in job_input else [])
+        video_key = f"videos/{job_id}/final.mp4"
+        video_upload = None
+        thumbnail_path = tmpdir / "thumbnail.jpg"
+        post_report = None
+        mix_report = {}
+
+        # Stage outputs are checkpointed under JOB_CHECKPOINT_DIR; a retry resumes after the last finished one
+        ckpt = checkpoints.job(
+            job_id,
+            inputs={"image": image_path, "voice": voice_path, "music": music_path, "ambience": ambience_path,
+                    **{f"sfx_{i}": Path(sfx["path"]) for i, sfx in enumerate(sfx_tracks)}},
+            params={"quality": quality, "captions": captions, "caption_style": caption_style,
+                    "ducking": ducking_config, "format": format_spec,
+                    "sfx": [(sfx["start_time"], sfx["volume"]) for sfx in sfx_tracks]}
+        )
 
-        mix_audio(voice_path, music_path, ambience_path, sfx_tracks,
-                  mixed_audio, total_duration, ducking_config)
-
-        # Step 5: Burn captions
-        captions = job_input.get("captions", [])
-        caption_style = job_input.get("caption_style", {})
-        captioned_output = tmpdir / "captioned.mp4"
-
-        if captions:
-            print(f"[VideoRender] Step 5/7: Burning {len(captions)} captions")
-            burn_captions(current_video, captions, caption_style, captioned_output)
-            current_video = captioned_output
-        else:
-            print(f"[VideoRender] Step 5/7: No captions to burn")
-
-        # Step 6: Color grading (Pixar/Cinema only)
-        graded_output = tmpdir / "graded.mp4"
-        if preset.get("color_grading", False):
-            print(f"[VideoRender] Step 6/7: Cinematic color grading")
-            apply_color_grading(current_video, graded_output, style="cinematic")
-            current_video = graded_output
-        else:
-            print(f"[VideoRender] Step 6/7: Skipping color grading")
-
-        # Step 7: Film grain + Final encode
-        print(f"[VideoRender] Step 7/7: Final encode with preset quality")
-        format_spec = job_input.get("format", {"width": 1080, "height": 1920, "fps": 30})
-        final_output = tmpdir / "final.mp4"
-
-        # Add film grain if requested (Cinema quality)
-        if preset.get("film_grain", 0) > 0:
-            grain_output = tmpdir / "grain.mp4"
-            add_film_grain(current_video, grain_output, intensity=preset["film_grain"])
-            current_video = grain_output
-
-        # Final encode with quality preset settings
-        subprocess.run([
-            "ffmpeg", "-y",
-            "-i", str(current_video),
-            "-i", str(mixed_audio),
-            "-c:v", "libx264",
-            "-preset", preset["preset"],
-            "-crf", str(preset["crf"]),
-            "-b:v", preset["video_bitrate"],
-            "-c:a", "aac",
-            "-b:a", preset["audio_bitrate"],
-            "-map", "0:v",
-            "-map", "1:a",
-            "-shortest",
-            str(final_output)
-        ], check=True, capture_output=True)
+        # The same image + voice under another caption style or music bed reuses the stage cache
+        memo_params = stage_memo_params(preset)
+        lipsync_key = stage_memo.key("lipsync", image_path, voice_path, params=memo_params["lipsync"])
+        memo_report = []
+
+        # Step 1: Generate lip-synced video (segmented and parallel for long voice tracks)
+        def lipsync_stage(lipsync_output: Path) -> Dict[str, Any]:
+            print(f"[VideoRender] Step 1/7: MuseTalk lip-sync")
+            return memoized_lipsync(
+                lipsync_key, lipsync_output,
+                lambda out, stats: run_lipsync(image_path, voice_path, out, quality, tmpdir, stats,
+                                               duration=total_duration),
+                memo_report
+            )
 
-        # Generate thumbnail
-        thumbnail_path = tmpdir / "thumbnail.jpg"
-        subprocess.run([
-            "ffmpeg", "-y",
-            "-i", str(final_output),
-            "-ss", "0",
-            "-vframes", "1",
-            "-q:v", "2",
-            str(thumbnail_path)
-        ], capture_output=True)
+        lipsync = ckpt.stage("lipsync", lipsync_stage, filename="lipsync.mp4")
+
+        # Steps 2-7: mix, then one decode → enhance/upscale/captions/grade/grain → one encode
+        def render_stage(final_output: Path) -> Optional[Dict[str, Any]]:
+            if soft_captions:
+                # Encode without captions, then mux the track into final_output (stream copy)
+                encoded = tmpdir / "uncaptioned.mp4"
+                stats = encode_stage(encoded)
+                add_soft_subtitles(encoded, captions, caption_style, final_output)
+                return stats
+            return encode_stage(final_output)
+
+        def encode_stage(final_output: Path) -> Optional[Dict[str, Any]]:
+            nonlocal video_upload, post_report
+            lipsync_output = lipsync.path()
+            current_video = lipsync_output
+            mixed_audio = None
+
+            def mix() -> Path:
+                print(f"[VideoRender] Step 2/7: Audio mixing with ducking")
+                return mix_audio(voice_path, music_path, ambience_path, sfx_tracks,
+                                 tmpdir / "mixed.aac", total_duration, ducking_config, stats=mix_report)
+
+            pipeline_stats = None
+            if job_input.get("frame_pipeline", True):
+                # Step 2: Mix audio (first, so the single-pass encode can mux it directly)
+                mixed_audio = mix()
+                try:
+                    print(f"[VideoRender] Steps 3-7/7: Single-pass frame pipeline")
+                    video_upload = stream_output(final_output, video_key) if not soft_captions else None
+                    pipeline_stats = run_frame_pipeline(
+                        lipsync_output, final_output, preset,
+                        audio_path=mixed_audio,
+                        captions=burned_captions,
+                        caption_style=caption_style,
+                        encoder_args=format_args + (FRAGMENTED_MP4_ARGS if video_upload else []),
+                        upstream_key=lipsync_key,
+                        memo_report=memo_report
+                    )
+                except Exception as e:
+                    if video_upload:
+                        video_upload.abort()
+                        video_upload = None
+                    print(f"[VideoRender] Frame pipeline failed, using multi-pass chain: {e}")
+
+            if pipeline_stats is None:
+                step_key = lipsync_key
+
+                # Step 3: Face enhancement (GFPGAN)
+                print(f"[VideoRender] Step 3/7: GFPGAN face enhancement")
+                enhanced_output = tmpdir / "enhanced.mp4"
+                if preset.get("face_enhance", True):
+                    step_key = memoized_step("enhanced", step_key, memo_params["enhanced"],
+                                             current_video, enhanced_output, enhance_face_in_video,
+                                             memo_report)
+                    current_video = enhanced_output
+                else:
+                    print(f"[VideoRender] Skipping face enhancement")
+
+                # Step 4: Real-ESRGAN upscaling (Pixar/Cinema only)
+                upscaled_output = tmpdir / "upscaled.mp4"
+                if preset.get("upscale", False):
+                    print(f"[VideoRender] Step 4/7: Real-ESRGAN {preset['upscale_factor']}x upscaling")
+                    step_key = memoized_step(
+                        "upscaled", step_key, memo_params["upscaled"], current_video, upscaled_output,
+                        lambda src, dst: upscale_video_realesrgan(
+                            src, dst,
+                            scale=preset["upscale_factor"],
+                            apply_temporal_smoothing=preset.get("temporal_smoothing", False)
+                        ),
+                        memo_report
+                    )
+                    current_video = upscaled_output
+                else:
+                    print(f"[VideoRender] Step 4/7: Skipping upscaling")
+
+                # Steps 2, 5-7: mix + captions + grade + grain + format + thumbnail, one ffmpeg run
+                if job_input.get("post_graph", True):
+                    graph = PostGraph(current_video)
+                    if AUDIO_MIXER == "native":
+                        mixed_audio = mixed_audio or mix()
+                        graph.audio(mixed_audio)
+                    else:
+                        graph.mix(
+                            voice_path,
+                            music=music_path if music_path and music_path.exists() else None,
+                            ambience=ambience_path if ambience_path and ambience_path.exists() else None,
+                            sfx=[(Path(sfx["path"]), sfx["start_time"], sfx["volume"])
+                                 for sfx in sfx_tracks if Path(sfx["path"]).exists()],
+                            duration=total_duration,
+                            ducking=ducking_config
+                        )
+                        mix_report["engine"] = "post_graph"
+                    if burned_captions and CAPTION_ENGINE == "ass":
+                        graph.subtitles(write_ass(burned_captions, caption_style, *probe_size(current_video),
+                                                  tmpdir / "captions.ass"))
+                    else:
+                        graph.captions(burned_captions, caption_style)
+                    if preset.get("color_grading", False):
+                        graph.grade("cinematic")
+                    graph.grain(preset.get("film_grain", 0))
+                    if "format" in job_input:
+                        graph.scale(format_spec["width"], format_spec["height"], format_spec.get("fps"))
+                    graph.thumbnail(thumbnail_path)
+                    try:
+                        print(f"[VideoRender] Steps 2, 5-7/7: One-pass post graph")
+                        video_upload = stream_output(final_output, video_key) if not soft_captions else None
+                        post_report = run_post_graph(graph, final_output, preset,
+                                                     encoder_args=FRAGMENTED_MP4_ARGS if video_upload else None)
+                        return pipeline_stats
+                    except Exception as e:
+                        if video_upload:
+                            video_upload.abort()
+                            video_upload = None
+                        thumbnail_path.unlink(missing_ok=True)
+                        print(f"[VideoRender] Post graph failed, using one process per step: {e}")
+
+                # Step 2: Mix audio (unless the frame pipeline or post graph already did)
+                mixed_audio = mixed_audio or mix()
+
+                # Step 5: Burn captions
+                captioned_output = tmpdir / "captioned.mp4"
+                if burned_captions:
+                    print(f"[VideoRender] Step 5/7: Burning {len(captions)} captions")
+                    burn_captions(current_video, captions, caption_style, captioned_output)
+                    current_video = captioned_output
+                    # Captions are cheap and per-job: not stored, but they key the grade below
+                    step_key = stage_memo.key("captioned", step_key,
+                                              params={"captions": captions, "style": caption_style})
+                else:
+                    print(f"[VideoRender] Step 5/7: No captions to burn")
+
+                # Step 6: Color grading (Pixar/Cinema only)
+                graded_output = tmpdir / "graded.mp4"
+                if preset.get("color_grading", False):
+                    print(f"[VideoRender] Step 6/7: Cinematic color grading")
+                    memoized_step("graded", step_key, memo_params["graded"], current_video, graded_output,
+                                  lambda src, dst: apply_color_grading(src, dst, style="cinematic"),
+                                  memo_report)
+                    current_video = graded_output
+                else:
+                    print(f"[VideoRender] Step 6/7: Skipping color grading")
+
+                # Step 7: Film grain + Final encode
+                print(f"[VideoRender] Step 7/7: Final encode with preset quality")
+
+                # Add film grain if requested (Cinema quality)
+                if preset.get("film_grain", 0) > 0:
+                    grain_output = tmpdir / "grain.mp4"
+                    add_film_grain(current_video, grain_output, intensity=preset["film_grain"])
+                    current_video = grain_output
+
+                # Final encode with quality preset settings
+                with resources.use("cpu"):
+                    subprocess.run([
+                        "ffmpeg", "-y",
+                        "-i", str(current_video),
+                        "-i", str(mixed_audio),
+                        *format_args,
+                        "-c:v", "libx264",
+                        "-preset", preset["preset"],
+                        "-crf", str(preset["crf"]),
+                        "-b:v", preset["video_bitrate"],
+                        "-c:a", "aac",
+                        "-b:a", preset["audio_bitrate"],
+                        "-map", "0:v",
+                        "-map", "1:a",
+                        "-shortest",
+                        str(final_output)
+                    ], check=True, capture_output=True)
+            return pipeline_stats
+
+        render = ckpt.stage("render", render_stage, filename="final.mp4",
+                            params={"frame_pipeline": job_input.get("frame_pipeline", True),
+                                    "caption_mode": "soft" if soft_captions else "burn"},
+                            after=[lipsync])
+        final_output = render.path()
+        pipeline_stats, musetalk_stats = render.stats, lipsync.stats
+
+        # Start the video upload (unless it is already streaming) so it overlaps the thumbnail
+        if video_upload is None:
+            video_upload = start_upload(final_output, video_key)
+
+        # Generate thumbnail (unless the post graph already wrote it)
+        if not thumbnail_path.exists():
+            with resources.use("cpu"):
+                subprocess.run([
+                    "ffmpeg", "-y",
+                    "-i", str(final_output),
+                    "-ss", "0",
+                    "-vframes", "1",
+                    "-q:v", "2",
+                    str(thumbnail_path)
+                ], capture_output=True)
 
         # Upload results
-        video_url = upload_to_r2(final_output, f"videos/{job_id}/final.mp4")
-        thumbnail_url = upload_to_r2(thumbnail_path, f"videos/{job_id}/thumbnail.jpg")
+        upload_stats = []
+        thumbnail_url = upload_output(thumbnail_path, f"videos/{job_id}/thumbnail.jpg", upload_stats)
+        video_url = finish_upload(video_upload, final_output, video_key, upload_stats)
+        checkpoint_report = ckpt.report()
+        if not JOB_CHECKPOINT_KEEP_COMPLETED:
+            ckpt.discard()
 
         duration_ms = int((time.time() - start) * 1000)
 
@@ -1446,13 +2230,26 @@ def handle_video_render(job_input: Dict[str, Any]) -> JobResult:
                 "color_graded": preset.get("color_grading", False),
                 "duration": total_duration,
                 "format": format_spec,
+                "musetalk": musetalk_stats,
+                "frame_pipeline": pipeline_stats,
+                "post_graph": post_report,
+                "audio_mix": mix_report,
+                "captions": {"count": len(captions), "mode": "soft" if soft_captions else "burn",
+                             "engine": CAPTION_ENGINE, "glyph_cache": caption_glyphs.stats()},
+                "uploads": upload_stats,
+                "inputs": inputs_report,
+                "checkpoints": checkpoint_report,
+                "stage_cache": memo_report,
                 "processing_ms": duration_ms
             },
             duration_ms=duration_ms
         )
 
 def handle_persona_build(job_input: Dict[str, Any]) -> JobResult:
-    """Build persona base takes."""
+    """
+    Build persona base takes: the primary image is decoded once, takes render
+    PERSONA_TAKE_WORKERS at a time and upload while the rest still render.
+    """
     start = time.time()
 
     persona_id = job_input.get("persona_id")
@@ -1463,45 +2260,70 @@ def handle_persona_build(job_input: Dict[str, Any]) -> JobResult:
 
         # Download primary image
         image_path = tmpdir / "primary.png"
-        if primary_image.startswith("http"):
-            download_file(primary_image, image_path)
-        else:
-            decode_base64_to_file(primary_image, image_path)
+        inputs_report = fetch_inputs({"primary_image": (primary_image, image_path)})
+
+        # Decode once for every take
+        import cv2
+        image = cv2.imread(str(image_path))
+        if image is None:
+            raise ValueError("primary_image is not a readable image")
+        height, width = image.shape[:2]
+
+        # Populate the avatar cache so this persona's first lip-sync job skips preparation
+        avatar = None
+        eye_box = None
+        with models.acquire("musetalk") as engine:
+            if engine is not None:
+                try:
+                    with resources.use("gpu"):
+                        prep, lookup = prepare_avatar(engine, image_path)
+                    avatar = lookup.to_dict()
+                    # Blinks follow the face landmarks when MuseTalk found them
+                    eye_box = eye_box_from_landmarks(prep.landmarks[0], width, height)
+                except Exception as e:
+                    print(f"[PersonaBuild] Avatar preparation failed: {e}")
+                    avatar = {"error": str(e)}
 
         # Generate idle takes
         takes_to_generate = job_input.get("takes_to_generate", [
             {"emotion": "neutral", "angle": "front"},
         ])
 
-        base_takes = []
-        for i, take_spec in enumerate(takes_to_generate):
-            take_id = f"{persona_id}_take_{i}"
-            take_output = tmpdir / f"take_{i}.mp4"
+        upload_stats = []
 
-            # Generate short idle video (5 seconds)
-            subprocess.run([
-                "ffmpeg", "-y",
-                "-loop", "1",
-                "-i", str(image_path),
-                "-c:v", "libx264",
-                "-t", "5",
-                "-pix_fmt", "yuv420p",
-                "-r", "30",
-                str(take_output)
-            ], check=True, capture_output=True)
-
-            video_url = upload_to_r2(
-                take_output,
-                f"personas/{persona_id}/takes/{take_id}.mp4"
-            )
-
-            base_takes.append({
-                "id": take_id,
+        def render_take(i: int, take_spec: Dict[str, Any], timings: Dict[str, float]):
+            take_output = tmpdir / f"take_{i}.mp4"
+            remote_key = f"personas/{persona_id}/takes/{persona_id}_take_{i}.mp4"
+            idle_stats = {}
+
+            # Seamless idle loop (breathing, blinks, head sway), cached per image + emotion
+            with resources.use("cpu"):
+                t0 = time.time()
+                generate_idle_animation(image_path, take_output, duration=take_spec.get("duration", 5),
+                                        expression=take_spec.get("emotion", "neutral"),
+                                        image=image, eye_box=eye_box, stats=idle_stats)
+                timings["render_ms"] = round((time.time() - t0) * 1000, 1)
+
+            # Uploads overlap the rendering of the remaining takes
+            return take_output, remote_key, start_upload(take_output, remote_key), idle_stats
+
+        def finish_take(i: int, take_spec: Dict[str, Any], rendered, timings: Dict[str, float]) -> Dict[str, Any]:
+            take_output, remote_key, upload, idle_stats = rendered
+            video_url = finish_upload(upload, take_output, remote_key, upload_stats)
+            timings["upload_ms"] = round(upload_stats[-1]["elapsed_s"] * 1000, 1)
+            return {
+                "id": f"{persona_id}_take_{i}",
                 "emotion": take_spec.get("emotion", "neutral"),
                 "angle": take_spec.get("angle", "front"),
                 "video_url": video_url,
-                "duration": 5
-            })
+                "duration": take_spec.get("duration", 5),
+                "idle": idle_stats,
+            }
+
+        base_takes, take_pipeline = render_takes(takes_to_generate, render_take, finish_take,
+                                                 workers=PERSONA_TAKE_WORKERS)
+        print(f"[PersonaBuild] {take_pipeline['takes']} takes ready in {take_pipeline['wall_ms']:.0f}ms, "
+              f"{take_pipeline['workers']} at a time ({take_pipeline['speedup']}x vs one at a time)")
 
         duration_ms = int((time.time() - start) * 1000)
 
@@ -1510,7 +2332,11 @@ def handle_persona_build(job_input: Dict[str, Any]) -> JobResult:
             output_urls={},
             metadata={
                 "persona_id": persona_id,
-                "base_takes": base_takes
+                "base_takes": base_takes,
+                "take_pipeline": take_pipeline,
+                "uploads": upload_stats,
+                "avatar": avatar,
+                "inputs": inputs_report
             },
             duration_ms=duration_ms
         )
@@ -1523,20 +2349,37 @@ def handler(job: Dict[str, Any]) -> Dict[str, Any]:
     """Main RunPod handler."""
     job_input = job.get("input", {})
     job_type = job_input.get("job_type", "lipsync_only")
+    if not job_input.get("job_id") and job.get("id"):
+        # RunPod keeps the id across retries, so checkpoints of a failed attempt are found again
+        job_input = {**job_input, "job_id": job["id"]}
 
     print(f"\n[Studio] ═══════════════════════════════════════════")
     print(f"[Studio] Job Type: {job_type}")
     print(f"[Studio] Input Keys: {list(job_input.keys())}")
 
     try:
-        if job_type in [JobType.LIPSYNC_ONLY, "lipsync_only"]:
-            result = handle_lipsync_only(job_input)
-        elif job_type in [JobType.VIDEO_RENDER, "video_render"]:
-            result = handle_video_render(job_input)
-        elif job_type in [JobType.PERSONA_BUILD, "persona_build"]:
-            result = handle_persona_build(job_input)
-        else:
-            raise ValueError(f"Unknown job type: {job_type}")
+        with PeakRssMonitor() as rss, resources.track() as resource_usage:
+            if job_type in [JobType.LIPSYNC_ONLY, "lipsync_only"]:
+                result = handle_lipsync_only(
+                    job_input, progress=lambda data: runpod.serverless.progress_update(job, data))
+            elif job_type in [JobType.VIDEO_RENDER, "video_render"]:
+                result = handle_video_render(job_input)
+            elif job_type in [JobType.PERSONA_BUILD, "persona_build"]:
+                result = handle_persona_build(job_input)
+            else:
+                raise ValueError(f"Unknown job type: {job_type}")
+
+        print(f"[Studio] Peak RSS: {rss.to_dict()['peak_rss_mb']} MB ({rss.method})")
+        result.metadata["memory"] = rss.to_dict()
+        result.metadata["resources"] = resource_usage
+        result.metadata["executor"] = executor.stats()
+        result.metadata["model_registry"] = models.stats()
+        result.metadata["avatar_cache"] = avatars.stats()
+        result.metadata["audio_feature_cache"] = audio_features.stats()
+        result.metadata["idle_cache"] = idle_engine.stats()
+        result.metadata["stage_cache_totals"] = stage_memo.stats()
+        result.metadata["realtime_batcher"] = realtime_batcher.stats()
+        result.metadata["cold_start"] = cold_start.report()
 
         return {
             "success": result.success,
@@ -1554,6 +2397,9 @@ def handler(job: Dict[str, Any]) -> Dict[str, Any]:
             "traceback": traceback.format_exc()
         }
 
+# Up to JOB_CONCURRENCY jobs in flight; stages queue on their resource class, not on each other
+executor = JobExecutor(handler, max_jobs=JOB_CONCURRENCY, resources=resources)
+
 # ═══════════════════════════════════════════════════════════════════════════════════
 # RUNPOD ENTRY POINT
 # ═══════════════════════════════════════════════════════════════════════════════════
@@ -1585,22 +2431,43 @@ print("""
 
 print(f"[Studio] Workspace: {WORKSPACE}")
 print(f"[Studio] R2 Configured: {bool(R2_ENDPOINT)}")
+print(f"[Studio] Output storage: {storage.describe()}")
 print(f"[Studio] Quality Presets Available: {list(QUALITY_PRESETS.keys())}")
+print(f"[Studio] Concurrency: {JOB_CONCURRENCY} jobs, slots {resources.limits}")
+
+# Readiness: presence-only check of the bootstrap manifest (no pip / git at runtime)
+print(f"\n[Studio] Checking bootstrap manifest...")
+with cold_start.phase("readiness"):
+    readiness = check()
+print_readiness(readiness)
+missing = [name for name in BOOTSTRAP_REQUIRED if name in readiness and not readiness[name].ready]
+if missing:
+    raise BootstrapError(
+        f"Required components not provisioned: {', '.join(missing)}. "
+        f"Run `python download_models.py --bootstrap` on the network volume."
+    )
 
-# Pre-warm: setup models on startup
-print("\n[Studio] Pre-warming AI models...")
+# Pre-warm: load only MODEL_PREWARM on startup; everything else loads lazily per job mix
+print(f"\n[Studio] Pre-warming AI models: {MODEL_PREWARM or 'none'}")
 try:
-    print("[Studio] Loading MuseTalk...")
-    setup_musetalk()
-    print("[Studio] Loading GFPGAN...")
-    setup_gfpgan()
-    print("[Studio] Loading Real-ESRGAN...")
-    setup_realesrgan()
-    print("[Studio] All models pre-warmed successfully!")
+    for name in MODEL_PREWARM:
+        print(f"[Studio] Loading {name}...")
+        with cold_start.phase(f"prewarm:{name}"):
+            models.get(name)
+    print("[Studio] Pre-warm complete!")
 except Exception as e:
     print(f"[Studio] Pre-warm incomplete (will lazy-load on first job): {e}")
 
+cold_start.ready()
+timings = cold_start.report()
+print(f"[Studio] Cold start: {timings['total_ms'] / 1000:.2f}s {timings['phases_ms']}")
 print("\n[Studio] Ready to create magic! Accepting jobs...")
 
 # Start RunPod handler
-runpod.serverless.start({"handler": handler})
+if JOB_CONCURRENCY > 1:
+    runpod.serverless.start({
+        "handler": executor.async_handler,
+        "concurrency_modifier": executor.concurrency
+    })
+else:
+    runpod.serverless.start({"handler": handler})
@@ -0,0 +1,427 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+HLS SEGMENTER - Publish Frames as Playable Segments While They Are Rendered
+═══════════════════════════════════════════════════════════════════════════════════
+
+A realtime caller used to wait for the whole job (lip-sync, encode, upload)
+before getting a URL. HlsSegmenter is a frame sink that turns the frames into
+an HLS event stream as they arrive:
+
+    start()        empty EVENT playlist published → URL handed out at once
+    write(frame)   frames go into the current segment's encoder; every
+                   `segment_s` seconds of video the segment is closed
+    (background)   segment encoded → stored → playlist rewritten and stored,
+                   strictly in order, so a player polling the playlist only
+                   ever sees complete segments
+    close()        last partial segment, then #EXT-X-ENDLIST
+
+Each segment is an independent MPEG-TS video encode that starts on a
+keyframe, with its timestamps offset to the segment start. The voice track is
+encoded to AAC once, and each segment muxes (stream copy) the whole AAC
+packets that cover it, timestamped where they fall in the track. Encoding
+the audio per segment would put encoder priming silence at every boundary;
+one encode keeps the audio continuous, so segments concatenate into one
+timeline.
+
+A segment that fails to encode or publish is left out of the playlist and
+the next one is tagged #EXT-X-DISCONTINUITY, so players reset their
+timeline across the gap instead of splicing the neighbours together.
+
+Time-to-first-segment is measured from `start()` to the moment the first
+segment is listed in the published playlist. `encoder_factory` and `publish`
+are pluggable, so the segmenter runs with stub encoders and synthetic frames
+(see `python benchmark.py --hls`).
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import time
+import threading
+import subprocess
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import numpy as np
+
+from encoder import FfmpegEncoderSink
+
+PLAYLIST = "index.m3u8"
+
+
+# ADTS sampling_frequency_index → Hz
+_ADTS_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+
+class AdtsTrack:
+    """
+    An AAC track in ADTS framing, split into packets so that any time range
+    can be cut on packet boundaries without re-encoding.
+
+    The encoder's priming packet is packet 0, so packet n (n ≥ 1) holds the
+    source audio from (n - 1) × packet_s. `cut(start_s, end_s, dest)`
+    writes the packets covering [start_s, end_s) and returns the timestamp
+    offset of its first packet relative to `start_s` (within half a packet;
+    segment 0 keeps the priming packet, one packet before 0), or None when
+    the track has ended before `start_s`.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offsets: List[int] = []
+        self.sample_rate = 0
+        self.packet_samples = 1024
+        pos = 0
+        while pos + 7 <= len(data):
+            header = data[pos:pos + 7]
+            if header[0] != 0xFF or header[1] & 0xF0 != 0xF0:
+                raise ValueError(f"No ADTS sync word at byte {pos}")
+            if not self.sample_rate:
+                self.sample_rate = _ADTS_RATES[(header[2] >> 2) & 0x0F]
+                self.packet_samples = 1024 * ((header[6] & 0x03) + 1)
+            length = ((header[3] & 0x03) << 11) | (header[4] << 3) | (header[5] >> 5)
+            if length < 7:
+                raise ValueError(f"Corrupt ADTS frame at byte {pos}")
+            self.offsets.append(pos)
+            pos += length
+        self.offsets.append(min(pos, len(data)))
+
+    @classmethod
+    def encode(cls, audio_path: Path, dest: Path, bitrate: str = "128k",
+               sample_rate: int = 48000) -> "AdtsTrack":
+        subprocess.run([
+            "ffmpeg", "-y", "-v", "error",
+            "-i", str(audio_path),
+            "-vn", "-c:a", "aac", "-b:a", bitrate, "-ar", str(sample_rate),
+            "-f", "adts", str(dest)
+        ], check=True, capture_output=True)
+        return cls(Path(dest).read_bytes())
+
+    @property
+    def packets(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def packet_s(self) -> float:
+        return self.packet_samples / self.sample_rate
+
+    def _index(self, t: float) -> int:
+        # Priming packet first: the one starting nearest to t, plus one
+        return 0 if t <= 0 else min(self.packets, int(round(t / self.packet_s)) + 1)
+
+    def cut(self, start_s: float, end_s: float, dest: Path) -> Optional[float]:
+        first, last = self._index(start_s), self._index(end_s)
+        if last <= first:
+            return None
+        Path(dest).write_bytes(self.data[self.offsets[first]:self.offsets[last]])
+        return (first - 1) * self.packet_s - start_s
+
+
+def ffmpeg_segment_encoder(audio_path: Optional[Path] = None, crf: int = 28, preset: str = "ultrafast",
+                           audio_bitrate: str = "128k") -> Callable[[Path, float, float], Any]:
+    """
+    Factory of per-segment MPEG-TS encoders. The voice track is encoded once
+    (next to the first segment, on its first call); each segment stream-copies
+    its slice of it. If that encode fails, segments encode their own slice.
+    """
+    track: List[Optional[AdtsTrack]] = []
+
+    def factory(path: Path, start_s: float, duration_s: float) -> FfmpegEncoderSink:
+        if audio_path and not track:
+            try:
+                track.append(AdtsTrack.encode(audio_path, path.parent / "voice.aac", audio_bitrate))
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                print(f"[HLS] Voice track encode failed, encoding audio per segment: {e}")
+                track.append(None)
+
+        audio = {}
+        if audio_path and track[0] is None:
+            audio = {"audio_path": audio_path, "audio_offset_s": start_s, "audio_bitrate": audio_bitrate}
+        elif audio_path:
+            cut = path.with_suffix(".aac")
+            ts_offset = track[0].cut(start_s, start_s + duration_s, cut)
+            if ts_offset is not None:
+                audio = {"audio_path": cut, "audio_codec": "copy", "audio_ts_offset_s": ts_offset}
+        return FfmpegEncoderSink(
+            path,
+            crf=crf,
+            preset=preset,
+            extra_args=["-f", "mpegts", "-output_ts_offset", f"{start_s:.3f}"],
+            **audio,
+        )
+    return factory
+
+
+class HlsSegmenter:
+    """
+    Usage:
+        segmenter = HlsSegmenter(workdir, publish=lambda path, name: store(path, f"{prefix}/{name}"),
+                                 encoder_factory=ffmpeg_segment_encoder(voice_path), segment_s=2)
+        playlist_url = segmenter.start()        # hand this out before rendering
+        segmenter.open(width, height, fps)
+        for frame in frames:
+            segmenter.write(frame)
+        metadata["stream"] = segmenter.close()
+
+    `publish(path, name)` stores one file next to the playlist and returns its
+    URL. `encoder_factory(path, start_s, duration_s)` returns a sink with
+    open / write / close / abort (FfmpegEncoderSink or a stub). A segment
+    that fails to encode or publish is logged (`errors`) and left out of the
+    playlist, and the next listed segment starts a discontinuity; it never
+    fails the render.
+    """
+
+    def __init__(
+        self,
+        workdir: Path,
+        publish: Callable[[Path, str], str],
+        encoder_factory: Callable[[Path, float, float], Any],
+        segment_s: float = 2.0,
+    ):
+        self.workdir = Path(workdir)
+        self.publish = publish
+        self.encoder_factory = encoder_factory
+        self.segment_s = max(0.1, segment_s)
+
+        self.playlist_url: Optional[str] = None
+        self.frames = 0
+        self.fps = 0.0
+        self.size = (0, 0)
+        self.segments: List[Dict[str, Any]] = []
+        self.errors: List[str] = []
+
+        self._encoder: Any = None
+        self._encoder_info: Dict[str, Any] = {}
+        self._segment_frames = 0
+        self._frames_per_segment = 0
+        self._index = 0
+        self._publisher = ThreadPoolExecutor(1, thread_name_prefix="hls-publish")
+        self._pending: List[Future] = []
+        self._lock = threading.Lock()
+        self._started = 0.0
+        self._first_segment_s: Optional[float] = None
+        self._gap = False  # A segment was dropped since the last one listed
+        self._closed = False
+
+    @property
+    def opened(self) -> bool:
+        return self._frames_per_segment > 0
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def _playlist(self, ended: bool) -> str:
+        with self._lock:
+            segments = list(self.segments)
+        target = max([self.segment_s] + [s["duration_s"] for s in segments])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{int(np.ceil(target))}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+        ]
+        for segment in segments:
+            if segment.get("discontinuity"):
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines += [f"#EXTINF:{segment['duration_s']:.3f},", segment["name"]]
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def _publish_playlist(self, ended: bool = False) -> Optional[str]:
+        path = self.workdir / PLAYLIST
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(self._playlist(ended))
+        tmp.replace(path)
+        try:
+            return self.publish(path, PLAYLIST)
+        except Exception as e:
+            self.errors.append(f"{PLAYLIST}: {e}")
+            print(f"[HLS] Playlist publish failed: {e}")
+            return None
+
+    def start(self) -> Optional[str]:
+        """Publish the empty playlist; returns its URL (the stream's public address)."""
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self._started = time.perf_counter()
+        self.playlist_url = self._publish_playlist()
+        return self.playlist_url
+
+    def open(self, width: int, height: int, fps: float) -> None:
+        """Set the stream's frame size and rate (first call wins; later frames are resized to it)."""
+        if self.opened:
+            return
+        if not self._started:
+            self.start()
+        self.size = (width, height)
+        self.fps = fps
+        self._frames_per_segment = max(1, int(round(self.segment_s * fps)))
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def _open_segment(self) -> None:
+        name = f"seg_{self._index:05d}.ts"
+        start_s = self.frames / self.fps
+        self._encoder = self.encoder_factory(self.workdir / name, start_s,
+                                             self._frames_per_segment / self.fps)
+        self._encoder.open(self.size[0], self.size[1], self.fps)
+        self._encoder_info = {"index": self._index, "name": name, "start_s": round(start_s, 3),
+                              "opened": time.perf_counter()}
+        self._segment_frames = 0
+        self._index += 1
+
+    def _finish_segment(self) -> None:
+        encoder, info, frames = self._encoder, self._encoder_info, self._segment_frames
+        self._encoder = None
+        info["frames"] = frames
+        info["duration_s"] = round(frames / self.fps, 3)
+        self._pending.append(self._publisher.submit(self._ship, encoder, info))
+
+    def _ship(self, encoder: Any, info: Dict[str, Any]) -> None:
+        # Runs on the single publisher thread: segments are listed strictly in order
+        t0 = time.perf_counter()
+        try:
+            encoder.close()
+        except Exception as e:
+            self.errors.append(f"{info['name']}: {e}")
+            print(f"[HLS] Segment {info['name']} failed to encode: {e}")
+            self._gap = True
+            return
+        encoded = time.perf_counter()
+        path = self.workdir / info["name"]
+        try:
+            self.publish(path, path.name)
+        except Exception as e:
+            self.errors.append(f"{path.name}: {e}")
+            print(f"[HLS] Segment {path.name} publish failed: {e}")
+            self._gap = True
+            return
+        if self._gap:
+            info["discontinuity"] = True
+            self._gap = False
+        info["bytes"] = path.stat().st_size
+        info["encode_ms"] = round((encoded - t0) * 1000, 1)
+        info["publish_ms"] = round((time.perf_counter() - encoded) * 1000, 1)
+        opened = info.pop("opened")
+        info["segment_ms"] = round((time.perf_counter() - opened) * 1000, 1)
+        with self._lock:
+            self.segments.append(info)
+        self._publish_playlist()
+        info["listed_at_ms"] = round((time.perf_counter() - self._started) * 1000, 1)
+        if self._first_segment_s is None:
+            self._first_segment_s = time.perf_counter() - self._started
+            print(f"[HLS] First segment live after {self._first_segment_s * 1000:.0f}ms")
+
+    def write(self, frame: np.ndarray) -> None:
+        if self._closed:
+            raise RuntimeError("HlsSegmenter is closed")
+        if not self.opened:
+            self.open(frame.shape[1], frame.shape[0], 25)
+        if frame.shape[1] != self.size[0] or frame.shape[0] != self.size[1]:
+            import cv2
+            frame = cv2.resize(frame, self.size)
+        if self._encoder is None:
+            self._open_segment()
+        self._encoder.write(frame)
+        self._segment_frames += 1
+        self.frames += 1
+        if self._segment_frames >= self._frames_per_segment:
+            self._finish_segment()
+
+    def write_batch(self, frames: Iterable[np.ndarray]) -> None:
+        for frame in frames:
+            self.write(frame)
+
+    def close(self) -> Dict[str, Any]:
+        """Flush the last partial segment, end the playlist and return the stream stats."""
+        if not self._closed:
+            self._closed = True
+            if self._encoder is not None:
+                self._finish_segment()
+            for future in self._pending:
+                future.result()
+            self._publisher.shutdown(wait=True)
+            if self._started:
+                self._publish_playlist(ended=True)
+        return self.stats()
+
+    def abort(self) -> None:
+        """Stop without ending the playlist (the frames so far stay published)."""
+        self._closed = True
+        if self._encoder is not None:
+            self._encoder.abort()
+            self._encoder = None
+        self._publisher.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            segments = list(self.segments)
+        return {
+            "playlist": self.playlist_url,
+            "segment_s": self.segment_s,
+            "segments": len(segments),
+            "frames": self.frames,
+            "duration_s": round(self.frames / self.fps, 3) if self.fps else 0.0,
+            "ttfs_ms": round(self._first_segment_s * 1000, 1) if self._first_segment_s is not None else None,
+            "elapsed_ms": round((time.perf_counter() - self._started) * 1000, 1) if self._started else 0.0,
+            "detail": segments,
+            "errors": self.errors,
+        }
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# LOCAL STAND-INS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class SyntheticFrameSource:
+    """
+    Frames at a fixed render rate, for exercising the segmenter without a
+    model: `render_fps` frames per wall-second (0 = as fast as possible),
+    `count` frames of `width`x`height` with a moving bar so segments differ.
+    """
+
+    def __init__(self, count: int = 250, width: int = 256, height: int = 256,
+                 fps: float = 25, render_fps: float = 0):
+        self.count = count
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.render_fps = render_fps
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        start = time.perf_counter()
+        for i in range(self.count):
+            if self.render_fps > 0:
+                delay = start + i / self.render_fps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+            x = i % self.width
+            frame[:, x:x + 8] = 255
+            yield frame
+
+
+class StubSegmentEncoder:
+    """Stands in for FfmpegEncoderSink: writes a row per frame; close() costs frames / encode_fps seconds."""
+
+    def __init__(self, path: Path, encode_fps: float = 0):
+        self.path = Path(path)
+        self.encode_fps = encode_fps
+        self.frames = 0
+        self._file = None
+
+    def open(self, width: int, height: int, fps: float) -> None:
+        self._file = open(self.path, "wb")
+
+    def write(self, frame: np.ndarray) -> None:
+        self._file.write(frame[:1].tobytes())
+        self.frames += 1
+
+    def close(self) -> None:
+        if self.encode_fps > 0:
+            time.sleep(self.frames / self.encode_fps)
+        self._file.close()
+
+    def abort(self) -> None:
+        self._file.close()
+        self.path.unlink(missing_ok=True)
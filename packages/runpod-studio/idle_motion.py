@@ -0,0 +1,631 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+IDLE MOTION - Vectorized Breathing / Blink / Head-Sway Loops, Cached per Persona
+═══════════════════════════════════════════════════════════════════════════════════
+
+Idle takes are what a persona shows while it is not speaking. They used to be
+the still image looped by ffmpeg. Here the whole motion track is computed up
+front as NumPy arrays (one value per frame, no per-frame Python math):
+
+    blink   0..1     eyelid closure, a 150 ms triangle every few seconds
+    breath  -1..1    slow sine; slight scale + rise of the whole frame
+    pitch / yaw / roll   radians of subtle head sway around the face centre
+
+All periods are snapped to a whole number of cycles per loop, so frame N
+would equal frame 0 and the take loops without a seam. The curves become one
+(N, 2, 3) array of affine matrices. A warp backend applies them:
+
+    opencv   cv2.warpAffine per frame (C speed, the default)
+    numpy    pure-NumPy bilinear sampling, a chunk of frames per call
+             (fallback without OpenCV, several times slower)
+
+A backend is any object with `name` and `warp(image, matrices, blink,
+eye_box)`, so a LivePortrait-driven backend can replace the affine one.
+With `workers` > 1 the frames of a loop are warped in worker processes
+(IdleFrameRenderer over a frame_ring.FramePool) and reach the encoder
+through shared memory in order.
+Blinks squeeze the eye band (from face landmarks or OpenCV's eye cascade)
+before the warp; only a few distinct closure levels are ever rendered.
+
+Loops are cached on the workspace volume, keyed by image content,
+expression, duration, fps and backend:
+
+    <cache>/<key[:2]>/<key>/
+        loop.mp4
+        meta.json
+
+A persona rebuilt with the same image gets every take from the cache.
+render_takes() renders a persona's takes a few at a time and finishes them
+(uploads) in order while later takes still render.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import json
+import time
+import shutil
+import threading
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from disk_cache import DiskCache, digest_key, file_digest
+from frame_ring import FramePool
+
+IDLE_VERSION = 1  # Bump when the curves, the warp or the loop layout change
+
+# Motion character per expression: blink / breath timing, amplitudes and a static head pose
+EXPRESSIONS: Dict[str, Dict[str, float]] = {
+    "neutral":   {"blink_ms": 5000, "breath_ms": 4000, "breath": 1.0, "sway": 0.020, "pitch": 0.000, "roll": 0.000},
+    "happy":     {"blink_ms": 4000, "breath_ms": 3500, "breath": 1.1, "sway": 0.025, "pitch": -0.010, "roll": 0.010},
+    "sad":       {"blink_ms": 6000, "breath_ms": 5000, "breath": 0.8, "sway": 0.012, "pitch": 0.030, "roll": -0.005},
+    "thinking":  {"blink_ms": 6500, "breath_ms": 4500, "breath": 0.9, "sway": 0.015, "pitch": -0.015, "roll": 0.020},
+    "listening": {"blink_ms": 4500, "breath_ms": 4000, "breath": 1.0, "sway": 0.018, "pitch": 0.010, "roll": 0.015},
+    "excited":   {"blink_ms": 3500, "breath_ms": 3000, "breath": 1.3, "sway": 0.030, "pitch": -0.010, "roll": 0.000},
+    "intense":   {"blink_ms": 7000, "breath_ms": 3500, "breath": 1.2, "sway": 0.010, "pitch": 0.020, "roll": 0.000},
+}
+
+# Head sway: angular rates (rad/ms) and phases of pitch / yaw / roll
+SWAY_RATES = (0.0003, 0.0005, 0.0002)
+SWAY_PHASES = (0.0, 1.0, 2.0)
+
+BLINK_MS = 150
+BLINK_LEVELS = 8  # Distinct eyelid positions rendered per loop
+
+
+def expression_params(expression: str) -> Dict[str, float]:
+    """Motion parameters for `expression` (unknown names move like "neutral")."""
+    return EXPRESSIONS.get(expression, EXPRESSIONS["neutral"])
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# MOTION CURVES
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def blink_curve(t_ms: np.ndarray, interval_ms: float = 5000, duration_ms: float = BLINK_MS,
+                offset_ms: float = 0.0) -> np.ndarray:
+    """Eyelid closure (0-1) at each timestamp: a triangle of `duration_ms` every `interval_ms`."""
+    phase = np.mod(np.asarray(t_ms, dtype=np.float64) - offset_ms, interval_ms)
+    half = duration_ms / 2
+    ramp = np.where(phase < half, phase / half, 1 - (phase - half) / half)
+    return np.clip(ramp, 0, 1) * (phase < duration_ms)
+
+
+def breathing_curve(t_ms: np.ndarray, period_ms: float = 4000) -> np.ndarray:
+    """Breathing cycle (-1..1) at each timestamp."""
+    phase = np.mod(np.asarray(t_ms, dtype=np.float64), period_ms) / period_ms
+    return np.sin(phase * np.pi * 2)
+
+
+def sway_curves(t_ms: np.ndarray, scale: float = 0.02, rates: Tuple[float, ...] = SWAY_RATES,
+                phases: Tuple[float, ...] = SWAY_PHASES) -> Dict[str, np.ndarray]:
+    """Subtle head micro-movements (radians): pitch, yaw and roll (half amplitude)."""
+    t_ms = np.asarray(t_ms, dtype=np.float64)
+    return {
+        "pitch": np.sin(t_ms * rates[0] + phases[0]) * scale,
+        "yaw": np.sin(t_ms * rates[1] + phases[1]) * scale,
+        "roll": np.sin(t_ms * rates[2] + phases[2]) * scale * 0.5,
+    }
+
+
+def _snap(period_ms: float, loop_ms: float) -> float:
+    """Nearest period that fits a whole number of times (at least once) into the loop."""
+    return loop_ms / max(1, round(loop_ms / period_ms))
+
+
+@dataclass
+class MotionCurves:
+    """Per-frame motion of one idle loop (all arrays have one value per frame)."""
+    fps: float
+    blink: np.ndarray
+    breath: np.ndarray
+    pitch: np.ndarray
+    yaw: np.ndarray
+    roll: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.blink)
+
+    @classmethod
+    def loop(cls, duration_s: float, fps: float = 30, expression: str = "neutral") -> "MotionCurves":
+        """Curves for a seamless `duration_s` loop: every period is snapped to the loop length."""
+        params = expression_params(expression)
+        frames = max(1, int(round(duration_s * fps)))
+        loop_ms = frames / fps * 1000
+        t_ms = np.arange(frames) / fps * 1000
+
+        blink_ms = _snap(params["blink_ms"], loop_ms)
+        rates = tuple(2 * np.pi / _snap(2 * np.pi / rate, loop_ms) for rate in SWAY_RATES)
+        sway = sway_curves(t_ms, params["sway"], rates)
+        return cls(
+            fps=fps,
+            blink=blink_curve(t_ms, blink_ms, offset_ms=blink_ms * 0.6).astype(np.float32),
+            breath=(breathing_curve(t_ms, _snap(params["breath_ms"], loop_ms)) * params["breath"]).astype(np.float32),
+            pitch=(sway["pitch"] + params["pitch"]).astype(np.float32),
+            yaw=sway["yaw"].astype(np.float32),
+            roll=(sway["roll"] + params["roll"]).astype(np.float32),
+        )
+
+    def affine(self, width: int, height: int, pivot: Optional[Tuple[float, float]] = None) -> np.ndarray:
+        """
+        (N, 2, 3) float32 source→frame matrices: roll rotates around `pivot`
+        (default: centre, slightly low), yaw / pitch shift, breathing scales
+        up to 0.4% and lifts the frame.
+        """
+        cx, cy = pivot if pivot is not None else (width / 2, height * 0.55)
+        scale = 1 + 0.004 * self.breath
+        cos = np.cos(self.roll) * scale
+        sin = np.sin(self.roll) * scale
+        dx = self.yaw * width * 0.5
+        dy = self.pitch * height * 0.5 - self.breath * height * 0.002
+
+        m = np.empty((len(self), 2, 3), dtype=np.float32)
+        m[:, 0, 0], m[:, 0, 1] = cos, -sin
+        m[:, 1, 0], m[:, 1, 1] = sin, cos
+        m[:, 0, 2] = cx - cos * cx + sin * cy + dx
+        m[:, 1, 2] = cy - sin * cx - cos * cy + dy
+        return m
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# BLINKS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def eye_box_from_landmarks(landmarks: np.ndarray, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+    """Eye band (x0, y0, x1, y1) around 68-point landmarks 36-47, padded to take in the lids."""
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    if landmarks.shape[0] < 48:
+        return None
+    eyes = landmarks[36:48]
+    if not np.isfinite(eyes).all():
+        return None
+    x0, y0 = eyes.min(axis=0)
+    x1, y1 = eyes.max(axis=0)
+    pad_x = (x1 - x0) * 0.15
+    pad_y = max(4.0, (y1 - y0) * 1.2)
+    box = (int(x0 - pad_x), int(y0 - pad_y), int(np.ceil(x1 + pad_x)), int(np.ceil(y1 + pad_y)))
+    return (max(0, box[0]), max(0, box[1]), min(width, box[2]), min(height, box[3]))
+
+
+def detect_eye_box(image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """Eye band from OpenCV's Haar eye cascade (two largest detections), or None."""
+    try:
+        import cv2
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        eyes = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=6,
+                                        minSize=(image.shape[1] // 20, image.shape[1] // 20))
+    except Exception:
+        return None
+    if len(eyes) < 2:
+        return None
+    eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+    x0 = min(e[0] for e in eyes)
+    x1 = max(e[0] + e[2] for e in eyes)
+    # Cascade boxes include brow and cheek; the lids sit in the middle half
+    y0 = int(min(e[1] + e[3] * 0.2 for e in eyes))
+    y1 = int(max(e[1] + e[3] * 0.8 for e in eyes))
+    return (int(x0), y0, int(x1), y1)
+
+
+def close_eyes(image: np.ndarray, eye_box: Tuple[int, int, int, int], amount: float) -> np.ndarray:
+    """
+    Copy of `image` with the eye band squeezed toward its centre line by
+    `amount` (0 open, 1 closed) and the lid rows stretched over the gap,
+    feathered into the surrounding columns.
+    """
+    if amount <= 0:
+        return image
+    x0, y0, x1, y1 = eye_box
+    if x1 - x0 < 4 or y1 - y0 < 4:
+        return image
+
+    half = (y1 - y0) / 2
+    centre = y0 + half
+    visible = max(0.5, half * (1 - 0.95 * amount))
+    d = np.arange(y0, y1) + 0.5 - centre
+    src = np.where(np.abs(d) <= visible, centre + d * half / visible, np.where(d < 0, y0, y1 - 1))
+    rows = np.clip(np.floor(src), y0, y1 - 1).astype(np.intp)
+
+    band = image[y0:y1, x0:x1].astype(np.float32)
+    closed = image[rows, x0:x1].astype(np.float32)
+    feather = max(1.0, (x1 - x0) * 0.1)
+    xs = np.arange(x1 - x0)
+    weight = np.clip(np.minimum(xs + 1, x1 - x0 - xs) / feather, 0, 1)[None, :, None]
+
+    out = image.copy()
+    out[y0:y1, x0:x1] = (band + (closed - band) * weight + 0.5).astype(np.uint8)
+    return out
+
+
+class _BlinkFrames:
+    """Source image per quantized closure level, rendered on first use."""
+
+    def __init__(self, image: np.ndarray, eye_box: Optional[Tuple[int, int, int, int]]):
+        self.image = image
+        self.eye_box = eye_box
+        self._levels: Dict[int, np.ndarray] = {}
+
+    def __getitem__(self, amount: float) -> np.ndarray:
+        if self.eye_box is None:
+            return self.image
+        level = int(round(float(amount) * BLINK_LEVELS))
+        if level not in self._levels:
+            self._levels[level] = close_eyes(self.image, self.eye_box, level / BLINK_LEVELS)
+        return self._levels[level]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# WARP BACKENDS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class OpenCVWarpBackend:
+    """cv2.warpAffine per frame, reflecting the border so no black edges appear."""
+
+    name = "opencv"
+
+    def warp(self, image: np.ndarray, matrices: np.ndarray, blink: np.ndarray,
+             eye_box: Optional[Tuple[int, int, int, int]] = None) -> Iterator[np.ndarray]:
+        import cv2
+
+        height, width = image.shape[:2]
+        sources = _BlinkFrames(image, eye_box)
+        for m, amount in zip(matrices, blink):
+            yield cv2.warpAffine(sources[amount], m, (width, height), flags=cv2.INTER_LINEAR,
+                                 borderMode=cv2.BORDER_REFLECT_101)
+
+
+class NumpyWarpBackend:
+    """
+    Bilinear sampling of `chunk` frames per NumPy call: inverse-maps every
+    output pixel of the chunk at once and gathers from the (blinked) sources.
+    Edges are clamped. Larger chunks stop paying off once the gathers fall
+    out of cache, hence the small default.
+    """
+
+    name = "numpy"
+
+    def __init__(self, chunk: int = 2):
+        self.chunk = max(1, chunk)
+
+    def warp(self, image: np.ndarray, matrices: np.ndarray, blink: np.ndarray,
+             eye_box: Optional[Tuple[int, int, int, int]] = None) -> Iterator[np.ndarray]:
+        height, width = image.shape[:2]
+        sources = _BlinkFrames(image, eye_box)
+        ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+
+        for start in range(0, len(matrices), self.chunk):
+            m = matrices[start:start + self.chunk].astype(np.float32)
+            inv = np.linalg.inv(m[:, :, :2])                       # (k, 2, 2)
+            ox = xs[None] - m[:, 0, 2, None, None]
+            oy = ys[None] - m[:, 1, 2, None, None]
+            sx = inv[:, 0, 0, None, None] * ox + inv[:, 0, 1, None, None] * oy
+            sy = inv[:, 1, 0, None, None] * ox + inv[:, 1, 1, None, None] * oy
+            np.clip(sx, 0, width - 1.001, out=sx)
+            np.clip(sy, 0, height - 1.001, out=sy)
+
+            x0 = sx.astype(np.intp)
+            y0 = sy.astype(np.intp)
+            fx = (sx - x0)[..., None]
+            fy = (sy - y0)[..., None]
+
+            # Gather from one flat uint8 array of the chunk's distinct sources
+            levels = [sources[a] for a in blink[start:start + self.chunk]]
+            distinct = {id(level): level for level in levels}
+            slot = {key: i for i, key in enumerate(distinct)}
+            flat = np.concatenate([level.reshape(-1, 3) for level in distinct.values()])
+            base = np.array([slot[id(level)] for level in levels], dtype=np.intp)[:, None, None] * (height * width)
+            idx = base + y0 * width + x0
+
+            tl, tr = flat[idx].astype(np.float32), flat[idx + 1].astype(np.float32)
+            bl, br = flat[idx + width].astype(np.float32), flat[idx + width + 1].astype(np.float32)
+            top = tl + (tr - tl) * fx
+            bottom = bl + (br - bl) * fx
+            frames = (top + (bottom - top) * fy + 0.5).astype(np.uint8)
+            yield from frames
+
+
+WARP_BACKENDS = {"opencv": OpenCVWarpBackend, "numpy": NumpyWarpBackend}
+
+
+class IdleFrameRenderer:
+    """
+    Frame `index` of a loop on its own (FrameStage protocol, no input frame),
+    so a frame_ring.FramePool can warp frames in any order and process. Blink
+    levels are rendered once per worker.
+    """
+
+    name = "idle_warp"
+
+    def __init__(self, backend: Any, image: np.ndarray, matrices: np.ndarray, blink: np.ndarray,
+                 eye_box: Optional[Tuple[int, int, int, int]] = None):
+        self.backend = backend
+        self.matrices = matrices
+        self.blink = blink
+        self.sources = _BlinkFrames(image, eye_box)
+
+    def setup(self, width: int, height: int, fps: float) -> Tuple[int, int]:
+        return width, height
+
+    def process(self, frame: Optional[np.ndarray], index: int) -> np.ndarray:
+        source = self.sources[self.blink[index]]
+        # The source is already blinked, so the backend warps it as is (no eye box)
+        return next(iter(self.backend.warp(source, self.matrices[index:index + 1], self.blink[index:index + 1])))
+
+    def close(self) -> None:
+        pass
+
+
+def create_warp_backend(name: str = "opencv"):
+    if name not in WARP_BACKENDS:
+        raise ValueError(f"Unknown warp backend: {name!r} (expected one of {sorted(WARP_BACKENDS)})")
+    return WARP_BACKENDS[name]()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# ENGINE + LOOP CACHE
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class IdleLookup:
+    key: str
+    cache: str = "miss"          # "hit" | "miss" | "bypass"
+    elapsed_s: float = 0.0
+    frames: int = 0
+    blink: bool = False
+    backend: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "cache": self.cache,
+            "ms": round(self.elapsed_s * 1000, 1),
+            "frames": self.frames,
+            "blink": self.blink,
+            "backend": self.backend,
+        }
+
+
+class IdleMotionEngine:
+    """
+    Usage:
+        idle = IdleMotionEngine(DiskCache(WORKSPACE / "cache" / "idle", max_bytes=5 * 1024**3),
+                                encoder_factory=lambda path: FfmpegEncoderSink(path, crf=23, preset="fast"))
+        image = cv2.imread(str(image_path))                 # decode once for every take
+        for expression in ("neutral", "happy"):
+            lookup = idle.render(image_path, out / f"{expression}.mp4", duration_s=5,
+                                 expression=expression, image=image, eye_box=eye_box)
+        metadata["idle_cache"] = idle.stats()
+
+    `encoder_factory(path)` returns a sink with open / write / close / abort.
+    `eye_box` (x0, y0, x1, y1) enables blinks; without one the eye cascade
+    is tried once per image. `cache=None` always renders. `workers` > 1 warps
+    frames in that many processes; the frames are identical either way.
+    """
+
+    def __init__(self, cache: Optional[DiskCache], encoder_factory: Callable[[Path], Any],
+                 backend: Any = None, fps: float = 30, workers: int = 1):
+        self.cache = cache
+        self.encoder_factory = encoder_factory
+        self.backend = backend or OpenCVWarpBackend()
+        self.fps = fps
+        self.workers = workers
+
+        self.hits = 0
+        self.misses = 0
+        self.frames_rendered = 0
+        self.render_s = 0.0
+        self._digests: Dict[tuple, str] = {}
+        self._eyes: Dict[str, Optional[Tuple[int, int, int, int]]] = {}
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._inflight.setdefault(key, threading.Lock())
+
+    def _image_digest(self, image_path: Path) -> str:
+        st = image_path.stat()
+        ident = (str(image_path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(ident)
+        if digest is None:
+            digest = file_digest(image_path)
+            with self._lock:
+                self._digests[ident] = digest
+        return digest
+
+    def key(self, image_path: Path, duration_s: float, expression: str,
+            eye_box: Optional[Tuple[int, int, int, int]] = None) -> str:
+        params = {
+            "expression": expression_params(expression),
+            "duration_s": duration_s,
+            "fps": self.fps,
+            "eye_box": list(eye_box) if eye_box else None,
+            "backend": self.backend.name,
+        }
+        return digest_key(IDLE_VERSION, self._image_digest(Path(image_path)), json.dumps(params, sort_keys=True))
+
+    def frames(self, image: np.ndarray, duration_s: float, expression: str = "neutral",
+               eye_box: Optional[Tuple[int, int, int, int]] = None) -> Iterator[np.ndarray]:
+        """Warped frames of one seamless loop."""
+        height, width = image.shape[:2]
+        curves = MotionCurves.loop(duration_s, self.fps, expression)
+        return self.backend.warp(image, curves.affine(width, height), curves.blink, eye_box)
+
+    def _encode(self, image: np.ndarray, output_path: Path, duration_s: float, expression: str,
+                eye_box: Optional[Tuple[int, int, int, int]]) -> int:
+        height, width = image.shape[:2]
+        if self.workers > 1:
+            return self._encode_pooled(image, output_path, duration_s, expression, eye_box)
+
+        sink = self.encoder_factory(output_path)
+        sink.open(width, height, self.fps)
+        frames = 0
+        try:
+            for frame in self.frames(image, duration_s, expression, eye_box):
+                sink.write(frame)
+                frames += 1
+        except BaseException:
+            sink.abort()
+            raise
+        sink.close()
+        return frames
+
+    def _encode_pooled(self, image: np.ndarray, output_path: Path, duration_s: float, expression: str,
+                       eye_box: Optional[Tuple[int, int, int, int]]) -> int:
+        height, width = image.shape[:2]
+        curves = MotionCurves.loop(duration_s, self.fps, expression)
+        renderer = IdleFrameRenderer(self.backend, image, curves.affine(width, height), curves.blink, eye_box)
+
+        sink = self.encoder_factory(output_path)
+        sink.open(width, height, self.fps)
+        with FramePool([renderer], out_shape=image.shape, workers=self.workers, fps=self.fps) as pool:
+            try:
+                stats = pool.run(None, sink, count=len(curves))
+            except BaseException:
+                sink.abort()
+                raise
+            sink.close()  # before the pool unmaps the slots the encoder reads from
+        return stats["frames"]
+
+    def render(
+        self,
+        image_path: Path,
+        output_path: Path,
+        duration_s: float = 5.0,
+        expression: str = "neutral",
+        image: Optional[np.ndarray] = None,
+        eye_box: Optional[Tuple[int, int, int, int]] = None,
+    ) -> IdleLookup:
+        """Write the idle loop for (image, expression, duration) to `output_path`, from the cache when possible."""
+        start = time.time()
+        image_path = Path(image_path)
+
+        if eye_box is None:
+            digest = self._image_digest(image_path)
+            if digest not in self._eyes:
+                if image is None:
+                    image = _imread(image_path)
+                self._eyes[digest] = detect_eye_box(image)
+            eye_box = self._eyes[digest]
+
+        key = self.key(image_path, duration_s, expression, eye_box)
+        lookup = IdleLookup(key, blink=eye_box is not None, backend=self.backend.name)
+        # Concurrent takes of one loop (same emotion) render it once; the rest hit the cache
+        with self._key_lock(key) if self.cache is not None else nullcontext():
+            path = self.cache.get(key) if self.cache is not None else None
+
+            if path is not None:
+                lookup.cache = "hit"
+                shutil.copyfile(path / "loop.mp4", output_path)
+                lookup.frames = json.loads((path / "meta.json").read_text()).get("frames", 0)
+                with self._lock:
+                    self.hits += 1
+            else:
+                if image is None:
+                    image = _imread(image_path)
+                t0 = time.time()
+                if self.cache is None:
+                    lookup.cache = "bypass"
+                    lookup.frames = self._encode(image, output_path, duration_s, expression, eye_box)
+                else:
+                    tmp = self.cache.reserve()
+                    tmp.mkdir()
+                    lookup.frames = self._encode(image, tmp / "loop.mp4", duration_s, expression, eye_box)
+                    (tmp / "meta.json").write_text(json.dumps({
+                        "version": IDLE_VERSION,
+                        "expression": expression,
+                        "duration_s": duration_s,
+                        "fps": self.fps,
+                        "frames": lookup.frames,
+                        "backend": self.backend.name,
+                        "created_at": time.time(),
+                    }))
+                    path = self.cache.commit(key, tmp)
+                    shutil.copyfile(path / "loop.mp4", output_path)
+                with self._lock:
+                    self.misses += 1
+                    self.frames_rendered += lookup.frames
+                    self.render_s += time.time() - t0
+
+        lookup.elapsed_s = time.time() - start
+        return lookup
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            report = {
+                "backend": self.backend.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "frames_rendered": self.frames_rendered,
+                "render_fps": round(self.frames_rendered / self.render_s, 1) if self.render_s else 0.0,
+            }
+        if self.cache is not None:
+            report["cache"] = self.cache.stats()
+        return report
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# PERSONA TAKES
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def render_takes(
+    specs: List[Dict[str, Any]],
+    render: Callable[[int, Dict[str, Any], Dict[str, float]], Any],
+    finish: Callable[[int, Dict[str, Any], Any, Dict[str, float]], Dict[str, Any]],
+    workers: int = 1,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Render persona takes `workers` at a time and finish them in submission order.
+
+    `render(i, spec, timings)` runs on a pool thread; `finish(i, spec, rendered,
+    timings)` runs on the calling thread as soon as take `i` is rendered, so
+    its upload overlaps the rendering of later takes, and returns the take's
+    entry. Both record their own "*_ms" timings; queued_ms and ready_ms
+    (since the pipeline started) are added here. Returns the entries, each
+    with its "timings", and a summary against rendering one take at a time.
+    """
+    workers = max(1, min(workers, len(specs)))
+    start = time.time()
+
+    def since_start() -> float:
+        return round((time.time() - start) * 1000, 1)
+
+    def run(i: int, spec: Dict[str, Any]) -> Tuple[Any, Dict[str, float]]:
+        timings = {"queued_ms": since_start()}
+        return render(i, spec, timings), timings
+
+    takes = []
+    with ThreadPoolExecutor(workers, thread_name_prefix="take") as pool:
+        futures = [pool.submit(run, i, spec) for i, spec in enumerate(specs)]
+        for i, (spec, future) in enumerate(zip(specs, futures)):
+            rendered, timings = future.result()
+            take = finish(i, spec, rendered, timings)
+            timings["ready_ms"] = since_start()
+            take["timings"] = timings
+            takes.append(take)
+
+    wall_ms = since_start()
+    serial_ms = sum(ms for take in takes for name, ms in take["timings"].items()
+                    if name not in ("queued_ms", "ready_ms"))
+    return takes, {
+        "workers": workers,
+        "takes": len(takes),
+        "wall_ms": wall_ms,
+        "serial_ms": round(serial_ms, 1),
+        "speedup": round(serial_ms / wall_ms, 2) if wall_ms > 0 else 0.0,
+    }
+
+
+def _imread(image_path: Path) -> np.ndarray:
+    import cv2
+
+    image = cv2.imread(str(image_path))
+    if image is None:
+        raise IOError(f"Cannot read image: {image_path}")
+    return image
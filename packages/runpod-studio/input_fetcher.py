@@ -0,0 +1,282 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+INPUT FETCHER - Concurrent, Streaming, Content-Addressed Job Inputs
+═══════════════════════════════════════════════════════════════════════════════════
+
+Replaces sequential `urlretrieve` / `b64decode` calls. All inputs of a job are
+fetched together on a thread pool, with per-request timeouts and retries,
+streamed to disk in chunks while being hashed.
+
+Blobs live in a DiskCache keyed by content sha256, so a persona image or a
+music bed is stored once however it arrives. Two small reference records
+point at them:
+
+    URL     → `refs/<sha256(url)>.json` holding the ETag / Last-Modified; reused
+              without a request inside `revalidate_after_s`, otherwise
+              revalidated with a conditional GET (304 = hit)
+    base64  → keyed by sha256 of the payload string, so a repeat payload is
+              not even decoded
+
+A job gets its own copy of the blob, never a hard link: a step that rewrote
+its input in place would otherwise change the cached object for every later
+job. The copy goes through copy_file_range, so filesystems that support it
+share extents (reflink on XFS / btrfs) instead of duplicating the data.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import re
+import json
+import time
+import base64
+import hashlib
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from disk_cache import DiskCache, copy_blob, digest_key
+
+B64_CHUNK = 4 * 256 * 1024  # Characters of payload read per step
+
+# What base64.b64decode skips (line breaks of MIME / encodebytes output, spaces)
+_NOT_BASE64 = re.compile(r"[^A-Za-z0-9+/=]")
+
+
+@dataclass
+class FetchResult:
+    name: str
+    path: Path
+    source: str = "url"          # "url" | "base64"
+    cache: str = "miss"          # "hit" | "revalidated" | "miss" | "bypass"
+    bytes: int = 0
+    elapsed_s: float = 0.0
+    attempts: int = 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "cache": self.cache,
+            "bytes": self.bytes,
+            "ms": round(self.elapsed_s * 1000, 1),
+            "attempts": self.attempts,
+        }
+
+
+def decode_base64_stream(data: str, f, chunk: int = B64_CHUNK) -> None:
+    """
+    Decode `data` into file `f` a chunk at a time. Skipped characters are
+    dropped first and a partial 4-character group is carried into the next
+    chunk, so wrapped input decodes exactly like one b64decode call.
+    """
+    carry = ""
+    for i in range(0, len(data), chunk):
+        text = carry + _NOT_BASE64.sub("", data[i:i + chunk])
+        usable = len(text) - len(text) % 4
+        f.write(base64.b64decode(text[:usable]))
+        carry = text[usable:]
+    if carry:
+        f.write(base64.b64decode(carry))
+
+
+class InputFetcher:
+    """
+    Usage:
+        fetcher = InputFetcher(DiskCache(root, max_bytes=20 * 1024**3))
+        results = fetcher.fetch_all({
+            "image": (job_input["source_image"], tmpdir / "image.png"),
+            "voice": (job_input["driven_audio"], tmpdir / "voice.mp3"),
+        })
+        metadata["inputs"] = fetcher.report(results)
+
+    Sources are http(s) URLs, data URLs or bare base64. `cache=None` fetches
+    without caching.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[DiskCache] = None,
+        workers: int = 8,
+        timeout: float = 30,
+        retries: int = 3,
+        revalidate_after_s: float = 3600,
+        chunk_size: int = 1024 * 1024,
+    ):
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.retries = retries
+        self.revalidate_after_s = revalidate_after_s
+        self.chunk_size = chunk_size
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def fetch_all(self, items: Dict[str, Tuple[str, Path]]) -> Dict[str, FetchResult]:
+        """Fetch {name: (source, dest)} concurrently. Raises the first failure after all finish."""
+        if not items:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items)),
+                                thread_name_prefix="fetch") as pool:
+            futures = {name: pool.submit(self.fetch, name, source, Path(dest))
+                       for name, (source, dest) in items.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def fetch(self, name: str, source: str, dest: Path) -> FetchResult:
+        start = time.time()
+        if source.startswith(("http://", "https://")):
+            result = self._fetch_url(name, source, dest)
+        else:
+            result = self._decode_base64(name, source, dest)
+        result.elapsed_s = time.time() - start
+        return result
+
+    # ───────────────────────────────────────────────────────────────────────────────
+    # base64
+
+    def _decode_base64(self, name: str, payload: str, dest: Path) -> FetchResult:
+        result = FetchResult(name, dest, source="base64")
+        key = f"b64-{digest_key(payload)}"
+
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                copy_blob(cached, dest)
+                result.cache, result.bytes = "hit", cached.stat().st_size
+                return result
+
+        data = payload.split(",", 1)[1] if payload.startswith("data:") else payload
+        target = self.cache.reserve() if self.cache is not None else dest
+        with open(target, "wb") as f:
+            decode_base64_stream(data, f)
+        result.bytes = target.stat().st_size
+
+        if self.cache is None:
+            result.cache = "bypass"
+        else:
+            copy_blob(self.cache.commit(key, target), dest)
+        return result
+
+    # ───────────────────────────────────────────────────────────────────────────────
+    # URLs
+
+    def _ref_path(self, url: str) -> Path:
+        return self.cache.root / "refs" / f"{digest_key(url)}.json"
+
+    def _load_ref(self, url: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._ref_path(url)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _save_ref(self, url: str, ref: Dict[str, Any]) -> None:
+        path = self._ref_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(ref))
+        os.replace(tmp, path)
+
+    def _fetch_url(self, name: str, url: str, dest: Path) -> FetchResult:
+        result = FetchResult(name, dest)
+        ref = self._load_ref(url) if self.cache is not None else None
+        cached = self.cache.path_for(ref["object"]) if ref else None
+        if cached is not None and not cached.exists():
+            ref, cached = None, None  # Object evicted since the ref was written
+
+        if ref and time.time() - ref["validated_at"] < self.revalidate_after_s:
+            self.cache.get(ref["object"])
+            copy_blob(cached, dest)
+            result.cache, result.bytes = "hit", cached.stat().st_size
+            return result
+
+        headers = {}
+        if ref and ref.get("etag"):
+            headers["If-None-Match"] = ref["etag"]
+        if ref and ref.get("last_modified"):
+            headers["If-Modified-Since"] = ref["last_modified"]
+
+        for attempt in range(1, self.retries + 2):
+            result.attempts = attempt
+            try:
+                request = urllib.request.Request(url, headers=headers)
+                try:
+                    response = urllib.request.urlopen(request, timeout=self.timeout)
+                except urllib.error.HTTPError as e:
+                    if e.code == 304 and ref:
+                        ref["validated_at"] = time.time()
+                        self._save_ref(url, ref)
+                        self.cache.get(ref["object"])
+                        copy_blob(cached, dest)
+                        result.cache, result.bytes = "revalidated", cached.stat().st_size
+                        return result
+                    raise
+
+                with response:
+                    self._stream(response, url, dest, result)
+                return result
+            except urllib.error.HTTPError as e:
+                if 400 <= e.code < 500 and e.code not in (408, 429):
+                    raise
+                if attempt > self.retries:
+                    raise
+            except (urllib.error.URLError, OSError):
+                if attempt > self.retries:
+                    raise
+            time.sleep(min(0.5 * 2 ** (attempt - 1), 8))
+        return result
+
+    def _stream(self, response, url: str, dest: Path, result: FetchResult) -> None:
+        if self.cache is not None:
+            self.cache.note_miss()
+        target = self.cache.reserve(dest.suffix) if self.cache is not None else dest
+        digest = hashlib.sha256()
+        try:
+            with open(target, "wb") as f:
+                for chunk in iter(lambda: response.read(self.chunk_size), b""):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    result.bytes += len(chunk)
+
+            length = response.headers.get("Content-Length")
+            if length is not None and int(length) != result.bytes:
+                raise OSError(f"truncated response: {result.bytes} of {length} bytes")
+        except BaseException:
+            result.bytes = 0
+            if target != dest:
+                target.unlink(missing_ok=True)
+            raise
+
+        if self.cache is None:
+            result.cache = "bypass"
+            return
+
+        if self.cache.contains(digest.hexdigest()):
+            target.unlink()  # Same content already cached under another URL or payload
+        else:
+            self.cache.commit(digest.hexdigest(), target)
+        copy_blob(self.cache.path_for(digest.hexdigest()), dest)
+        self._save_ref(url, {
+            "url": url,
+            "object": digest.hexdigest(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "validated_at": time.time(),
+        })
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def report(self, results: Dict[str, FetchResult], wall_s: Optional[float] = None) -> Dict[str, Any]:
+        """Per-input latency / cache outcome, plus this job's hit rate."""
+        hits = sum(1 for r in results.values() if r.cache in ("hit", "revalidated"))
+        cacheable = sum(1 for r in results.values() if r.cache != "bypass")
+        return {
+            "inputs": {name: r.to_dict() for name, r in results.items()},
+            "hit_rate": round(hits / cacheable, 3) if cacheable else 0.0,
+            "bytes": sum(r.bytes for r in results.values()),
+            "fetch_ms": round((wall_s if wall_s is not None
+                               else max((r.elapsed_s for r in results.values()), default=0)) * 1000, 1),
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
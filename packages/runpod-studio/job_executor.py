@@ -0,0 +1,279 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+JOB EXECUTOR - Concurrent Jobs, Pipelined by Resource Class
+═══════════════════════════════════════════════════════════════════════════════════
+
+`runpod.serverless.start({"handler": handler})` runs one job at a time, so the
+GPU idles while a job grades, encodes and uploads, and the CPU idles while
+the next one lip-syncs. Here several jobs run at once and every stage takes
+a slot of the resource class it needs:
+
+    gpu      MuseTalk, GFPGAN, Real-ESRGAN, the frame pipeline
+    cpu      ffmpeg mixing / grading / captions / encodes / thumbnails
+    upload   R2 / artifact uploads
+
+With one GPU slot the GPU work stays serialized, but job N+1's lip-sync runs
+while job N is in post-processing and upload. Slots are re-entrant within a
+thread, so a GPU stage that calls another GPU helper does not deadlock.
+
+Each class records busy slot-seconds and the time at least one slot was
+held. Utilization is busy / (wall × slots) and occupancy is held / wall.
+`FakeJobSource` + `simulated_handler` stand in for RunPod and the models
+when testing locally (see `python benchmark.py --executor`).
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import time
+import random
+import asyncio
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Optional, Dict, Any, List, Callable, Iterable, Iterator
+
+
+class ResourcePool:
+    """
+    Usage:
+        resources = ResourcePool({"gpu": 1, "cpu": 4, "upload": 4})
+
+        @resources.bound("gpu")
+        def run_lipsync(...): ...
+
+        with resources.track() as usage:         # per-job wait/hold times
+            with resources.use("cpu"):
+                subprocess.run(ffmpeg_cmd)
+        metadata["resources"] = usage
+        totals = resources.stats()
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = {name: max(1, int(n)) for name, n in limits.items()}
+        self._slots = {name: threading.BoundedSemaphore(n) for name, n in self.limits.items()}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        now = time.perf_counter()
+        self._started = now
+        self._busy = {name: 0 for name in self.limits}
+        self._busy_s = {name: 0.0 for name in self.limits}
+        self._occupied_s = {name: 0.0 for name in self.limits}
+        self._wait_s = {name: 0.0 for name in self.limits}
+        self._acquired = {name: 0 for name in self.limits}
+        self._peak = {name: 0 for name in self.limits}
+        self._changed = {name: now for name in self.limits}
+
+    def _advance(self, name: str, now: float) -> None:
+        # Integrate slot occupancy since the last change (caller holds the lock)
+        dt = now - self._changed[name]
+        self._busy_s[name] += self._busy[name] * dt
+        if self._busy[name]:
+            self._occupied_s[name] += dt
+        self._changed[name] = now
+
+    def _held(self) -> Dict[str, int]:
+        if not hasattr(self._local, "held"):
+            self._local.held = {}
+        return self._local.held
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    @contextmanager
+    def use(self, name: str):
+        """Hold one `name` slot (blocking until one is free) for the duration of the block."""
+        held = self._held()
+        if held.get(name):
+            held[name] += 1  # Already ours further up the stack
+            try:
+                yield
+            finally:
+                held[name] -= 1
+            return
+
+        t0 = time.perf_counter()
+        self._slots[name].acquire()
+        acquired = time.perf_counter()
+        with self._lock:
+            self._advance(name, acquired)
+            self._busy[name] += 1
+            self._acquired[name] += 1
+            self._wait_s[name] += acquired - t0
+            self._peak[name] = max(self._peak[name], self._busy[name])
+        held[name] = 1
+
+        try:
+            yield
+        finally:
+            held[name] = 0
+            released = time.perf_counter()
+            with self._lock:
+                self._advance(name, released)
+                self._busy[name] -= 1
+            self._slots[name].release()
+            usage = getattr(self._local, "usage", None)
+            if usage is not None:
+                entry = usage.setdefault(name, {"wait_ms": 0.0, "held_ms": 0.0})
+                entry["wait_ms"] = round(entry["wait_ms"] + (acquired - t0) * 1000, 1)
+                entry["held_ms"] = round(entry["held_ms"] + (released - acquired) * 1000, 1)
+
+    def bound(self, name: str):
+        """Decorator: the function runs holding a `name` slot."""
+        def decorate(fn: Callable) -> Callable:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.use(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    @contextmanager
+    def track(self):
+        """Collect this thread's wait / hold times per resource into the yielded dict."""
+        previous = getattr(self._local, "usage", None)
+        self._local.usage = usage = {}
+        try:
+            yield usage
+        finally:
+            self._local.usage = previous
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.perf_counter()
+        wall = now - self._started
+        report = {}
+        with self._lock:
+            for name, limit in self.limits.items():
+                self._advance(name, now)
+                report[name] = {
+                    "slots": limit,
+                    "in_use": self._busy[name],
+                    "peak": self._peak[name],
+                    "acquired": self._acquired[name],
+                    "busy_s": round(self._busy_s[name], 3),
+                    "wait_s": round(self._wait_s[name], 3),
+                    "utilization": round(self._busy_s[name] / (wall * limit), 3) if wall > 0 else 0.0,
+                    "occupancy": round(self._occupied_s[name] / wall, 3) if wall > 0 else 0.0,
+                }
+        return {"wall_s": round(wall, 3), "resources": report}
+
+
+class JobExecutor:
+    """
+    Usage:
+        executor = JobExecutor(handler, max_jobs=2, resources=resources)
+
+        # RunPod: up to max_jobs jobs in flight in this worker
+        runpod.serverless.start({"handler": executor.async_handler,
+                                 "concurrency_modifier": executor.concurrency})
+
+        # Locally: drain a job source, results in submission order
+        results = executor.run(FakeJobSource(count=8))
+
+    `handler(job)` is the synchronous RunPod handler; it runs on a pool
+    thread and takes resource slots itself.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Any], max_jobs: int = 2,
+                 resources: Optional[ResourcePool] = None):
+        self.handler = handler
+        self.max_jobs = max(1, max_jobs)
+        self.resources = resources
+        self.pool = ThreadPoolExecutor(self.max_jobs, thread_name_prefix="job")
+
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _run(self, job: Dict[str, Any]) -> Any:
+        with self._lock:
+            self.in_flight += 1
+        try:
+            result = self.handler(job)
+            with self._lock:
+                self.completed += 1
+            return result
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def submit(self, job: Dict[str, Any]) -> Future:
+        return self.pool.submit(self._run, job)
+
+    async def async_handler(self, job: Dict[str, Any]) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self._run, job)
+
+    def concurrency(self, current: int) -> int:
+        """RunPod `concurrency_modifier`: how many jobs this worker takes at once."""
+        return self.max_jobs
+
+    def run(self, jobs: Iterable[Dict[str, Any]]) -> List[Any]:
+        futures = [self.submit(job) for job in jobs]
+        return [future.result() for future in futures]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            report = {
+                "max_jobs": self.max_jobs,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+        if self.resources is not None:
+            report.update(self.resources.stats())
+        return report
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# LOCAL STAND-INS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class FakeJobSource:
+    """
+    RunPod-shaped jobs for local runs: each job is a list of (resource, seconds)
+    phases, by default lip-sync on the GPU, then post-processing and upload.
+    `jitter` varies every phase by up to ±jitter (fraction), seeded.
+    """
+
+    DEFAULT_PHASES = [("gpu", 0.20), ("cpu", 0.12), ("upload", 0.08)]
+
+    def __init__(self, count: int = 8, phases: Optional[List[tuple]] = None,
+                 jitter: float = 0.2, seed: int = 0):
+        self.count = count
+        self.phases = phases or self.DEFAULT_PHASES
+        self.jitter = jitter
+        self.seed = seed
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        rng = random.Random(self.seed)
+        for i in range(self.count):
+            phases = [(name, seconds * (1 + rng.uniform(-self.jitter, self.jitter)))
+                      for name, seconds in self.phases]
+            yield {"id": f"fake-{i}", "input": {"job_type": "fake", "phases": phases}}
+
+    def total_seconds(self) -> Dict[str, float]:
+        """Expected busy seconds per resource (without jitter)."""
+        totals: Dict[str, float] = {}
+        for name, seconds in self.phases:
+            totals[name] = totals.get(name, 0.0) + seconds * self.count
+        return totals
+
+
+def simulated_handler(resources: ResourcePool) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """A handler that sleeps through each phase of a FakeJobSource job while holding its resource."""
+    def handler(job: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        with resources.track() as usage:
+            for name, seconds in job["input"]["phases"]:
+                with resources.use(name):
+                    time.sleep(seconds)
+        return {"id": job["id"], "elapsed_s": time.perf_counter() - start, "resources": usage}
+    return handler
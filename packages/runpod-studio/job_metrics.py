@@ -0,0 +1,109 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+JOB METRICS - Per-Job Resource Measurements
+═══════════════════════════════════════════════════════════════════════════════════
+
+Process-wide counters (ru_maxrss, VmHWM) only ever grow, so a worker that once
+handled a large job reports that peak forever. PeakRssMonitor resets the Linux
+high-water mark at job start (/proc/self/clear_refs) so each job gets its own
+peak, and falls back to sampling VmRSS where the reset is not permitted.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import threading
+from typing import Optional, Dict, Any
+
+_STATUS = "/proc/self/status"
+
+
+def _status_bytes(field: str) -> Optional[int]:
+    try:
+        with open(_STATUS) as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size (Linux), or None."""
+    return _status_bytes("VmRSS")
+
+
+def _lifetime_peak_bytes() -> Optional[int]:
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+class PeakRssMonitor:
+    """
+    Usage:
+        with PeakRssMonitor() as rss:
+            run_job()
+        metadata["memory"] = rss.to_dict()
+
+    `method` is "hwm" (kernel high-water mark reset at entry), "sampled"
+    (VmRSS polled every `interval_s`; short spikes may be missed) or
+    "lifetime" (ru_maxrss, not per job).
+    """
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self.method = "lifetime"
+        self.start_bytes: Optional[int] = None
+        self.end_bytes: Optional[int] = None
+        self.peak_bytes: Optional[int] = None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "PeakRssMonitor":
+        self.start_bytes = rss_bytes()
+        self.peak_bytes = self.start_bytes
+        if self.start_bytes is None:
+            return self
+
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")  # Reset VmHWM to the current RSS
+            self.method = "hwm"
+        except OSError:
+            self.method = "sampled"
+            self._thread = threading.Thread(target=self._sample, name="rss-monitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            current = rss_bytes() or 0
+            if current > (self.peak_bytes or 0):
+                self.peak_bytes = current
+
+    def __exit__(self, *exc) -> bool:
+        self.end_bytes = rss_bytes()
+        if self.method == "hwm":
+            self.peak_bytes = _status_bytes("VmHWM")
+        elif self.method == "sampled":
+            self._stop.set()
+            self._thread.join()
+            self.peak_bytes = max(self.peak_bytes or 0, self.end_bytes or 0)
+        else:
+            self.peak_bytes = _lifetime_peak_bytes()
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        mb = lambda b: round(b / 1024 ** 2, 1) if b is not None else None
+        return {
+            "peak_rss_mb": mb(self.peak_bytes),
+            "start_rss_mb": mb(self.start_bytes),
+            "end_rss_mb": mb(self.end_bytes),
+            "method": self.method,
+        }
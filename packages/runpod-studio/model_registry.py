@@ -0,0 +1,259 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+MODEL REGISTRY - Lazy Loading, LRU Eviction, Memory Accounting
+═══════════════════════════════════════════════════════════════════════════════════
+
+Replaces the ad-hoc `_musetalk_ready` / `_gfpgan_model` / `_realesrgan_model` /
+`_liveportrait_ready` globals. Models are loaded on first use by key
+(name + params such as scale or precision), their footprint is tracked, and
+the least-recently-used models are evicted when a memory ceiling would be
+exceeded - so a pod can move between a realtime-heavy and a cinema-heavy job
+mix without OOM kills or parking unused weights in VRAM.
+
+Footprints are measured as the CUDA allocation delta around the load when
+torch + CUDA are available, and otherwise fall back to the declared estimate,
+so the registry is unit-testable with dummy factories.
+
+A model that a caller still holds (a BatchedFaceEnhancer mid-render, the
+MuseTalk engine behind coalesced realtime batches) must not be evicted:
+dropping the registry's reference would not free its VRAM, and the next
+`get` would load a second copy. Callers pin what they use for the duration
+(`with registry.acquire(name)` or `@registry.pin(name)`); pinned models are
+skipped by eviction, even when that leaves the registry above its ceiling.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import threading
+import time
+from collections import OrderedDict, Counter
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, Iterator, Tuple
+from dataclasses import dataclass
+
+ModelKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+
+@dataclass
+class ModelSpec:
+    factory: Callable[..., Any]
+    footprint_bytes: int = 0
+    unload: Optional[Callable[[Any], None]] = None
+
+
+@dataclass
+class ModelEntry:
+    key: ModelKey
+    model: Any
+    footprint_bytes: int
+    load_s: float
+    last_used: float
+
+
+def _cuda_allocated() -> Optional[int]:
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return int(torch.cuda.memory_allocated())
+    except ImportError:
+        pass
+    return None
+
+
+def release_cuda_cache() -> None:
+    """Return freed blocks to the driver after an eviction."""
+    try:
+        import gc
+        import torch
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+
+
+class ModelRegistry:
+    """
+    Usage:
+        registry = ModelRegistry(ceiling_bytes=40 * 1024**3)
+        registry.register("realesrgan", load_realesrgan, footprint_mb=700)
+        upsampler = registry.get("realesrgan", scale=4)
+
+        with registry.acquire("gfpgan") as gfpgan:      # not evicted until the block exits
+            ...
+
+        @registry.pin("realesrgan")                     # every realesrgan variant, per call
+        def upscale_video(...): ...
+
+    `ceiling_bytes=0` disables eviction (accounting and counters still work).
+    `measure` returns the current allocation in bytes (or None to trust the
+    declared footprint); it defaults to torch.cuda.memory_allocated.
+    """
+
+    def __init__(
+        self,
+        ceiling_bytes: int = 0,
+        measure: Optional[Callable[[], Optional[int]]] = _cuda_allocated,
+        on_evict: Optional[Callable[[], None]] = None,
+    ):
+        self.ceiling_bytes = ceiling_bytes
+        self.measure = measure or (lambda: None)
+        self.on_evict = on_evict
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._specs: Dict[str, ModelSpec] = {}
+        self._entries: "OrderedDict[ModelKey, ModelEntry]" = OrderedDict()
+        self._pins: Counter = Counter()
+        self._lock = threading.RLock()
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def register(self, name: str, factory: Callable[..., Any], footprint_mb: float = 0,
+                 unload: Optional[Callable[[Any], None]] = None) -> None:
+        """Declare a loadable model. `factory(**params)` builds it on first `get`."""
+        self._specs[name] = ModelSpec(factory, int(footprint_mb * 1024 * 1024), unload)
+
+    @staticmethod
+    def make_key(name: str, params: Dict[str, Any]) -> ModelKey:
+        return name, tuple(sorted(params.items()))
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(entry.footprint_bytes for entry in self._entries.values())
+
+    def loaded(self, name: str, **params) -> bool:
+        return self.make_key(name, params) in self._entries
+
+    def get(self, name: str, **params) -> Any:
+        """Return the model for (name, params), loading it (and evicting LRU) if needed."""
+        if name not in self._specs:
+            raise KeyError(f"Unknown model: {name}")
+        key = self.make_key(name, params)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry.last_used = time.time()
+                self._entries.move_to_end(key)
+                return entry.model
+
+            self.misses += 1
+            spec = self._specs[name]
+            self._make_room(spec.footprint_bytes)
+
+            print(f"[Registry] Loading {self._label(key)}...")
+            before = self.measure()
+            start = time.time()
+            model = spec.factory(**params)
+            load_s = time.time() - start
+            after = self.measure()
+
+            footprint = spec.footprint_bytes
+            if before is not None and after is not None and after > before:
+                footprint = after - before
+
+            self._entries[key] = ModelEntry(key, model, footprint, load_s, time.time())
+            print(f"[Registry] Loaded {self._label(key)} in {load_s:.2f}s "
+                  f"({footprint / 1024 ** 2:.0f} MB, {self.used_bytes / 1024 ** 2:.0f} MB in use)")
+
+            # The real footprint may exceed the estimate - settle up afterwards
+            self._make_room(0, keep=key)
+            return model
+
+    @contextmanager
+    def pin(self, name: str, **params) -> Iterator[None]:
+        """
+        Keep (name, params) from being evicted while the block (or decorated
+        call) runs. Without params every variant of `name` is pinned. Pins
+        nest and count; pinning does not load anything.
+        """
+        key = self.make_key(name, params)
+        with self._lock:
+            self._pins[key] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[key] -= 1
+                if self._pins[key] <= 0:
+                    del self._pins[key]
+
+    @contextmanager
+    def acquire(self, name: str, **params) -> Iterator[Any]:
+        """`get` the model and keep it pinned until the block exits."""
+        with self.pin(name, **params):
+            yield self.get(name, **params)
+
+    def pinned(self, key: ModelKey) -> bool:
+        return bool(self._pins.get(key) or self._pins.get((key[0], ())))
+
+    def _make_room(self, incoming: int, keep: Optional[ModelKey] = None) -> None:
+        if not self.ceiling_bytes:
+            return
+        while self._entries and self.used_bytes + incoming > self.ceiling_bytes:
+            victim = next((k for k in self._entries if k != keep and not self.pinned(k)), None)
+            if victim is None:
+                over = self.used_bytes + incoming - self.ceiling_bytes
+                print(f"[Registry] {over / 1024 ** 2:.0f} MB over the ceiling: no other model can be evicted")
+                break
+            self.evict(victim)
+
+    def evict(self, key: ModelKey) -> bool:
+        """Unload one model; returns False if it is not loaded or is pinned."""
+        with self._lock:
+            if self.pinned(key):
+                print(f"[Registry] Not evicting {self._label(key)}: in use")
+                return False
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self.evictions += 1
+            print(f"[Registry] Evicting {self._label(key)} ({entry.footprint_bytes / 1024 ** 2:.0f} MB)")
+
+            spec = self._specs.get(key[0])
+            if spec and spec.unload:
+                try:
+                    spec.unload(entry.model)
+                except Exception as e:
+                    print(f"[Registry] Unload hook failed for {key[0]}: {e}")
+            del entry
+            if self.on_evict:
+                self.on_evict()
+            return True
+
+    def clear(self) -> None:
+        """Evict every model that is not pinned."""
+        for key in list(self._entries):
+            self.evict(key)
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _label(key: ModelKey) -> str:
+        name, params = key
+        if not params:
+            return name
+        return f"{name}({', '.join(f'{k}={v}' for k, v in params)})"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "used_mb": round(self.used_bytes / 1024 ** 2, 1),
+                "ceiling_mb": round(self.ceiling_bytes / 1024 ** 2, 1),
+                "loaded": [
+                    {
+                        "model": self._label(entry.key),
+                        "mb": round(entry.footprint_bytes / 1024 ** 2, 1),
+                        "load_s": round(entry.load_s, 2),
+                        "pinned": self.pinned(entry.key),
+                    }
+                    for entry in self._entries.values()
+                ],
+            }
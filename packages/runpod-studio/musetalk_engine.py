@@ -0,0 +1,212 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+MUSETALK ENGINE - Resident Models, Cached Avatars, Audio-Driven Generation
+═══════════════════════════════════════════════════════════════════════════════════
+
+Replaces the `scripts.inference.main(args)` call, which reloaded the models
+and redid the image preparation on every job. The engine keeps the VAE, UNet,
+positional encoding and Whisper feature extractor resident (owned by the
+model registry) and splits inference into:
+
+    prepare_avatar(image)   → AvatarPrep  (landmarks, bbox, latents, masks;
+                                           cached per image by AvatarCache)
+    featurize(pcm)          → Whisper features of one audio window
+                              (streamed and cached by AudioFeatureExtractor)
+    audio_chunks(features)  → per-frame feature windows at the job's fps
+    generate(prep, chunks)  → blended BGR frames, batch by batch
+
+so a repeat persona goes straight to the audio-driven UNet passes.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import wave
+import tempfile
+from pathlib import Path
+from typing import Optional, Any, List, Iterator, Callable
+
+import numpy as np
+
+from avatar_cache import AvatarPrep
+from audio_features import SAMPLE_RATE
+
+FACE_SIZE = 256  # MuseTalk's UNet works on 256×256 face crops
+
+
+def _load_models(root: Path):
+    """
+    MuseTalk's `load_all_model()` with its weight paths resolved against the
+    checkout. Its own defaults are relative ("./models/..."), i.e. to the
+    process cwd, which other jobs' threads share.
+    """
+    from musetalk.whisper.audio2feature import Audio2Feature
+    from musetalk.models.vae import VAE
+    from musetalk.models.unet import UNet, PositionalEncoding
+
+    models = Path(root).resolve() / "models"
+    audio_processor = Audio2Feature(model_path=str(models / "whisper" / "tiny.pt"))
+    vae = VAE(model_path=str(models / "sd-vae-ft-mse"))
+    unet = UNet(unet_config=str(models / "musetalk" / "musetalk.json"),
+                model_path=str(models / "musetalk" / "pytorch_model.bin"))
+    pe = PositionalEncoding(d_model=384)
+    return audio_processor, vae, unet, pe
+
+
+class MuseTalkEngine:
+    """
+    Usage:
+        engine = MuseTalkEngine.load(MUSETALK_DIR)
+        prep = engine.prepare_avatar(image_path)
+        features = engine.featurize(pcm_16k)
+        for frame in engine.generate(prep, engine.audio_chunks(features, fps=25), batch_size=8):
+            sink.write(frame)
+    """
+
+    version = "musetalk-v1"
+
+    def __init__(self, audio_processor: Any, vae: Any, unet: Any, pe: Any, device: Any,
+                 bbox_shift: int = 0):
+        import torch
+
+        self.audio_processor = audio_processor
+        self.vae = vae
+        self.unet = unet
+        self.pe = pe
+        self.device = device
+        self.bbox_shift = bbox_shift
+        self.timesteps = torch.tensor([0], device=device)
+
+    @classmethod
+    def load(cls, root: Path, half: bool = True, bbox_shift: int = 0) -> "MuseTalkEngine":
+        import torch
+
+        audio_processor, vae, unet, pe = _load_models(root)
+
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if half and device.type == "cuda":
+            pe = pe.half()
+            vae.vae = vae.vae.half()
+            unet.model = unet.model.half()
+        pe = pe.to(device)
+        return cls(audio_processor, vae, unet, pe, device, bbox_shift=bbox_shift)
+
+    # ───────────────────────────────────────────────────────────────────────────────
+    # Avatar preparation (audio-independent)
+
+    @property
+    def prep_params(self) -> dict:
+        """Everything besides the image that changes `prepare_avatar`'s result."""
+        return {"model": self.version, "bbox_shift": self.bbox_shift, "face_size": FACE_SIZE}
+
+    @staticmethod
+    def _face_landmarks(frame: np.ndarray) -> Optional[np.ndarray]:
+        """68 face keypoints from MuseTalk's DWPose model (the ones behind its bbox), if reachable."""
+        try:
+            from mmpose.apis import inference_topdown
+            from mmpose.structures import merge_data_samples
+            from musetalk.utils.preprocessing import model as pose_model
+
+            results = merge_data_samples(inference_topdown(pose_model, frame))
+            return np.asarray(results.pred_instances.keypoints[0][23:91], dtype=np.float32)
+        except Exception:
+            return None
+
+    def prepare_avatar(self, image_path: Path) -> AvatarPrep:
+        import cv2
+        from musetalk.utils.preprocessing import get_landmark_and_bbox, coord_placeholder
+        from musetalk.utils.blending import get_image_prepare_material
+
+        coords, frames = get_landmark_and_bbox([str(image_path)], self.bbox_shift)
+
+        kept_frames, bboxes, landmarks, latents, masks, mask_boxes = [], [], [], [], [], []
+        for bbox, frame in zip(coords, frames):
+            if bbox == coord_placeholder:
+                continue
+            x1, y1, x2, y2 = bbox
+            crop = cv2.resize(frame[y1:y2, x1:x2], (FACE_SIZE, FACE_SIZE), interpolation=cv2.INTER_LANCZOS4)
+            latent = self.vae.get_latents_for_unet(crop)
+            mask, mask_box = get_image_prepare_material(frame, [x1, y1, x2, y2])
+
+            points = self._face_landmarks(frame)
+            kept_frames.append(frame)
+            bboxes.append(bbox)
+            landmarks.append(points if points is not None else np.full((68, 2), np.nan, np.float32))
+            latents.append(latent.detach().float().cpu().numpy()[0].astype(np.float16))
+            masks.append(np.asarray(mask, dtype=np.uint8))
+            mask_boxes.append(mask_box)
+
+        if not bboxes:
+            raise ValueError(f"No face found in {image_path}")
+
+        return AvatarPrep(
+            frames=np.stack(kept_frames).astype(np.uint8),
+            bboxes=np.asarray(bboxes, dtype=np.int32),
+            landmarks=np.stack(landmarks),
+            latents=np.stack(latents),
+            masks=masks,
+            mask_boxes=np.asarray(mask_boxes, dtype=np.int32),
+            meta={"source": Path(image_path).name},
+        )
+
+    # ───────────────────────────────────────────────────────────────────────────────
+    # Audio-driven generation
+
+    @property
+    def feature_params(self) -> dict:
+        """Everything besides the audio that changes `featurize`'s result."""
+        return {"model": self.version, "whisper": "tiny"}
+
+    def featurize(self, pcm: np.ndarray) -> np.ndarray:
+        """Whisper encoder features (50 per second) for one mono float32 window at 16 kHz."""
+        # Audio2Feature only takes a path; hand it the window as 16-bit WAV
+        with tempfile.NamedTemporaryFile(suffix=".wav") as f:
+            with wave.open(f.name, "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(SAMPLE_RATE)
+                w.writeframes((np.clip(pcm, -1, 1) * 32767).astype("<i2").tobytes())
+            return np.asarray(self.audio_processor.audio2feat(f.name))
+
+    def audio_chunks(self, features: np.ndarray, fps: int) -> List[np.ndarray]:
+        """Whisper features windowed to one chunk per output video frame."""
+        return self.audio_processor.feature2chunks(feature_array=features, fps=fps)
+
+    def infer(self, latents: np.ndarray, audio: np.ndarray) -> List[np.ndarray]:
+        """
+        One UNet + VAE pass: B avatar latents and B audio chunks → B face crops
+        (FACE_SIZE² BGR). Rows are independent, so one batch may mix frames of
+        several jobs (batch_coalescer).
+        """
+        import torch
+
+        dtype = self.unet.model.dtype
+        audio = self.pe(torch.from_numpy(np.asarray(audio)).to(device=self.device, dtype=dtype))
+        latent = torch.from_numpy(np.asarray(latents, dtype=np.float32)).to(device=self.device, dtype=dtype)
+
+        with torch.no_grad():
+            pred = self.unet.model(latent, self.timesteps, encoder_hidden_states=audio).sample
+            return list(self.vae.decode_latents(pred))
+
+    def generate(self, prep: AvatarPrep, chunks: List[np.ndarray], batch_size: int = 8,
+                 infer: Optional[Callable[[np.ndarray, np.ndarray], List[np.ndarray]]] = None
+                 ) -> Iterator[np.ndarray]:
+        """
+        Yield one blended full-resolution BGR frame per audio chunk. `infer`
+        replaces the direct forward pass, e.g. with a coalescer that batches
+        these frames together with other jobs'.
+        """
+        import cv2
+        from musetalk.utils.blending import get_image_blending
+
+        infer = infer or self.infer
+        latents = np.asarray(prep.latents)
+
+        for start in range(0, len(chunks), batch_size):
+            indices = [prep.cycle_index(i) for i in range(start, min(start + batch_size, len(chunks)))]
+            faces = infer(latents[indices], np.stack(chunks[start:start + len(indices)]))
+
+            for face, j in zip(faces, indices):
+                x1, y1, x2, y2 = (int(v) for v in prep.bboxes[j])
+                face = cv2.resize(face.astype(np.uint8), (x2 - x1, y2 - y1))
+                yield get_image_blending(np.array(prep.frames[j]), face, [x1, y1, x2, y2],
+                                         prep.masks[j], [int(v) for v in prep.mask_boxes[j]])
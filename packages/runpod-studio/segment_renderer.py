@@ -0,0 +1,321 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+SEGMENT RENDERER - Long-Form Lip-Sync Split at Silences, Rendered in Parallel
+═══════════════════════════════════════════════════════════════════════════════════
+
+One `run_musetalk_inference` call over a 10-minute narration holds a single
+GPU stream for the whole duration. The segment renderer instead:
+
+    1. finds silences in the voice track (RMS over 20 ms windows, vectorized)
+    2. plans segments of ~`target_s` cut at silence midpoints, snapped to
+       video frame boundaries so every cut is frame-accurate
+    3. renders the segments concurrently on a worker pool, each one `overlap`
+       frames longer than its share so neighbours can be crossfaded
+    4. stitches them in order (streaming: segment k is written as soon as it
+       and its predecessor are done) with a linear crossfade over the overlap,
+       and muxes the original, uncut voice track
+
+Each segment's frame count is forced to its planned length (pad with the last
+frame / truncate), so video frame n always lines up with audio at n / fps.
+
+The lip-sync backend, audio cutter, frame reader and sink are all injectable,
+so planning and stitching run on CPU with a stub backend.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import time
+import subprocess
+from pathlib import Path
+from typing import Dict, Any, List, Callable, Iterable, Iterator, Tuple
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_features import SAMPLE_RATE, ffmpeg_pcm_chunks
+
+# backend(segment, segment_audio_path, segment_video_path) renders one segment
+LipSyncBackend = Callable[["Segment", Path, Path], Any]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# SILENCE DETECTION
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def rms_envelope(pcm_chunks: Iterable[np.ndarray], sample_rate: int = SAMPLE_RATE,
+                 window_s: float = 0.02) -> Tuple[np.ndarray, float]:
+    """Per-window RMS level in dBFS over a stream of mono PCM chunks, and the total duration."""
+    window = max(1, int(sample_rate * window_s))
+    levels: List[np.ndarray] = []
+    carry = np.empty(0, np.float32)
+    samples = 0
+    for chunk in pcm_chunks:
+        samples += len(chunk)
+        data = np.concatenate([carry, chunk]) if len(carry) else chunk
+        usable = len(data) - len(data) % window
+        if usable:
+            frames = data[:usable].reshape(-1, window).astype(np.float32)
+            levels.append(np.sqrt(np.mean(frames * frames, axis=1)))
+        carry = data[usable:]
+    if len(carry):
+        levels.append(np.sqrt([np.mean(carry.astype(np.float32) ** 2)]))
+
+    rms = np.concatenate(levels) if levels else np.empty(0, np.float32)
+    return 20 * np.log10(np.maximum(rms, 1e-10)), samples / sample_rate
+
+
+def find_silences(levels_db: np.ndarray, window_s: float = 0.02, threshold_db: float = -40,
+                  min_silence_s: float = 0.25) -> List[Tuple[float, float]]:
+    """(start_s, end_s) of every run of windows below `threshold_db` lasting `min_silence_s`."""
+    quiet = np.concatenate([[False], levels_db < threshold_db, [False]])
+    edges = np.flatnonzero(np.diff(quiet.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    keep = (ends - starts) * window_s >= min_silence_s
+    return [(s * window_s, e * window_s) for s, e in zip(starts[keep], ends[keep])]
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# PLANNING
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class Segment:
+    index: int
+    start_frame: int
+    end_frame: int               # Exclusive; the segment's share of the output
+    render_end_frame: int        # Exclusive; end_frame + crossfade overlap (not past the end)
+    fps: float
+
+    @property
+    def frames(self) -> int:
+        return self.end_frame - self.start_frame
+
+    @property
+    def render_frames(self) -> int:
+        return self.render_end_frame - self.start_frame
+
+    @property
+    def start_s(self) -> float:
+        return self.start_frame / self.fps
+
+    @property
+    def render_duration_s(self) -> float:
+        return self.render_frames / self.fps
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "start_s": round(self.start_s, 3),
+            "end_s": round(self.end_frame / self.fps, 3),
+            "frames": self.frames,
+            "overlap_frames": self.render_end_frame - self.end_frame,
+        }
+
+
+def plan_segments(
+    duration_s: float,
+    silences: List[Tuple[float, float]],
+    fps: float,
+    target_s: float = 30.0,
+    min_s: float = 10.0,
+    max_s: float = 60.0,
+    overlap_frames: int = 6,
+) -> List[Segment]:
+    """
+    Cut [0, duration) into segments near `target_s` long, at the silence
+    midpoint closest to the target inside [min_s, max_s]; a hard cut at
+    `max_s` when there is none. All cuts fall on frame boundaries.
+    """
+    total = int(round(duration_s * fps))
+    cuts = sorted({int(round((a + b) / 2 * fps)) for a, b in silences})
+    lo, hi, target = int(min_s * fps), int(max_s * fps), int(target_s * fps)
+
+    bounds = [0]
+    while total - bounds[-1] > hi:
+        pos = bounds[-1]
+        candidates = [c for c in cuts if pos + lo <= c <= pos + hi and total - c >= lo]
+        bounds.append(min(candidates, key=lambda c: abs(c - pos - target)) if candidates else pos + hi)
+    bounds.append(total)
+
+    segments = []
+    for start, end in zip(bounds, bounds[1:]):
+        if end <= start:
+            continue
+        render_end = min(end + overlap_frames, total) if end < total else end
+        segments.append(Segment(len(segments), start, end, render_end, fps))
+    return segments
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# STITCHING
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def fit_frames(frames: Iterable[np.ndarray], count: int) -> Iterator[np.ndarray]:
+    """Exactly `count` frames: truncate, or repeat the last frame if the backend came up short."""
+    last = None
+    n = 0
+    for frame in frames:
+        if n == count:
+            return
+        last = frame
+        n += 1
+        yield frame
+    if last is None and count:
+        raise ValueError("Segment rendered no frames")
+    for _ in range(count - n):
+        yield last
+
+
+def crossfade(a: np.ndarray, b: np.ndarray, weight: float) -> np.ndarray:
+    """(1 - weight) * a + weight * b, rounded back to uint8."""
+    mixed = a.astype(np.float32) * (1 - weight) + b.astype(np.float32) * weight
+    return (mixed + 0.5).astype(np.uint8)
+
+
+def stitch_segments(segments: List[Segment],
+                    sources: Iterable[Iterable[np.ndarray]]) -> Iterator[np.ndarray]:
+    """
+    Yield the output frames in order. The overlap frames rendered past a
+    segment's end are blended into the start of the next segment, ramping
+    linearly from the old render to the new one.
+    """
+    tail: List[np.ndarray] = []
+    for segment, source in zip(segments, sources):
+        next_tail: List[np.ndarray] = []
+        for j, frame in enumerate(fit_frames(source, segment.render_frames)):
+            if j >= segment.frames:
+                next_tail.append(frame)
+                continue
+            if j < len(tail):
+                frame = crossfade(tail[j], frame, (j + 1) / (len(tail) + 1))
+            yield frame
+        tail = next_tail
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# RENDERER
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def ffmpeg_cut_audio(src: Path, start_s: float, duration_s: float, dest: Path) -> Path:
+    """Sample-accurate cut (decode-side seek) to 16-bit WAV at the source rate."""
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-i", str(src),
+        "-ss", f"{start_s:.6f}", "-t", f"{duration_s:.6f}",
+        "-c:a", "pcm_s16le",
+        str(dest)
+    ], check=True, capture_output=True)
+    return dest
+
+
+def video_frames(path: Path) -> Iterable[np.ndarray]:
+    from frame_pipeline import VideoFrameSource
+    return VideoFrameSource(path)
+
+
+class SegmentRenderer:
+    """
+    Usage:
+        renderer = SegmentRenderer(
+            lambda seg, audio, out: run_musetalk_inference(image, audio, out, quality),
+            workers=2,
+        )
+        stats = renderer.render(voice_path, workdir, fps=30,
+                                sink=FfmpegEncoderSink(output_path, audio_path=voice_path))
+
+    Workers share whatever the backend closes over (one engine through the
+    model registry, or a pool of them). `pcm_source`, `cut_audio` and
+    `read_frames` default to ffmpeg / OpenCV; stubs make it CPU-testable.
+    """
+
+    def __init__(
+        self,
+        backend: LipSyncBackend,
+        workers: int = 2,
+        target_s: float = 30.0,
+        min_s: float = 10.0,
+        max_s: float = 60.0,
+        crossfade_s: float = 0.2,
+        silence_db: float = -40.0,
+        min_silence_s: float = 0.25,
+        pcm_source: Callable[[Path, int], Iterable[np.ndarray]] = ffmpeg_pcm_chunks,
+        cut_audio: Callable[[Path, float, float, Path], Path] = ffmpeg_cut_audio,
+        read_frames: Callable[[Path], Iterable[np.ndarray]] = video_frames,
+    ):
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.target_s = target_s
+        self.min_s = min_s
+        self.max_s = max_s
+        self.crossfade_s = crossfade_s
+        self.silence_db = silence_db
+        self.min_silence_s = min_silence_s
+        self.pcm_source = pcm_source
+        self.cut_audio = cut_audio
+        self.read_frames = read_frames
+
+    def plan(self, audio_path: Path, fps: float) -> Tuple[List[Segment], float]:
+        levels, duration = rms_envelope(self.pcm_source(Path(audio_path), SAMPLE_RATE * 10))
+        silences = find_silences(levels, threshold_db=self.silence_db, min_silence_s=self.min_silence_s)
+        segments = plan_segments(duration, silences, fps, target_s=self.target_s, min_s=self.min_s,
+                                 max_s=self.max_s, overlap_frames=int(round(self.crossfade_s * fps)))
+        return segments, duration
+
+    def _render_one(self, segment: Segment, audio_path: Path, workdir: Path) -> Tuple[Path, float]:
+        start = time.time()
+        segment_audio = self.cut_audio(audio_path, segment.start_s, segment.render_duration_s,
+                                       workdir / f"segment_{segment.index:03d}.wav")
+        segment_video = workdir / f"segment_{segment.index:03d}.mp4"
+        self.backend(segment, segment_audio, segment_video)
+        return segment_video, time.time() - start
+
+    def render(self, audio_path: Path, workdir: Path, fps: float, sink: Any) -> Dict[str, Any]:
+        """Render `audio_path` into `sink` (opened here from the first frame). Returns timing stats."""
+        start = time.time()
+        workdir = Path(workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+        segments, duration = self.plan(audio_path, fps)
+        plan_s = time.time() - start
+        if not segments:
+            raise ValueError(f"No audio to render in {audio_path}")
+        print(f"[Segments] {duration:.1f}s of audio → {len(segments)} segments, {self.workers} workers")
+
+        timings: List[float] = [0.0] * len(segments)
+        frames = 0
+        opened = False
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="segment") as pool:
+            futures = [pool.submit(self._render_one, seg, Path(audio_path), workdir) for seg in segments]
+
+            def sources() -> Iterator[Iterable[np.ndarray]]:
+                for i, future in enumerate(futures):
+                    path, timings[i] = future.result()
+                    yield self.read_frames(path)
+
+            try:
+                for frame in stitch_segments(segments, sources()):
+                    if not opened:
+                        sink.open(frame.shape[1], frame.shape[0], fps)
+                        opened = True
+                    sink.write(frame)
+                    frames += 1
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                if opened:
+                    sink.abort()
+                raise
+        encoder = sink.close()
+
+        wall = time.time() - start
+        busy = sum(timings)
+        return {
+            "segments": [dict(seg.to_dict(), render_s=round(t, 3)) for seg, t in zip(segments, timings)],
+            "workers": self.workers,
+            "duration_s": round(duration, 3),
+            "frames": frames,
+            "plan_s": round(plan_s, 3),
+            "elapsed_s": round(wall, 3),
+            "parallel_speedup": round(busy / wall, 2) if wall > 0 else 0.0,
+            "encoder": encoder.to_dict() if hasattr(encoder, "to_dict") else None,
+        }
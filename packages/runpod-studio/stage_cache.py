@@ -0,0 +1,250 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+STAGE CACHE - Cross-Job Memoization of Lip-Sync / Enhance / Upscale / Grade
+═══════════════════════════════════════════════════════════════════════════════════
+
+Many jobs are near-duplicates: the same image and voice with another caption
+style, or the same lip-sync under a different `music_url`. Checkpoints only
+help the retry of one job; this cache lets any later job reuse a stage output.
+
+Each memoized stage is keyed by a digest of its inputs and the
+QUALITY_PRESETS fields that change its result:
+
+    lipsync   ← image content + voice content + {fps, engine, segmenting}
+    enhanced  ← lipsync key  + {GFPGAN settings}
+    upscaled  ← upstream key + {upscale_factor, temporal_smoothing}
+    graded    ← upstream key + {style}
+
+Keys chain, so a stage only matches when everything upstream matched too.
+Fields that only affect throughput (batch_size) or the final encode (crf,
+bitrates) are left out, so a draft and a cinema render share the lip-sync.
+
+Entries live in a size-capped LRU DiskCache as `<key>/<filename>` +
+`<key>/meta.json` (stage, producing time, stats). A hit is copied (reflinked
+where the filesystem can) to where the stage would have written its output;
+never hard-linked, since a retried step rewrites its output in place.
+
+In the single-pass frame pipeline the enhance → upscale → grade prefix is
+fused, so only the deepest stage of that prefix is stored (a tee into a
+near-lossless encode) and a later job starts decoding from it.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import json
+import time
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable, Tuple, Union
+from dataclasses import dataclass
+
+from disk_cache import DiskCache, copy_blob, digest_key, file_digest
+
+MEMO_VERSION = 1
+
+# Frame-pipeline stage name → memoized stage name
+PIPELINE_STAGES = {"face_enhance": "enhanced", "upscale": "upscaled", "color_grade": "graded"}
+
+
+@dataclass
+class StageLookup:
+    stage: str
+    key: str
+    cache: str = "miss"          # "hit" | "miss" | "bypass"
+    elapsed_s: float = 0.0
+    bytes: int = 0
+    saved_s: float = 0.0         # Time the original run took (hits only)
+    stats: Any = None
+    path: Optional[Path] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "key": self.key[:16],
+            "cache": self.cache,
+            "ms": round(self.elapsed_s * 1000, 1),
+            "bytes_saved": self.bytes if self.cache == "hit" else 0,
+            "saved_s": round(self.saved_s, 3),
+        }
+
+
+@dataclass
+class PipelinePlan:
+    """What's left of a frame-pipeline run after the stage cache has been consulted."""
+    input_path: Path
+    stages: List[Any]
+    lookups: List[StageLookup]
+    store: Optional[Tuple[str, str, int]] = None  # (stage, key, tee position in `stages`)
+
+
+def differs(a: Path, b: Path) -> bool:
+    """False if `b` is a byte copy of `a` (how the file-based steps fall back on failure)."""
+    if a.stat().st_size != b.stat().st_size:
+        return True
+    return file_digest(a) != file_digest(b)
+
+
+class StageMemo:
+    """
+    Usage:
+        memo = StageMemo(DiskCache(WORKSPACE / "cache" / "stages", max_bytes=100 * 1024**3))
+        key = memo.key("lipsync", image_path, voice_path, params={"fps": 30})
+        lookup = memo.run("lipsync", key, out, lambda path: run_lipsync(..., path))
+        metadata["stage_cache"] = [lookup.to_dict()]
+
+    `key` inputs are files (hashed by content) or upstream keys. `run` either
+    places the cached output at `out` or calls `produce(out)`, which may
+    return JSON-able stats; `keep(stats)` decides whether the result is
+    good enough to store (e.g. not a fallback render).
+    """
+
+    def __init__(self, cache: Optional[DiskCache] = None):
+        self.cache = cache
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache is not None
+
+    def _file_digest(self, path: Path) -> str:
+        st = Path(path).stat()
+        marker = (str(path), st.st_size, st.st_mtime_ns)
+        if marker not in self._digests:
+            self._digests[marker] = file_digest(path)
+        return self._digests[marker]
+
+    def key(self, stage: str, *inputs: Union[Path, str, None],
+            params: Optional[Dict[str, Any]] = None) -> str:
+        parts = [self._file_digest(item) if isinstance(item, Path) else str(item)
+                 for item in inputs if item is not None]
+        return digest_key(MEMO_VERSION, stage, *parts, json.dumps(params or {}, sort_keys=True, default=str))
+
+    def _count(self, lookup: StageLookup) -> None:
+        with self._lock:
+            counters = self._stages.setdefault(lookup.stage, {
+                "hits": 0, "misses": 0, "bytes_saved": 0, "saved_s": 0.0, "bytes_stored": 0,
+            })
+            if lookup.cache == "hit":
+                counters["hits"] += 1
+                counters["bytes_saved"] += lookup.bytes
+                counters["saved_s"] += lookup.saved_s
+            elif lookup.cache == "miss":
+                counters["misses"] += 1
+                counters["bytes_stored"] += lookup.bytes
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def lookup(self, stage: str, key: str) -> Optional[Tuple[Path, Dict[str, Any]]]:
+        """(output file, meta) of a stored stage, or None."""
+        if self.cache is None:
+            return None
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        try:
+            meta = json.loads((entry / "meta.json").read_text())
+            return entry / meta["filename"], meta
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[StageCache] Dropping unreadable {stage} entry {key[:16]}: {e}")
+            self.cache.remove(key)
+            return None
+
+    def hit(self, stage: str, key: str, start: float) -> Optional[StageLookup]:
+        found = self.lookup(stage, key)
+        if found is None:
+            return None
+        path, meta = found
+        lookup = StageLookup(stage, key, "hit", time.time() - start, path.stat().st_size,
+                             meta.get("elapsed_s", 0.0), meta.get("stats"), path)
+        self._count(lookup)
+        print(f"[StageCache] {stage} hit ({lookup.bytes / 1024 ** 2:.1f} MB, "
+              f"saves ~{lookup.saved_s:.1f}s)")
+        return lookup
+
+    def reserve(self) -> Path:
+        directory = self.cache.reserve()
+        directory.mkdir(parents=True)
+        return directory
+
+    def commit(self, stage: str, key: str, directory: Path, filename: str,
+               elapsed_s: float, stats: Any = None) -> StageLookup:
+        """Store a reserved directory holding `filename` as the entry for `key`."""
+        (directory / "meta.json").write_text(json.dumps({
+            "stage": stage,
+            "filename": filename,
+            "elapsed_s": round(elapsed_s, 3),
+            "stats": stats,
+            "created_at": time.time(),
+        }, default=str))
+        size = (directory / filename).stat().st_size
+        self.cache.commit(key, directory)
+        lookup = StageLookup(stage, key, "miss", elapsed_s, size, stats=stats)
+        self._count(lookup)
+        return lookup
+
+    def discard(self, directory: Path) -> None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def run(self, stage: str, key: str, output: Path, produce: Callable[[Path], Any],
+            keep: Optional[Callable[[Any], bool]] = None) -> StageLookup:
+        start = time.time()
+        cached = self.hit(stage, key, start)
+        if cached is not None:
+            copy_blob(cached.path, output)
+            return cached
+
+        stats = produce(output)
+        elapsed = time.time() - start
+        if self.cache is None or not output.exists() or (keep is not None and not keep(stats)):
+            return StageLookup(stage, key, "bypass", elapsed, stats=stats)
+
+        directory = self.reserve()
+        try:
+            copy_blob(output, directory / output.name)
+            return self.commit(stage, key, directory, output.name, elapsed, stats)
+        except BaseException:
+            self.discard(directory)
+            raise
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def plan_pipeline(self, input_path: Path, stages: List[Any], upstream_key: str,
+                      params: Dict[str, Dict[str, Any]]) -> PipelinePlan:
+        """
+        Skip the leading memoizable stages (PIPELINE_STAGES) whose fused output
+        is cached, and say where to tee frames to store the deepest one.
+        `params` maps memoized stage names to their key params.
+        """
+        start = time.time()
+        keys = []
+        for stage in stages:
+            memo_name = PIPELINE_STAGES.get(stage.name)
+            if memo_name is None:
+                break
+            # Tee'd frames carry no audio track, so they never stand in for a file-chain output
+            upstream_key = self.key(memo_name, upstream_key, "pipeline", params=params.get(memo_name))
+            keys.append((memo_name, upstream_key))
+
+        if not keys or self.cache is None:
+            return PipelinePlan(input_path, stages, [])
+
+        for depth in range(len(keys), 0, -1):
+            cached = self.hit(*keys[depth - 1], start)
+            if cached is not None:
+                remaining = stages[depth:]
+                store = None
+                if depth < len(keys):
+                    store = (*keys[-1], len(keys) - depth)
+                return PipelinePlan(cached.path, remaining, [cached], store)
+
+        return PipelinePlan(input_path, stages, [], (*keys[-1], len(keys)))
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        with self._lock:
+            stages = {name: {**c, "saved_s": round(c["saved_s"], 1)} for name, c in self._stages.items()}
+        return {**self.cache.stats(), "stages": stages}
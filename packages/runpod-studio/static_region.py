@@ -0,0 +1,237 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+STATIC REGION REUSE - Enhance / Upscale the Background Once, the Face per Frame
+═══════════════════════════════════════════════════════════════════════════════════
+
+Every job animates one still `source_image`: outside the mouth and jaw each
+MuseTalk frame is (up to compression noise) the same picture. GFPGAN and
+Real-ESRGAN still ran on every full frame. In delta-region mode:
+
+    frame 0 ──▶ model (full frame) ──▶ background (cached, output size)
+    frame n ──▶ ChangeDetector ──▶ ROI ──▶ model (ROI crop only)
+                                              │
+                 background ◀── composite ◀───┘  feathered at interior edges
+
+1. The first frame of a run goes through the model whole. That frame and
+   its output become the reference and the cached background.
+2. ChangeDetector compares each batch with the reference on 4×4 block sums.
+   Isolated noisy blocks are dropped. The bounding box of what is left is
+   padded by `margin`, so the model sees context around the change.
+   For GFPGAN the box is widened to the aligned face (face_box), because
+   the restorer needs the whole face in its crop.
+3. Only the ROI crop goes through the model. The result is blended onto
+   the background with a mask that ramps over `feather` pixels at ROI edges
+   that lie inside the frame, which hides model edge effects.
+4. A batch with no change reuses the background as is. A change that
+   covers more than `max_fraction` of the frame (head motion, a scene cut)
+   is processed whole and becomes the new reference.
+
+Everything here is NumPy on uint8 frames and runs without a GPU. The stage
+that drives it is frame_pipeline.DeltaRegionStage (see `python benchmark.py
+--delta`).
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+from typing import Optional, Dict, Any, List, Tuple
+from dataclasses import dataclass
+
+import numpy as np
+
+# (x0, y0, x1, y1) in pixels, exclusive end
+Box = Tuple[int, int, int, int]
+
+
+def box_area(box: Box) -> int:
+    x0, y0, x1, y1 = box
+    return max(0, x1 - x0) * max(0, y1 - y0)
+
+
+def union_box(a: Optional[Box], b: Optional[Box]) -> Optional[Box]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+def expand_box(box: Box, margin: int, width: int, height: int, align: int = 1) -> Box:
+    """Pad by `margin`, snap outwards to multiples of `align` and clip to the frame."""
+    x0, y0, x1, y1 = box
+    x0 = max(0, (x0 - margin) // align * align)
+    y0 = max(0, (y0 - margin) // align * align)
+    x1 = min(width, -(-(x1 + margin) // align) * align)
+    y1 = min(height, -(-(y1 + margin) // align) * align)
+    return x0, y0, x1, y1
+
+
+def face_box(affine: np.ndarray, face_size: int, width: int, height: int, margin: int = 16,
+             align: int = 8) -> Box:
+    """
+    Frame-space box around an aligned face: the bounding box of the
+    `face_size` square (face_batch's aligned crop) mapped back through
+    the inverse of `affine`.
+    """
+    a = np.vstack([np.asarray(affine, dtype=np.float64), [0.0, 0.0, 1.0]])
+    inverse = np.linalg.inv(a)[:2]
+    corners = np.array([[0, 0, 1], [face_size, 0, 1], [0, face_size, 1], [face_size, face_size, 1]],
+                       dtype=np.float64)
+    points = corners @ inverse.T
+    box = (int(np.floor(points[:, 0].min())), int(np.floor(points[:, 1].min())),
+           int(np.ceil(points[:, 0].max())), int(np.ceil(points[:, 1].max())))
+    return expand_box(box, margin, width, height, align)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# CHANGE DETECTION
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class ChangeDetector:
+    """
+    Usage:
+        detector = ChangeDetector(threshold=10, margin=32)
+        detector.reset(reference_frame)
+        box = detector.changed_box(frames)   # None when nothing moved
+
+    A block counts as changed when a channel's mean differs from the
+    reference block by more than `threshold` levels. Block means average out
+    per-pixel compression noise. A changed block with no changed 4-neighbour
+    is dropped, so one speckle cannot stretch the box across the frame.
+    Up to `block - 1` rows and columns at the right and bottom edges are
+    not compared. The margin covers them for any change next to them.
+    """
+
+    def __init__(self, threshold: float = 10.0, block: int = 4, margin: int = 32, align: int = 8):
+        self.threshold = threshold
+        self.block = max(1, block)
+        self.margin = margin
+        self.align = max(1, align)
+        self.width = 0
+        self.height = 0
+        self._reference: Optional[np.ndarray] = None
+
+    def _cells(self, frame: np.ndarray) -> np.ndarray:
+        """Per-block channel sums (uint16 holds blocks of up to 16×16 uint8 pixels)."""
+        b = self.block
+        rows, cols = frame.shape[0] // b, frame.shape[1] // b
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        strip = frame[:rows * b, :cols * b].reshape(rows, b, cols * b * channels).sum(axis=1, dtype=np.uint16)
+        return strip.reshape(rows, cols, b, channels).sum(axis=2, dtype=np.uint16).astype(np.int32)
+
+    def reset(self, reference: np.ndarray) -> None:
+        self.height, self.width = reference.shape[:2]
+        self._reference = self._cells(reference)
+
+    def changed_mask(self, frame: np.ndarray) -> np.ndarray:
+        """Changed blocks of one frame, speckles removed (bool, rows × cols)."""
+        limit = self.threshold * self.block * self.block
+        changed = (np.abs(self._cells(frame) - self._reference) > limit).any(axis=-1)
+
+        neighbours = np.zeros_like(changed)
+        neighbours[1:] |= changed[:-1]
+        neighbours[:-1] |= changed[1:]
+        neighbours[:, 1:] |= changed[:, :-1]
+        neighbours[:, :-1] |= changed[:, 1:]
+        return changed & neighbours
+
+    def changed_box(self, frames: List[np.ndarray]) -> Optional[Box]:
+        """Padded, aligned box around every change in `frames`, or None."""
+        if self._reference is None:
+            raise RuntimeError("ChangeDetector.reset() must be called with a reference frame first")
+
+        changed = np.zeros(self._reference.shape[:2], dtype=bool)
+        for frame in frames:
+            changed |= self.changed_mask(frame)
+
+        rows = np.flatnonzero(changed.any(axis=1))
+        if len(rows) == 0:
+            return None
+        cols = np.flatnonzero(changed.any(axis=0))
+
+        b = self.block
+        box = (int(cols[0]) * b, int(rows[0]) * b, (int(cols[-1]) + 1) * b, (int(rows[-1]) + 1) * b)
+        return expand_box(box, self.margin, self.width, self.height, self.align)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# COMPOSITING
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def edge_feather(box: Box, width: int, height: int, feather: int, scale: int = 1) -> np.ndarray:
+    """
+    Blend weights for a ROI patch at `scale`× the size of `box`, shaped
+    (h, w, 1). The weight ramps linearly over `feather` × `scale` pixels from
+    each ROI edge that lies inside the frame. Edges on the frame border stay
+    at 1, because the full-frame model has no neighbour there either.
+    """
+    x0, y0, x1, y1 = box
+    ramp = max(1, feather * scale)
+
+    def axis(start: int, end: int, limit: int) -> np.ndarray:
+        n = (end - start) * scale
+        weights = np.ones(n, dtype=np.float32)
+        steps = (np.arange(n, dtype=np.float32) + 0.5) / ramp
+        if start > 0:
+            weights = np.minimum(weights, steps)
+        if end < limit:
+            weights = np.minimum(weights, steps[::-1])
+        return np.clip(weights, 0.0, 1.0)
+
+    return np.outer(axis(y0, y1, height), axis(x0, x1, width))[..., None]
+
+
+def composite(background: np.ndarray, patch: np.ndarray, box: Box, mask: np.ndarray,
+              background_roi: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Copy of `background` with `patch` blended in at `box` (output
+    coordinates) through `mask` (edge_feather). `background_roi` is the
+    float32 background under the box, which callers can compute once per ROI.
+    """
+    x0, y0, x1, y1 = box
+    if background_roi is None:
+        background_roi = background[y0:y1, x0:x1].astype(np.float32)
+    out = background.copy()
+    blended = background_roi + (patch.astype(np.float32) - background_roi) * mask
+    out[y0:y1, x0:x1] = (blended + 0.5).astype(np.uint8)
+    return out
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# STATS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class DeltaRegionStats:
+    frames: int = 0
+    full_frames: int = 0          # Whole frame through the model (first batch, large changes)
+    roi_frames: int = 0           # ROI crop through the model
+    static_frames: int = 0        # Cached background reused, no model call
+    seeds: int = 0                # Times the reference / background was (re)set
+    roi_changes: int = 0
+    pixels_processed: int = 0     # Input pixels the model actually saw
+    pixels_total: int = 0         # Input pixels of every frame
+    region_s: float = 0.0         # Detection + compositing time
+    roi: Optional[Box] = None
+
+    @property
+    def pixel_fraction(self) -> float:
+        return self.pixels_processed / self.pixels_total if self.pixels_total else 0.0
+
+    def add(self, kind: str, frames: int, pixels_per_frame: int, frame_pixels: int) -> None:
+        self.frames += frames
+        setattr(self, f"{kind}_frames", getattr(self, f"{kind}_frames") + frames)
+        self.pixels_processed += frames * pixels_per_frame
+        self.pixels_total += frames * frame_pixels
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "full_frames": self.full_frames,
+            "roi_frames": self.roi_frames,
+            "static_frames": self.static_frames,
+            "seeds": self.seeds,
+            "roi_changes": self.roi_changes,
+            "roi": list(self.roi) if self.roi else None,
+            "pixel_fraction": round(self.pixel_fraction, 4),
+            "region_s": round(self.region_s, 3),
+        }
@@ -0,0 +1,283 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+STORAGE BACKENDS - Where Job Outputs Go and the URL That Comes Back
+═══════════════════════════════════════════════════════════════════════════════════
+
+    R2Storage             - multipart / streaming uploads to R2 (uploader.py)
+    LocalArtifactStorage  - files under a local directory served over HTTP by
+                            a built-in artifact server; small files may be
+                            returned inline as base64 data URLs
+
+Every backend exposes the same calls, so handlers don't branch on storage:
+
+    url, stats = storage.put(path, key)
+    handle = storage.stream(path, key)      # None if the backend can't tail a file
+    handle = storage.submit(path, key)      # background upload of a finished file
+    url, stats = storage.finish(handle, path, key)
+
+Inline data URLs are only produced below `inline_max_bytes` and are encoded in
+chunks, so the raw file is never held in memory alongside its encoding.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import io
+import os
+import time
+import base64
+import shutil
+import socket
+import threading
+from pathlib import Path
+from typing import Optional, Tuple, Callable, Any
+from concurrent.futures import Future
+
+from uploader import MultipartUploader, StreamingUpload, UploadStats, content_type_for
+
+INLINE_CHUNK_SIZE = 3 * 256 * 1024  # Multiple of 3: chunks encode without padding
+
+
+def encode_data_url(path: Path, mime: Optional[str] = None, chunk_size: int = INLINE_CHUNK_SIZE) -> str:
+    """base64 data URL for `path`, read and encoded one chunk at a time."""
+    chunk_size -= chunk_size % 3
+    out = io.StringIO()
+    out.write(f"data:{mime or content_type_for(path)};base64,")
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            out.write(base64.b64encode(chunk).decode("ascii"))
+    return out.getvalue()
+
+
+class StorageBackend:
+    """Base backend: synchronous `put`, no streaming. Subclasses override what they can do better."""
+
+    name = "base"
+
+    def put(self, local_path: Path, key: str, inline: bool = True) -> Tuple[str, UploadStats]:
+        """Store `local_path` under `key`. `inline=False` always returns a fetchable URL."""
+        raise NotImplementedError
+
+    def stream(self, local_path: Path, key: str) -> Optional[Any]:
+        return None
+
+    def submit(self, local_path: Path, key: str) -> Optional[Any]:
+        return None
+
+    def finish(self, handle: Optional[Any], local_path: Path, key: str) -> Tuple[str, UploadStats]:
+        return self.put(local_path, key)
+
+    def describe(self) -> str:
+        return self.name
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# R2
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class R2Storage(StorageBackend):
+    """
+    Uploads through a lazily created MultipartUploader. `client_factory` returns
+    the (pooled) S3 client; `public_url` is the bucket's public base URL.
+    """
+
+    name = "r2"
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        bucket: str,
+        public_url: str,
+        part_size: int = 16 * 1024 * 1024,
+        concurrency: int = 8,
+        stream_uploads: bool = True,
+    ):
+        self.client_factory = client_factory
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.stream_uploads = stream_uploads
+        self._uploader: Optional[MultipartUploader] = None
+        self._lock = threading.Lock()
+
+    @property
+    def uploader(self) -> MultipartUploader:
+        with self._lock:
+            if self._uploader is None:
+                self._uploader = MultipartUploader(self.client_factory(), self.bucket,
+                                                   part_size=self.part_size, concurrency=self.concurrency)
+            return self._uploader
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    def put(self, local_path: Path, key: str, inline: bool = True) -> Tuple[str, UploadStats]:
+        return self.url(key), self.uploader.upload_file(local_path, key)
+
+    def stream(self, local_path: Path, key: str) -> Optional[StreamingUpload]:
+        return self.uploader.stream(local_path, key) if self.stream_uploads else None
+
+    def submit(self, local_path: Path, key: str) -> Future:
+        return self.uploader.submit(local_path, key)
+
+    def finish(self, handle: Optional[Any], local_path: Path, key: str) -> Tuple[str, UploadStats]:
+        if handle is None:
+            return self.put(local_path, key)
+        try:
+            stats = handle.finish() if isinstance(handle, StreamingUpload) else handle.result()
+        except Exception as e:
+            print(f"[Storage] Background upload of {key} failed, retrying: {e}")
+            return self.put(local_path, key)
+        return self.url(key), stats
+
+    def describe(self) -> str:
+        return f"r2 ({self.bucket} → {self.public_url})"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# LOCAL ARTIFACTS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def default_artifact_base_url(port: int) -> str:
+    """RunPod's HTTP proxy URL on a pod, else this host."""
+    pod_id = os.getenv("RUNPOD_POD_ID")
+    if pod_id:
+        return f"https://{pod_id}-{port}.proxy.runpod.net"
+    return f"http://{socket.gethostname()}:{port}"
+
+
+class ArtifactServer:
+    """Threaded static file server over the artifact directory (started on first use)."""
+
+    def __init__(self, root: Path, port: int = 8765, host: str = "0.0.0.0"):
+        self.root = Path(root)
+        self.port = port
+        self.host = host
+        self._httpd = None
+
+    @property
+    def running(self) -> bool:
+        return self._httpd is not None
+
+    def start(self) -> None:
+        if self._httpd is not None:
+            return
+        import functools
+        import http.server
+
+        class Handler(http.server.SimpleHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        handler = functools.partial(Handler, directory=str(self.root))
+        self._httpd = http.server.ThreadingHTTPServer((self.host, self.port), handler)
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name="artifact-server", daemon=True).start()
+        print(f"[Storage] Artifact server on :{self.port} serving {self.root}")
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+class LocalArtifactStorage(StorageBackend):
+    """
+    Copies (hard-links when possible) outputs under `root/<key>` and returns
+    `base_url/<key>`. Files up to `inline_max_bytes` come back as data URLs
+    instead (0 disables inlining; `put(..., inline=False)` opts a file out,
+    e.g. HLS segments a player fetches by relative URI). Artifacts older than `ttl_hours` are pruned
+    on each put.
+
+    `serve=True` starts the built-in ArtifactServer; leave it off when `root`
+    is already served by something else behind `base_url`.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        root: Path,
+        base_url: str = "",
+        port: int = 8765,
+        serve: bool = True,
+        inline_max_bytes: int = 0,
+        ttl_hours: float = 24,
+    ):
+        self.root = Path(root)
+        self.server = ArtifactServer(self.root, port) if serve else None
+        self._base_url = base_url.rstrip("/")
+        self.inline_max_bytes = inline_max_bytes
+        self.ttl_hours = ttl_hours
+        self._last_prune = 0.0
+
+    @property
+    def base_url(self) -> str:
+        if self.server is not None and not self.server.running:
+            self.server.start()
+        if not self._base_url:
+            self._base_url = default_artifact_base_url(self.server.port if self.server else 80)
+        return self._base_url
+
+    def put(self, local_path: Path, key: str, inline: bool = True) -> Tuple[str, UploadStats]:
+        local_path = Path(local_path)
+        start = time.time()
+        stats = UploadStats(key, bytes=local_path.stat().st_size, parts=1)
+
+        if inline and self.inline_max_bytes and stats.bytes <= self.inline_max_bytes:
+            url = encode_data_url(local_path)
+            stats.inline = True
+        else:
+            dest = self.root / key
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            if dest.exists():
+                dest.unlink()
+            try:
+                os.link(local_path, dest)
+            except OSError:
+                shutil.copy2(local_path, dest)
+            url = f"{self.base_url}/{key}"
+            self.prune()
+
+        stats.elapsed_s = time.time() - start
+        return url, stats
+
+    def prune(self) -> int:
+        """Delete artifacts older than ttl_hours (at most once a minute). Returns files removed."""
+        now = time.time()
+        if not self.ttl_hours or now - self._last_prune < 60:
+            return 0
+        self._last_prune = now
+        cutoff = now - self.ttl_hours * 3600
+        removed = 0
+        for path in self.root.rglob("*"):
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def describe(self) -> str:
+        inline = f", inline ≤ {self.inline_max_bytes / 1e6:.1f} MB" if self.inline_max_bytes else ""
+        return f"local ({self.root}{inline})"
+
+
+def create_storage(kind: str, r2_endpoint: str = "", **config) -> StorageBackend:
+    """
+    `kind` is "r2", "local" or "auto" (R2 when an endpoint is configured).
+    `config` holds the keyword arguments of the chosen backend, prefixed
+    `r2_` or `local_` (e.g. r2_bucket=..., local_root=...).
+    """
+    if kind == "auto":
+        kind = "r2" if r2_endpoint else "local"
+    prefix = f"{kind}_"
+    options = {k[len(prefix):]: v for k, v in config.items() if k.startswith(prefix)}
+    if kind == "r2":
+        return R2Storage(**options)
+    if kind == "local":
+        return LocalArtifactStorage(**options)
+    raise ValueError(f"Unknown storage backend: {kind}")
@@ -0,0 +1,9 @@
+"""
+Tests run on CPU without the GPU models, ffmpeg or RunPod: modules sit next
+to handler.py (as in the container), so their directory goes on sys.path.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
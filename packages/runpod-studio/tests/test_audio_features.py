@@ -0,0 +1,144 @@
+import json
+
+import numpy as np
+import pytest
+
+from audio_features import SAMPLE_RATE, AudioFeatureExtractor
+from disk_cache import DiskCache, file_digest, path_size
+
+FRAME = 160   # 10 ms at 16 kHz, as Whisper's hop
+
+
+def raw_pcm_chunks(path, chunk_samples):
+    """Stands in for ffmpeg_pcm_chunks: the test audio files are raw float32 PCM at SAMPLE_RATE."""
+    pcm = np.fromfile(path, dtype=np.float32)
+    for start in range(0, len(pcm), chunk_samples):
+        yield pcm[start:start + chunk_samples]
+
+
+class StubFeaturizer:
+    """Stands in for the Whisper encoder: (mean, max) of each 10 ms frame."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, pcm):
+        self.calls += 1
+        frames = pcm[:len(pcm) // FRAME * FRAME].reshape(-1, FRAME)
+        return np.stack([frames.mean(axis=1), frames.max(axis=1)], axis=1)
+
+
+def write_audio(path, duration, seed=0):
+    pcm = np.random.default_rng(seed).uniform(-0.5, 0.5, int(duration * SAMPLE_RATE)).astype(np.float32)
+    pcm.tofile(path)
+    return path
+
+
+def extractor(cache=None, **kwargs):
+    return AudioFeatureExtractor(cache, chunk_s=0.1, pcm_source=raw_pcm_chunks, **kwargs)
+
+
+@pytest.fixture
+def voice(tmp_path):
+    return write_audio(tmp_path / "voice.f32", 0.35)
+
+
+# ─── cache ───
+
+def test_second_extract_is_a_memmapped_hit(tmp_path, voice):
+    features = extractor(DiskCache(tmp_path / "cache"))
+    featurize = StubFeaturizer()
+    miss = features.extract(voice, featurize, params={"model": "tiny"})
+    hit = features.extract(voice, featurize, params={"model": "tiny"})
+
+    assert featurize.calls == 4   # 0.35 s in 0.1 s windows, featurized on the miss only
+    assert (miss.cache, hit.cache) == ("miss", "hit") and miss.key == hit.key
+    assert isinstance(hit.features, np.memmap) and not hit.features.flags.writeable
+    assert hit.features.dtype == np.float16 and hit.features.shape == (35, 2)
+
+    expected = StubFeaturizer()(np.fromfile(voice, dtype=np.float32)).astype(np.float16)
+    np.testing.assert_array_equal(miss.features, expected)
+    np.testing.assert_array_equal(hit.features, expected)
+
+
+def test_metadata_records_the_cache_flag_and_chunk_timings(tmp_path, voice):
+    features = extractor(DiskCache(tmp_path / "cache"))
+    miss = features.extract(voice, StubFeaturizer()).to_dict()
+    hit = features.extract(voice, StubFeaturizer()).to_dict()
+
+    assert (miss["cache"], hit["cache"]) == ("miss", "hit")
+    assert miss["shape"] == hit["shape"] == [35, 2]
+    assert [c["frames"] for c in miss["chunks"]] == [10, 10, 10, 5]
+    assert [c["audio_s"] for c in miss["chunks"]] == [0.1, 0.1, 0.1, 0.05]
+    assert hit["chunks"] == miss["chunks"]   # The timings of the extraction that filled the entry
+    json.dumps(hit)
+
+
+def test_key_covers_content_params_and_dtype(tmp_path, voice):
+    features = extractor(DiskCache(tmp_path / "cache"))
+    featurize = StubFeaturizer()
+    copy = tmp_path / "renamed.f32"
+    copy.write_bytes(voice.read_bytes())
+
+    assert features.extract(voice, featurize, {"model": "tiny"}).cache == "miss"
+    assert features.extract(copy, featurize, {"model": "tiny"}).cache == "hit"
+    assert features.extract(voice, featurize, {"model": "base"}).cache == "miss"
+    assert extractor(features.cache, dtype=np.float32).extract(voice, featurize, {"model": "tiny"}).cache == "miss"
+    assert features.extract(write_audio(tmp_path / "other.f32", 0.35, seed=1), featurize).cache == "miss"
+
+
+def test_without_a_cache_features_are_concatenated(voice):
+    result = extractor().extract(voice, StubFeaturizer())
+    assert result.cache == "bypass" and not isinstance(result.features, np.memmap)
+    assert result.features.shape == (35, 2) and len(result.chunks) == 4
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = DiskCache(tmp_path / "cache")
+    features = extractor(cache)
+    a, b, c = (write_audio(tmp_path / f"{name}.f32", 0.35, seed) for seed, name in enumerate("abc"))
+
+    entry = path_size(cache.path_for(features.extract(a, StubFeaturizer()).key))
+    cache.max_bytes = int(2.5 * entry)
+    key_b = features.extract(b, StubFeaturizer()).key
+    assert features.extract(a, StubFeaturizer()).cache == "hit"   # a is now more recent than b
+    features.extract(c, StubFeaturizer())
+
+    assert cache.stats()["evictions"] == 1 and not cache.contains(key_b)
+    assert features.extract(a, StubFeaturizer()).cache == "hit"
+    assert features.extract(b, StubFeaturizer()).cache == "miss"
+    assert cache.size_bytes() <= cache.max_bytes
+
+
+# ─── failures ───
+
+def test_unreadable_entry_is_dropped_and_extracted_again(tmp_path, voice):
+    features = extractor(DiskCache(tmp_path / "cache"))
+    key = features.extract(voice, StubFeaturizer()).key
+    (features.cache.path_for(key) / "meta.json").write_text("{")
+
+    featurize = StubFeaturizer()
+    result = features.extract(voice, featurize)
+    assert result.cache == "miss" and featurize.calls == 4 and result.features.shape == (35, 2)
+    assert features.extract(voice, featurize).cache == "hit"
+
+
+def test_failed_featurize_leaves_nothing_behind(tmp_path, voice):
+    features = extractor(DiskCache(tmp_path / "cache"))
+
+    def featurize(pcm):
+        raise RuntimeError("CUDA out of memory")
+
+    with pytest.raises(RuntimeError, match="out of memory"):
+        features.extract(voice, featurize)
+    assert not features.cache.contains(features.key_for(file_digest(voice)))
+    assert list((tmp_path / "cache" / "tmp").iterdir()) == []
+    assert features.extract(voice, StubFeaturizer()).cache == "miss"
+
+
+def test_empty_audio_is_an_error(tmp_path):
+    empty = tmp_path / "empty.f32"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError, match="No audio decoded"):
+        extractor(DiskCache(tmp_path / "cache")).extract(empty, StubFeaturizer())
+    assert list((tmp_path / "cache" / "tmp").iterdir()) == []
@@ -0,0 +1,167 @@
+import math
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from audio_mixer import SidechainDucker, StreamingMixer
+from benchmark import read_wav, write_wav as write_wav_at
+from filtergraph import audio_mix_filters
+
+RATE = 8000
+LSB = 1 / 32768
+DUCKING = {"base_volume": 0.15, "attack_ms": 20, "release_ms": 200}
+
+
+def seconds(duration, rate=RATE):
+    return np.arange(int(duration * rate)) / rate
+
+
+def speech(duration, rate=RATE):
+    """220 Hz phrases of 0.5 s with 0.5 s pauses, so a ducked bed dips and recovers."""
+    t = seconds(duration, rate)
+    return (0.3 * np.sin(2 * np.pi * 220 * t) * (t % 1.0 < 0.5)).astype(np.float32)
+
+
+def write_wav(path, samples, rate=RATE):
+    return write_wav_at(path, samples, rate)
+
+
+def mixer(**kwargs):
+    return StreamingMixer(sample_rate=RATE, block_s=0.25, **kwargs)
+
+
+def envelope_per_sample(power, attack, release, slope=0.0):
+    """ffmpeg sidechaincompress's detector: one envelope update per sample."""
+    out = np.empty(len(power))
+    for i, p in enumerate(power.tolist()):
+        slope += (p - slope) * (attack if p > slope else release)
+        out[i] = slope
+    return out
+
+
+# ─── mixing ───
+
+def test_voice_only_output_is_the_voice(tmp_path):
+    voice_path = write_wav(tmp_path / "voice.wav", speech(2.0))
+    stats = mixer().mix(voice_path, tmp_path / "mixed.wav")
+
+    voice, mixed = read_wav(voice_path), read_wav(tmp_path / "mixed.wav")
+    assert mixed.shape == (len(voice), 2) and stats["inputs"] == 1
+    np.testing.assert_allclose(mixed, np.repeat(voice, 2, axis=1), atol=2 * LSB)
+    assert stats["duration_s"] == 2.0 and stats["clipped_samples"] == 0
+
+
+@pytest.mark.parametrize("loop_buffer_s, decodes", [(1.0, 1), (0.1, math.ceil(RATE * 2.0 / 1234))],
+                         ids=["kept", "re-decoded"])
+def test_bed_loops_without_seams(tmp_path, loop_buffer_s, decodes):
+    # 1234-sample sawtooth: loop points fall mid-block, and a skipped or repeated sample shifts the phase
+    music = write_wav(tmp_path / "music.wav", np.linspace(-0.5, 0.5, 1234, endpoint=False))
+    voice = np.zeros(int(RATE * 2.0), np.float32)   # Silent voice: the bed is not ducked
+    stats = mixer(loop_buffer_s=loop_buffer_s).mix(
+        write_wav(tmp_path / "voice.wav", voice), tmp_path / "mixed.wav",
+        music=music, duration=2.0, ducking=DUCKING)
+
+    bed, mixed = read_wav(music)[:, 0], read_wav(tmp_path / "mixed.wav")[:, 0]
+    expected = np.resize(bed, len(voice)) * DUCKING["base_volume"] / 2
+    np.testing.assert_allclose(mixed, expected, atol=2 * LSB)
+    assert stats["music_decodes"] == decodes
+
+
+def test_bed_is_trimmed_to_the_duration(tmp_path):
+    voice = np.zeros(int(RATE * 2.0), np.float32)
+    mixer().mix(write_wav(tmp_path / "voice.wav", voice), tmp_path / "mixed.wav",
+                ambience=write_wav(tmp_path / "ambience.wav", np.full(500, 0.5, np.float32)), duration=1.0)
+    mixed = read_wav(tmp_path / "mixed.wav")[:, 0]
+    assert len(mixed) == len(voice)
+    assert (mixed[:RATE] > 0).all() and (mixed[RATE:] == 0).all()
+
+
+@pytest.mark.parametrize("start_s", [0.3217, 0.25, 1.7499])
+def test_sfx_lands_on_its_sample(tmp_path, start_s):
+    click = np.zeros(64, np.float32)
+    click[0] = 0.5
+    voice = np.zeros(int(RATE * 2.0), np.float32)
+    mixer().mix(write_wav(tmp_path / "voice.wav", voice), tmp_path / "mixed.wav",
+                sfx=[(write_wav(tmp_path / "click.wav", click), start_s, 0.8)])
+
+    mixed = read_wav(tmp_path / "mixed.wav")[:, 0]
+    [offset] = np.flatnonzero(mixed)
+    assert offset == round(start_s * RATE)
+    assert mixed[offset] == pytest.approx(0.5 * 0.8 / 2, abs=2 * LSB)
+
+
+@pytest.mark.parametrize("bed", ["music", "ambience"])
+def test_empty_bed_is_skipped(tmp_path, bed):
+    voice_path = write_wav(tmp_path / "voice.wav", speech(1.0))
+    stats = mixer().mix(voice_path, tmp_path / "mixed.wav",
+                        **{bed: write_wav(tmp_path / f"{bed}.wav", np.zeros(0, np.float32))},
+                        duration=1.0, ducking=DUCKING)
+    voice, mixed = read_wav(voice_path)[:, 0], read_wav(tmp_path / "mixed.wav")
+    assert len(mixed) == len(voice) and stats["inputs"] == 2
+    # The empty bed drops out at once; the normalization eases from 2 inputs to 1 like amix
+    assert np.all(np.abs(mixed[:, 0]) <= np.abs(voice) + 2 * LSB)
+    assert np.abs(mixed[:100, 0]) == pytest.approx(np.abs(voice[:100]) / 2, abs=2 * LSB)
+    np.testing.assert_allclose(mixed[-100:, 0], voice[-100:] / (2 - 1 / 2), atol=2 * LSB)
+
+
+def test_empty_voice_is_an_error(tmp_path):
+    with pytest.raises(RuntimeError, match="no samples"):
+        mixer().mix(write_wav(tmp_path / "voice.wav", np.zeros(0, np.float32)), tmp_path / "mixed.wav")
+
+
+# ─── ducking ───
+
+def test_steady_voice_settles_at_the_compressor_gain():
+    ducker = SidechainDucker(RATE, attack_ms=20, release_ms=200)
+    voice = np.full((RATE, 2), 0.3, np.float32)
+    gain = np.concatenate([ducker.process(voice[i:i + 1000]) for i in range(0, RATE, 1000)])
+    # Above the knee: 10:1 over the 0.02 threshold
+    assert gain[-1] == pytest.approx((0.3 / 0.02) ** (1 / 10 - 1), rel=1e-4)
+    assert gain[0] > 0.99 and np.all(np.diff(gain) <= 1e-7)
+
+
+def test_hop_envelope_is_exact_per_sample_at_hop_one():
+    power = speech(1.0) ** 2
+    ducker = SidechainDucker(RATE, attack_ms=20, release_ms=200, hop=1)
+    np.testing.assert_allclose(ducker._envelope(power),
+                               envelope_per_sample(power, ducker.attack, ducker.release), rtol=1e-9, atol=1e-15)
+
+
+def test_hopped_gain_tracks_the_per_sample_gain():
+    rate = 48000
+    voice = np.repeat(speech(2.0, rate)[:, None], 2, axis=1)
+    exact = SidechainDucker(rate, attack_ms=20, release_ms=200, hop=1)
+    hopped = SidechainDucker(rate, attack_ms=20, release_ms=200)
+    blocks = range(0, len(voice), rate // 4)
+    reference = np.concatenate([exact.process(voice[i:i + rate // 4]) for i in blocks])
+    gain = np.concatenate([hopped.process(voice[i:i + rate // 4]) for i in blocks])
+    # The hopped gain is interpolated over a hop (128 samples, 2.7 ms), so it only trails the
+    # per-sample gain in the first hop of a phrase; elsewhere they agree closely
+    error = np.abs(gain - reference)
+    onset = np.arange(len(voice)) % rate < 2 * hopped.hop
+    assert error[~onset].max() < 0.01
+    assert np.sqrt(np.mean(error ** 2)) < 0.02
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not on PATH")
+def test_ducked_music_matches_sidechaincompress(tmp_path):
+    rate, duration = 48000, 3.0
+    voice_path = write_wav(tmp_path / "voice.wav", speech(duration, rate), rate)
+    music_path = write_wav(tmp_path / "music.wav", 0.4 * np.sin(2 * np.pi * 330 * seconds(duration, rate)), rate)
+    voice = read_wav(voice_path)[:, 0]
+
+    StreamingMixer(sample_rate=rate).mix(voice_path, tmp_path / "native.wav", music=music_path,
+                                         duration=duration, ducking=DUCKING)
+    graph = ";".join(audio_mix_filters("0:a", "1:a", duration=duration, ducking=DUCKING, out="out"))
+    subprocess.run(["ffmpeg", "-y", "-v", "error", "-i", str(voice_path), "-i", str(music_path),
+                    "-filter_complex", graph, "-map", "[out]", "-ar", str(rate), "-ac", "2",
+                    str(tmp_path / "ffmpeg.wav")], check=True)
+
+    # What the ducked music contributes to each mix (the voice passes through both unchanged)
+    native = read_wav(tmp_path / "native.wav")[:, 0] - voice / 2
+    reference = read_wav(tmp_path / "ffmpeg.wav")[:, 0] - voice / 2
+    n = min(len(native), len(reference))
+    error = np.sqrt(np.mean((native[:n] - reference[:n]) ** 2))
+    assert error < 0.05 * np.sqrt(np.mean(reference[:n] ** 2))
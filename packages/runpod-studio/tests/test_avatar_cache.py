@@ -0,0 +1,111 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from avatar_cache import PREP_VERSION, AvatarCache, AvatarPrep
+from disk_cache import DiskCache
+
+FRAMES = 3
+
+
+class StubPreparer:
+    """Stands in for MuseTalkEngine.prepare_avatar: small arrays derived from the image bytes."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, image_path):
+        self.calls.append(image_path)
+        seed = image_path.read_bytes()[0]
+        rng = np.random.default_rng(seed)
+        return AvatarPrep(
+            frames=rng.integers(0, 256, (FRAMES, 32, 24, 3), dtype=np.uint8),
+            bboxes=np.tile(np.array([[4, 6, 20, 26]], np.int32), (FRAMES, 1)),
+            landmarks=rng.random((FRAMES, 68, 2), dtype=np.float32),
+            latents=rng.random((FRAMES, 8, 4, 4)).astype(np.float16),
+            masks=[np.full((10 + i, 12), i, np.uint8) for i in range(FRAMES)],
+            mask_boxes=np.tile(np.array([[2, 2, 14, 12]], np.int32), (FRAMES, 1)),
+        )
+
+
+@pytest.fixture
+def image(tmp_path):
+    path = tmp_path / "persona.png"
+    path.write_bytes(bytes([7]) + os.urandom(1024))
+    return path
+
+
+@pytest.fixture
+def avatars(tmp_path):
+    return AvatarCache(DiskCache(tmp_path / "cache"))
+
+
+def assert_same_prep(a, b):
+    for name in ("frames", "bboxes", "landmarks", "latents", "mask_boxes"):
+        np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+    assert len(a.masks) == len(b.masks)
+    for x, y in zip(a.masks, b.masks):
+        np.testing.assert_array_equal(x, y)
+
+
+def test_second_prepare_is_a_memmapped_hit(image, avatars):
+    preparer = StubPreparer()
+    first, miss = avatars.prepare(image, preparer, params={"bbox_shift": 0})
+    second, hit = avatars.prepare(image, preparer, params={"bbox_shift": 0})
+
+    assert len(preparer.calls) == 1
+    assert (miss.cache, hit.cache) == ("miss", "hit") and miss.key == hit.key
+    assert hit.to_dict()["cache"] == "hit" and hit.to_dict()["frames"] == FRAMES
+    assert isinstance(second.latents, np.memmap) and not second.latents.flags.writeable
+    assert all(isinstance(mask, np.memmap) for mask in second.masks)
+    assert_same_prep(first, preparer(image))
+    assert_same_prep(second, preparer(image))
+    assert second.meta["version"] == PREP_VERSION and second.meta["params"] == {"bbox_shift": 0}
+
+
+def test_params_and_image_content_are_part_of_the_key(tmp_path, image, avatars):
+    preparer = StubPreparer()
+    avatars.prepare(image, preparer, params={"bbox_shift": 0})
+    assert avatars.prepare(image, preparer, params={"bbox_shift": 5})[1].cache == "miss"
+
+    copy = tmp_path / "renamed.png"
+    copy.write_bytes(image.read_bytes())
+    assert avatars.prepare(copy, preparer, params={"bbox_shift": 0})[1].cache == "hit"
+    assert len(preparer.calls) == 2
+
+
+def test_without_a_cache_every_prepare_runs(image):
+    preparer = StubPreparer()
+    avatars = AvatarCache()
+    for _ in range(2):
+        prep, lookup = avatars.prepare(image, preparer)
+        assert lookup.cache == "bypass" and not isinstance(prep.frames, np.memmap)
+    assert len(preparer.calls) == 2 and avatars.stats() is None
+
+
+def test_unreadable_entry_is_dropped_and_prepared_again(image, avatars):
+    preparer = StubPreparer()
+    _, lookup = avatars.prepare(image, preparer)
+    entry = avatars.cache.path_for(lookup.key)
+    (entry / "latents.npy").write_bytes(b"not an array")
+
+    prep, lookup = avatars.prepare(image, preparer)
+    assert lookup.cache == "miss" and len(preparer.calls) == 2
+    assert_same_prep(prep, preparer(image))
+
+
+def test_save_load_round_trip_without_mmap(tmp_path, image):
+    prep = StubPreparer()(image)
+    prep.meta["note"] = "x"
+    prep.save(tmp_path / "prep")
+    loaded = AvatarPrep.load(tmp_path / "prep", mmap=False)
+    assert not isinstance(loaded.frames, np.memmap)
+    assert_same_prep(loaded, prep)
+    assert json.loads((tmp_path / "prep" / "meta.json").read_text()) == {"note": "x"}
+
+
+def test_frames_cycle_forward_then_backward(image):
+    prep = StubPreparer()(image)
+    assert [prep.cycle_index(i) for i in range(8)] == [0, 1, 2, 2, 1, 0, 0, 1]
@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batch_coalescer import MicroBatcher, percentile
+
+
+class RecordingModel:
+    """Doubles every item and records each batch; `gate` holds batches until it is set."""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail_on = fail_on
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        self.gate.wait()
+        if self.fail_on is not None and self.fail_on in items:
+            raise RuntimeError("CUDA out of memory")
+        return [item * 2 for item in items]
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def model():
+    return RecordingModel()
+
+
+def test_lone_request_flushes_on_timeout(model):
+    batcher = MicroBatcher(model, max_batch=32, max_wait_ms=5)
+    try:
+        assert batcher.run([1, 2, 3]) == [2, 4, 6]
+        assert batcher.run([]) == []
+        stats = batcher.stats()
+        assert stats["flushes"] == {"full": 0, "timeout": 1}
+        assert (stats["requests"], stats["batches"], stats["items"]) == (1, 1, 3)
+        assert stats["fill_rate"] == pytest.approx(3 / 32, abs=1e-3)
+        assert stats["added_latency_ms"]["p50"] >= 4
+    finally:
+        batcher.close()
+
+
+def test_large_request_is_split_in_order(model):
+    batcher = MicroBatcher(model, max_batch=32, max_wait_ms=5)
+    try:
+        items = list(range(70))
+        assert batcher.run(items) == [i * 2 for i in items]
+        assert [len(batch) for batch in model.batches] == [32, 32, 6]
+        assert [item for batch in model.batches for item in batch] == items
+        assert batcher.stats()["flushes"] == {"full": 2, "timeout": 1}
+    finally:
+        batcher.close()
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_outputs(model):
+    batcher = MicroBatcher(model, max_batch=24, max_wait_ms=10_000)
+    try:
+        with ThreadPoolExecutor(3) as pool:
+            futures = [pool.submit(batcher.run, [100 * job + i for i in range(8)]) for job in range(3)]
+            results = [future.result(timeout=5) for future in futures]
+
+        assert results == [[2 * (100 * job + i) for i in range(8)] for job in range(3)]
+        assert len(model.batches) == 1 and sorted(model.batches[0]) == sorted(
+            100 * job + i for job in range(3) for i in range(8))
+        assert batcher.stats()["flushes"] == {"full": 1, "timeout": 0}
+    finally:
+        batcher.close()
+
+
+def test_batches_are_filled_first_in_first_out(model):
+    batcher = MicroBatcher(model, max_batch=32, max_wait_ms=20)
+    try:
+        with ThreadPoolExecutor(3) as pool:
+            model.gate.clear()
+            first = pool.submit(batcher.run, list(range(32)))
+            wait_until(lambda: len(model.batches) == 1)
+
+            a = pool.submit(batcher.run, list(range(1000, 1020)))
+            wait_until(lambda: batcher._queued() == 20)
+            b = pool.submit(batcher.run, list(range(2000, 2020)))
+            wait_until(lambda: batcher._queued() == 40)
+            model.gate.set()
+
+            assert first.result(timeout=5) == [i * 2 for i in range(32)]
+            assert a.result(timeout=5) == [i * 2 for i in range(1000, 1020)]
+            assert b.result(timeout=5) == [i * 2 for i in range(2000, 2020)]
+
+        assert model.batches[1] == list(range(1000, 1020)) + list(range(2000, 2012))
+        assert model.batches[2] == list(range(2012, 2020))
+        assert batcher.stats()["flushes"] == {"full": 2, "timeout": 1}
+    finally:
+        batcher.close()
+
+
+def test_zero_wait_flushes_without_coalescing(model):
+    batcher = MicroBatcher(model, max_batch=32, max_wait_ms=0)
+    try:
+        assert batcher.run([5]) == [10]
+        assert batcher.stats()["max_wait_ms"] == 0.0
+        assert batcher.stats()["flushes"]["timeout"] == 1
+    finally:
+        batcher.close()
+
+
+def test_failed_batch_fails_its_callers_and_drops_their_remaining_parts():
+    model = RecordingModel(fail_on=3)
+    batcher = MicroBatcher(model, max_batch=4, max_wait_ms=5)
+    try:
+        with pytest.raises(RuntimeError, match="out of memory"):
+            batcher.run(list(range(10)))
+        assert model.batches == [[0, 1, 2, 3]]
+
+        # The batcher keeps serving
+        assert batcher.run([7, 8]) == [14, 16]
+    finally:
+        batcher.close()
+
+
+def test_wrong_output_count_is_an_error():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch=8, max_wait_ms=1)
+    try:
+        with pytest.raises(RuntimeError, match="returned 2 outputs for 3 items"):
+            batcher.run([1, 2, 3])
+    finally:
+        batcher.close()
+
+
+def test_closed_batcher_rejects_requests(model):
+    batcher = MicroBatcher(model, max_batch=8, max_wait_ms=1)
+    assert batcher.run([1]) == [2]
+    batcher.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.run([1])
+
+
+def test_percentile_nearest_rank():
+    samples = [5, 1, 4, 2, 3]
+    assert percentile(samples, 50) == 3
+    assert percentile(samples, 99) == 5
+    assert percentile(samples, 0) == 1
+    assert percentile([], 50) == 0.0
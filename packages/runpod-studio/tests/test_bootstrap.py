@@ -0,0 +1,116 @@
+import hashlib
+import json
+
+import pytest
+
+import bootstrap
+from bootstrap import BootstrapError, Component, Package, Repo, check_component, require, weight_path
+
+WEIGHT = b"w" * 4096
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """A `toy` component whose packages, repo and weights live under a tmp WORKSPACE."""
+    models_dir = tmp_path / "models"
+    monkeypatch.setattr(bootstrap, "WORKSPACE", tmp_path)
+    monkeypatch.setattr(bootstrap, "MODELS_DIR", models_dir)
+    monkeypatch.setattr(bootstrap, "LOCK_PATH", models_dir / "manifest.lock.json")
+    monkeypatch.setitem(bootstrap.MODELS, "toy", {
+        "files": {"local_dir": models_dir / "toy" / "files",
+                  "urls": {"toy.pth": "https://example.com/toy.pth", "toy_gan.pth": "https://example.com/toy_gan.pth"}},
+        "snapshot": {"repo_id": "example/toy", "local_dir": models_dir / "toy" / "snapshot", "files": None},
+    })
+    monkeypatch.setitem(bootstrap.COMPONENTS, "toy", Component(
+        packages=[Package("numpy", "numpy")],
+        repos=[Repo("https://example.com/Toy.git", tmp_path / "Toy")],
+        weights=["toy/files", "toy/snapshot"],
+    ))
+    return tmp_path
+
+
+def provision(workspace):
+    """Lay out everything `toy` needs, as download_models.py --bootstrap would."""
+    (workspace / "Toy").mkdir()
+    (workspace / "Toy" / "README.md").write_text("toy")
+    snapshot = workspace / "models" / "toy" / "snapshot"
+    snapshot.mkdir(parents=True)
+    (snapshot / "config.json").write_text("{}")
+    records = {}
+    for name in ("toy.pth", "toy_gan.pth"):
+        path = weight_path("toy/files", name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(WEIGHT)
+        records[bootstrap.lock_key(path)] = {"sha256": hashlib.sha256(WEIGHT).hexdigest(), "bytes": len(WEIGHT)}
+    bootstrap.save_lock(records)
+
+
+def test_weight_path_resolves_under_the_models_dir(workspace):
+    assert weight_path("toy/files", "toy.pth") == workspace / "models" / "toy" / "files" / "toy.pth"
+    assert bootstrap.lock_key(weight_path("toy/files", "toy.pth")) == "models/toy/files/toy.pth"
+    with pytest.raises(KeyError):
+        weight_path("toy/missing", "toy.pth")
+
+
+def test_provisioned_component_is_ready(workspace):
+    provision(workspace)
+    readiness = check_component("toy")
+    assert readiness.ready and readiness.missing == [] and readiness.elapsed_ms < 1000
+    require("toy")
+    assert check_component("toy", deep=True).ready
+
+
+def test_nothing_provisioned_lists_every_repo_and_weight(workspace):
+    readiness = check_component("toy")
+    files = workspace / "models" / "toy" / "files"
+    assert readiness.missing == [
+        f"repo {workspace / 'Toy'}",
+        f"weights {files / 'toy.pth'}",
+        f"weights {files / 'toy_gan.pth'}",
+        f"weights {workspace / 'models' / 'toy' / 'snapshot'}",
+    ]
+
+
+def test_missing_package_is_reported(workspace, monkeypatch):
+    provision(workspace)
+    monkeypatch.setattr(bootstrap.COMPONENTS["toy"], "packages",
+                        [Package("numpy", "numpy"), Package("toy-kernels", "toy_kernels_not_installed")])
+    assert check_component("toy").missing == ["package toy-kernels"]
+
+
+def test_incomplete_clone_and_empty_snapshot_are_missing(workspace):
+    provision(workspace)
+    (workspace / "Toy" / "README.md").unlink()               # Clone interrupted before checkout
+    (workspace / "models" / "toy" / "snapshot" / "config.json").unlink()
+    assert check_component("toy").missing == [
+        f"repo {workspace / 'Toy'}",
+        f"weights {workspace / 'models' / 'toy' / 'snapshot'}",
+    ]
+
+
+def test_weight_size_is_checked_against_the_lock(workspace):
+    provision(workspace)
+    truncated = weight_path("toy/files", "toy_gan.pth")
+    truncated.write_bytes(WEIGHT[:100])                      # Download cut short
+    assert check_component("toy").missing == [f"weights {truncated} (size differs from lock)"]
+
+    # Without a lock record the size can't be checked; presence is enough
+    lock = json.loads(bootstrap.LOCK_PATH.read_text())
+    del lock[bootstrap.lock_key(truncated)]
+    assert check_component("toy", lock=lock).ready
+
+
+def test_deep_check_rehashes_against_the_lock(workspace):
+    provision(workspace)
+    corrupt = weight_path("toy/files", "toy.pth")
+    corrupt.write_bytes(b"x" * len(WEIGHT))                  # Same size, different bytes
+    assert check_component("toy").ready
+    assert check_component("toy", deep=True).missing == [f"weights {corrupt} (sha256 mismatch)"]
+
+
+def test_require_raises_instead_of_installing(workspace):
+    provision(workspace)
+    (workspace / "Toy" / "README.md").unlink()
+    with pytest.raises(BootstrapError, match=r"toy is not provisioned \(missing: repo .*Toy\).*--bootstrap"):
+        require("toy")
+    assert not (workspace / "Toy" / "README.md").exists()
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from caption_engine import CaptionTimeline, GlyphCache, blend_patch
+
+STYLE = {"font_size": 40}
+
+
+def patch_bytes(patch):
+    return sum(array.nbytes for array in patch)
+
+
+def test_patch_is_cached_per_text_and_style():
+    glyphs = GlyphCache()
+    first = glyphs.patch("hello", STYLE)
+    assert glyphs.patch("hello", STYLE) is first
+    assert glyphs.patch("hello", {"font_size": 60}) is not first
+    stats = glyphs.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 1, 2)
+    assert glyphs.bytes == patch_bytes(first) + patch_bytes(glyphs.patch("hello", {"font_size": 60}))
+
+
+def test_byte_cap_evicts_least_recently_used():
+    words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot"]
+    sizes = {word: patch_bytes(GlyphCache().patch(word, STYLE)) for word in words}
+    glyphs = GlyphCache(max_entries=100, max_bytes=sizes["alpha"] + sizes["bravo"] + sizes["charlie"])
+
+    for word in words[:3]:
+        glyphs.patch(word, STYLE)
+    glyphs.patch("alpha", STYLE)              # Most recently used now
+    glyphs.patch("delta", STYLE)
+
+    assert glyphs.bytes <= glyphs.max_bytes
+    cached = [key[0] for key in glyphs._patches]
+    assert cached[-2:] == ["alpha", "delta"] and "bravo" not in cached
+    assert glyphs.stats()["evictions"] >= 1
+
+
+def test_entry_cap_still_applies():
+    glyphs = GlyphCache(max_entries=2, max_bytes=0)
+    for word in ("one", "two", "three"):
+        glyphs.patch(word, STYLE)
+    assert [key[0] for key in glyphs._patches] == ["two", "three"]
+    assert glyphs.bytes == sum(patch_bytes(p) for p in glyphs._patches.values())
+
+
+def test_oversized_patch_is_kept_alone():
+    glyphs = GlyphCache(max_bytes=1024)
+    glyphs.patch("short", STYLE)
+    big = glyphs.patch("a much longer caption line", {"font_size": 72})
+    assert list(glyphs._patches.values()) == [big]
+    assert glyphs.bytes == patch_bytes(big) > glyphs.max_bytes
+
+
+def test_blend_is_clipped_to_the_frame():
+    premultiplied = np.full((4, 6, 3), 100.0, np.float32)
+    inverse_alpha = np.full((4, 6, 1), 0.5, np.float32)
+    frame = np.full((10, 10, 3), 40, np.uint8)
+
+    out = blend_patch(frame, (premultiplied, inverse_alpha), 7, 8)
+    assert out is not frame and (frame == 40).all()
+    assert (out[8:, 7:] == 120).all()
+    assert (out[:8] == 40).all() and (out[:, :7] == 40).all()
+    assert blend_patch(frame, (premultiplied, inverse_alpha), 10, 0) is frame
+
+
+@pytest.mark.parametrize("fps", [25, 30])
+def test_timeline_prefers_the_earliest_caption_on_overlap(fps):
+    captions = [{"text": "b", "start": 1.0, "end": 2.0}, {"text": "a", "start": 0.0, "end": 1.5}]
+    timeline = CaptionTimeline(captions, fps)
+    assert timeline.captions[timeline.active(0)]["text"] == "a"
+    assert timeline.captions[timeline.active(int(1.2 * fps))]["text"] == "a"
+    assert timeline.captions[timeline.active(int(1.8 * fps))]["text"] == "b"
+    assert timeline.active(int(3 * fps)) is None and timeline.active(-1) is None
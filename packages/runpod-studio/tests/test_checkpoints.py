@@ -0,0 +1,117 @@
+import os
+import time
+from collections import Counter
+
+import pytest
+
+from checkpoints import CheckpointStore
+
+
+class StubStages:
+    """lipsync → render → captions, each appending its name to its upstream output."""
+
+    def __init__(self, fail=()):
+        self.calls = Counter()
+        self.fail = set(fail)
+
+    def build(self, store, inputs, render_params=None, job_id="job-1"):
+        ckpt = store.job(job_id, inputs=inputs, params={"quality": "high"})
+
+        def step(name, upstream=None):
+            def produce(out):
+                source = upstream.path().read_text() if upstream else inputs["audio"].read_text()
+                self.calls[name] += 1
+                if name in self.fail:
+                    raise RuntimeError(f"{name} failed")
+                out.write_text(f"{source}|{name}")
+                return {"stage": name, "run": self.calls[name]}
+            return produce
+
+        lipsync = ckpt.stage("lipsync", step("lipsync"))
+        render = ckpt.stage("render", step("render", lipsync), params=render_params, after=[lipsync])
+        captions = ckpt.stage("captions", step("captions", render), after=[render])
+        return ckpt, captions
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(tmp_path / "jobs")
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    audio = tmp_path / "voice.wav"
+    audio.write_text("voice")
+    return {"audio": audio, "image": None}
+
+
+def test_retry_resumes_after_failed_stage(store, inputs):
+    stages = StubStages(fail={"captions"})
+    ckpt, final = stages.build(store, inputs)
+    with pytest.raises(RuntimeError, match="captions failed"):
+        final.path()
+    assert [s.to_dict()["status"] for s in ckpt.stages] == ["ran", "ran", "skipped"]
+    assert not any(store._tmp.iterdir())
+
+    stages.fail.clear()
+    ckpt, final = stages.build(store, inputs)
+    assert final.path().read_text() == "voice|lipsync|render|captions"
+    assert stages.calls == {"lipsync": 1, "render": 1, "captions": 2}
+    assert [s.to_dict()["status"] for s in ckpt.stages] == ["skipped", "resumed", "ran"]
+    assert ckpt.stages[1].stats == {"stage": "render", "run": 1}
+
+
+def test_finished_job_is_fully_resumed(store, inputs):
+    stages = StubStages()
+    _, final = stages.build(store, inputs)
+    first = final.path()
+
+    ckpt, final = stages.build(store, inputs)
+    assert final.path() == first
+    assert stages.calls == {"lipsync": 1, "render": 1, "captions": 1}
+    # Resolved lazily from the end: upstream stages are never even opened
+    assert [s.to_dict()["status"] for s in ckpt.stages] == ["skipped", "skipped", "resumed"]
+
+
+def test_changed_input_content_reruns_everything(store, inputs):
+    stages = StubStages()
+    stages.build(store, inputs)[1].path()
+
+    inputs["audio"].write_text("other voice")
+    _, final = stages.build(store, inputs)
+    assert final.path().read_text() == "other voice|lipsync|render|captions"
+    assert stages.calls == {"lipsync": 2, "render": 2, "captions": 2}
+
+
+def test_changed_stage_params_rerun_it_and_downstream(store, inputs):
+    stages = StubStages()
+    stages.build(store, inputs, render_params={"grade": "warm"})[1].path()
+
+    ckpt, final = stages.build(store, inputs, render_params={"grade": "cool"})
+    final.path()
+    assert stages.calls == {"lipsync": 1, "render": 2, "captions": 2}
+    assert ckpt.report()["resumed"] == ["lipsync"]
+
+
+def test_discard_drops_the_job(store, inputs):
+    ckpt, final = StubStages().build(store, inputs)
+    final.path()
+    assert store.stats()["jobs"] == 1
+    ckpt.discard()
+    assert store.stats()["jobs"] == 0 and not ckpt.directory.exists()
+
+
+def test_prune_applies_age_limit_and_size_cap(tmp_path, inputs):
+    store = CheckpointStore(tmp_path / "jobs", ttl_hours=1)
+    stages = StubStages()
+    for i, age_h in enumerate((3, 0.5, 0)):
+        ckpt, final = stages.build(store, inputs, job_id=f"job-{i}")
+        final.path()
+        stamp = time.time() - age_h * 3600
+        os.utime(ckpt.directory, (stamp, stamp))
+
+    assert store.prune() == 1
+    assert sorted(p.name for p in store._jobs()) == ["job-1", "job-2"]
+
+    store.max_bytes = 1
+    assert store.prune() == 2 and store._jobs() == []
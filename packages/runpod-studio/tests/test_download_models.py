@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from benchmark import LocalFileServer
+from download_models import FileTask, ParallelDownloader
+
+DATA = os.urandom(3 * 1024 * 1024 + 17)
+DIGEST = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "srv"
+    root.mkdir()
+    (root / "model.pth").write_bytes(DATA)
+    with LocalFileServer(root) as server:
+        yield server
+
+
+def downloader(tmp_path, **kwargs):
+    options = {"workers": 2, "retries": 0, "headers": {}, "chunk_size": 256 * 1024,
+               "lock_path": tmp_path / "lock.json"}
+    options.update(kwargs)
+    return ParallelDownloader(**options)
+
+
+def task(server, dest, sha256=None, name="model.pth"):
+    return FileTask("test/model", f"{server.url}/{name}", dest / name, sha256)
+
+
+def test_downloads_records_digest_and_skips_next_time(tmp_path, server):
+    dest = tmp_path / "models"
+    [result] = downloader(tmp_path).run([task(server, dest)], progress=False)
+
+    assert result.error is None
+    assert (dest / "model.pth").read_bytes() == DATA
+    assert not (dest / "model.pth.part").exists()
+    lock = json.loads((tmp_path / "lock.json").read_text())
+    assert lock[str(dest / "model.pth")] == {"sha256": DIGEST, "bytes": len(DATA)}
+
+    requests = server.requests
+    [again] = downloader(tmp_path).run([task(server, dest)], progress=False)
+    assert again.skipped and server.requests == requests
+
+
+def test_resumes_a_partial_with_a_range_request(tmp_path, server):
+    dest = tmp_path / "models"
+    dest.mkdir()
+    (dest / "model.pth.part").write_bytes(DATA[:1024 * 1024])
+
+    [result] = downloader(tmp_path).run([task(server, dest, DIGEST)], progress=False)
+
+    assert result.error is None
+    assert result.resumed_from == 1024 * 1024
+    assert result.bytes_downloaded == len(DATA) - 1024 * 1024
+    assert (dest / "model.pth").read_bytes() == DATA
+
+
+def test_complete_partial_is_accepted_on_416(tmp_path, server):
+    dest = tmp_path / "models"
+    dest.mkdir()
+    (dest / "model.pth.part").write_bytes(DATA)
+
+    [result] = downloader(tmp_path).run([task(server, dest, DIGEST)], progress=False)
+
+    assert result.error is None
+    assert result.bytes_downloaded == 0
+    assert (dest / "model.pth").read_bytes() == DATA
+
+
+def test_dropped_connection_is_retried_from_where_it_stopped(tmp_path):
+    root = tmp_path / "srv"
+    root.mkdir()
+    (root / "model.pth").write_bytes(DATA)
+    with LocalFileServer(root, truncate_once=("/model.pth",)) as server:
+        [result] = downloader(tmp_path, retries=1).run([task(server, tmp_path / "models", DIGEST)],
+                                                       progress=False)
+
+    assert result.error is None
+    assert 0 < result.resumed_from < len(DATA)
+    assert (tmp_path / "models" / "model.pth").read_bytes() == DATA
+
+
+def test_sha256_mismatch_fails_without_installing_the_file(tmp_path, server):
+    dest = tmp_path / "models"
+    [result] = downloader(tmp_path).run([task(server, dest, "0" * 64)], progress=False)
+
+    assert result.error.startswith("ChecksumError")
+    assert not (dest / "model.pth").exists()
+    assert not (dest / "model.pth.part").exists()
+    assert not (tmp_path / "lock.json").exists()
+
+
+def test_client_errors_are_not_retried(tmp_path, server):
+    [result] = downloader(tmp_path, retries=3).run([task(server, tmp_path / "models", name="missing.pth")],
+                                                   progress=False)
+    assert "404" in result.error
+    assert server.requests == 1
@@ -0,0 +1,47 @@
+import sys
+
+import numpy as np
+import pytest
+
+from encoder import FfmpegEncoderSink
+
+
+class CopySink(FfmpegEncoderSink):
+    """The encoder's queue / writer thread, with a process that copies stdin to the output file."""
+
+    def command(self, width, height, fps):
+        script = "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open(sys.argv[1], 'wb'))"
+        return [sys.executable, "-c", script, str(self.output_path)]
+
+
+def test_frames_and_batches_reach_the_process_in_order(tmp_path):
+    sink = CopySink(tmp_path / "out.raw", max_pending=2)
+    sink.open(4, 2, 25)
+    frames = [np.full((2, 4, 3), i, dtype=np.uint8) for i in range(6)]
+    released = []
+
+    sink.write(frames[0], release=lambda: released.append(0))
+    sink.write_batch(np.stack(frames[1:4]))
+    sink.write_batch(frames[4:])
+    sink.close()
+
+    data = np.frombuffer((tmp_path / "out.raw").read_bytes(), dtype=np.uint8).reshape(-1, 2, 4, 3)
+    assert [int(frame[0, 0, 0]) for frame in data] == list(range(6))
+    assert released == [0]
+    assert sink.stats.frames == 6
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.int16])
+def test_write_batch_rejects_non_uint8(tmp_path, dtype):
+    sink = CopySink(tmp_path / "out.raw")
+    sink.open(4, 2, 25)
+    try:
+        with pytest.raises(ValueError):
+            sink.write_batch(np.full((3, 2, 4, 3), 300, dtype=dtype))
+        with pytest.raises(ValueError):
+            sink.write(np.zeros((2, 4, 3), dtype=dtype))
+        with pytest.raises(ValueError):
+            sink.write_batch(np.zeros((3, 4, 4, 3), dtype=np.uint8))
+    finally:
+        sink.close()
+    assert sink.stats.frames == 0
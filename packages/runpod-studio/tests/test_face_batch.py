@@ -0,0 +1,85 @@
+import numpy as np
+
+from face_batch import BatchedFaceEnhancer
+
+FACE = 32
+# Frame coords → aligned-face coords: the 32×32 square at (16, 16) of a 64×64 frame
+AFFINE = np.array([[1.0, 0.0, -16.0], [0.0, 1.0, -16.0]])
+
+
+class FakeDetector:
+    def __init__(self, affine=AFFINE):
+        self.affine = affine
+        self.calls = 0
+
+    def __call__(self, frame):
+        self.calls += 1
+        return self.affine
+
+
+class FakeRestorer:
+    """Records batch sizes and returns white faces."""
+
+    def __init__(self):
+        self.batches = []
+
+    def restore_batch(self, crops):
+        assert crops.shape[1:] == (FACE, FACE, 3)
+        self.batches.append(len(crops))
+        return np.full_like(crops, 255)
+
+
+def frames(count, value=60):
+    return [np.full((64, 64, 3), value, dtype=np.uint8) for _ in range(count)]
+
+
+def engine(detector=None, restorer=None, **kwargs):
+    options = {"upscale": 1, "face_size": FACE, "batch_size": 8, "detect_every": 30}
+    options.update(kwargs)
+    return BatchedFaceEnhancer(detector or FakeDetector(), restorer or FakeRestorer(), **options)
+
+
+def test_restores_in_batches_of_batch_size_with_one_detection():
+    restorer = FakeRestorer()
+    enhancer = engine(restorer=restorer)
+    out = enhancer.enhance_batch(frames(20))
+
+    assert len(out) == 20
+    assert restorer.batches == [8, 8, 4]
+    assert enhancer.stats.detections == 1
+
+
+def test_track_carries_across_calls_and_redetects_every_n_frames():
+    detector, restorer = FakeDetector(), FakeRestorer()
+    enhancer = engine(detector, restorer, detect_every=5)
+    for _ in range(3):
+        enhancer.enhance_batch(frames(4))
+
+    assert detector.calls == 3          # frames 0, 5 and 10
+    # An unchanged affine keeps the track, so batches are not split at re-detects
+    assert restorer.batches == [4, 4, 4]
+
+
+def test_scene_cut_forces_detection():
+    detector = FakeDetector()
+    enhancer = engine(detector)
+    enhancer.enhance_batch(frames(3, value=60) + frames(3, value=220))
+    assert detector.calls == 2
+    assert enhancer.stats.scene_cuts == 1
+
+
+def test_faceless_frames_skip_the_restorer():
+    restorer = FakeRestorer()
+    enhancer = engine(FakeDetector(affine=None), restorer, upscale=2)
+    out = enhancer.enhance_batch(frames(5))
+
+    assert restorer.batches == []
+    assert enhancer.stats.faceless_frames == 5
+    assert all(frame.shape == (128, 128, 3) and np.all(frame == 60) for frame in out)
+
+
+def test_paste_back_blends_only_the_face_region():
+    out = engine().enhance_batch(frames(2))[0]
+    assert out[32, 32].tolist() == [255, 255, 255]   # face centre: restored
+    assert out[2, 2].tolist() == [60, 60, 60]        # outside the face: untouched
+    assert 60 < out[17, 32, 0] < 255                 # feathered edge
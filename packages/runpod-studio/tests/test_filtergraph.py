@@ -0,0 +1,102 @@
+from pathlib import Path
+
+from encoder import FfmpegEncoderSink
+from filtergraph import (
+    COLOR_GRADES, PostGraph, audio_mix_filters, drawtext_filters, grade_filter, grain_filter, scale_filter,
+)
+
+CAPTIONS = [{"text": "Hello: it's me", "start": 0.5, "end": 2.0}, {"text": "Bye", "start": 2.0, "end": 3.0}]
+
+
+def test_scale_fits_pads_and_resamples():
+    assert scale_filter(1080, 1920) == ("scale=1080:1920:force_original_aspect_ratio=decrease,"
+                                        "pad=1080:1920:(ow-iw)/2:(oh-ih)/2,setsar=1")
+    assert scale_filter(720, 1280, 24).endswith(",setsar=1,fps=24")
+
+
+def test_grade_and_grain_filters():
+    assert grade_filter("cinematic") == "eq=contrast=1.1:saturation=1.15:brightness=0.02,curves=preset=lighter"
+    assert grade_filter("unknown") == COLOR_GRADES["cinematic"]
+    assert grain_filter(0.03) == "noise=alls=3:allf=t"
+
+
+def test_drawtext_escapes_and_enables_per_caption():
+    first, second = drawtext_filters(CAPTIONS, {"font_size": 60, "position_y": 0.8})
+    assert first.startswith("drawtext=text='Hello\\: it'\\''s me':fontsize=60:")
+    assert "y=h*0.8:" in first and first.endswith("enable='between(t,0.5,2.0)'")
+    assert second.endswith("enable='between(t,2.0,3.0)'")
+
+
+def test_voice_only_mix_is_a_passthrough():
+    assert audio_mix_filters("1:a") == ["[1:a]volume=1.0[aout]"]
+
+
+def test_music_is_ducked_under_the_voice():
+    parts = audio_mix_filters("1:a", music="2:a", sfx=[("3:a", 1.5, 0.4)], duration=12.0,
+                              ducking={"base_volume": 0.2, "attack_ms": 20, "release_ms": 250})
+    assert parts == [
+        "[1:a]volume=1.0,asplit=2[voice][voice_key]",
+        "[2:a]aloop=loop=-1:size=2e+09,atrim=0:12.0,volume=0.2[music_raw]",
+        "[music_raw][voice_key]sidechaincompress=threshold=0.02:ratio=10:attack=20:release=250[music]",
+        "[3:a]adelay=1500|1500,volume=0.4[sfx0]",
+        "[voice][music][sfx0]amix=inputs=3:duration=first[aout]",
+    ]
+
+
+def test_graph_steps_apply_in_call_order_with_thumbnail_split():
+    graph = (PostGraph(Path("lipsync.mp4"))
+             .subtitles(Path("/tmp/job:1/captions.ass"))
+             .grade("cinematic")
+             .grain(0.02)
+             .scale(1080, 1920, 30)
+             .thumbnail(Path("thumb.jpg")))
+
+    video, thumb = graph.filter_complex().split(";")
+    assert video == ("[0:v]ass=filename='/tmp/job\\:1/captions.ass',"
+                     f"{COLOR_GRADES['cinematic']},noise=alls=2:allf=t,"
+                     f"{scale_filter(1080, 1920, 30)},split=2[vout][thumb_src]")
+    assert thumb == "[thumb_src]trim=end_frame=1[thumb]"
+    assert graph.describe() == {"stages": ["captions", "grade", "grain", "scale", "thumbnail"],
+                                "inputs": 1, "filters": 4}
+
+
+def test_thumbnail_at_a_later_time_is_trimmed_from_there():
+    graph = PostGraph(Path("in.mp4")).thumbnail(Path("thumb.jpg"), at_s=1.5)
+    assert graph.filter_complex() == ("[0:v]null,split=2[vout][thumb_src];"
+                                      "[thumb_src]trim=start=1.5,setpts=PTS-STARTPTS,trim=end_frame=1[thumb]")
+
+
+def test_graph_without_steps_passes_video_and_audio_through():
+    graph = PostGraph(Path("in.mp4")).captions([], {}).grain(0)
+    assert graph.filter_complex() == "[0:v]null[vout]"
+    cmd = graph.command(Path("out.mp4"))
+    assert cmd[cmd.index("-map", cmd.index("[vout]")) + 1] == "0:a?"
+    assert graph.stages == []
+
+
+def test_premixed_audio_is_mapped_from_its_input():
+    graph = PostGraph(Path("in.mp4")).audio(Path("mixed.wav")).captions(CAPTIONS, {})
+    cmd = graph.command(Path("out.mp4"), video_args=["-c:v", "libx264", "-crf", "18"])
+    assert cmd[:6] == ["ffmpeg", "-y", "-i", "in.mp4", "-i", "mixed.wav"]
+    assert cmd[cmd.index("[vout]") + 1:cmd.index("[vout]") + 3] == ["-map", "1:a"]
+    assert cmd[-6:] == ["-crf", "18", "-c:a", "aac", "-shortest", "out.mp4"]
+    assert graph.filter_complex().count("drawtext=") == 2
+
+
+def test_mixed_graph_maps_the_mix_output_and_thumbnail():
+    graph = (PostGraph(Path("in.mp4"))
+             .mix(Path("voice.wav"), music=Path("music.mp3"), duration=8.0)
+             .thumbnail(Path("thumb.jpg")))
+    cmd = graph.command(Path("out.mp4"))
+    assert [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-i"] == ["in.mp4", "voice.wav", "music.mp3"]
+    assert ["-map", "[vout]", "-map", "[aout]"] == cmd[cmd.index("-filter_complex") + 2:][:4]
+    assert cmd[-8:] == ["out.mp4", "-map", "[thumb]", "-frames:v", "1", "-q:v", "2", "thumb.jpg"]
+    assert graph.filter_complex().endswith("amix=inputs=2:duration=first[aout]")
+
+
+def test_frame_pipeline_encode_uses_the_same_scale():
+    # handler passes `format` to the frame pipeline's encoder as ["-vf", scale_filter(...)]
+    sink = FfmpegEncoderSink(Path("out.mp4"), extra_args=["-vf", scale_filter(1080, 1920, 30)])
+    cmd = sink.command(540, 960, 25)
+    assert cmd[cmd.index("-vf") + 1] == PostGraph(Path("in.mp4")).scale(1080, 1920, 30).video_filters[0]
+    assert cmd.index("-vf") > cmd.index("-i") and cmd[-1] == "out.mp4"
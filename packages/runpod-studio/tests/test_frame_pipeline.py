@@ -0,0 +1,112 @@
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from frame_pipeline import (ArrayFrameSource, ColorGradeStage, FaceEnhanceStage, FilmGrainStage, FramePipeline,
+                            MemoryFrameSink, UpscaleStage, build_stages, curve_lut, eq_lut)
+from filtergraph import grade_filter
+
+
+class StubEnhancer:
+    """GFPGANer API: returns the frame upscaled 2× with nearest neighbour."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def enhance(self, frame, has_aligned=False, only_center_face=True, paste_back=True):
+        self.calls += 1
+        return None, None, np.repeat(np.repeat(frame, 2, axis=0), 2, axis=1)
+
+
+class StubUpsampler:
+    """RealESRGANer API."""
+
+    def enhance(self, frame, outscale=2):
+        return np.repeat(np.repeat(frame, outscale, axis=0), outscale, axis=1), None
+
+
+def frames(count=6, width=32, height=24):
+    return [np.full((height, width, 3), i * 10, dtype=np.uint8) for i in range(count)]
+
+
+def test_pipeline_runs_stub_stages_in_order():
+    enhancer = StubEnhancer()
+    sink = MemoryFrameSink()
+    stages = [FaceEnhanceStage(enhancer), UpscaleStage(StubUpsampler(), scale=2)]
+
+    stats = FramePipeline(stages).run(ArrayFrameSource(frames(), 32, 24, 25, 6), sink)
+
+    assert stats.frames == 6
+    assert stats.output_size == (128, 96)
+    assert sink.size == (128, 96) and sink.closed
+    assert enhancer.calls == 6
+    assert [int(frame[0, 0, 0]) for frame in sink.frames] == [0, 10, 20, 30, 40, 50]
+    assert set(stats.stage_seconds) == {"face_enhance", "upscale"}
+
+
+def test_build_stages_follows_preset_toggles():
+    preset = {"face_enhance": True, "upscale": True, "upscale_factor": 4, "color_grading": True, "film_grain": 0.02}
+    names = [stage.name for stage in build_stages(preset, face_enhancer=StubEnhancer(), upscaler=StubUpsampler())]
+    assert names == ["face_enhance", "upscale", "color_grade", "film_grain"]
+
+    # A toggle whose model is missing is skipped
+    names = [stage.name for stage in build_stages(preset, face_enhancer=None, upscaler=None)]
+    assert names == ["color_grade", "film_grain"]
+
+    assert build_stages({"face_enhance": False}) == []
+
+
+def test_film_grain_depends_only_on_frame_and_index():
+    frame = np.full((16, 16, 3), 128, dtype=np.uint8)
+    a, b = FilmGrainStage(0.02, seed=3), FilmGrainStage(0.02, seed=3)
+    assert np.array_equal(a.process(frame, 5), b.process(frame, 5))
+    assert not np.array_equal(a.process(frame, 5), a.process(frame, 6))
+    assert np.abs(a.process(frame, 5).astype(int) - 128).max() <= 2
+
+
+def test_eq_lut_matches_ffmpeg_integer_math():
+    # vf_eq process_c: pel = (src * (int)(c * 4096) >> 12) + brightness offset, clipped
+    lut = eq_lut(1.1, 0.02)
+    assert lut[128] == 132
+    assert lut[0] == 0 and lut[255] == 255
+    assert np.array_equal(eq_lut(), np.arange(256))
+    # Saturation on a chroma plane: neutral 128 lands on 127, as in ffmpeg
+    assert eq_lut(1.15)[128] == 127
+
+
+def test_curve_lut_is_natural_spline_through_preset_points():
+    lut = curve_lut([0.0, 0.4, 1.0], [0.0, 0.5, 1.0])
+    assert lut[0] == 0
+    assert lut[102] == 127           # knot (0.4, 0.5)
+    assert np.all(np.diff(lut.astype(int)) >= 0)
+    # The spline bows above the straight segments that np.interp would give
+    linear = np.interp(np.arange(256) / 255, [0.0, 0.4, 1.0], [0.0, 0.5, 1.0]) * 255
+    assert lut[200] > linear[200]
+
+
+@pytest.mark.parametrize("style", ["cinematic", "warm", "cool", "vibrant"])
+def test_grade_keeps_shape_and_range(style):
+    frame = np.random.default_rng(0).integers(0, 256, size=(24, 32, 3), dtype=np.uint8)
+    graded = ColorGradeStage(style).process(frame, 0)
+    assert graded.shape == frame.shape and graded.dtype == np.uint8
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not on PATH")
+@pytest.mark.parametrize("style", ["cinematic", "warm", "cool", "vibrant"])
+def test_grade_matches_ffmpeg(style):
+    height, width = 64, 96
+    y, x = np.mgrid[0:height, 0:width]
+    frame = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], -1).astype(np.uint8)
+
+    # 4:4:4 so ffmpeg's chroma is full resolution too
+    result = subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-i", "-",
+         "-vf", f"format=yuv444p,{grade_filter(style)},format=bgr24", "-f", "rawvideo", "-"],
+        input=frame.tobytes(), capture_output=True, check=True)
+    reference = np.frombuffer(result.stdout, dtype=np.uint8).reshape(height, width, 3)
+
+    diff = np.abs(ColorGradeStage(style).process(frame, 0).astype(int) - reference)
+    assert diff.mean() < 1.5
+    assert np.percentile(diff, 99) <= 4
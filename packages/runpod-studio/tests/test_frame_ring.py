@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from frame_pipeline import (ArrayFrameSource, CaptionOverlayStage, ColorGradeStage, FilmGrainStage, FramePipeline,
+                            FrameStage, MemoryFrameSink, UpscaleStage)
+from frame_ring import FramePool, FrameRing
+
+W, H, FPS = 96, 64, 25
+CAPTIONS = [{"text": "hello", "start": 0.0, "end": 0.3}, {"text": "world", "start": 0.3, "end": 0.6}]
+
+
+class StubUpsampler:
+    """RealESRGANer API."""
+
+    def enhance(self, frame, outscale=2):
+        return np.repeat(np.repeat(frame, outscale, axis=0), outscale, axis=1), None
+
+
+class Gradient(FrameStage):
+    """Generates frames from nothing (idle-loop style): process(None, index)."""
+
+    name = "gradient"
+    parallel_safe = True
+
+    def process(self, frame, index):
+        out = np.zeros((H, W, 3), np.uint8)
+        out[..., 0] = index
+        out[..., 1] = np.arange(W, dtype=np.uint8)
+        return out
+
+
+class Exploding(FrameStage):
+    name = "exploding"
+    parallel_safe = True
+
+    def process(self, frame, index):
+        if index == 3:
+            raise ValueError("bad frame")
+        return frame
+
+
+def source(count=20):
+    rng = np.random.default_rng(3)
+    frames = [rng.integers(0, 256, (H, W, 3), dtype=np.uint8) for _ in range(count)]
+    return ArrayFrameSource(frames, W, H, FPS, count)
+
+
+def stages():
+    return [UpscaleStage(StubUpsampler(), scale=2), CaptionOverlayStage(CAPTIONS, {"font_size": 20}),
+            ColorGradeStage("cinematic"), FilmGrainStage(0.02, seed=7)]
+
+
+def test_ring_slots_are_shared_between_views():
+    ring = FrameRing(3, (4, 5, 3))
+    try:
+        view = FrameRing.attach(ring.spec)
+        view.frames[2][...] = 9
+        assert (ring.frames[2] == 9).all() and (ring.frames[1] == 0).all()
+        view.close()
+    finally:
+        ring.close()
+
+
+def test_pooled_output_matches_in_process_bit_for_bit():
+    in_process = MemoryFrameSink()
+    FramePipeline(stages(), workers=0).run(source(), in_process)
+
+    pipeline = FramePipeline(stages(), workers=2)
+    pooled = MemoryFrameSink()
+    stats = pipeline.run(source(), pooled)
+
+    head, tail = pipeline.split()
+    assert [s.name for s in head] == ["upscale"]
+    assert [s.name for s in tail] == ["captions", "color_grade", "film_grain"]
+    assert stats.frames == 20 and stats.pool["workers"] == 2
+    assert len(pooled.frames) == len(in_process.frames) == 20
+    for a, b in zip(in_process.frames, pooled.frames):
+        assert a.shape == (2 * H, 2 * W, 3)
+        np.testing.assert_array_equal(a, b)
+
+
+def test_one_worker_stays_in_process():
+    pipeline = FramePipeline(stages(), workers=1)
+    assert pipeline.split()[1] == []
+    stats = pipeline.run(source(4), MemoryFrameSink())
+    assert stats.pool == {}
+
+
+def test_generated_frames_arrive_in_order():
+    sink = MemoryFrameSink()
+    with FramePool([Gradient()], out_shape=(H, W, 3), workers=2, fps=FPS) as pool:
+        stats = pool.run(None, sink, count=12)
+
+    assert stats["frames"] == 12
+    assert [int(frame[0, 0, 0]) for frame in sink.frames] == list(range(12))
+    assert all((frame[0, :, 1] == np.arange(W)).all() for frame in sink.frames)
+
+
+def test_worker_error_is_raised_with_its_frame():
+    with FramePool([Exploding()], out_shape=(H, W, 3), in_shape=(H, W, 3), workers=2, fps=FPS) as pool:
+        with pytest.raises(RuntimeError, match="failed on frame 3") as error:
+            pool.run(source(8), MemoryFrameSink())
+    assert "bad frame" in str(error.value)
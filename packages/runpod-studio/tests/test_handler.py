@@ -0,0 +1,49 @@
+"""
+handler.py starts the RunPod worker when imported, so it is checked statically:
+a name its job handlers use but never define raises NameError mid-job, which
+the stage fallbacks (frame pipeline → multi-pass chain) would swallow.
+"""
+
+import builtins
+import symtable
+from pathlib import Path
+
+HANDLER = Path(__file__).resolve().parent.parent / "handler.py"
+
+
+def unresolved_names(source, filename):
+    """(scope, name) for every global a scope reads that the module never binds."""
+    module = symtable.symtable(source, filename, "exec")
+    bound = {s.get_name() for s in module.get_symbols() if s.is_assigned() or s.is_imported() or s.is_namespace()}
+    missing = []
+
+    def walk(table, scope):
+        for symbol in table.get_symbols():
+            name = symbol.get_name()
+            if (symbol.is_referenced() and (table is module or symbol.is_global())
+                    and name not in bound and not hasattr(builtins, name)):
+                missing.append((scope, name))
+        for child in table.get_children():
+            walk(child, f"{scope}.{child.get_name()}")
+
+    walk(module, "handler")
+    return missing
+
+
+def test_every_name_the_handler_uses_is_defined():
+    assert unresolved_names(HANDLER.read_text(), str(HANDLER)) == []
+
+
+def test_check_sees_names_leaked_between_job_handlers():
+    # The user-021 regression: render_stage of one handler used a local of another
+    source = (
+        "def handle_video_render(job_input):\n"
+        "    format_args = ['-vf', 'scale=1:1']\n"
+        "    return format_args\n"
+        "\n"
+        "def handle_lipsync_only(job_input):\n"
+        "    def render_stage(path):\n"
+        "        return format_args + []\n"
+        "    return render_stage\n"
+    )
+    assert unresolved_names(source, "handler.py") == [("handler.handle_lipsync_only.render_stage", "format_args")]
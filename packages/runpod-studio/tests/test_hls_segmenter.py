@@ -0,0 +1,186 @@
+import subprocess
+
+import numpy as np
+import pytest
+
+from hls_segmenter import AdtsTrack, HlsSegmenter, StubSegmentEncoder, ffmpeg_segment_encoder
+
+PACKET_S = 1024 / 48000
+
+
+def adts_frame(index, payload=5):
+    """One ADTS frame (48 kHz, one raw data block) whose payload bytes all equal `index % 256`."""
+    length = 7 + payload
+    header = bytes([0xFF, 0xF1, 0x4C, 0x80 | (length >> 11), (length >> 3) & 0xFF,
+                    ((length & 0x07) << 5) | 0x1F, 0xFC])
+    return header + bytes([index % 256]) * payload
+
+
+def adts_track(packets):
+    return AdtsTrack(b"".join(adts_frame(i, 5 + i % 3) for i in range(packets)))
+
+
+def frames(count, size=16):
+    return [np.full((size, size, 3), i % 256, np.uint8) for i in range(count)]
+
+
+class Published:
+    def __init__(self, fail=()):
+        self.names = []
+        self.fail = set(fail)
+
+    def __call__(self, path, name):
+        if name in self.fail:
+            raise ConnectionError(f"{name} rejected")
+        self.names.append(name)
+        return f"https://cdn.test/stream/{name}"
+
+
+def playlist_entries(workdir):
+    lines = (workdir / "index.m3u8").read_text().splitlines()
+    return [line for line in lines if line == "#EXT-X-DISCONTINUITY" or line.endswith(".ts")]
+
+
+# ─── voice track ───
+
+def test_adts_track_parses_packets():
+    track = adts_track(100)
+    assert (track.packets, track.sample_rate, track.packet_samples) == (100, 48000, 1024)
+    assert track.packet_s == pytest.approx(PACKET_S)
+
+
+def test_adts_track_rejects_garbage():
+    with pytest.raises(ValueError, match="sync word"):
+        AdtsTrack(adts_frame(0) + b"\x00" * 16)
+
+
+def test_cuts_cover_every_packet_once(tmp_path):
+    track = adts_track(500)
+    starts = [i * 2.0 for i in range(6)] + [10.64]   # 2 s segments at 25 fps; the last is short
+    offsets = []
+    for i, (start, end) in enumerate(zip(starts, starts[1:])):
+        offsets.append(track.cut(start, end, tmp_path / f"seg_{i}.aac"))
+
+    joined = b"".join((tmp_path / f"seg_{i}.aac").read_bytes() for i in range(len(offsets)))
+    assert AdtsTrack(joined).packets == round(10.64 / PACKET_S) + 1
+    assert joined == track.data[:len(joined)]
+
+    assert offsets[0] == pytest.approx(-PACKET_S)   # Segment 0 keeps the priming packet
+    assert all(abs(offset) <= PACKET_S / 2 for offset in offsets[1:])
+
+
+def test_cut_is_clamped_to_the_track_end(tmp_path):
+    track = adts_track(50)   # 49 packets of audio after priming, about 1.05 s
+    assert track.cut(0.5, 2.0, tmp_path / "tail.aac") == pytest.approx(23 * PACKET_S - 0.5)
+    assert AdtsTrack((tmp_path / "tail.aac").read_bytes()).packets == 50 - 24
+    assert track.cut(5.0, 7.0, tmp_path / "none.aac") is None
+    assert not (tmp_path / "none.aac").exists()
+
+
+# ─── segment encoders ───
+
+def test_segments_stream_copy_one_voice_encode(tmp_path, monkeypatch):
+    encodes = []
+
+    def encode(audio_path, dest, bitrate="128k", sample_rate=48000):
+        encodes.append(dest)
+        return adts_track(500)
+
+    monkeypatch.setattr(AdtsTrack, "encode", staticmethod(encode))
+    factory = ffmpeg_segment_encoder(tmp_path / "voice.wav")
+    first = factory(tmp_path / "seg_00000.ts", 0.0, 2.0).command(64, 64, 25)
+    second = factory(tmp_path / "seg_00001.ts", 2.0, 2.0).command(64, 64, 25)
+
+    assert encodes == [tmp_path / "voice.aac"]
+    for cmd, start in ((first, "0.000"), (second, "2.000")):
+        assert cmd[cmd.index("-c:a") + 1] == "copy"
+        assert "-shortest" not in cmd and "-ss" not in cmd
+        assert cmd[cmd.index("-output_ts_offset") + 1] == start
+    assert first[first.index("-itsoffset") + 1] == f"{-PACKET_S:.6f}"
+    assert second[second.index("-i", second.index("-i") + 1) + 1] == str(tmp_path / "seg_00001.aac")
+
+
+def test_failed_voice_encode_falls_back_to_per_segment_audio(tmp_path, monkeypatch):
+    def encode(*args, **kwargs):
+        raise subprocess.CalledProcessError(1, "ffmpeg")
+
+    monkeypatch.setattr(AdtsTrack, "encode", staticmethod(encode))
+    cmd = ffmpeg_segment_encoder(tmp_path / "voice.wav")(tmp_path / "seg_00001.ts", 2.0, 2.0).command(64, 64, 25)
+    assert cmd[cmd.index("-ss") + 1] == "2.000" and cmd[cmd.index("-c:a") + 1] == "aac"
+
+
+def test_segments_without_voice_have_no_audio(tmp_path):
+    cmd = ffmpeg_segment_encoder(None)(tmp_path / "seg_00000.ts", 0.0, 2.0).command(64, 64, 25)
+    assert "-c:a" not in cmd and cmd.count("-i") == 1
+
+
+# ─── segmenter ───
+
+def test_segments_listed_in_order_with_endlist(tmp_path):
+    publish = Published()
+    segmenter = HlsSegmenter(tmp_path, publish, lambda path, start_s, duration_s: StubSegmentEncoder(path),
+                             segment_s=1.0)
+    assert segmenter.start() == "https://cdn.test/stream/index.m3u8"
+    segmenter.open(16, 16, 10)
+    segmenter.write_batch(frames(35))
+    stats = segmenter.close()
+
+    assert playlist_entries(tmp_path) == [f"seg_{i:05d}.ts" for i in range(4)]
+    assert (tmp_path / "index.m3u8").read_text().endswith("#EXT-X-ENDLIST\n")
+    assert [s["duration_s"] for s in stats["detail"]] == [1.0, 1.0, 1.0, 0.5]
+    assert [s["start_s"] for s in stats["detail"]] == [0.0, 1.0, 2.0, 3.0]
+    assert stats["frames"] == 35 and stats["errors"] == [] and stats["ttfs_ms"] is not None
+    assert [name for name in publish.names if name.endswith(".ts")] == [f"seg_{i:05d}.ts" for i in range(4)]
+
+
+class BrokenEncoder(StubSegmentEncoder):
+    def close(self):
+        super().close()
+        raise RuntimeError("ffmpeg encode failed (1)")
+
+
+def test_failed_segment_starts_a_discontinuity(tmp_path):
+    def factory(path, start_s, duration_s):
+        return BrokenEncoder(path) if path.name == "seg_00001.ts" else StubSegmentEncoder(path)
+
+    segmenter = HlsSegmenter(tmp_path, Published(), factory, segment_s=1.0)
+    segmenter.open(16, 16, 10)
+    segmenter.write_batch(frames(40))
+    stats = segmenter.close()
+
+    assert playlist_entries(tmp_path) == ["seg_00000.ts", "#EXT-X-DISCONTINUITY", "seg_00002.ts", "seg_00003.ts"]
+    assert stats["errors"] == ["seg_00001.ts: ffmpeg encode failed (1)"]
+    assert [s.get("discontinuity", False) for s in stats["detail"]] == [False, True, False]
+
+
+def test_failed_publish_starts_a_discontinuity(tmp_path):
+    segmenter = HlsSegmenter(tmp_path, Published(fail={"seg_00000.ts"}),
+                             lambda path, start_s, duration_s: StubSegmentEncoder(path), segment_s=1.0)
+    segmenter.open(16, 16, 10)
+    segmenter.write_batch(frames(20))
+    stats = segmenter.close()
+
+    assert playlist_entries(tmp_path) == ["#EXT-X-DISCONTINUITY", "seg_00001.ts"]
+    assert stats["segments"] == 1 and len(stats["errors"]) == 1
+
+
+def test_segment_encoders_get_their_timeline_slot(tmp_path):
+    calls = []
+
+    def factory(path, start_s, duration_s):
+        calls.append((path.name, start_s, duration_s))
+        return StubSegmentEncoder(path)
+
+    segmenter = HlsSegmenter(tmp_path, Published(), factory, segment_s=2.0)
+    segmenter.open(16, 16, 25)
+    segmenter.write_batch(frames(120))
+    segmenter.close()
+    assert calls == [("seg_00000.ts", 0.0, 2.0), ("seg_00001.ts", 2.0, 2.0), ("seg_00002.ts", 4.0, 2.0)]
+
+
+def test_write_after_close_is_rejected(tmp_path):
+    segmenter = HlsSegmenter(tmp_path, Published(), lambda path, s, d: StubSegmentEncoder(path))
+    segmenter.open(16, 16, 10)
+    segmenter.close()
+    with pytest.raises(RuntimeError):
+        segmenter.write(frames(1)[0])
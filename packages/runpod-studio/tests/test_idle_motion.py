@@ -0,0 +1,297 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import idle_motion
+from disk_cache import DiskCache
+from idle_motion import (EXPRESSIONS, IdleMotionEngine, MotionCurves, NumpyWarpBackend, OpenCVWarpBackend,
+                         close_eyes, render_takes)
+
+W, H, FPS = 48, 40, 10
+EYES = (12, 12, 36, 20)
+CURVES = ("blink", "breath", "pitch", "yaw", "roll")
+
+
+class NpySink:
+    """Stands in for FfmpegEncoderSink: the loop's frames go to one .npy file on close."""
+
+    def __init__(self, path):
+        self.path = path
+        self.frames = []
+
+    def open(self, width, height, fps):
+        self.size = (width, height)
+
+    def write(self, frame, release=None):
+        self.frames.append(frame.copy())
+        if release is not None:
+            release()
+
+    def close(self):
+        with open(self.path, "wb") as f:
+            np.save(f, np.stack(self.frames))
+
+    def abort(self):
+        self.frames = []
+
+
+def portrait(seed=0):
+    """Small synthetic face: a smooth gradient (so warps change it gradually) with some texture."""
+    ys, xs = np.mgrid[0:H, 0:W]
+    image = np.stack([xs * 5, ys * 6, (xs + ys) * 3], axis=-1).astype(np.float32)
+    image += np.random.default_rng(seed).integers(0, 20, (H, W, 3))
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def write_image(path, seed=0):
+    """The engine keys on the file's bytes; the decoded image is passed in, so raw pixels will do."""
+    path.write_bytes(portrait(seed).tobytes())
+    return path
+
+
+def engine(tmp_path, cache=True, **kwargs):
+    options = {"backend": NumpyWarpBackend(), "fps": FPS}
+    options.update(kwargs)
+    return IdleMotionEngine(DiskCache(tmp_path / "cache") if cache else None, NpySink, **options)
+
+
+def frames_at_loop_end(duration_s, fps, expression):
+    """Curve values one frame past the loop, from the periods MotionCurves.loop snaps to."""
+    params = idle_motion.expression_params(expression)
+    loop_ms = round(duration_s * fps) / fps * 1000
+    t = np.array([loop_ms])
+    blink_ms = idle_motion._snap(params["blink_ms"], loop_ms)
+    rates = tuple(2 * np.pi / idle_motion._snap(2 * np.pi / rate, loop_ms) for rate in idle_motion.SWAY_RATES)
+    sway = idle_motion.sway_curves(t, params["sway"], rates)
+    return {
+        "blink": idle_motion.blink_curve(t, blink_ms, offset_ms=blink_ms * 0.6)[0],
+        "breath": idle_motion.breathing_curve(t, idle_motion._snap(params["breath_ms"], loop_ms))[0] * params["breath"],
+        "pitch": sway["pitch"][0] + params["pitch"],
+        "yaw": sway["yaw"][0],
+        "roll": sway["roll"][0] + params["roll"],
+    }
+
+
+# ─── motion curves ───
+
+@pytest.mark.parametrize("expression", sorted(EXPRESSIONS))
+@pytest.mark.parametrize("duration_s, fps", [(5.0, 30), (3.3, 25), (7.0, 24)])
+def test_curves_loop_seamlessly(expression, duration_s, fps):
+    curves = MotionCurves.loop(duration_s, fps, expression)
+    assert len(curves) == round(duration_s * fps)
+
+    # Frame N (the first frame of the next pass) is frame 0 again
+    after = frames_at_loop_end(duration_s, fps, expression)
+    for name in CURVES:
+        assert after[name] == pytest.approx(float(getattr(curves, name)[0]), abs=1e-6), name
+
+    # ... so the wrap from the last frame to the first is no bigger a step than any other
+    for name in ("breath", "pitch", "yaw", "roll"):
+        values = getattr(curves, name).astype(np.float64)
+        steps = np.abs(np.diff(values))
+        assert abs(values[0] - values[-1]) <= steps.max() + 1e-6, name
+
+
+def test_each_loop_blinks_whole_blinks():
+    curves = MotionCurves.loop(5.0, 30, "neutral")
+    closed = curves.blink > 0
+    assert closed.any() and not closed[0] and not closed[-1]   # No blink is cut by the seam
+    assert 0 < curves.blink.max() <= 1
+
+
+def test_affine_matrices_match_the_curves():
+    curves = MotionCurves.loop(2.0, FPS, "happy")
+    m = curves.affine(W, H)
+    assert m.shape == (len(curves), 2, 3) and m.dtype == np.float32
+    scale = 1 + 0.004 * curves.breath
+    np.testing.assert_allclose(np.hypot(m[:, 0, 0], m[:, 1, 0]), scale, rtol=1e-5)
+    np.testing.assert_allclose(np.arctan2(m[:, 1, 0], m[:, 0, 0]), curves.roll, atol=1e-5)
+
+
+# ─── warp ───
+
+def test_identity_warp_returns_the_image():
+    image = portrait()
+    identity = np.tile(np.array([[1, 0, 0], [0, 1, 0]], np.float32), (3, 1, 1))
+    frames = list(NumpyWarpBackend(chunk=2).warp(image, identity, np.zeros(3, np.float32)))
+    assert len(frames) == 3
+    for frame in frames:
+        np.testing.assert_array_equal(frame, image)
+
+
+def test_warped_loop_wraps_without_a_jump():
+    image = portrait()
+    curves = MotionCurves.loop(3.0, FPS, "excited")
+    frames = np.stack(list(NumpyWarpBackend().warp(image, curves.affine(W, H), np.zeros(len(curves)))))
+    step = lambda a, b: np.abs(a.astype(int) - b).mean()
+    steps = [step(frames[i], frames[i + 1]) for i in range(len(frames) - 1)]
+    assert step(frames[-1], frames[0]) <= max(steps) + 0.5
+
+
+def test_blink_closes_the_eye_band_only():
+    image = portrait()
+    closed = close_eyes(image, EYES, 1.0)
+    x0, y0, x1, y1 = EYES
+    outside = np.ones(image.shape[:2], bool)
+    outside[y0:y1, x0:x1] = False
+    np.testing.assert_array_equal(closed[outside], image[outside])
+    assert not np.array_equal(closed[y0:y1, x0:x1], image[y0:y1, x0:x1])
+    assert close_eyes(image, EYES, 0.0) is image
+
+
+# ─── loop cache ───
+
+def test_loops_are_cached_per_persona_and_expression(tmp_path):
+    idle = engine(tmp_path)
+    alice, bob = write_image(tmp_path / "alice.raw"), write_image(tmp_path / "bob.raw", seed=1)
+    alice_copy = tmp_path / "alice-copy.raw"
+    alice_copy.write_bytes(alice.read_bytes())
+
+    def render(path, expression, name):
+        return idle.render(path, tmp_path / f"{name}.npy", duration_s=1.0, expression=expression,
+                           image=portrait(0 if "alice" in path.name else 1), eye_box=EYES).cache
+
+    assert render(alice, "neutral", "a-neutral") == "miss"
+    assert render(alice, "happy", "a-happy") == "miss"
+    assert render(bob, "neutral", "b-neutral") == "miss"
+    assert render(alice, "neutral", "a-neutral-again") == "hit"
+    assert render(alice_copy, "happy", "a-happy-copy") == "hit"   # Keyed by content, not path
+
+    np.testing.assert_array_equal(np.load(tmp_path / "a-neutral.npy"), np.load(tmp_path / "a-neutral-again.npy"))
+    assert not np.array_equal(np.load(tmp_path / "a-neutral.npy"), np.load(tmp_path / "a-happy.npy"))
+    stats = idle.stats()
+    assert (stats["hits"], stats["misses"], stats["frames_rendered"]) == (2, 3, 3 * FPS)
+
+
+def test_key_covers_duration_fps_eyes_and_backend(tmp_path):
+    idle = engine(tmp_path)
+    image = write_image(tmp_path / "alice.raw")
+    base = idle.key(image, 1.0, "neutral", EYES)
+    assert idle.key(image, 2.0, "neutral", EYES) != base
+    assert idle.key(image, 1.0, "neutral", None) != base
+    assert engine(tmp_path, fps=FPS * 2).key(image, 1.0, "neutral", EYES) != base
+    assert engine(tmp_path, backend=OpenCVWarpBackend()).key(image, 1.0, "neutral", EYES) != base
+    # Unknown expressions move like neutral, so they share its loop
+    assert idle.key(image, 1.0, "mysterious", EYES) == base
+
+
+def test_concurrent_takes_of_one_loop_render_it_once(tmp_path):
+    idle = engine(tmp_path)
+    image = write_image(tmp_path / "alice.raw")
+    results = []
+
+    def take(i):
+        results.append(idle.render(image, tmp_path / f"take_{i}.npy", duration_s=1.0, image=portrait(),
+                                   eye_box=EYES).cache)
+
+    threads = [threading.Thread(target=take, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == ["hit", "hit", "hit", "miss"]
+    assert idle.stats()["frames_rendered"] == FPS
+
+
+def test_without_a_cache_every_take_renders(tmp_path):
+    idle = engine(tmp_path, cache=False)
+    image = write_image(tmp_path / "alice.raw")
+    lookups = [idle.render(image, tmp_path / f"take_{i}.npy", duration_s=1.0, image=portrait(), eye_box=EYES)
+               for i in range(2)]
+    assert [lookup.cache for lookup in lookups] == ["bypass", "bypass"]
+    assert lookups[0].to_dict()["frames"] == FPS and lookups[0].blink and "cache" not in idle.stats()
+
+
+def test_frame_workers_render_the_same_loop(tmp_path):
+    image = write_image(tmp_path / "alice.raw")
+    serial = engine(tmp_path, cache=False).render(image, tmp_path / "serial.npy", duration_s=1.0,
+                                                  expression="happy", image=portrait(), eye_box=EYES)
+    pooled = engine(tmp_path, cache=False, workers=2).render(image, tmp_path / "pooled.npy", duration_s=1.0,
+                                                             expression="happy", image=portrait(), eye_box=EYES)
+    assert serial.frames == pooled.frames == FPS
+    np.testing.assert_array_equal(np.load(tmp_path / "serial.npy"), np.load(tmp_path / "pooled.npy"))
+
+
+# ─── persona takes ───
+
+def test_takes_finish_in_submission_order_with_their_timings():
+    delays = [0.15, 0.05, 0.1, 0.0]                          # Later takes render faster
+    events, lock = [], threading.Lock()
+    running, peak = [0], [0]
+
+    def render(i, spec, timings):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(spec["delay"])
+        timings["render_ms"] = spec["delay"] * 1000
+        with lock:
+            running[0] -= 1
+            events.append(("rendered", i))
+        return f"take_{i}.mp4"
+
+    def finish(i, spec, rendered, timings):
+        events.append(("finished", i))
+        timings["upload_ms"] = 1.0
+        return {"id": i, "path": rendered}
+
+    takes, report = render_takes([{"delay": d} for d in delays], render, finish, workers=2)
+
+    assert [take["id"] for take in takes] == [0, 1, 2, 3]
+    assert [i for kind, i in events if kind == "finished"] == [0, 1, 2, 3]
+    assert events.index(("rendered", 1)) < events.index(("rendered", 0))   # ... though not rendered in order
+    assert peak[0] == 2 and report["workers"] == 2 and report["takes"] == 4
+    for take in takes:
+        timings = take["timings"]
+        assert list(timings) == ["queued_ms", "render_ms", "upload_ms", "ready_ms"]
+        assert timings["queued_ms"] <= timings["ready_ms"] <= report["wall_ms"]
+    assert [take["timings"]["ready_ms"] for take in takes] == sorted(take["timings"]["ready_ms"] for take in takes)
+    assert takes[3]["timings"]["queued_ms"] >= 50           # Waited for a worker
+    assert report["serial_ms"] == pytest.approx(sum(delays) * 1000 + 4.0)
+    assert report["speedup"] > 1
+
+
+def test_earlier_takes_finish_while_later_ones_render():
+    first_finished = threading.Event()
+
+    def render(i, spec, timings):
+        # Take 1 only completes once take 0 has been finished (uploaded) alongside it
+        return first_finished.wait(5) if i == 1 else True
+
+    def finish(i, spec, rendered, timings):
+        first_finished.set()
+        return {"overlapped": rendered}
+
+    takes, _ = render_takes([{}, {}], render, finish, workers=2)
+    assert takes[1]["overlapped"]
+
+
+def test_failed_take_is_raised_and_workers_are_capped():
+    def render(i, spec, timings):
+        if spec.get("bad"):
+            raise RuntimeError("encoder crashed")
+        return i
+
+    with pytest.raises(RuntimeError, match="encoder crashed"):
+        render_takes([{}, {"bad": True}], render, lambda i, spec, rendered, timings: {}, workers=2)
+
+    takes, report = render_takes([{}], render, lambda i, spec, rendered, timings: {"id": rendered}, workers=8)
+    assert report["workers"] == 1 and takes == [{"id": 0, "timings": takes[0]["timings"]}]
+    assert render_takes([], render, lambda *args: {}, workers=4)[1]["takes"] == 0
+
+
+def test_persona_takes_share_the_loop_cache(tmp_path):
+    idle = engine(tmp_path)
+    image = write_image(tmp_path / "alice.raw")
+    specs = [{"emotion": emotion} for emotion in ("neutral", "happy", "neutral", "happy", "sad")]
+
+    def render(i, spec, timings):
+        return idle.render(image, tmp_path / f"take_{i}.npy", duration_s=1.0, expression=spec["emotion"],
+                           image=portrait(), eye_box=EYES)
+
+    takes, _ = render_takes(specs, render, lambda i, spec, lookup, timings: {"idle": lookup.to_dict()}, workers=3)
+    assert sorted(take["idle"]["cache"] for take in takes) == ["hit", "hit", "miss", "miss", "miss"]
+    assert idle.stats()["frames_rendered"] == 3 * FPS
+    np.testing.assert_array_equal(np.load(tmp_path / "take_0.npy"), np.load(tmp_path / "take_2.npy"))
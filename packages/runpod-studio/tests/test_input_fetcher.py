@@ -0,0 +1,72 @@
+import base64
+import os
+
+import pytest
+
+from benchmark import LocalFileServer
+from disk_cache import DiskCache
+from input_fetcher import InputFetcher
+
+DATA = os.urandom(3 * 1024 * 1024 + 2)
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    return InputFetcher(DiskCache(tmp_path / "cache"), retries=0)
+
+
+@pytest.mark.parametrize("payload", [
+    base64.b64encode(DATA).decode(),
+    base64.encodebytes(DATA).decode(),                                     # 76-char lines
+    "data:audio/mpeg;base64," + base64.encodebytes(DATA).decode().replace("\n", "\r\n"),
+    " " + base64.b64encode(DATA).decode()[:4001] + "\n" + base64.b64encode(DATA).decode()[4001:] + "\n",
+], ids=["plain", "encodebytes", "data-url-crlf", "odd-split"])
+@pytest.mark.parametrize("cached", [True, False])
+def test_base64_decodes_like_one_b64decode_call(tmp_path, payload, cached):
+    fetcher = InputFetcher(DiskCache(tmp_path / "cache") if cached else None)
+    result = fetcher.fetch("voice", payload, tmp_path / "voice.mp3")
+    assert (tmp_path / "voice.mp3").read_bytes() == DATA
+    assert result.bytes == len(DATA)
+
+
+def test_invalid_base64_still_fails(tmp_path, fetcher):
+    with pytest.raises(ValueError):
+        fetcher.fetch("voice", base64.b64encode(DATA).decode()[:-1], tmp_path / "voice.mp3")
+
+
+def test_repeat_payload_is_a_hit(tmp_path, fetcher):
+    payload = base64.encodebytes(DATA).decode()
+    fetcher.fetch("voice", payload, tmp_path / "a.mp3")
+    result = fetcher.fetch("voice", payload, tmp_path / "b.mp3")
+    assert result.cache == "hit"
+    assert (tmp_path / "b.mp3").read_bytes() == DATA
+
+
+def test_job_cannot_modify_the_cached_blob(tmp_path, fetcher):
+    payload = base64.b64encode(DATA).decode()
+    first = tmp_path / "job1" / "image.png"
+    fetcher.fetch("image", payload, first)
+    with open(first, "r+b") as f:          # a step that edits its input in place
+        f.write(b"\0" * 1024)
+
+    second = tmp_path / "job2" / "image.png"
+    assert fetcher.fetch("image", payload, second).cache == "hit"
+    assert second.read_bytes() == DATA
+    assert os.stat(first).st_ino != os.stat(second).st_ino
+
+
+def test_url_miss_hit_and_revalidation(tmp_path):
+    root = tmp_path / "srv"
+    root.mkdir()
+    (root / "music.mp3").write_bytes(DATA)
+    cache = DiskCache(tmp_path / "cache")
+    with LocalFileServer(root) as server:
+        url = f"{server.url}/music.mp3"
+        assert InputFetcher(cache).fetch("music", url, tmp_path / "1.mp3").cache == "miss"
+        assert InputFetcher(cache).fetch("music", url, tmp_path / "2.mp3").cache == "hit"
+        stale = InputFetcher(cache, revalidate_after_s=0)
+        assert stale.fetch("music", url, tmp_path / "3.mp3").cache == "revalidated"
+        assert server.requests == 2
+
+    for name in ("1.mp3", "2.mp3", "3.mp3"):
+        assert (tmp_path / name).read_bytes() == DATA
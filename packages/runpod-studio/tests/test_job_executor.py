@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from job_executor import FakeJobSource, JobExecutor, ResourcePool, simulated_handler
+
+LIMITS = {"gpu": 1, "cpu": 2, "upload": 2}
+PHASES = [("gpu", 0.02), ("cpu", 0.03), ("upload", 0.02)]
+
+
+class Occupancy:
+    """Counts holders of each resource from inside the slot, independently of the pool's own stats."""
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.current = {name: 0 for name in resources.limits}
+        self.peak = dict(self.current)
+        self._lock = threading.Lock()
+
+    def hold(self, name, seconds):
+        with self.resources.use(name):
+            with self._lock:
+                self.current[name] += 1
+                self.peak[name] = max(self.peak[name], self.current[name])
+            time.sleep(seconds)
+            with self._lock:
+                self.current[name] -= 1
+
+    def handler(self, job):
+        for name, seconds in job["input"]["phases"]:
+            self.hold(name, seconds)
+        return job["id"]
+
+
+def take(resources, name):
+    def hold_briefly():
+        with resources.use(name):
+            pass
+    return hold_briefly
+
+
+def run_in_thread(fn, timeout=5.0):
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (fn(), done.set()), daemon=True)
+    thread.start()
+    return done.wait(timeout)
+
+
+def test_slot_limits_are_respected():
+    resources = ResourcePool(LIMITS)
+    occupancy = Occupancy(resources)
+    executor = JobExecutor(occupancy.handler, max_jobs=4, resources=resources)
+    try:
+        executor.run(FakeJobSource(count=8, phases=PHASES, jitter=0.5))
+    finally:
+        executor.shutdown()
+
+    stats = resources.stats()["resources"]
+    for name, limit in LIMITS.items():
+        assert 1 <= occupancy.peak[name] <= limit
+        assert stats[name]["peak"] == occupancy.peak[name]
+        assert stats[name]["acquired"] == 8 and stats[name]["in_use"] == 0
+    assert occupancy.peak["cpu"] == 2   # Four jobs in flight do overlap on the two CPU slots
+
+
+def test_nested_use_of_the_same_resource_does_not_deadlock():
+    resources = ResourcePool({"gpu": 1})
+
+    @resources.bound("gpu")
+    def enhance():
+        with resources.use("gpu"):
+            return "enhanced"
+
+    def lipsync_then_enhance():
+        with resources.use("gpu"):
+            assert enhance() == "enhanced"
+
+    assert run_in_thread(lipsync_then_enhance)
+    assert resources.stats()["resources"]["gpu"]["acquired"] == 1
+
+    # The slot was released: another thread gets it
+    assert run_in_thread(take(resources, "gpu"))
+
+
+def test_slot_is_not_shared_between_threads():
+    resources = ResourcePool({"gpu": 1})
+    held, release = threading.Event(), threading.Event()
+
+    def holder():
+        with resources.use("gpu"):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    held.wait(5)
+    assert not run_in_thread(take(resources, "gpu"), timeout=0.1)
+    release.set()
+    thread.join()
+
+
+def test_results_come_back_in_submission_order():
+    resources = ResourcePool(LIMITS)
+    executor = JobExecutor(simulated_handler(resources), max_jobs=4, resources=resources)
+    # Later jobs are shorter, so they finish first
+    jobs = [{"id": f"job-{i}", "input": {"phases": [("cpu", 0.01 * (4 - i))]}} for i in range(4)]
+    try:
+        results = executor.run(jobs)
+    finally:
+        executor.shutdown()
+    assert [r["id"] for r in results] == ["job-0", "job-1", "job-2", "job-3"]
+    assert all(set(r["resources"]["cpu"]) == {"wait_ms", "held_ms"} for r in results)
+
+
+def test_failed_jobs_are_counted():
+    def handler(job):
+        if job["id"] == "bad":
+            raise RuntimeError("CUDA out of memory")
+        return job["id"]
+
+    executor = JobExecutor(handler, max_jobs=2)
+    try:
+        futures = [executor.submit({"id": name}) for name in ("a", "bad", "b")]
+        assert futures[0].result() == "a" and futures[2].result() == "b"
+        with pytest.raises(RuntimeError, match="out of memory"):
+            futures[1].result()
+    finally:
+        executor.shutdown()
+    stats = executor.stats()
+    assert (stats["completed"], stats["failed"], stats["in_flight"]) == (2, 1, 0)
+
+
+def test_utilization_stays_within_bounds():
+    resources = ResourcePool(LIMITS)
+    executor = JobExecutor(simulated_handler(resources), max_jobs=3, resources=resources)
+    try:
+        executor.run(FakeJobSource(count=6, phases=PHASES))
+        stats = executor.stats()
+    finally:
+        executor.shutdown()
+    for name in LIMITS:
+        usage = stats["resources"][name]
+        assert 0.0 < usage["utilization"] <= 1.0
+        assert usage["utilization"] <= usage["occupancy"] <= 1.0
+    assert stats["resources"]["gpu"]["busy_s"] == pytest.approx(6 * 0.02, rel=0.5)
+
+
+def test_async_handler_runs_on_the_pool():
+    executor = JobExecutor(lambda job: threading.current_thread().name, max_jobs=2)
+    try:
+        assert asyncio.run(executor.async_handler({"id": "x"})).startswith("job")
+        assert executor.concurrency(0) == 2
+    finally:
+        executor.shutdown()
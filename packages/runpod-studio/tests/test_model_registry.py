@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from model_registry import ModelRegistry
+
+MB = 1024 * 1024
+
+
+class Dummy:
+    def __init__(self, name, **params):
+        self.name = name
+        self.params = params
+
+
+def registry(ceiling_mb=1000, unloaded=None):
+    r = ModelRegistry(ceiling_bytes=ceiling_mb * MB, measure=None)
+    for name, footprint in (("musetalk", 600), ("gfpgan", 300), ("realesrgan", 200)):
+        r.register(name, lambda name=name, **params: Dummy(name, **params), footprint_mb=footprint,
+                   unload=(lambda model: unloaded.append(model.name)) if unloaded is not None else None)
+    return r
+
+
+def test_loads_once_and_counts_hits():
+    r = registry()
+    first = r.get("realesrgan", scale=4)
+    assert r.get("realesrgan", scale=4) is first
+    assert r.get("realesrgan", scale=2) is not first
+    assert (r.hits, r.misses) == (1, 2)
+    assert r.used_bytes == 400 * MB
+
+
+def test_unknown_model_raises():
+    with pytest.raises(KeyError):
+        registry().get("wav2lip")
+
+
+def test_evicts_least_recently_used_above_ceiling():
+    unloaded = []
+    r = registry(ceiling_mb=1000, unloaded=unloaded)
+    r.get("musetalk")
+    r.get("gfpgan")
+    r.get("musetalk")                     # gfpgan is now the LRU entry
+    r.get("realesrgan", scale=4)          # 1100 MB > 1000: evict gfpgan
+    assert unloaded == ["gfpgan"]
+    assert r.loaded("musetalk") and not r.loaded("gfpgan")
+    assert r.evictions == 1
+
+
+def test_acquired_model_is_not_evicted_or_loaded_twice():
+    unloaded = []
+    r = registry(ceiling_mb=700, unloaded=unloaded)
+    with r.acquire("musetalk") as engine:
+        r.get("gfpgan")                   # would evict musetalk (LRU), but it is in use
+        assert r.loaded("musetalk")
+        assert r.get("musetalk") is engine
+        assert r.evict(r.make_key("musetalk", {})) is False
+        pinned = {entry["model"]: entry["pinned"] for entry in r.stats()["loaded"]}
+        assert pinned == {"musetalk": True, "gfpgan": False}
+    assert unloaded == []
+    assert r.misses == 2
+
+    r.get("realesrgan", scale=4)          # unpinned now: both go, LRU first
+    assert unloaded == ["gfpgan", "musetalk"]
+
+
+def test_pin_without_params_covers_every_variant_and_nests():
+    r = registry(ceiling_mb=300)
+
+    @r.pin("realesrgan")
+    def render():
+        r.get("realesrgan", scale=2)
+        with r.pin("realesrgan"):
+            r.get("realesrgan", scale=4)
+        r.get("gfpgan")                   # over the ceiling: both upscalers stay
+        return r.loaded("realesrgan", scale=2) and r.loaded("realesrgan", scale=4)
+
+    assert render() is True
+    assert not r._pins
+    r.clear()
+    assert r.used_bytes == 0
+
+
+def test_pins_are_released_on_error():
+    r = registry()
+    with pytest.raises(RuntimeError):
+        with r.acquire("gfpgan"):
+            raise RuntimeError("render failed")
+    assert r.evict(r.make_key("gfpgan", {})) is True
+
+
+def test_concurrent_holders_share_one_copy():
+    loads = []
+    r = ModelRegistry(ceiling_bytes=500 * MB, measure=None)
+    r.register("musetalk", lambda: loads.append(1) or Dummy("musetalk"), footprint_mb=400)
+    r.register("gfpgan", lambda: Dummy("gfpgan"), footprint_mb=300)
+    barrier = threading.Barrier(4)
+
+    def job():
+        with r.acquire("musetalk"):
+            barrier.wait()
+            r.get("gfpgan")
+
+    threads = [threading.Thread(target=job) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loads == [1]
@@ -0,0 +1,186 @@
+import numpy as np
+import pytest
+
+from segment_renderer import (
+    SAMPLE_RATE, SegmentRenderer, crossfade, find_silences, fit_frames, plan_segments, rms_envelope,
+    stitch_segments,
+)
+
+
+def solid(value, size=2):
+    return np.full((size, size, 3), value, np.uint8)
+
+
+def voice(*spans):
+    """Mono PCM: a 0.5-amplitude tone for ("tone", s) spans, digital silence for ("gap", s)."""
+    parts = []
+    for kind, seconds in spans:
+        n = int(seconds * SAMPLE_RATE)
+        t = np.arange(n, dtype=np.float32) / SAMPLE_RATE
+        parts.append(0.5 * np.sin(2 * np.pi * 220 * t) if kind == "tone" else np.zeros(n))
+    return np.concatenate(parts).astype(np.float32)
+
+
+class MemorySink:
+    def __init__(self):
+        self.frames = []
+        self.shape = None
+        self.aborted = False
+
+    def open(self, width, height, fps):
+        self.shape = (height, width, fps)
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+    def close(self):
+        return None
+
+    def abort(self):
+        self.aborted = True
+
+
+# ─── silences ───
+
+def test_silence_found_across_chunk_boundaries():
+    pcm = voice(("tone", 1.0), ("gap", 0.5), ("tone", 1.0))
+    chunks = [pcm[i:i + 777] for i in range(0, len(pcm), 777)]
+    levels, duration = rms_envelope(chunks)
+    assert duration == pytest.approx(2.5)
+
+    (start, end), = find_silences(levels)
+    assert start == pytest.approx(1.0, abs=0.02) and end == pytest.approx(1.5, abs=0.02)
+
+
+def test_short_pauses_are_not_silences():
+    levels, _ = rms_envelope([voice(("tone", 1.0), ("gap", 0.1), ("tone", 1.0))])
+    assert find_silences(levels, min_silence_s=0.25) == []
+
+
+# ─── planning ───
+
+def test_cuts_at_silence_midpoint_nearest_target():
+    segments = plan_segments(100, [(28, 30), (55, 57), (80, 82)], fps=10)
+    assert [(s.start_frame, s.end_frame, s.render_end_frame) for s in segments] == \
+        [(0, 290, 296), (290, 560, 566), (560, 1000, 1000)]
+
+
+def test_hard_cut_at_max_without_silences():
+    segments = plan_segments(130, [], fps=10)
+    assert [(s.start_frame, s.end_frame) for s in segments] == [(0, 600), (600, 1200), (1200, 1300)]
+    assert [s.index for s in segments] == [0, 1, 2]
+
+
+def test_silence_leaving_a_too_short_tail_is_skipped():
+    segments = plan_segments(70, [(64, 66)], fps=10)
+    assert [(s.start_frame, s.end_frame) for s in segments] == [(0, 600), (600, 700)]
+
+
+def test_short_audio_is_one_segment_without_overlap():
+    segment, = plan_segments(12.34, [(5, 6)], fps=25)
+    assert (segment.frames, segment.render_frames) == (308, 308)
+    assert segment.to_dict() == {"index": 0, "start_s": 0.0, "end_s": 12.32, "frames": 308,
+                                 "overlap_frames": 0}
+
+
+def test_segments_cover_every_frame_once():
+    segments = plan_segments(301.7, [(a, a + 0.4) for a in range(7, 300, 13)], fps=30)
+    assert segments[0].start_frame == 0 and segments[-1].end_frame == round(301.7 * 30)
+    assert all(a.end_frame == b.start_frame for a, b in zip(segments, segments[1:]))
+    assert all(10 * 30 <= s.frames <= 60 * 30 for s in segments)
+    assert all(s.render_end_frame - s.end_frame == 6 for s in segments[:-1])
+
+
+# ─── fitting and crossfades ───
+
+def test_fit_frames_truncates():
+    out = list(fit_frames((solid(i) for i in range(10)), 4))
+    assert [int(f[0, 0, 0]) for f in out] == [0, 1, 2, 3]
+
+
+def test_fit_frames_pads_with_last_frame():
+    out = list(fit_frames([solid(1), solid(2)], 5))
+    assert [int(f[0, 0, 0]) for f in out] == [1, 2, 2, 2, 2]
+
+
+def test_fit_frames_rejects_empty_render():
+    with pytest.raises(ValueError):
+        list(fit_frames([], 3))
+    assert list(fit_frames([], 0)) == []
+
+
+def test_crossfade_rounds_to_uint8():
+    out = crossfade(solid(0), solid(255), 1 / 3)
+    assert out.dtype == np.uint8 and int(out[0, 0, 0]) == 85
+    assert int(crossfade(solid(10), solid(11), 0.5)[0, 0, 0]) == 11
+
+
+def test_stitch_ramps_over_the_overlap():
+    segments = plan_segments(3, [], fps=10, target_s=1, min_s=1, max_s=1, overlap_frames=2)
+    assert [s.render_frames for s in segments] == [12, 12, 10]
+
+    sources = [[solid(v)] * s.render_frames for v, s in zip((0, 90, 180), segments)]
+    out = [int(f[0, 0, 0]) for f in stitch_segments(segments, sources)]
+    assert out == [0] * 10 + [30, 60] + [90] * 8 + [120, 150] + [180] * 8
+
+
+def test_stitch_pads_short_segment_renders():
+    segments = plan_segments(2, [], fps=10, target_s=1, min_s=1, max_s=1, overlap_frames=2)
+    out = list(stitch_segments(segments, [[solid(0)] * 3, [solid(90)] * 20]))
+    assert len(out) == 20
+    assert [int(f[0, 0, 0]) for f in out[10:13]] == [30, 60, 90]
+
+
+# ─── renderer ───
+
+def make_renderer(backend, pcm, **kwargs):
+    rendered = {}
+
+    def stub_backend(segment, audio, video):
+        rendered[video.name] = backend(segment)
+
+    return SegmentRenderer(
+        stub_backend, target_s=1.5, min_s=0.5, max_s=2.0, crossfade_s=0.2,
+        pcm_source=lambda path, chunk: [pcm[i:i + chunk] for i in range(0, len(pcm), chunk)],
+        cut_audio=lambda src, start_s, duration_s, dest: dest,
+        read_frames=lambda path: rendered[path.name],
+        **kwargs,
+    )
+
+
+def test_render_stitches_segments_into_sink(tmp_path):
+    pcm = voice(("tone", 1.2), ("gap", 0.4), ("tone", 1.4))
+    calls = []
+
+    def backend(segment):
+        calls.append((segment.index, segment.start_s, segment.render_frames))
+        return [solid(100 * segment.index, 4)] * (segment.render_frames - segment.index)
+
+    sink = MemorySink()
+    stats = make_renderer(backend, pcm, workers=2).render("voice.wav", tmp_path, fps=10, sink=sink)
+
+    assert sorted(calls) == [(0, 0.0, 16), (1, 1.4, 16)]
+    assert sink.shape == (4, 4, 10)
+    assert [int(f[0, 0, 0]) for f in sink.frames] == [0] * 14 + [33, 67] + [100] * 14
+    assert stats["frames"] == 30 and stats["workers"] == 2
+    assert [s["frames"] for s in stats["segments"]] == [14, 16]
+
+
+def test_render_aborts_sink_when_a_segment_fails(tmp_path):
+    pcm = voice(("tone", 1.2), ("gap", 0.4), ("tone", 1.4))
+
+    def backend(segment):
+        if segment.index == 1:
+            raise RuntimeError("out of memory")
+        return [solid(0)] * segment.render_frames
+
+    sink = MemorySink()
+    with pytest.raises(RuntimeError, match="out of memory"):
+        make_renderer(backend, pcm, workers=1).render("voice.wav", tmp_path, fps=10, sink=sink)
+    assert sink.aborted and len(sink.frames) == 14
+
+
+def test_render_rejects_empty_audio(tmp_path):
+    renderer = make_renderer(lambda segment: [], np.zeros(0, np.float32))
+    with pytest.raises(ValueError, match="No audio"):
+        renderer.render("voice.wav", tmp_path, fps=10, sink=MemorySink())
@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from disk_cache import DiskCache
+from stage_cache import StageMemo
+
+FRAMES = os.urandom(256 * 1024)
+
+
+@pytest.fixture
+def memo(tmp_path):
+    return StageMemo(DiskCache(tmp_path / "cache"))
+
+
+def render(data=FRAMES):
+    def produce(path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return {"frames": 25}
+    return produce
+
+
+def rewrite_in_place(path):
+    # What `ffmpeg -y` does to an existing output: truncate and write the same inode
+    with open(path, "r+b") as f:
+        f.truncate(0)
+        f.write(b"retry")
+
+
+def test_hit_places_the_stored_output(tmp_path, memo):
+    assert memo.run("lipsync", "k", tmp_path / "job1" / "lipsync.mp4", render()).cache == "miss"
+    lookup = memo.run("lipsync", "k", tmp_path / "job2" / "lipsync.mp4", render(b"other"))
+    assert (lookup.cache, lookup.stats, lookup.bytes) == ("hit", {"frames": 25}, len(FRAMES))
+    assert (tmp_path / "job2" / "lipsync.mp4").read_bytes() == FRAMES
+
+
+def test_rewriting_a_fresh_output_leaves_the_entry_intact(tmp_path, memo):
+    first = tmp_path / "job1" / "lipsync.mp4"
+    memo.run("lipsync", "k", first, render())
+    rewrite_in_place(first)
+
+    second = tmp_path / "job2" / "lipsync.mp4"
+    assert memo.run("lipsync", "k", second, render(b"other")).cache == "hit"
+    assert second.read_bytes() == FRAMES
+
+
+def test_rewriting_a_placed_hit_leaves_the_entry_intact(tmp_path, memo):
+    memo.run("lipsync", "k", tmp_path / "job1" / "lipsync.mp4", render())
+    placed = tmp_path / "job2" / "lipsync.mp4"
+    memo.run("lipsync", "k", placed, render())
+    rewrite_in_place(placed)
+
+    again = tmp_path / "job3" / "lipsync.mp4"
+    memo.run("lipsync", "k", again, render(b"other"))
+    assert again.read_bytes() == FRAMES
+    assert os.stat(placed).st_ino != os.stat(again).st_ino
+
+
+def test_rejected_or_uncached_runs_bypass(tmp_path, memo):
+    out = tmp_path / "lipsync.mp4"
+    assert memo.run("lipsync", "k", out, render(), keep=lambda stats: False).cache == "bypass"
+    assert memo.run("lipsync", "k", out, render()).cache == "miss"
+    assert StageMemo().run("lipsync", "k", out, render()).cache == "bypass"
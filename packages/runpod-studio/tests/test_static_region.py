@@ -0,0 +1,156 @@
+import numpy as np
+import pytest
+
+from frame_pipeline import DeltaRegionStage, FrameStage
+from static_region import ChangeDetector, composite, edge_feather, expand_box, face_box
+
+H, W = 96, 128
+
+
+def still(seed=0):
+    return np.random.default_rng(seed).integers(40, 200, (H, W, 3), dtype=np.uint8)
+
+
+def noisy(frame, amplitude=3, seed=1):
+    noise = np.random.default_rng(seed).integers(-amplitude, amplitude + 1, frame.shape)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def moved(frame, box, delta=60):
+    x0, y0, x1, y1 = box
+    out = frame.copy()
+    out[y0:y1, x0:x1] = (out[y0:y1, x0:x1].astype(np.int16) + delta).clip(0, 255).astype(np.uint8)
+    return out
+
+
+class Upscale2x(FrameStage):
+    """Stub model: nearest 2× upscale, inverted, so its output differs from any input."""
+
+    name = "upscale"
+
+    def __init__(self):
+        self.sizes = []
+
+    def setup(self, width, height, fps):
+        self.sizes.append((width, height))
+        return width * 2, height * 2
+
+    def process(self, frame, index):
+        return 255 - frame.repeat(2, axis=0).repeat(2, axis=1)
+
+
+# ─── boxes ───
+
+def test_expand_box_pads_snaps_and_clips():
+    assert expand_box((20, 30, 41, 50), 4, W, H, align=8) == (16, 24, 48, 56)
+    assert expand_box((2, 3, 120, 90), 16, W, H, align=8) == (0, 0, W, H)
+
+
+def test_face_box_maps_the_aligned_square_back():
+    # Aligned crop = frame shifted by (-40, -20) and halved: the 64px face covers 128px of frame
+    affine = np.array([[0.5, 0.0, -20.0], [0.0, 0.5, -10.0]])
+    assert face_box(affine, 32, 200, 200, margin=0, align=1) == (40, 20, 104, 84)
+    assert face_box(affine, 32, 200, 200, margin=4, align=8) == (32, 16, 112, 88)
+
+
+# ─── change detection ───
+
+@pytest.fixture
+def detector():
+    detector = ChangeDetector(threshold=10, margin=8, align=8)
+    detector.reset(still())
+    return detector
+
+
+def test_compression_noise_is_not_a_change(detector):
+    assert detector.changed_box([noisy(still(), seed=s) for s in range(4)]) is None
+
+
+def test_isolated_speckle_is_dropped(detector):
+    frame = still()
+    frame[40:44, 60:64] = 255 - frame[40:44, 60:64]   # Exactly one 4×4 block
+    assert detector.changed_box([frame]) is None
+
+
+def test_changed_region_is_padded_and_aligned(detector):
+    box = detector.changed_box([moved(noisy(still()), (52, 60, 76, 72))])
+    assert box == (40, 48, 88, 80)
+
+
+def test_box_covers_changes_of_every_frame_in_the_batch(detector):
+    frames = [moved(still(), (20, 20, 32, 28)), still(), moved(still(), (84, 60, 100, 72))]
+    assert detector.changed_box(frames) == (8, 8, 112, 80)
+
+
+def test_reference_is_required():
+    with pytest.raises(RuntimeError, match="reset"):
+        ChangeDetector().changed_box([still()])
+
+
+# ─── compositing ───
+
+def test_feather_ramps_only_at_interior_edges():
+    mask = edge_feather((0, 16, 64, 48), W, H, feather=4)
+    assert mask.shape == (32, 64, 1)
+    assert mask[0, 10, 0] == pytest.approx(0.125) and mask[-1, 10, 0] == pytest.approx(0.125)
+    assert mask[16, 0, 0] == 1.0                      # Left edge is the frame border
+    assert mask[16, -1, 0] == pytest.approx(0.125)     # Right edge is inside the frame
+    assert (mask[4:-4, :-4] == 1.0).all()
+
+    assert edge_feather((0, 0, W, H), W, H, feather=4).min() == 1.0
+    assert edge_feather((8, 8, 24, 24), W, H, feather=2, scale=2).shape == (32, 32, 1)
+
+
+def test_composite_blends_inside_the_box_only():
+    background = np.full((H, W, 3), 100, np.uint8)
+    patch = np.full((32, 64, 3), 200, np.uint8)
+    box = (32, 16, 96, 48)
+    out = composite(background, patch, box, edge_feather(box, W, H, feather=4))
+
+    assert out is not background and (background == 100).all()
+    assert (out[:16] == 100).all() and (out[48:] == 100).all()
+    assert (out[:, :32] == 100).all() and (out[:, 96:] == 100).all()
+    assert (out[24:40, 40:88] == 200).all()
+    assert out[16, 64, 0] == 113                       # 100 + 100 × 0.125
+    np.testing.assert_array_equal(
+        out, composite(background, patch, box, edge_feather(box, W, H, feather=4),
+                       background[16:48, 32:96].astype(np.float32)))
+
+
+# ─── delta-region stage ───
+
+def test_stage_reuses_background_and_processes_roi_only():
+    model = Upscale2x()
+    stage = DeltaRegionStage(model, threshold=10, margin=8, feather=4)
+    assert stage.setup(W, H, 25) == (2 * W, 2 * H)
+
+    reference = still()
+    first = stage.process_batch([reference], 0)[0]
+    np.testing.assert_array_equal(first, Upscale2x().process(reference, 0))
+
+    static = stage.process_batch([noisy(reference)], 1)
+    assert static[0] is first
+
+    talking = moved(reference, (52, 60, 76, 72))
+    out = stage.process_batch([talking], 2)[0]
+    assert model.sizes[-1] == (48, 32)                  # ROI (40, 48, 88, 80), not the frame
+    full = Upscale2x().process(talking, 2)
+    np.testing.assert_array_equal(out[:96], first[:96])                  # Above the ROI: background
+    np.testing.assert_array_equal(out[104:152, 88:168], full[104:152, 88:168])  # ROI interior: model
+
+    report = stage.report()["delta_region"]
+    assert (report["full_frames"], report["static_frames"], report["roi_frames"]) == (1, 1, 1)
+    assert report["roi"] == [40, 48, 88, 80]
+    assert report["pixel_fraction"] == pytest.approx((W * H + 48 * 32) / (3 * W * H), abs=1e-4)
+
+
+def test_large_change_reseeds_with_a_full_frame():
+    stage = DeltaRegionStage(Upscale2x(), max_fraction=0.5)
+    stage.setup(W, H, 25)
+    stage.process_batch([still()], 0)
+
+    cut = still(seed=7)
+    out = stage.process_batch([cut], 1)[0]
+    np.testing.assert_array_equal(out, Upscale2x().process(cut, 1))
+    assert stage.report()["delta_region"]["seeds"] == 2
+    assert stage.process_batch([cut], 2)[0] is out
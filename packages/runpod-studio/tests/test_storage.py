@@ -0,0 +1,141 @@
+import base64
+import os
+import time
+import urllib.request
+
+import pytest
+
+from benchmark import LocalS3
+from job_metrics import PeakRssMonitor
+from storage import ArtifactServer, LocalArtifactStorage, R2Storage, create_storage, encode_data_url
+from uploader import MIN_PART_SIZE
+
+BASE_URL = "https://pod-8765.proxy.runpod.net"
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return path
+
+
+@pytest.fixture
+def local(tmp_path):
+    return LocalArtifactStorage(tmp_path / "outputs", base_url=BASE_URL + "/", serve=False, inline_max_bytes=1024)
+
+
+# ─── backend selection ───
+
+def test_auto_picks_r2_only_when_an_endpoint_is_configured(tmp_path):
+    config = dict(r2_client_factory=lambda: LocalS3(latency_s=0), r2_bucket="outputs",
+                  r2_public_url="https://cdn.example.com/", local_root=tmp_path, local_serve=False)
+    r2 = create_storage("auto", r2_endpoint="https://r2.example.com", **config)
+    local = create_storage("auto", r2_endpoint="", **config)
+
+    assert isinstance(r2, R2Storage) and (r2.bucket, r2.public_url) == ("outputs", "https://cdn.example.com")
+    assert isinstance(local, LocalArtifactStorage) and local.root == tmp_path and local.server is None
+    assert isinstance(create_storage("local", r2_endpoint="https://r2.example.com", **config), LocalArtifactStorage)
+    with pytest.raises(ValueError, match="Unknown storage backend"):
+        create_storage("gcs", **config)
+
+
+def test_r2_storage_uploads_and_returns_the_public_url(tmp_path):
+    s3 = LocalS3(latency_s=0)
+    storage = R2Storage(lambda: s3, "outputs", "https://cdn.example.com/", part_size=MIN_PART_SIZE)
+    data = os.urandom(MIN_PART_SIZE + 100)
+    url, stats = storage.put(write(tmp_path / "final.mp4", data), "videos/j1/final.mp4")
+
+    assert url == "https://cdn.example.com/videos/j1/final.mp4"
+    assert s3.objects["videos/j1/final.mp4"] == data
+    assert stats.parts == 2 and not stats.inline
+    storage.uploader.shutdown()
+
+
+# ─── inline data URLs ───
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 1000, 3 * 64 + 1])
+@pytest.mark.parametrize("chunk_size", [3, 64, 100])
+def test_chunked_encoding_equals_one_shot_b64encode(tmp_path, size, chunk_size):
+    data = os.urandom(size)
+    url = encode_data_url(write(tmp_path / "clip.mp4", data), chunk_size=chunk_size)
+    assert url == "data:video/mp4;base64," + base64.b64encode(data).decode("ascii")
+
+
+def test_files_up_to_the_cap_are_inlined(tmp_path, local):
+    url, stats = local.put(write(tmp_path / "thumb.jpg", b"j" * 1024), "images/j1/thumb.jpg")
+    assert url.startswith("data:image/jpeg;base64,") and stats.inline and stats.bytes == 1024
+    assert base64.b64decode(url.split(",", 1)[1]) == b"j" * 1024
+    assert not (local.root / "images/j1/thumb.jpg").exists()
+
+    url, stats = local.put(write(tmp_path / "still.jpg", b"j" * 1025), "images/j1/still.jpg")
+    assert url == f"{BASE_URL}/images/j1/still.jpg" and not stats.inline
+
+
+def test_inlining_can_be_disabled_per_call_and_per_backend(tmp_path, local):
+    segment = write(tmp_path / "seg_00000.ts", b"ts")
+    assert local.put(segment, "videos/j1/stream/seg_00000.ts", inline=False)[0] == \
+        f"{BASE_URL}/videos/j1/stream/seg_00000.ts"
+
+    never = LocalArtifactStorage(tmp_path / "never", base_url=BASE_URL, serve=False, inline_max_bytes=0)
+    url, stats = never.put(write(tmp_path / "empty.txt", b""), "empty.txt")
+    assert url == f"{BASE_URL}/empty.txt" and not stats.inline
+
+
+# ─── local artifacts ───
+
+def test_artifact_urls_map_to_files_under_the_root(tmp_path, local):
+    source = write(tmp_path / "final.mp4", os.urandom(4096))
+    url, stats = local.put(source, "videos/j1/final.mp4")
+    assert url == f"{BASE_URL}/videos/j1/final.mp4" and stats.parts == 1
+    assert (local.root / "videos/j1/final.mp4").read_bytes() == source.read_bytes()
+
+    # Storing the same key again replaces the artifact
+    url, _ = local.put(write(tmp_path / "retry.mp4", b"r" * 2048), "videos/j1/final.mp4")
+    assert (local.root / "videos/j1/final.mp4").read_bytes() == b"r" * 2048
+
+    handle = local.submit(source, "videos/j1/again.mp4")
+    assert handle is None and local.stream(source, "videos/j1/again.mp4") is None
+    assert local.finish(handle, source, "videos/j1/again.mp4")[0] == f"{BASE_URL}/videos/j1/again.mp4"
+
+
+def test_expired_artifacts_are_pruned(tmp_path):
+    storage = LocalArtifactStorage(tmp_path / "outputs", base_url=BASE_URL, serve=False, ttl_hours=1)
+    stale = storage.root / "videos/old/final.mp4"
+    stale.parent.mkdir(parents=True)
+    stale.write_bytes(b"old")
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+
+    storage.put(write(tmp_path / "final.mp4", b"new"), "videos/new/final.mp4")
+    assert not stale.exists() and (storage.root / "videos/new/final.mp4").exists()
+
+
+def test_artifact_server_serves_the_stored_file(tmp_path):
+    server = ArtifactServer(tmp_path / "outputs", port=0, host="127.0.0.1")
+    storage = LocalArtifactStorage(tmp_path / "outputs", base_url=BASE_URL, serve=False)
+    data = os.urandom(3000)
+    url, _ = storage.put(write(tmp_path / "final.mp4", data), "videos/j1/final.mp4")
+
+    server.start()
+    try:
+        local_url = url.replace(BASE_URL, f"http://127.0.0.1:{server.port}")
+        with urllib.request.urlopen(local_url, timeout=5) as response:
+            assert response.read() == data
+    finally:
+        server.stop()
+    assert not server.running
+
+
+# ─── job metrics ───
+
+def test_peak_rss_covers_an_allocation_inside_the_job():
+    with PeakRssMonitor(interval_s=0.005) as rss:
+        block = bytearray(64 * 1024 * 1024)
+        block[::4096] = b"x" * len(block[::4096])   # Touch every page so it is resident
+        time.sleep(0.05)
+        del block
+
+    metrics = rss.to_dict()
+    if rss.start_bytes is None:
+        pytest.skip("no /proc/self/status")
+    assert metrics["method"] in ("hwm", "sampled")
+    assert metrics["peak_rss_mb"] >= metrics["start_rss_mb"] + 60
+    assert metrics["peak_rss_mb"] >= metrics["end_rss_mb"]
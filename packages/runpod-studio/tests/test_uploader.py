@@ -0,0 +1,97 @@
+import os
+import time
+
+import pytest
+
+from benchmark import LocalS3
+from uploader import MIN_PART_SIZE, MultipartUploader
+
+DATA = os.urandom(2 * MIN_PART_SIZE + 12345)
+
+
+class FailingS3(LocalS3):
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == 2:
+            raise ConnectionError("part 2 lost")
+        return super().upload_part(Bucket, Key, UploadId, PartNumber, Body)
+
+
+@pytest.fixture
+def s3():
+    return LocalS3(latency_s=0)
+
+
+@pytest.fixture
+def uploader(s3):
+    uploader = MultipartUploader(s3, "bucket", part_size=MIN_PART_SIZE, concurrency=4)
+    yield uploader
+    uploader.shutdown()
+
+
+def test_small_file_is_one_put(tmp_path, s3, uploader):
+    (tmp_path / "thumb.jpg").write_bytes(b"jpeg")
+    stats = uploader.upload_file(tmp_path / "thumb.jpg", "thumb.jpg")
+    assert s3.objects["thumb.jpg"] == b"jpeg"
+    assert stats.parts == 1
+
+
+def test_large_file_goes_up_in_ordered_parts(tmp_path, s3, uploader):
+    (tmp_path / "final.mp4").write_bytes(DATA)
+    stats = uploader.upload_file(tmp_path / "final.mp4", "final.mp4")
+    assert s3.objects["final.mp4"] == DATA
+    assert (stats.parts, stats.bytes) == (3, len(DATA))
+
+
+def test_concurrent_uploads_share_the_part_pool(tmp_path, s3, uploader):
+    for name in ("a.mp4", "b.mp4"):
+        (tmp_path / name).write_bytes(DATA)
+    futures = [uploader.submit(tmp_path / name, name) for name in ("a.mp4", "b.mp4")]
+    assert [f.result().parts for f in futures] == [3, 3]
+    assert s3.objects["a.mp4"] == s3.objects["b.mp4"] == DATA
+
+
+def test_streaming_upload_follows_a_growing_file(tmp_path, s3, uploader):
+    target = tmp_path / "growing.mp4"
+    upload = uploader.stream(target, "growing.mp4", poll_s=0.01)
+
+    with open(target, "wb") as f:
+        for i in range(0, len(DATA), 1024 * 1024):
+            f.write(DATA[i:i + 1024 * 1024])
+            f.flush()
+            time.sleep(0.005)
+    stats = upload.finish(timeout=30)
+
+    assert s3.objects["growing.mp4"] == DATA
+    assert stats.streamed and stats.parts == 3
+
+
+def test_streaming_upload_below_one_part_is_one_put(tmp_path, s3, uploader):
+    target = tmp_path / "short.mp4"
+    upload = uploader.stream(target, "short.mp4", poll_s=0.01)
+    target.write_bytes(b"x" * 1000)
+    stats = upload.finish(timeout=30)
+    assert s3.objects["short.mp4"] == b"x" * 1000
+    assert stats.parts == 1
+
+
+def test_failed_part_aborts_the_multipart_upload(tmp_path):
+    s3 = FailingS3(latency_s=0)
+    uploader = MultipartUploader(s3, "bucket", part_size=MIN_PART_SIZE, concurrency=2)
+    (tmp_path / "final.mp4").write_bytes(DATA)
+    try:
+        with pytest.raises(ConnectionError):
+            uploader.upload_file(tmp_path / "final.mp4", "final.mp4")
+    finally:
+        uploader.shutdown()
+    assert "final.mp4" not in s3.objects
+    assert s3._uploads == {}
+
+
+def test_aborted_stream_stores_nothing(tmp_path, s3, uploader):
+    target = tmp_path / "cancelled.mp4"
+    target.write_bytes(DATA[:MIN_PART_SIZE + 1])
+    upload = uploader.stream(target, "cancelled.mp4", poll_s=0.01)
+    time.sleep(0.1)
+    upload.abort()
+    assert "cancelled.mp4" not in s3.objects
+    assert s3._uploads == {}
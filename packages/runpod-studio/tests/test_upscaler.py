@@ -0,0 +1,151 @@
+import numpy as np
+import pytest
+
+from upscaler import (InterpolationUpscaleModel, TiledUpscaler, estimate_bytes_per_pixel, plan_tiles, split_tiles,
+                      stitch_tiles)
+
+BPP = estimate_bytes_per_pixel(2)   # 2304 bytes per input pixel at 2x, fp16
+
+
+class BilinearModel:
+    """2x bilinear upscale with clamped edges: each window sees its own border, as a conv net does."""
+
+    scale = 2
+
+    def __init__(self):
+        self.batches = []
+
+    @staticmethod
+    def _axis(length):
+        position = np.clip((np.arange(2 * length) + 0.5) / 2 - 0.5, 0, length - 1)
+        low = np.floor(position).astype(int)
+        return low, np.minimum(low + 1, length - 1), (position - low).astype(np.float32)
+
+    def upscale_batch(self, batch):
+        self.batches.append(len(batch))
+        y0, y1, fy = self._axis(batch.shape[1])
+        x0, x1, fx = self._axis(batch.shape[2])
+        rows = batch[:, y0] * (1 - fy)[None, :, None, None] + batch[:, y1] * fy[None, :, None, None]
+        out = rows[:, :, x0] * (1 - fx)[None, None, :, None] + rows[:, :, x1] * fx[None, None, :, None]
+        return np.clip(out + 0.5, 0, 255).astype(np.uint8)
+
+
+def frame(width, height, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def seam_mask(plan):
+    """Output pixels under any window's blend ramp (its overlap on edges that border another window)."""
+    s, ramp = plan.scale, plan.overlap * plan.scale
+    mask = np.zeros((plan.height * s, plan.width * s), bool)
+    for x0, y0, x1, y1 in plan.windows:
+        if x0 > 0:
+            mask[:, x0 * s:x0 * s + ramp] = True
+        if x1 < plan.width:
+            mask[:, x1 * s - ramp:x1 * s] = True
+        if y0 > 0:
+            mask[y0 * s:y0 * s + ramp] = True
+        if y1 < plan.height:
+            mask[y1 * s - ramp:y1 * s] = True
+    return mask
+
+
+# ─── planning ───
+
+def test_whole_frame_fits_and_batches_frames():
+    plan = plan_tiles(64, 48, 2, budget_bytes=5 * 64 * 48 * BPP)
+    assert (plan.tiled, plan.batch_size, plan.windows) == (False, 5, [])
+    assert plan_tiles(64, 48, 2, budget_bytes=5 * 64 * 48 * BPP, max_batch=3).batch_size == 3
+    assert plan_tiles(64, 48, 2, budget_bytes=64 * 48 * BPP - 1).tiled
+
+
+@pytest.mark.parametrize("budget_px, tile", [(544 ** 2, 512), (544 ** 2 - 1, 384), (416 ** 2, 384), (1, 64)])
+def test_largest_tile_whose_window_fits(budget_px, tile):
+    plan = plan_tiles(1920, 1080, 2, budget_bytes=budget_px * BPP, overlap=16)
+    assert plan.tile == tile and plan.batch_size == 1
+    width, height = tile + 32, tile + 32
+    assert {(x1 - x0, y1 - y0) for x0, y0, x1, y1 in plan.windows} == {(width, height)}
+
+
+def test_windows_cover_the_frame_inside_its_bounds():
+    plan = plan_tiles(1000, 700, 2, budget_bytes=288 ** 2 * BPP, overlap=16)
+    assert plan.tile == 256
+    covered = np.zeros((700, 1000), bool)
+    for x0, y0, x1, y1 in plan.windows:
+        assert 0 <= x0 and x1 <= 1000 and 0 <= y0 and y1 <= 700
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+    assert plan.to_dict()["tiles_per_frame"] == len(plan.windows) == 4 * 3
+
+
+def test_short_frames_batch_several_clipped_windows():
+    # 160px windows are clipped to the 90px frame height, so two fit the budget per pass
+    plan = plan_tiles(4000, 90, 2, budget_bytes=200 ** 2 * BPP, overlap=16)
+    assert plan.tile == 128 and plan.batch_size == 2
+    assert {y1 - y0 for _, y0, _, y1 in plan.windows} == {90}
+
+
+# ─── stitching ───
+
+def test_nearest_upscale_stitches_back_exactly():
+    image = frame(300, 200)
+    plan = plan_tiles(300, 200, 2, budget_bytes=1, overlap=8)
+    model = InterpolationUpscaleModel(2)
+    stitched = stitch_tiles(model.upscale_batch(split_tiles(image, plan)), plan)
+    np.testing.assert_array_equal(stitched, model.upscale_batch(image[None])[0])
+
+
+def test_tiled_matches_whole_frame_except_at_blended_seams():
+    image = frame(300, 200)
+    plan = plan_tiles(300, 200, 2, budget_bytes=1, overlap=8)
+    model = BilinearModel()
+    stitched = stitch_tiles(model.upscale_batch(split_tiles(image, plan)), plan)
+    whole = model.upscale_batch(image[None])[0]
+
+    error = np.abs(stitched.astype(int) - whole)
+    seams = seam_mask(plan)
+    assert error[~seams].max() == 0
+    assert error[seams].max() <= 8 and error[seams].mean() < 0.5
+
+
+# ─── engine ───
+
+def test_engine_batches_tiles_across_frames():
+    loads = []
+    model = BilinearModel()
+    engine = TiledUpscaler(lambda scale: loads.append(scale) or model,
+                           memory_budget_bytes=2 * (128 + 2 * 8) ** 2 * BPP, overlap=8)
+    frames = [frame(300, 144, seed) for seed in range(3)]
+    out = engine.upscale_frames(frames, 2)
+
+    plan = engine.plan(300, 144, 2)
+    assert (plan.tile, plan.batch_size, len(plan.windows)) == (128, 2, 3)
+    assert model.batches == [2, 2, 2, 2, 1]   # Frame 0's last tile shares a pass with frame 1's first
+    assert engine.stats.to_dict()["tiles"] == 9 and engine.stats.forward_passes == 5
+
+    seams = seam_mask(plan)
+    for image, upscaled in zip(frames, out):
+        assert upscaled.shape == (288, 600, 3)
+        np.testing.assert_array_equal(upscaled[~seams], model.upscale_batch(image[None])[0][~seams])
+
+    engine.upscale_frames(frames[:1], 2)
+    assert loads == [2] and list(engine.stats.plans) == ["300x144@2x"]
+
+
+def test_engine_batches_whole_frames_when_they_fit():
+    model = BilinearModel()
+    engine = TiledUpscaler(lambda scale: model, memory_budget_bytes=4 * 64 * 48 * BPP)
+    frames = [frame(64, 48, seed) for seed in range(10)]
+    out = engine.upscale_frames(frames, 2)
+    assert model.batches == [4, 4, 2] and engine.stats.tiles == 0
+    np.testing.assert_array_equal(out[7], model.upscale_batch(frames[7][None])[0])
+    assert engine.upscale_frames([], 2) == []
+
+
+def test_uncached_models_are_loaded_every_call():
+    loads = []
+    engine = TiledUpscaler(lambda scale: loads.append(scale) or InterpolationUpscaleModel(scale),
+                           memory_budget_bytes=1 << 30, cache_models=False)
+    engine.upscale_frames([frame(32, 32)], 2)
+    engine.upscale_frames([frame(32, 32)], 2)
+    assert loads == [2, 2]
@@ -0,0 +1,330 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+UPLOADER - Pooled S3/R2 Client, Parallel Multipart and Streaming Uploads
+═══════════════════════════════════════════════════════════════════════════════════
+
+Replaces the per-call `boto3.client(...)` + `upload_file` in `upload_to_r2`:
+
+    - one process-wide client per endpoint with a sized connection pool
+    - multipart uploads with a fixed part size, parts sent in parallel
+    - `submit()` returns a future so the thumbnail overlaps the video upload
+    - `stream()` uploads a file while it is still being written (append-only
+      outputs such as fragmented MP4), finishing seconds after the encoder
+
+Any client exposing put_object / create_multipart_upload / upload_part /
+complete_multipart_upload / abort_multipart_upload works, so the same code runs
+against R2, MinIO or an in-process stand-in.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, Future
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+
+CONTENT_TYPES = {
+    ".mp4": "video/mp4",
+    ".m4s": "video/iso.segment",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+}
+
+_clients: Dict[Tuple[str, str], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def content_type_for(path: Path) -> str:
+    return CONTENT_TYPES.get(Path(path).suffix.lower(), "application/octet-stream")
+
+
+def get_s3_client(endpoint: str, access_key: str, secret_key: str, max_pool: int = 32):
+    """Process-wide boto3 S3 client for `endpoint` (created once, thread-safe to share)."""
+    key = (endpoint, access_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            client = boto3.session.Session().client(
+                "s3",
+                endpoint_url=endpoint,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                config=Config(
+                    signature_version="s3v4",
+                    max_pool_connections=max_pool,
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                    tcp_keepalive=True,
+                ),
+            )
+            _clients[key] = client
+        return client
+
+
+@dataclass
+class UploadStats:
+    key: str
+    bytes: int = 0
+    parts: int = 0
+    elapsed_s: float = 0.0
+    streamed: bool = False
+    tail_s: float = 0.0  # Time from writer finished to upload complete (streamed only)
+    inline: bool = False  # Returned as a data URL instead of stored
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes / 1e6 / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "bytes": self.bytes,
+            "parts": self.parts,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "mb_per_s": round(self.mb_per_s, 2),
+            "streamed": self.streamed,
+            "tail_s": round(self.tail_s, 3),
+            "inline": self.inline,
+        }
+
+
+class MultipartUploader:
+    """
+    Usage:
+        uploader = MultipartUploader(get_s3_client(...), bucket)
+        stats = uploader.upload_file(path, "videos/job/final.mp4")
+
+        video = uploader.submit(video_path, video_key)        # Future[UploadStats]
+        thumb = uploader.submit(thumb_path, thumb_key)
+
+        upload = uploader.stream(out_path, key)               # while ffmpeg writes
+        ...encode...
+        stats = upload.finish()
+
+    Parts from every concurrent upload share one pool of `concurrency` workers,
+    which also bounds memory to `concurrency * part_size`.
+    """
+
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        part_size: int = 16 * 1024 * 1024,
+        concurrency: int = 8,
+        acl: Optional[str] = "public-read",
+    ):
+        self.client = client
+        self.bucket = bucket
+        self.part_size = max(MIN_PART_SIZE, part_size)
+        self.concurrency = max(1, concurrency)
+        self.acl = acl
+
+        self._parts = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="upload-part")
+        self._jobs = ThreadPoolExecutor(max_workers=4, thread_name_prefix="upload")
+        self._in_flight = threading.BoundedSemaphore(self.concurrency * 2)
+
+    def _extra(self, content_type: str) -> Dict[str, Any]:
+        extra = {"ContentType": content_type}
+        if self.acl:
+            extra["ACL"] = self.acl
+        return extra
+
+    # ───────────────────────────────────────────────────────────────────────────────
+
+    def upload_file(self, path: Path, key: str, content_type: Optional[str] = None) -> UploadStats:
+        """Upload a finished file: single PUT below one part, parallel multipart above."""
+        path = Path(path)
+        content_type = content_type or content_type_for(path)
+        stats = UploadStats(key)
+        start = time.time()
+
+        size = path.stat().st_size
+        if size <= self.part_size:
+            with open(path, "rb") as f:
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=f.read(),
+                                       **self._extra(content_type))
+            stats.bytes, stats.parts = size, 1
+        else:
+            with _MultipartSession(self, key, content_type) as session, open(path, "rb") as f:
+                for offset in range(0, size, self.part_size):
+                    session.add(os.pread(f.fileno(), self.part_size, offset))
+            stats.bytes, stats.parts = session.bytes, session.count
+
+        stats.elapsed_s = time.time() - start
+        return stats
+
+    def submit(self, path: Path, key: str, content_type: Optional[str] = None) -> "Future[UploadStats]":
+        """Start `upload_file` in the background (e.g. thumbnail alongside the video)."""
+        return self._jobs.submit(self.upload_file, path, key, content_type)
+
+    def stream(self, path: Path, key: str, content_type: Optional[str] = None,
+               poll_s: float = 0.2) -> "StreamingUpload":
+        """Upload `path` part by part as a writer appends to it; call `finish()` when it is closed."""
+        upload = StreamingUpload(self, Path(path), key, content_type or content_type_for(path), poll_s)
+        upload.start()
+        return upload
+
+    def shutdown(self) -> None:
+        self._jobs.shutdown(wait=True)
+        self._parts.shutdown(wait=True)
+
+
+class _MultipartSession:
+    """One multipart upload: parts are numbered in order and sent on the shared pool."""
+
+    def __init__(self, uploader: MultipartUploader, key: str, content_type: str):
+        self.uploader = uploader
+        self.key = key
+        self.content_type = content_type
+        self.upload_id = None
+        self.count = 0
+        self.bytes = 0
+        self._futures: List[Future] = []
+
+    def begin(self) -> "_MultipartSession":
+        u = self.uploader
+        response = u.client.create_multipart_upload(Bucket=u.bucket, Key=self.key,
+                                                    **u._extra(self.content_type))
+        self.upload_id = response["UploadId"]
+        return self
+
+    def add(self, data: bytes) -> None:
+        self.count += 1
+        self.bytes += len(data)
+        self.uploader._in_flight.acquire()
+        future = self.uploader._parts.submit(self._send, self.count, data)
+        future.add_done_callback(lambda _: self.uploader._in_flight.release())
+        self._futures.append(future)
+
+    def _send(self, number: int, data: bytes) -> Dict[str, Any]:
+        u = self.uploader
+        response = u.client.upload_part(Bucket=u.bucket, Key=self.key, UploadId=self.upload_id,
+                                        PartNumber=number, Body=data)
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def complete(self) -> None:
+        u = self.uploader
+        try:
+            parts = [f.result() for f in self._futures]
+            u.client.complete_multipart_upload(Bucket=u.bucket, Key=self.key, UploadId=self.upload_id,
+                                               MultipartUpload={"Parts": parts})
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self) -> None:
+        """Drop queued parts and release the parts already stored server-side."""
+        u = self.uploader
+        for f in self._futures:
+            f.cancel()
+        try:
+            u.client.abort_multipart_upload(Bucket=u.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            print(f"[Uploader] Abort failed for {self.key}: {e}")
+
+    __enter__ = begin
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.complete()
+        else:
+            self.abort()
+        return False
+
+
+class StreamingUpload:
+    """
+    Tails a file that is still being written and uploads each full part as soon
+    as it exists. Only valid for append-only outputs (fragmented MP4, TS, raw):
+    a regular MP4 rewrites its header on close.
+    """
+
+    def __init__(self, uploader: MultipartUploader, path: Path, key: str, content_type: str, poll_s: float):
+        self.uploader = uploader
+        self.path = path
+        self.key = key
+        self.content_type = content_type
+        self.poll_s = poll_s
+        self.stats = UploadStats(key, streamed=True)
+
+        self._done = threading.Event()
+        self._aborted = threading.Event()
+        self._done_at = 0.0
+        self._future: Optional[Future] = None
+
+    def start(self) -> None:
+        self._future = self.uploader._jobs.submit(self._run)
+
+    def _run(self) -> UploadStats:
+        start = time.time()
+        part_size = self.uploader.part_size
+        session = None
+        offset = 0
+
+        while not self.path.exists() and not self._done.is_set():
+            time.sleep(self.poll_s)
+
+        try:
+            with open(self.path, "rb") as f:
+                while True:
+                    if self._aborted.is_set():
+                        raise RuntimeError("streaming upload aborted")
+                    done = self._done.is_set()
+                    available = os.fstat(f.fileno()).st_size - offset
+
+                    if available >= part_size or (done and available > 0 and session is not None):
+                        if session is None:
+                            session = _MultipartSession(self.uploader, self.key, self.content_type).begin()
+                        data = os.pread(f.fileno(), min(part_size, available), offset)
+                        session.add(data)
+                        offset += len(data)
+                        continue
+                    if done:
+                        break
+                    time.sleep(self.poll_s)
+
+                if session is None:
+                    # Smaller than one part: a single PUT once the writer is finished
+                    data = os.pread(f.fileno(), max(available, 0), 0)
+                    self.uploader.client.put_object(Bucket=self.uploader.bucket, Key=self.key, Body=data,
+                                                    **self.uploader._extra(self.content_type))
+                    self.stats.bytes, self.stats.parts = len(data), 1
+        except BaseException:
+            if session is not None:
+                session.abort()
+            raise
+
+        if session is not None:
+            session.complete()
+            self.stats.bytes, self.stats.parts = session.bytes, session.count
+
+        end = time.time()
+        self.stats.elapsed_s = end - start
+        self.stats.tail_s = end - self._done_at
+        return self.stats
+
+    def finish(self, timeout: Optional[float] = None) -> UploadStats:
+        """Signal that the writer has closed the file and wait for the upload to complete."""
+        self._done_at = time.time()
+        self._done.set()
+        return self._future.result(timeout=timeout)
+
+    def abort(self) -> None:
+        self._aborted.set()
+        self._done.set()
+        try:
+            self._future.result()
+        except Exception:
+            pass
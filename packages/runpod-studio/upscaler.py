@@ -0,0 +1,373 @@
+"""
+═══════════════════════════════════════════════════════════════════════════════════
+TILED UPSCALER - Memory-Budgeted, Batched Real-ESRGAN
+═══════════════════════════════════════════════════════════════════════════════════
+
+setup_realesrgan used to hardcode tile=0 and upscale one frame at a time, so
+cinema 4x ran out of memory on large inputs and small inputs never batched.
+
+This engine plans per frame size:
+
+    whole frame fits the budget  → no tiling, batch several frames per forward
+    it doesn't                   → largest tile that fits, batch tiles (across
+                                   frames too), stitch with feathered overlaps
+
+Models are cached one per native scale and loaded through an injected
+`loader(scale)`, so the planner and stitcher run on CPU with
+`InterpolationUpscaleModel` for benchmarking without a GPU.
+
+═══════════════════════════════════════════════════════════════════════════════════
+"""
+
+import os
+import time
+from typing import Optional, Dict, Any, List, Callable, Tuple
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# Tile edge lengths tried from largest to smallest when a frame doesn't fit
+TILE_CANDIDATES = [768, 512, 384, 256, 192, 128, 96, 64]
+
+# Window dims are padded to this multiple (RealESRGAN x2 pixel-unshuffles by 2)
+_MOD = 4
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# MEMORY BUDGET
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+def estimate_bytes_per_pixel(scale: int, half: bool = True) -> int:
+    """
+    Rough peak activation bytes per *input* pixel for RRDBNet (num_feat=64).
+
+    ~384 channels live in the dense blocks at input resolution, plus 64-channel
+    maps after each upsample (2x and 4x). Deliberately conservative; the
+    budget is the knob to tune, not this estimate.
+    """
+    dtype_bytes = 2 if half else 4
+    return (384 + 64 * (4 + 2 * scale * scale)) * dtype_bytes
+
+
+def detect_memory_budget(fraction: float = 0.5) -> int:
+    """Bytes usable for upscaling: a fraction of free VRAM, else of free RAM."""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            free, _ = torch.cuda.mem_get_info()
+            return int(free * fraction)
+    except ImportError:
+        pass
+
+    try:
+        available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+        return int(available * fraction)
+    except (ValueError, OSError, AttributeError):
+        return 2 * 1024 ** 3
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# TILE PLANNING + STITCHING
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class TilePlan:
+    width: int
+    height: int
+    scale: int
+    tile: int                     # 0 = whole frame, no tiling
+    overlap: int
+    batch_size: int               # frames (tile=0) or tiles per forward pass
+    windows: List[Tuple[int, int, int, int]] = field(default_factory=list)  # x0, y0, x1, y1
+
+    @property
+    def tiled(self) -> bool:
+        return self.tile > 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "size": [self.width, self.height],
+            "scale": self.scale,
+            "tile": self.tile,
+            "overlap": self.overlap,
+            "batch_size": self.batch_size,
+            "tiles_per_frame": max(1, len(self.windows)),
+        }
+
+
+def _axis_starts(length: int, window: int, step: int) -> List[int]:
+    if window >= length:
+        return [0]
+    starts = list(range(0, length - window, step))
+    starts.append(length - window)
+    return starts
+
+
+def plan_tiles(
+    width: int,
+    height: int,
+    scale: int,
+    budget_bytes: int,
+    overlap: int = 16,
+    half: bool = True,
+    max_batch: int = 16,
+) -> TilePlan:
+    """
+    Pick tile size and batch size for a frame size under a memory budget.
+
+    Windows are `tile + 2*overlap` wide and stepped by `tile`; the last window
+    on each axis is pulled back inside the frame, so every window (and every
+    batch) has the same shape.
+    """
+    bpp = estimate_bytes_per_pixel(scale, half)
+
+    frame_cost = width * height * bpp
+    if frame_cost <= budget_bytes:
+        batch = int(max(1, min(max_batch, budget_bytes // frame_cost)))
+        return TilePlan(width, height, scale, tile=0, overlap=0, batch_size=batch)
+
+    tile = TILE_CANDIDATES[-1]
+    for candidate in TILE_CANDIDATES:
+        window = candidate + 2 * overlap
+        if window * window * bpp <= budget_bytes:
+            tile = candidate
+            break
+
+    win_w = min(width, tile + 2 * overlap)
+    win_h = min(height, tile + 2 * overlap)
+    batch = int(max(1, min(max_batch, budget_bytes // (win_w * win_h * bpp))))
+
+    windows = [
+        (x, y, x + win_w, y + win_h)
+        for y in _axis_starts(height, win_h, tile)
+        for x in _axis_starts(width, win_w, tile)
+    ]
+    return TilePlan(width, height, scale, tile=tile, overlap=overlap, batch_size=batch, windows=windows)
+
+
+def _edge_ramp(length: int, overlap: int, ramp_start: bool, ramp_end: bool) -> np.ndarray:
+    w = np.ones(length, dtype=np.float32)
+    if overlap <= 0:
+        return w
+    n = min(overlap, length // 2)
+    ramp = (np.arange(n, dtype=np.float32) + 1) / (n + 1)
+    if ramp_start:
+        w[:n] = ramp
+    if ramp_end:
+        w[length - n:] = ramp[::-1]
+    return w
+
+
+def split_tiles(frame: np.ndarray, plan: TilePlan) -> np.ndarray:
+    """Cut a frame into the plan's windows → (N, win_h, win_w, 3)."""
+    return np.stack([frame[y0:y1, x0:x1] for x0, y0, x1, y1 in plan.windows])
+
+
+def stitch_tiles(tiles: np.ndarray, plan: TilePlan) -> np.ndarray:
+    """
+    Blend upscaled windows back into one frame.
+
+    Each window is weighted by a linear ramp across its overlap on every edge
+    that borders another window (not the frame border), then normalized by
+    the summed weights - seams fade instead of cutting.
+    """
+    s = plan.scale
+    out_h, out_w = plan.height * s, plan.width * s
+    acc = np.zeros((out_h, out_w, tiles.shape[-1]), dtype=np.float32)
+    weight = np.zeros((out_h, out_w, 1), dtype=np.float32)
+
+    for tile, (x0, y0, x1, y1) in zip(tiles, plan.windows):
+        th, tw = (y1 - y0) * s, (x1 - x0) * s
+        wy = _edge_ramp(th, plan.overlap * s, y0 > 0, y1 < plan.height)
+        wx = _edge_ramp(tw, plan.overlap * s, x0 > 0, x1 < plan.width)
+        w = np.outer(wy, wx)[..., None]
+
+        acc[y0 * s:y1 * s, x0 * s:x1 * s] += tile[:th, :tw].astype(np.float32) * w
+        weight[y0 * s:y1 * s, x0 * s:x1 * s] += w
+
+    return np.clip(acc / np.maximum(weight, 1e-6) + 0.5, 0, 255).astype(np.uint8)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# MODELS
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+class InterpolationUpscaleModel:
+    """
+    CPU fallback: nearest-neighbour (NumPy) or Lanczos (OpenCV) upscale.
+
+    Same batch API as the Real-ESRGAN adapter, so plans and stitching can be
+    exercised and benchmarked without a GPU.
+    """
+
+    def __init__(self, scale: int, lanczos: bool = False):
+        self.scale = scale
+        self.lanczos = lanczos
+
+    def upscale_batch(self, batch: np.ndarray) -> np.ndarray:
+        if self.lanczos:
+            import cv2
+            h, w = batch.shape[1:3]
+            return np.stack([
+                cv2.resize(img, (w * self.scale, h * self.scale), interpolation=cv2.INTER_LANCZOS4)
+                for img in batch
+            ])
+        return np.repeat(np.repeat(batch, self.scale, axis=1), self.scale, axis=2)
+
+
+class RealESRGANTorchModel:
+    """
+    Batched forward pass through a RealESRGANer's network.
+
+    Input/output are (N, H, W, 3) BGR uint8, like RealESRGANer.enhance. Inputs
+    are reflect-padded to a multiple of 4 and cropped after.
+    """
+
+    def __init__(self, upsampler: Any):
+        self.upsampler = upsampler
+        self.scale = int(upsampler.scale)
+
+    def upscale_batch(self, batch: np.ndarray) -> np.ndarray:
+        import torch
+
+        n, h, w = batch.shape[:3]
+        pad_h, pad_w = (-h) % _MOD, (-w) % _MOD
+        if pad_h or pad_w:
+            batch = np.pad(batch, ((0, 0), (0, pad_h), (0, pad_w), (0, 0)), mode="reflect")
+
+        t = torch.from_numpy(np.ascontiguousarray(batch[..., ::-1])).permute(0, 3, 1, 2)
+        t = t.to(self.upsampler.device)
+        t = t.half() if self.upsampler.half else t.float()
+        t = t.div_(255.0)
+
+        with torch.no_grad():
+            out = self.upsampler.model(t)
+
+        out = out.float().clamp_(0, 1).mul_(255.0).round_()
+        rgb = out.permute(0, 2, 3, 1).to(torch.uint8).cpu().numpy()
+        return np.ascontiguousarray(rgb[:, :h * self.scale, :w * self.scale, ::-1])
+
+
+# ═══════════════════════════════════════════════════════════════════════════════════
+# ENGINE
+# ═══════════════════════════════════════════════════════════════════════════════════
+
+@dataclass
+class UpscaleStats:
+    frames: int = 0
+    tiles: int = 0
+    forward_passes: int = 0
+    model_s: float = 0.0
+    stitch_s: float = 0.0
+    plans: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "frames": self.frames,
+            "tiles": self.tiles,
+            "forward_passes": self.forward_passes,
+            "model_s": round(self.model_s, 3),
+            "stitch_s": round(self.stitch_s, 3),
+            "plans": self.plans,
+        }
+
+
+class TiledUpscaler:
+    """
+    Budget-aware upscaler with one cached model per native scale.
+
+    `loader(scale)` returns a model with `.scale` and `upscale_batch()`; with
+    `cache_models=False` the loader is asked every call (e.g. when a model
+    registry owns model lifetime and may evict). If the
+    requested outscale differs from the model's native scale (e.g. 8x via the
+    4x model), the stitched result is resized like RealESRGANer's outscale.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[int], Any],
+        memory_budget_bytes: Optional[int] = None,
+        overlap: int = 16,
+        half: bool = True,
+        max_batch: int = 16,
+        frame_batch: int = 8,
+        cache_models: bool = True,
+    ):
+        self.loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.overlap = overlap
+        self.half = half
+        self.max_batch = max_batch
+        self.batch_size = frame_batch
+        self.cache_models = cache_models
+        self.stats = UpscaleStats()
+        self._models: Dict[int, Any] = {}
+        self._plans: Dict[Tuple[int, int, int], TilePlan] = {}
+
+    def model(self, scale: int) -> Any:
+        if not self.cache_models:
+            return self.loader(scale)
+        if scale not in self._models:
+            self._models[scale] = self.loader(scale)
+        return self._models[scale]
+
+    @property
+    def budget(self) -> int:
+        if self.memory_budget_bytes:
+            return self.memory_budget_bytes
+        return detect_memory_budget()
+
+    def plan(self, width: int, height: int, scale: int) -> TilePlan:
+        key = (width, height, scale)
+        if key not in self._plans:
+            plan = plan_tiles(width, height, scale, self.budget,
+                              overlap=self.overlap, half=self.half, max_batch=self.max_batch)
+            self._plans[key] = plan
+            self.stats.plans[f"{width}x{height}@{scale}x"] = plan.to_dict()
+            print(f"[Upscaler] Plan {width}x{height} @{scale}x: {plan.to_dict()}")
+        return self._plans[key]
+
+    def _run(self, model: Any, items: np.ndarray, batch_size: int) -> List[np.ndarray]:
+        outputs: List[np.ndarray] = []
+        for i in range(0, len(items), batch_size):
+            t0 = time.perf_counter()
+            outputs.extend(model.upscale_batch(items[i:i + batch_size]))
+            self.stats.model_s += time.perf_counter() - t0
+            self.stats.forward_passes += 1
+        return outputs
+
+    def _resize(self, frame: np.ndarray, native: int, outscale: int) -> np.ndarray:
+        if native == outscale:
+            return frame
+        import cv2
+        h, w = frame.shape[:2]
+        size = (w * outscale // native, h * outscale // native)
+        return cv2.resize(frame, size, interpolation=cv2.INTER_LANCZOS4)
+
+    def upscale_frames(self, frames: List[np.ndarray], scale: int) -> List[np.ndarray]:
+        """Upscale consecutive same-size frames; returns them in order."""
+        if not frames:
+            return []
+
+        model = self.model(scale)
+        native = int(getattr(model, "scale", scale))
+        height, width = frames[0].shape[:2]
+        plan = self.plan(width, height, native)
+        self.stats.frames += len(frames)
+
+        if not plan.tiled:
+            upscaled = self._run(model, np.stack(frames), plan.batch_size)
+            return [self._resize(f, native, scale) for f in upscaled]
+
+        # Tile every frame, then batch tiles across frame boundaries
+        tiles = np.concatenate([split_tiles(f, plan) for f in frames])
+        self.stats.tiles += len(tiles)
+        outputs = self._run(model, tiles, plan.batch_size)
+
+        per_frame = len(plan.windows)
+        results = []
+        t0 = time.perf_counter()
+        for i in range(len(frames)):
+            stitched = stitch_tiles(np.stack(outputs[i * per_frame:(i + 1) * per_frame]), plan)
+            results.append(self._resize(stitched, native, scale))
+        self.stats.stitch_s += time.perf_counter() - t0
+        return results